@@ -0,0 +1,72 @@
+import os
+import importlib
+import sys
+
+# -------------------------------------------------------
+# Ingest hooks
+# -------------------------------------------------------
+# Work that should happen once per new session (e.g. scoring it with the current
+# models) registers a function for an event here, and the ingest code emits the
+# event after the session is stored. A failing hook is reported and skipped, so
+# it can never stop a session from being ingested. Hooks run in priority order
+# (lowest first), whatever order their modules happen to be imported in.
+# Events: 'session_ingested' (session_key, laps=ml_training_data rows)
+
+# --- CONFIGURATION ---
+# Modules that register hooks when imported (loaded on the first emit)
+DEFAULT_HOOK_MODULES = ['lapQuality', 'pitModel', 'onlineUpdates', 'pitLoss']
+# Priorities of the default hooks: flags are stored before the session is scored,
+# and it is scored by the current model before the model learns from it; pit
+# losses are measured last, as nothing else reads them during an ingest
+FLAG_PRIORITY = 10
+PREDICT_PRIORITY = 20
+UPDATE_PRIORITY = 30
+PIT_LOSS_PRIORITY = 40
+DEFAULT_PRIORITY = 50
+HOOK_MODULE_DIRS = [os.path.abspath(os.path.dirname(__file__)),
+                    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'StrategyModel'))]
+
+_hooks = {}  # event -> [(priority, function)]
+_defaults_loaded = False
+
+def register(event, priority=DEFAULT_PRIORITY):
+    """
+    Decorator: calls the function with (session_key, **payload) whenever event is emitted.
+    Lower priorities run first; equal priorities run in registration order.
+    """
+    def decorator(func):
+        hooks = _hooks.setdefault(event, [])
+        if func not in [f for _, f in hooks]:
+            hooks.append((priority, func))
+        return func
+    return decorator
+
+def hooks_for(event):
+    """The functions registered for an event, in the order emit runs them."""
+    return [func for _, func in sorted(_hooks.get(event, []), key=lambda hook: hook[0])]
+
+def _load_default_hooks():
+    global _defaults_loaded
+    if _defaults_loaded:
+        return
+    _defaults_loaded = True
+    for folder in HOOK_MODULE_DIRS:
+        if folder not in sys.path:
+            sys.path.append(folder)
+    for module in DEFAULT_HOOK_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Could not load ingest hooks from {module}: {e}")
+
+def emit(event, session_key, **payload):
+    """Runs every hook registered for event. Returns the number of hooks that succeeded."""
+    _load_default_hooks()
+    succeeded = 0
+    for func in hooks_for(event):
+        try:
+            func(session_key, **payload)
+            succeeded += 1
+        except Exception as e:
+            print(f"Ingest hook {func.__name__} failed for session {session_key}: {e}")
+    return succeeded
@@ -0,0 +1,260 @@
+import os
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+import databaseManager as db
+import openf1_helper as of1
+import ingestHooks
+import storeMLData as mlData
+
+api = of1.api
+
+# -------------------------------------------------------
+# Lap quality flags
+# -------------------------------------------------------
+# Every ml_training_data lap gets a bitmask of the reasons it is not a normal
+# racing lap: lap 1, pit in/out laps, safety car / VSC / red flag laps (race
+# control), laps the whole field ran slowly, deleted laps, missing times and
+# lap times far off the driver's own pace (robust z-score: median and MAD of the
+# driver's gap to the field on otherwise clean laps). All conditions are array operations over every
+# lap of every session at once. The flags are stored per lap when a session is
+# ingested, and the feature store keeps them with each row, so model code selects
+# clean laps by their flags instead of re-implementing the filters.
+
+# --- CONFIGURATION ---
+LAP_QUALITY_TABLE = "lap_quality"
+SLOW_LAP_FACTOR = 1.10   # Field median slower than this x the session median: lap was neutralised
+OUTLIER_Z = 3.5          # Robust z-score beyond which a lap is off the driver's pace
+MAD_SCALE = 0.6745       # Makes the MAD comparable to a standard deviation for normal data
+
+# Flag bits
+LAP_ONE = 1
+PIT_IN = 2
+PIT_OUT = 4
+SAFETY_CAR = 8
+VSC = 16
+RED_FLAG = 32
+SLOW_FIELD = 64
+DELETED = 128
+NO_TIME = 256
+MISSING_SECTORS = 512
+OUTLIER = 1024
+
+FLAG_NAMES = {LAP_ONE: 'lap_one', PIT_IN: 'pit_in', PIT_OUT: 'pit_out', SAFETY_CAR: 'safety_car', VSC: 'vsc',
+              RED_FLAG: 'red_flag', SLOW_FIELD: 'slow_field', DELETED: 'deleted', NO_TIME: 'no_time',
+              MISSING_SECTORS: 'missing_sectors', OUTLIER: 'outlier'}
+NEUTRALISED = SAFETY_CAR | VSC | RED_FLAG | SLOW_FIELD
+# Laps that say nothing about tyre degradation (deleted laps and missing sectors still have a valid lap time)
+DEGRADATION_EXCLUDE = LAP_ONE | PIT_IN | PIT_OUT | NEUTRALISED | NO_TIME | OUTLIER
+ALL_FLAGS = sum(FLAG_NAMES)
+
+FLAG_COLUMNS = ['session_key', 'driver_number', 'lap_number', 'flags']
+
+# Track status periods from race control messages: (flag bit, start pattern, end pattern)
+TRACK_STATUS = [
+    (SAFETY_CAR, r"^SAFETY CAR DEPLOYED", r"^SAFETY CAR IN THIS LAP|TRACK CLEAR"),
+    (VSC, r"VIRTUAL SAFETY CAR DEPLOYED", r"VIRTUAL SAFETY CAR ENDING|TRACK CLEAR"),
+    (RED_FLAG, r"^RED FLAG", r"^GREEN LIGHT|PIT EXIT OPEN|TRACK CLEAR"),
+]
+DELETED_PATTERN = r"CAR (\d+).*DELETED.*LAP (\d+)"
+REINSTATED_PATTERN = r"CAR (\d+).*LAP (\d+).*REINSTATED"
+
+# ---------------------------
+# Registered queries
+# ---------------------------
+Q_FLAGS = db.register_query('lap_quality_for_session', f"""
+    SELECT {', '.join(FLAG_COLUMNS)}
+    FROM {LAP_QUALITY_TABLE}
+    WHERE session_key = :session_key
+""", dtypes={'flags': 'int64'})
+
+# ---------------------------
+# Race control
+# ---------------------------
+def lap_key(session, driver, lap):
+    """One int64 per (session, driver, lap), for isin / setdiff lookups."""
+    return (np.asarray(session, dtype=np.int64) * 100 + np.asarray(driver, dtype=np.int64)) * 1000 + np.asarray(lap, dtype=np.int64)
+
+def track_status_flags(race_control, session, lap):
+    """
+    Track status bits (TRACK_STATUS) for laps given as session and lap arrays.
+    Each period runs from its start message's lap to the first end message at or after it
+    (the session's last lap if it never ends). race_control is OpenF1 race_control rows.
+    """
+    flags = np.zeros(len(lap), dtype=np.int64)
+    if race_control is None or race_control.empty or not {'message', 'lap_number', 'session_key'} <= set(race_control.columns):
+        return flags
+    rc = race_control.dropna(subset=['message', 'lap_number'])
+    messages = rc['message'].astype(str).str.upper()
+    rc_lap = rc['lap_number'].to_numpy(dtype=np.int64)
+    # Sessions are placed end to end on one lap axis so all periods are marked with one difference array
+    sessions, session_index = np.unique(np.asarray(session, dtype=np.int64), return_inverse=True)
+    width = int(max(np.max(lap), rc_lap.max() if len(rc_lap) else 0)) + 2
+    last_lap = np.zeros(len(sessions), dtype=np.int64)
+    np.maximum.at(last_lap, session_index, np.asarray(lap, dtype=np.int64))
+    rc_session = np.searchsorted(sessions, rc['session_key'].to_numpy(dtype=np.int64))
+    known = (rc_session < len(sessions)) & (sessions[np.minimum(rc_session, len(sessions) - 1)] == rc['session_key'].to_numpy(dtype=np.int64))
+
+    for bit, start_pattern, end_pattern in TRACK_STATUS:
+        starts = known & messages.str.contains(start_pattern).to_numpy()
+        ends = known & messages.str.contains(end_pattern).to_numpy()
+        if not starts.any():
+            continue
+        start_pos = rc_session[starts] * width + rc_lap[starts]
+        end_pos = np.sort(rc_session[ends] * width + rc_lap[ends])
+        # First end at or after each start, within the same session
+        nearest = np.searchsorted(end_pos, start_pos)
+        session_end = rc_session[starts] * width + last_lap[rc_session[starts]]
+        stop = session_end.copy()
+        ended = nearest < len(end_pos)
+        stop[ended] = np.minimum(end_pos[nearest[ended]], session_end[ended])
+        diff = np.zeros(len(sessions) * width + 1, dtype=np.int64)
+        np.add.at(diff, start_pos, 1)
+        np.add.at(diff, stop + 1, -1)
+        active = np.cumsum(diff)[:-1] > 0
+        flags |= np.where(active[session_index * width + np.asarray(lap, dtype=np.int64)], bit, 0)
+    return flags
+
+def deleted_lap_keys(race_control):
+    """Lap keys (lap_key) of laps deleted by race control and not reinstated later."""
+    if race_control is None or race_control.empty or not {'message', 'session_key'} <= set(race_control.columns):
+        return np.empty(0, dtype=np.int64)
+    messages = race_control['message'].astype(str).str.upper()
+    session = race_control['session_key']
+
+    def keys(pattern, exclude=None):
+        found = messages.str.extract(pattern)
+        valid = found.notna().all(axis=1)
+        if exclude is not None:
+            valid &= ~messages.str.contains(exclude)
+        return lap_key(session[valid], found.loc[valid, 0].astype(np.int64), found.loc[valid, 1].astype(np.int64))
+
+    return np.setdiff1d(keys(DELETED_PATTERN, "REINSTATED"), keys(REINSTATED_PATTERN))
+
+# ---------------------------
+# Flags
+# ---------------------------
+def compute_flags(laps, race_control=None):
+    """
+    Quality bitmask for every lap (ml_training_data rows, any number of sessions). race_control
+    (OpenF1 race_control rows with session_key) adds track status and deleted laps; without it
+    neutralised laps are still caught by SLOW_FIELD. Returns FLAG_COLUMNS.
+    """
+    if laps is None or laps.empty:
+        return pd.DataFrame(columns=FLAG_COLUMNS)
+    laps = laps.sort_values(['session_key', 'driver_number', 'lap_number'], kind='stable').reset_index(drop=True)
+    session = laps['session_key'].to_numpy(dtype=np.int64)
+    driver = laps['driver_number'].to_numpy(dtype=np.int64)
+    lap = laps['lap_number'].to_numpy(dtype=np.int64)
+    lap_time = pd.to_numeric(laps['lap_duration'], errors='coerce')
+    pit_out = pd.to_numeric(laps['is_pit_out_lap'], errors='coerce').fillna(0).to_numpy(dtype=bool)
+
+    # In-lap: the same driver's next lap is a pit out lap
+    next_same = np.r_[(session[1:] == session[:-1]) & (driver[1:] == driver[:-1]) & (lap[1:] == lap[:-1] + 1), False]
+    pit_in = next_same & np.r_[pit_out[1:], False]
+
+    sectors = laps[[c for c in ('duration_sector_1', 'duration_sector_2', 'duration_sector_3') if c in laps.columns]]
+    missing_sectors = sectors.apply(pd.to_numeric, errors='coerce').isna().any(axis=1).to_numpy()
+
+    # Laps the whole field ran slowly (the session's median lap of each lap number)
+    field = lap_time.groupby([session, lap]).transform('median')
+    slow_field = (field > SLOW_LAP_FACTOR * lap_time.groupby(session).transform('median')).to_numpy()
+
+    flags = np.zeros(len(laps), dtype=np.int64)
+    flags |= np.where(lap == 1, LAP_ONE, 0)
+    flags |= np.where(pit_in, PIT_IN, 0)
+    flags |= np.where(pit_out, PIT_OUT, 0)
+    flags |= np.where(slow_field, SLOW_FIELD, 0)
+    flags |= np.where(lap_time.isna().to_numpy(), NO_TIME, 0)
+    flags |= np.where(missing_sectors, MISSING_SECTORS, 0)
+    flags |= track_status_flags(race_control, session, lap)
+    flags |= np.where(np.isin(lap_key(session, driver, lap), deleted_lap_keys(race_control)), DELETED, 0)
+
+    # Robust z-score of each lap's gap to the field (which removes fuel burn and track evolution)
+    # against the driver's own gaps on laps not already flagged
+    gap = lap_time - field
+    reference = gap.where((flags & (DEGRADATION_EXCLUDE & ~OUTLIER)) == 0)
+    groups = [session, driver]
+    median = reference.groupby(groups).transform('median')
+    mad = (reference - median).abs().groupby(groups).transform('median')
+    z = MAD_SCALE * (gap - median) / mad.where(mad > 0)
+    flags |= np.where(z.abs().gt(OUTLIER_Z).to_numpy(), OUTLIER, 0)
+
+    return pd.DataFrame({'session_key': session, 'driver_number': driver, 'lap_number': lap, 'flags': flags})
+
+def flag_names(flags):
+    """Names of the bits set in one flags value, e.g. ['pit_in', 'safety_car']."""
+    return [name for bit, name in FLAG_NAMES.items() if int(flags) & bit]
+
+def flag_counts(flags):
+    """Laps with each flag set per session (plus 'clean' laps with none)."""
+    counts = pd.DataFrame({name: (flags['flags'] & bit) != 0 for bit, name in FLAG_NAMES.items()})
+    counts['clean'] = flags['flags'] == 0
+    return counts.groupby(flags['session_key']).sum()
+
+# ---------------------------
+# Store / load
+# ---------------------------
+def fetch_race_control(session_keys):
+    """OpenF1 race_control rows for the sessions (empty for any the API cannot provide)."""
+    frames = [api.get_dataframe('race_control', {'session_key': int(key)}) for key in session_keys]
+    frames = [f.assign(session_key=int(key)) for key, f in zip(session_keys, frames) if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def store_flags(flags):
+    """Replaces the stored flags of every session in flags."""
+    if flags.empty:
+        return
+    for key in pd.unique(flags['session_key']):
+        db.execute_query(f"DELETE FROM {LAP_QUALITY_TABLE} WHERE session_key = :s", {'s': int(key)})
+    db.save_to_db(flags[FLAG_COLUMNS], LAP_QUALITY_TABLE, if_exists='append')
+
+def load_flags(session_keys):
+    """Stored flags of the given sessions (FLAG_COLUMNS); sessions never flagged are missing."""
+    frames = [db.query_df(Q_FLAGS, {'session_key': int(key)}) for key in session_keys]
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=FLAG_COLUMNS)
+
+def lap_flags(laps, stored=None):
+    """
+    Flags of laps (ml_training_data rows), in the laps' row order: the stored flags (load_flags)
+    where a lap has them, otherwise computed from the laps alone (without race control).
+    """
+    flags = compute_flags(laps)
+    if stored is not None and not stored.empty:
+        flags = pd.concat([stored[FLAG_COLUMNS], flags], ignore_index=True)
+    flag_keys = lap_key(flags['session_key'], flags['driver_number'], flags['lap_number'])
+    # Stored flags come first, so they win over the computed ones
+    lookup = pd.Series(flags['flags'].to_numpy(dtype=np.int64), index=flag_keys)
+    lookup = lookup[~lookup.index.duplicated(keep='first')]
+    keys = lap_key(laps['session_key'], laps['driver_number'], laps['lap_number'])
+    return lookup.reindex(keys).fillna(0).to_numpy(dtype=np.int64)
+
+def flag_sessions(session_keys=None, laps=None, race_control=None):
+    """
+    Computes and stores the flags of sessions (every session in ml_training_data by default).
+    laps and race_control are read from the DB / API when not given. Returns FLAG_COLUMNS.
+    """
+    if session_keys is None:
+        session_keys = mlData.stored_session_keys()
+    if laps is None:
+        frames = [db.query_df(mlData.Q_ML_SESSION, {'session_key': int(key)}) for key in session_keys]
+        frames = [f for f in frames if not f.empty]
+        laps = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    race_control = fetch_race_control(session_keys) if race_control is None else race_control
+    flags = compute_flags(laps, race_control)
+    store_flags(flags)
+    return flags
+
+# ---------------------------
+# Ingest hook
+# ---------------------------
+@ingestHooks.register('session_ingested', ingestHooks.FLAG_PRIORITY)
+def flag_on_ingest(session_key, laps=None):
+    """Ingest hook: flags the new session's laps (runs before the model updates, which read the flags)."""
+    flags = flag_sessions([session_key], laps)
+    print(f"Flagged {int((flags['flags'] != 0).sum())} of {len(flags)} laps in session {session_key}.")
+
+if __name__ == "__main__":
+    print(flag_counts(flag_sessions()).to_string())
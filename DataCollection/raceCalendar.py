@@ -0,0 +1,172 @@
+import datetime
+import pandas as pd
+from sqlalchemy.exc import OperationalError
+import openf1_helper as of1
+import sys, os; sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+import databaseManager as db
+
+api = of1.api
+
+# --- CONFIGURATION ---
+CALENDAR_TABLE = "race_calendar"
+REFRESH_TABLE = "calendar_refresh"
+CALENDAR_REFRESH_HOURS = 12  # How old a stored season schedule can get before it is re-fetched
+CALENDAR_COLUMNS = [
+    'session_key', 'meeting_key', 'circuit_key', 'year',
+    'session_name', 'session_type', 'country_name', 'location', 'circuit_short_name',
+    'date_start', 'date_end'
+]
+
+# ---------------------------
+# Registered queries
+# ---------------------------
+Q_REFRESHED_AT = db.register_query('calendar_refreshed_at', f"""
+    SELECT refreshed_at FROM {REFRESH_TABLE} WHERE year = :year
+""")
+
+Q_SEASON = db.register_query('calendar_season', f"""
+    SELECT {', '.join(CALENDAR_COLUMNS)}
+    FROM {CALENDAR_TABLE}
+    WHERE year = :year
+    ORDER BY date_start
+""")
+
+Q_SESSION_YEAR = db.register_query('calendar_session_year', f"""
+    SELECT year FROM {CALENDAR_TABLE} WHERE session_key = :session_key
+""")
+
+# In-process index, loaded from the DB once per season
+_season_index = {}    # year -> DataFrame sorted by date_start
+_session_index = {}   # session_key -> row (Series)
+_last_checked = {}    # year -> datetime of the last staleness check in this process
+
+# ---------------------------
+# get season year (adjust month if needed)
+# ---------------------------
+def get_season_year(today=None, season_start_month=3):
+    """
+    Return the season year to query.
+    If the current month is before the season_start_month, return previous year.
+    Default assumes season starts in March so Jan/Feb use previous year.
+    """
+    if today is None:
+        today = datetime.datetime.now(datetime.timezone.utc)
+    return today.year if today.month >= season_start_month else today.year - 1
+
+# ---------------------------
+# Refresh from API
+# ---------------------------
+def _last_refreshed(year):
+    """Returns when the season was last fetched from the API, or None if it never was."""
+    df = db.query_df(Q_REFRESHED_AT, {'year': int(year)})
+    if df.empty:
+        return None
+    return pd.to_datetime(df.iloc[0]['refreshed_at'], utc=True)
+
+def refresh_season(year=None, force=False, max_age_hours=CALENDAR_REFRESH_HOURS):
+    """
+    Fetches the season's race schedule from the API if the stored copy is missing or stale.
+    Returns True if a schedule is available afterwards (fresh or stored).
+    If the API is unreachable the stored schedule is kept, so the calendar works offline.
+    """
+    if year is None:
+        year = get_season_year()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    max_age = datetime.timedelta(hours=max_age_hours)
+
+    # Only ask the DB about staleness once per refresh period in this process
+    if not force and year in _last_checked and now - _last_checked[year] < max_age:
+        return not _get_season(year).empty
+
+    refreshed_at = None if force else _last_refreshed(year)
+    if refreshed_at is not None and now - refreshed_at < max_age:
+        _last_checked[year] = now
+        return not _get_season(year).empty
+
+    sessions_df = api.get_dataframe('sessions', {'year': year, 'session_type': 'Race'})
+    if sessions_df.empty:
+        print(f"Could not refresh {year} calendar, using stored schedule.")
+        _last_checked[year] = now
+        return not _get_season(year).empty
+
+    sessions_df['year'] = sessions_df.get('year', year)
+    for col in CALENDAR_COLUMNS:
+        if col not in sessions_df.columns:
+            sessions_df[col] = None
+    schedule = sessions_df[CALENDAR_COLUMNS]
+
+    try:
+        db.execute_query(f"DELETE FROM {CALENDAR_TABLE} WHERE year = :year", {'year': year})
+        db.execute_query(f"DELETE FROM {REFRESH_TABLE} WHERE year = :year", {'year': year})
+    except OperationalError as e:
+        # Tables do not exist yet, save_to_db will create them; anything else is a real failure
+        if "no such table" not in str(e):
+            raise
+    db.save_to_db(schedule, CALENDAR_TABLE, if_exists='append')
+    db.save_to_db(pd.DataFrame([{'year': year, 'refreshed_at': now.isoformat()}]), REFRESH_TABLE, if_exists='append')
+
+    _invalidate(year)
+    _last_checked[year] = now
+    return True
+
+# ---------------------------
+# Index
+# ---------------------------
+def _invalidate(year):
+    """Drops a season from the in-process index so the next query reloads it."""
+    season = _season_index.pop(year, None)
+    if season is not None:
+        for key in season['session_key']:
+            _session_index.pop(key, None)
+
+def _get_season(year):
+    """Returns the stored schedule for a season, sorted by start date."""
+    if year in _season_index:
+        return _season_index[year]
+
+    season = db.query_df(Q_SEASON, {'year': int(year)})
+    if not season.empty:
+        season['date_start'] = pd.to_datetime(season['date_start'], utc=True, format='ISO8601')
+        season['date_end'] = pd.to_datetime(season['date_end'], utc=True, format='ISO8601')
+        season = season.sort_values('date_start').reset_index(drop=True)
+        for _, row in season.iterrows():
+            _session_index[row['session_key']] = row
+        _season_index[year] = season
+    return season
+
+# ---------------------------
+# Queries
+# ---------------------------
+def get_recent_races(n=5, year=None, now=None):
+    """
+    Returns the last n completed races of the season, oldest first.
+    Served from the local store only (no network calls).
+    Races that have not finished yet are excluded so an in-progress session is never synced.
+    """
+    if year is None:
+        year = get_season_year()
+    if now is None:
+        now = pd.Timestamp.now(tz='UTC')
+
+    season = _get_season(year)
+    if season.empty:
+        return season
+
+    finished = season['date_end'].fillna(season['date_start']) <= now
+    return season[finished].tail(n).reset_index(drop=True)
+
+def get_race(session_key):
+    """Returns the calendar row for a session, or None if it is not in the local store."""
+    if session_key in _session_index:
+        return _session_index[session_key]
+
+    row = db.query_df(Q_SESSION_YEAR, {'session_key': int(session_key)})
+    if row.empty:
+        return None
+    _get_season(int(row.iloc[0]['year']))
+    return _session_index.get(session_key)
+
+if __name__ == "__main__":
+    # Force a refresh of the current season's schedule
+    refresh_season(force=True)
+    print(get_recent_races())
@@ -0,0 +1,305 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------
+# Random-access replay state
+# -------------------------------------------------------
+# The replay frames (replaySchema.REPLAY_FRAME_SCHEMA, one row per driver per
+# second) are sorted once by race time. A frame is then a contiguous slice found
+# with one searchsorted, so the state at any second - positions, leaderboard and
+# race control - is answered in O(log n) without building any other frame.
+# Lap -> time lookups use the leader's lap per frame, race control is keyed by lap.
+# With a track projection (trackProjection) every row also gets its race distance,
+# so the order and gaps come from where the cars actually are on the lap.
+# Stored pit predictions (pitModel) become a drivers x laps lookup, so the
+# leaderboard can show each driver's pit probability without scoring anything.
+
+# --- CONFIGURATION ---
+COMPOUND_COLOURS = {
+    'SOFT': '#ff0000',
+    'MEDIUM': '#ffff00',
+    'HARD': '#ffffff',
+    'INTERMEDIATE': '#00ff00',
+    'WET': '#0099ff',
+    'UNKNOWN': '#808080'
+}
+DEFAULT_COMPOUND_COLOUR = '#808080'
+LEADERBOARD_COLUMNS = ['Pos', 'Driver', 'Team', 'Lap', 'Compound', 'team_colour', 'compound_colour', 'Gap']
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def lap_time_seconds(lap_time_fmt):
+    """'M:SS.mmm' strings -> seconds (0.0 where missing), the values the leaderboard gaps add up."""
+    parts = pd.Series(lap_time_fmt, dtype=object).astype(str).str.split(':', n=1, expand=True)
+    if parts.shape[1] < 2:
+        return np.zeros(len(parts))
+    minutes = pd.to_numeric(parts[0], errors='coerce')
+    seconds = pd.to_numeric(parts[1], errors='coerce')
+    return (minutes * 60 + seconds).fillna(0.0).to_numpy(dtype=float)
+
+def safety_car_laps(race_control):
+    """
+    Laps under the safety car: from the first 'SafetyCar' message to the first TRACK CLEAR
+    after it (or the last 'SafetyCar' message if the track is never declared clear).
+    """
+    if race_control is None or race_control.empty or 'category' not in race_control.columns:
+        return set()
+    sc_laps = race_control.loc[race_control['category'] == 'SafetyCar', 'lap_number'].dropna().unique()
+    if len(sc_laps) == 0:
+        return set()
+
+    min_sc_lap = min(sc_laps)
+    max_sc_lap = max(sc_laps)
+    track_clear = race_control[(race_control['lap_number'] > min_sc_lap) &
+                               (race_control['message'].str.contains("TRACK CLEAR", na=False))]
+    if not track_clear.empty:
+        max_sc_lap = track_clear['lap_number'].min()
+    return set(range(int(min_sc_lap), int(max_sc_lap) + 1))
+
+def safety_car_start_laps(race_control):
+    """First lap of each safety car period, in order."""
+    laps = safety_car_laps(race_control)
+    return [lap for lap in sorted(laps) if lap - 1 not in laps]
+
+def race_messages(race_control):
+    """FIA messages other than safety car ones, joined per lap: {lap: 'msg | msg'}."""
+    if race_control is None or race_control.empty or not {'message', 'lap_number', 'category'} <= set(race_control.columns):
+        return {}
+    messages = race_control.dropna(subset=['message'])
+    messages = messages[messages['category'] != 'SafetyCar']
+    return {lap: " | ".join(group['message'].unique()) for lap, group in messages.groupby('lap_number')}
+
+# ---------------------------
+# Index
+# ---------------------------
+class ReplayIndex:
+    """Seekable view over one session's replay frames, lap times and race control messages."""
+
+    def __init__(self, frames, lap_times=None, race_control=None, projection=None, pit_predictions=None):
+        # Time-major order; drivers keep their category order within a frame
+        codes = frames['driver_acronym'].cat.codes.to_numpy()
+        race_time = frames['race_time'].to_numpy()
+        order = np.lexsort((codes, race_time))
+        self.frames = frames.iloc[order].reset_index(drop=True)
+
+        race_time = race_time[order]
+        self.times, self.offsets = np.unique(race_time, return_index=True)
+        self.offsets = np.append(self.offsets, len(race_time))
+
+        # Leader's lap per frame, made non-decreasing so laps can be searched like times
+        laps = self.frames['lap_number'].to_numpy()
+        frame_laps = np.maximum.reduceat(laps, self.offsets[:-1]) if len(laps) else laps
+        self.leader_laps = np.maximum.accumulate(frame_laps) if len(frame_laps) else frame_laps
+
+        self._codes = codes[order]
+        self._laps = laps
+        self._lap_start = self.frames['lap_start_time'].to_numpy()
+        self._race_time_before = self._cumulative_lap_times(lap_times)
+
+        self.safety_car_laps = safety_car_laps(race_control)
+        self.race_messages = race_messages(race_control)
+
+        self.distance = None
+        if projection is not None and len(self.frames):
+            self._project(projection)
+
+        self._pit_text = self._pit_lookup(pit_predictions)
+
+    def _project(self, projection):
+        """Race distance of every row, plus each driver's rows in time order (for time gaps)."""
+        lap_seconds = self.frames['lap_duration'].to_numpy(dtype=float)
+        known = ~np.isnan(lap_seconds)
+        self.lap_seconds = float(np.median(lap_seconds[known])) if known.any() else np.nan
+        lap_seconds = np.where(known, lap_seconds, self.lap_seconds)
+        elapsed = self.frames['race_time'].to_numpy(dtype=float) - self._lap_start
+
+        self.track_length = projection.length
+        self.distance = projection.race_distance(self.frames['x'].to_numpy(), self.frames['y'].to_numpy(),
+                                                 self._laps, elapsed, lap_seconds)
+        # Rows without a position fall back to the start of their lap
+        missing = np.isnan(self.distance)
+        self.distance[missing] = (self._laps[missing] - 1) * self.track_length
+
+        # Time-major order is kept within each driver by the stable sort
+        by_driver = np.argsort(self._codes, kind='stable')
+        splits = np.flatnonzero(np.diff(self._codes[by_driver])) + 1
+        self._driver_rows = {int(self._codes[rows[0]]): rows for rows in np.split(by_driver, splits) if len(rows)}
+
+    def _pit_lookup(self, predictions):
+        """(driver numbers x laps) display strings 'p% (low-high)' from pitModel predictions, or None without any."""
+        if predictions is None or predictions.empty:
+            return None
+        driver = predictions['driver_number'].to_numpy(dtype=np.int64)
+        lap = predictions['lap_number'].to_numpy(dtype=np.int64)
+        text = np.full((max(driver.max(), self.frames['driver_number'].max()) + 1,
+                        max(lap.max(), self._laps.max() if len(self._laps) else 0) + 1), '', dtype=object)
+
+        def percent(column):
+            return np.rint(predictions[column].to_numpy(dtype=float) * 100).astype(int).astype(str).astype(object)
+
+        text[driver, lap] = percent('pit_probability') + '% (' + percent('ci_low') + '–' + percent('ci_high') + ')'
+        return text
+
+    def _cumulative_lap_times(self, lap_times):
+        """(drivers x laps + 1) matrix: total recorded lap time of each driver before each lap."""
+        categories = self.frames['driver_acronym'].cat.categories
+        max_lap = int(self._laps.max()) if len(self._laps) else 0
+        totals = np.zeros((len(categories), max_lap + 2))
+        if lap_times is None or lap_times.empty:
+            return totals
+
+        driver = pd.Categorical(lap_times['driver_acronym'].astype(str), categories=categories).codes
+        lap = lap_times['lap_number'].to_numpy(dtype=np.int64)
+        keep = (driver >= 0) & (lap >= 0) & (lap <= max_lap)
+        # Lap L's time counts towards the total before lap L+1 onwards
+        np.add.at(totals, (driver[keep], lap[keep] + 1), lap_time_seconds(lap_times['lap_time_fmt'])[keep])
+        return np.cumsum(totals, axis=1)
+
+    # ---------------------------
+    # Seeking
+    # ---------------------------
+    def __len__(self):
+        return len(self.times)
+
+    def frame_number(self, race_time):
+        """Frame shown at race_time: the last frame at or before it (clamped to the replay)."""
+        i = np.searchsorted(self.times, race_time, side='right') - 1
+        return int(np.clip(i, 0, len(self.times) - 1))
+
+    def time_for_lap(self, lap):
+        """Race time of the first frame in which the leader is on lap (the last frame if never reached)."""
+        i = np.searchsorted(self.leader_laps, lap, side='left')
+        return int(self.times[min(i, len(self.times) - 1)])
+
+    def lap_at(self, race_time):
+        """Leader's lap at race_time."""
+        return int(self.leader_laps[self.frame_number(race_time)])
+
+    def safety_car_starts(self):
+        """Race times at which each safety car period starts (first frame of its first lap)."""
+        starts = [lap for lap in sorted(self.safety_car_laps) if lap - 1 not in self.safety_car_laps]
+        return [self.time_for_lap(lap) for lap in starts]
+
+    def next_safety_car(self, race_time=None):
+        """Start of the first safety car period after race_time (or the first one). None if there is none."""
+        for start in self.safety_car_starts():
+            if race_time is None or start > race_time:
+                return start
+        return None
+
+    # ---------------------------
+    # State at a race time
+    # ---------------------------
+    def positions_at(self, race_time):
+        """Frame rows (one per driver) shown at race_time."""
+        i = self.frame_number(race_time)
+        return self.frames.iloc[self.offsets[i]:self.offsets[i + 1]]
+
+    def window(self, start_time, end_time):
+        """All frame rows with start_time <= race_time < end_time, as one slice of the sorted frames."""
+        a = self.offsets[np.searchsorted(self.times, start_time, side='left')]
+        b = self.offsets[np.searchsorted(self.times, end_time, side='left')]
+        return self.frames.iloc[a:b]
+
+    def window_times(self, start_time, end_time):
+        """Frame times with start_time <= race_time < end_time."""
+        return self.times[np.searchsorted(self.times, start_time, side='left'):np.searchsorted(self.times, end_time, side='left')]
+
+    def leaderboard_at(self, race_time):
+        """
+        Standings at race_time. With a track projection they follow race distance (see
+        _leaderboard_by_distance); otherwise higher lap first, then earlier lap start, and the
+        gap is laps behind the leader or the difference in total lap time on the leader's lap.
+        """
+        i = self.frame_number(race_time)
+        a, b = self.offsets[i], self.offsets[i + 1]
+        if a == b:
+            return pd.DataFrame(columns=LEADERBOARD_COLUMNS)
+        if self.distance is not None:
+            return self._leaderboard_by_distance(a, b)
+
+        order = np.lexsort((self._lap_start[a:b], -self._laps[a:b].astype(np.int64))) + a
+        standings = self.frames.iloc[order]
+        laps = self._laps[order].astype(np.int64)
+        codes = self._codes[order]
+
+        # Position within each lap group (standings are grouped by lap, leader's lap first)
+        new_lap = np.r_[True, laps[1:] != laps[:-1]]
+        group_start = np.maximum.accumulate(np.where(new_lap, np.arange(len(laps)), 0))
+        positions = np.arange(len(laps)) - group_start + 1
+
+        lap_diff = laps[0] - laps
+        time_gap = np.abs(self._race_time_before[codes, laps] - self._race_time_before[codes[0], laps[0]])
+        gaps = ["Leader" if k == 0 else
+                (f"+{int(d)} Lap{'s' if d > 1 else ''}" if d > 0 else f"+{g:.3f}s")
+                for k, (d, g) in enumerate(zip(lap_diff, time_gap))]
+        return self._leaderboard_frame(standings, positions, gaps)
+
+    def _leaderboard_frame(self, standings, positions, gaps):
+        """LEADERBOARD_COLUMNS for frame rows already in standings order, plus 'Pit' with pit predictions."""
+        compound = standings['compound']
+        board = pd.DataFrame({
+            'Pos': positions.astype(str),
+            'Driver': standings['driver_acronym'].to_numpy(),
+            'Team': standings['team_name'].astype(object).fillna('').to_numpy(),
+            'Lap': standings['lap_number'].to_numpy(),
+            'Compound': compound.to_numpy(),
+            'team_colour': standings['team_colour'].to_numpy(),
+            'compound_colour': compound.astype(object).map(COMPOUND_COLOURS).fillna(DEFAULT_COMPOUND_COLOUR).to_numpy(),
+            'Gap': gaps,
+        })
+        if self._pit_text is not None:
+            # Probability of pitting at the end of the lap each driver is on
+            board['Pit'] = self._pit_text[standings['driver_number'].to_numpy(dtype=np.int64),
+                                          standings['lap_number'].to_numpy(dtype=np.int64)]
+        return board
+
+    def time_gaps(self, leader_code, race_time, distance, fallback):
+        """
+        Seconds between the leader passing each of the given race distances and race_time, from
+        the leader's trajectory up to race_time. Distances the leader passed before the loaded
+        frames use fallback (seconds).
+        """
+        rows = self._driver_rows[int(leader_code)]
+        times = self.frames['race_time'].to_numpy()[rows].astype(float)
+        seen = times <= race_time
+        history = np.maximum.accumulate(self.distance[rows[seen]])
+        passed_at = np.interp(distance, history, times[seen], left=np.nan)
+        return np.where(np.isnan(passed_at), fallback, race_time - passed_at)
+
+    def _leaderboard_by_distance(self, a, b):
+        """
+        Standings ordered by race distance. The gap is whole laps behind the leader's distance,
+        or the time since the leader passed the same point on track.
+        """
+        order = np.argsort(-self.distance[a:b], kind='stable') + a
+        standings = self.frames.iloc[order]
+        codes = self._codes[order]
+        distance = self.distance[order]
+
+        behind = distance[0] - distance
+        laps_behind = np.floor(behind / self.track_length).astype(np.int64)
+        seconds = self.time_gaps(codes[0], float(self.frames['race_time'].iat[a]), distance,
+                                 behind / self.track_length * self.lap_seconds)
+
+        gaps = ["Leader" if k == 0 else
+                (f"+{int(d)} Lap{'s' if d > 1 else ''}" if d > 0 else f"+{g:.3f}s")
+                for k, (d, g) in enumerate(zip(laps_behind, seconds))]
+        return self._leaderboard_frame(standings, np.arange(1, len(order) + 1), gaps)
+
+    def race_control_at(self, race_time):
+        """{'lap', 'safety_car', 'message'} for the leader's lap at race_time."""
+        lap = self.lap_at(race_time)
+        return {'lap': lap, 'safety_car': lap in self.safety_car_laps, 'message': self.race_messages.get(lap, "")}
+
+    def state_at(self, race_time):
+        """Everything the replay shows at race_time, without building any other frame."""
+        i = self.frame_number(race_time)
+        t = int(self.times[i])
+        return {
+            'race_time': t,
+            'positions': self.positions_at(t),
+            'leaderboard': self.leaderboard_at(t),
+            'race_control': self.race_control_at(t),
+        }
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------
+# Replay dtype contracts
+# -------------------------------------------------------
+# The replay carries ~120k aligned rows per race. Repeated strings (driver, team,
+# compound, colour) are categoricals, coordinates float32, lap numbers int16 and
+# race time int32 seconds. Producers call apply_schema() before returning and
+# consumers call check_schema() on what they receive, so a stray float64/object
+# column is caught at the module boundary instead of silently doubling memory.
+
+CATEGORY = 'category'
+UTC_TIMESTAMP = 'datetime64[ns, UTC]'
+
+# Decoded location samples (telemetryPartitions.read_session)
+SAMPLE_SCHEMA = {
+    'session_key': 'int32',
+    'driver_acronym': CATEGORY,
+    'driver_number': 'int16',
+    'lap_number': 'int16',
+    'lap_duration': 'float32',
+    'timestamp': UTC_TIMESTAMP,
+    'x': 'float32',
+    'y': 'float32',
+    'z': 'float32',
+}
+
+# Per-second resampled samples (storeRaceData.get_race_replay_data)
+RESAMPLED_SCHEMA = {
+    'driver_acronym': CATEGORY,
+    'driver_number': 'int16',
+    'timestamp': UTC_TIMESTAMP,
+    'x': 'float32',
+    'y': 'float32',
+    'lap_duration': 'float32',
+    'lap_number': 'int16',
+    'race_time': 'int32',
+}
+
+# Lap times derived from the samples (storeRaceData.get_race_replay_data)
+LAP_TIME_SCHEMA = {
+    'driver_acronym': CATEGORY,
+    'lap_number': 'int16',
+    'lap_time': 'float32',
+}
+
+# Lap table from the per-lap index (storeRaceData.get_replay_laps)
+REPLAY_LAP_SCHEMA = {
+    'driver_acronym': CATEGORY,
+    'driver_number': 'int16',
+    'lap_number': 'int16',
+    'lap_start_time': 'float32',
+    'lap_time': 'float32',
+}
+
+# Lap times as used by the replay page (adds colour and display string)
+LAP_TIME_DISPLAY_SCHEMA = {
+    **LAP_TIME_SCHEMA,
+    'team_colour': CATEGORY,
+    'lap_time_fmt': 'object',
+}
+
+# Frames aligned to the 1 s master timeline (raceReplay.get_replay_data)
+REPLAY_FRAME_SCHEMA = {
+    'race_time': 'int32',
+    'driver_acronym': CATEGORY,
+    'driver_number': 'int16',
+    'timestamp': UTC_TIMESTAMP,
+    'x': 'float32',
+    'y': 'float32',
+    'lap_duration': 'float32',
+    'lap_number': 'int16',
+    'lap_start_time': 'float32',
+    'compound': CATEGORY,
+    'team_colour': CATEGORY,
+    'team_name': CATEGORY,
+}
+
+# ---------------------------
+# Contracts
+# ---------------------------
+def _matches(series, dtype):
+    if dtype == CATEGORY:
+        return isinstance(series.dtype, pd.CategoricalDtype)
+    if dtype == 'object':
+        return pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)
+    return series.dtype == pd.api.types.pandas_dtype(dtype)
+
+def apply_schema(df, schema, fill=None):
+    """
+    Casts a DataFrame to a schema: keeps the schema's columns in order, converts each to its dtype.
+    Missing integer values become 0; fill optionally supplies defaults for missing columns.
+    Returns a new DataFrame.
+    """
+    fill = fill or {}
+    out = {}
+    for col, dtype in schema.items():
+        if col in df.columns:
+            series = df[col]
+        elif col in fill:
+            series = pd.Series(fill[col], index=df.index)
+        else:
+            raise KeyError(f"Column '{col}' required by the replay schema is missing")
+
+        if dtype == CATEGORY:
+            out[col] = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype(CATEGORY)
+        elif dtype == UTC_TIMESTAMP:
+            out[col] = pd.to_datetime(series, utc=True)
+        elif dtype == 'object':
+            out[col] = series.astype(object)
+        elif np.issubdtype(np.dtype(dtype), np.integer):
+            out[col] = series.fillna(0).astype(dtype)
+        else:
+            out[col] = series.astype(dtype)
+    return pd.DataFrame(out, index=df.index)
+
+def check_schema(df, schema, where):
+    """
+    Raises TypeError if a DataFrame does not follow a schema (missing column or wrong dtype).
+    where names the boundary in the message, e.g. 'get_replay_data input'.
+    Empty frames pass, as they carry no data to misrepresent.
+    """
+    if df.empty:
+        return df
+    problems = []
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            problems.append(f"missing '{col}'")
+        elif not _matches(df[col], dtype):
+            problems.append(f"'{col}' is {df[col].dtype}, expected {dtype}")
+    if problems:
+        raise TypeError(f"Replay schema violation at {where}: " + "; ".join(problems))
+    return df
+
+def memory_mb(df):
+    """Deep memory footprint of a DataFrame in MB (for logging and benchmarks)."""
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------
+# Stint segmentation
+# -------------------------------------------------------
+# Stints are runs of consecutive laps on one set of tyres. Every lap row gets a
+# "new stint" flag from array comparisons with the previous row (new driver,
+# compound change, tyre age reset or a gap in lap numbers); the flagged rows are
+# where runs start, the row before the next flag is where each one ends.
+# All drivers are segmented in one pass, so there is no per-driver loop.
+
+# --- CONFIGURATION ---
+UNKNOWN_COMPOUND = 'UNKNOWN'
+UNKNOWN_TYRE_AGE = 999  # Age assumed for laps before any known tyre age (as the replay always has)
+
+STINT_COLUMNS = ['driver', 'stint', 'start', 'end', 'compound', 'laps']
+STINT_LAP_COLUMNS = ['driver_acronym', 'lap_number', 'compound']
+
+def _empty_stints():
+    return pd.DataFrame({
+        'driver': pd.Series(dtype='category'),
+        'stint': pd.Series(dtype='int16'),
+        'start': pd.Series(dtype='int16'),
+        'end': pd.Series(dtype='int16'),
+        'compound': pd.Series(dtype='category'),
+        'laps': pd.Series(dtype='int16'),
+    })
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def _fill_tyre_age(age, new_driver):
+    """
+    Fills missing tyre ages by counting on from the last known age of the same driver
+    (UNKNOWN_TYRE_AGE if the driver has none yet), matching the lap-by-lap rule the views used.
+    """
+    known = ~np.isnan(age)
+    if known.all():
+        return age.astype(np.int64)
+
+    # Anchors are known ages and the first row of each driver; everything else counts on from its anchor
+    anchor = known | new_driver
+    anchor_value = np.where(known, age, UNKNOWN_TYRE_AGE)
+    positions = np.arange(len(age))
+    anchor_pos = np.where(anchor, positions, 0)
+    np.maximum.accumulate(anchor_pos, out=anchor_pos)
+    return (anchor_value[anchor_pos] + (positions - anchor_pos)).astype(np.int64)
+
+# ---------------------------
+# Segmentation
+# ---------------------------
+def build_stints(pit_data, driver_col='driver_acronym', lap_col='lap_number',
+                 compound_col='tire_compound', age_col='laps_on_tire'):
+    """
+    Finds every driver's stints from lap-by-lap tyre data (one row per driver and lap).
+    A stint ends when the compound changes, the tyre age goes down or a lap is missing.
+    Returns a DataFrame with STINT_COLUMNS: driver, stint (1-based per driver), start/end lap,
+    compound (upper case, UNKNOWN if missing) and laps. Drivers keep their order of appearance
+    in pit_data and rows without a driver are dropped.
+    """
+    if pit_data is None or pit_data.empty or lap_col not in pit_data.columns or compound_col not in pit_data.columns:
+        return _empty_stints()
+
+    data = pit_data[pit_data[driver_col].notna() & pit_data[lap_col].notna()]
+    if data.empty:
+        return _empty_stints()
+
+    # Drivers in order of appearance, then laps in order within each driver
+    driver_codes, driver_values = pd.factorize(data[driver_col], sort=False)
+    laps = data[lap_col].to_numpy(dtype=np.int64)
+    order = np.lexsort((laps, driver_codes))
+    driver_codes = driver_codes[order]
+    laps = laps[order]
+
+    compounds = data[compound_col].astype(object).to_numpy()[order]
+    missing = pd.isna(compounds)
+    compounds = np.where(missing, UNKNOWN_COMPOUND, compounds).astype(str)
+    compounds = np.char.upper(compounds)
+
+    new_driver = np.ones(len(laps), dtype=bool)
+    new_driver[1:] = driver_codes[1:] != driver_codes[:-1]
+
+    if age_col in data.columns:
+        age = pd.to_numeric(data[age_col], errors='coerce').to_numpy(dtype=float)[order]
+    else:
+        age = np.full(len(laps), np.nan)
+    age = _fill_tyre_age(age, new_driver)
+
+    # A row starts a stint if it starts a driver or breaks the run of the previous row
+    new_stint = new_driver.copy()
+    new_stint[1:] |= (compounds[1:] != compounds[:-1]) | (age[1:] < age[:-1]) | (laps[1:] > laps[:-1] + 1)
+
+    starts = np.flatnonzero(new_stint)
+    ends = np.append(starts[1:], len(laps)) - 1
+    stint_driver = driver_codes[starts]
+
+    # Stint number within the driver: position of the stint minus the position of the driver's first stint
+    stint_ids = np.arange(len(starts))
+    first_of_driver = np.flatnonzero(new_driver[starts])
+    stint_number = stint_ids - np.repeat(first_of_driver, np.diff(np.append(first_of_driver, len(starts)))) + 1
+
+    if isinstance(pit_data[driver_col].dtype, pd.CategoricalDtype):
+        # Keep the caller's categories so merges on the driver stay categorical
+        driver = pd.Categorical(np.asarray(driver_values)[stint_driver], dtype=pit_data[driver_col].dtype)
+    else:
+        driver = pd.Categorical(np.asarray(driver_values)[stint_driver], categories=np.asarray(driver_values))
+
+    return pd.DataFrame({
+        'driver': driver,
+        'stint': stint_number.astype(np.int16),
+        'start': laps[starts].astype(np.int16),
+        'end': laps[ends].astype(np.int16),
+        'compound': pd.Categorical(compounds[starts]),
+        'laps': (laps[ends] - laps[starts] + 1).astype(np.int16),
+    })
+
+def stint_laps(stints, lap_dtype='int16', with_stint=False):
+    """
+    Expands stints into one row per lap (STINT_LAP_COLUMNS), ready to merge onto lap-keyed data.
+    with_stint adds the stint number of each lap. Built with np.repeat over the stint lengths
+    rather than a loop over laps.
+    """
+    if stints.empty:
+        empty = pd.DataFrame({
+            'driver_acronym': pd.Series(dtype=stints['driver'].dtype if 'driver' in stints else 'category'),
+            'lap_number': pd.Series(dtype=lap_dtype),
+            'compound': pd.Series(dtype='category'),
+        })
+        return empty.assign(stint=pd.Series(dtype='int16')) if with_stint else empty
+
+    start = stints['start'].to_numpy(dtype=np.int64)
+    length = (stints['end'].to_numpy(dtype=np.int64) - start + 1).clip(min=0)
+    rows = np.repeat(np.arange(len(stints)), length)
+    # Offset of each lap inside its stint
+    offset = np.arange(len(rows)) - np.repeat(np.cumsum(length) - length, length)
+
+    laps = pd.DataFrame({
+        'driver_acronym': stints['driver'].array.take(rows),
+        'lap_number': (start[rows] + offset).astype(lap_dtype),
+        'compound': stints['compound'].array.take(rows),
+    })
+    if with_stint:
+        laps['stint'] = stints['stint'].to_numpy()[rows]
+    return laps
+
+def segment(pit_data, lap_dtype='int16', **columns):
+    """Returns (stints, per-lap compounds) for pit_data; see build_stints for column options."""
+    stints = build_stints(pit_data, **columns)
+    return stints, stint_laps(stints, lap_dtype)
+
+def clip_to_last_lap(stints, last_laps):
+    """
+    Clips each stint's end to its driver's last recorded lap (drivers who retire early)
+    and drops stints that start after it. last_laps maps driver -> last lap.
+    """
+    if stints.empty or not len(last_laps):
+        return stints
+    last = stints['driver'].astype(object).map(last_laps)
+    end = np.minimum(stints['end'].to_numpy(), last.fillna(stints['end']).to_numpy())
+    clipped = stints.assign(end=end.astype(stints['end'].dtype))
+    return clipped[clipped['end'] >= clipped['start']].reset_index(drop=True)
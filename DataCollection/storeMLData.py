@@ -1,11 +1,15 @@
 import asyncio
-import datetime
 import os
 import pandas as pd
 import openf1_helper as of1
+import raceCalendar
+from raceCalendar import get_season_year
 import weatherData as wd
 import sys, os; sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
 import databaseManager as db
+import telemetryPartitions as partitions
+import segmentCodec
+import ingestHooks
 
 api = of1.api
 session_key = None  # to be set when calling functions
@@ -157,6 +161,9 @@ async def fetchWithAPI(session_key):
             direction='nearest',
             tolerance=pd.Timedelta('5min') # limit match to within 5 mins for interpolation
         )
+
+        # Plus the time-weighted weather over each lap's own window
+        df_laps = df_laps.join(wd.lap_weather(df_laps, df_weather))
     else:
         print("Skipping weather merge (missing data).")
 
@@ -169,115 +176,171 @@ async def fetchWithAPI(session_key):
         'segments_sector_1', 'segments_sector_2', 'segments_sector_3',
         'is_pit_out_lap',
         'tire_compound', 'laps_on_tire',
-        'rainfall', 'track_temperature', 'air_temperature', 'humidity'
+        'rainfall', 'track_temperature', 'air_temperature', 'humidity',
+        'rain_fraction', 'track_temperature_mean', 'air_temperature_mean', 'humidity_mean',
+        'track_temperature_min', 'track_temperature_max', 'air_temperature_min', 'air_temperature_max'
     ]
     
     final_cols = [c for c in desired_columns if c in df_laps.columns]
     df_final = df_laps[final_cols].copy()
 
-    # Convert List Columns to Strings for SQLite
-    list_cols = ['segments_sector_1', 'segments_sector_2', 'segments_sector_3']
-    for col in list_cols:
-        if col in df_final.columns:
-            # Convert list
-            df_final[col] = df_final[col].astype(str)
+    # Pack mini-sector lists into uint16 blobs for SQLite (decode with segmentCodec.segment_matrix)
+    segmentCodec.encode_segment_columns(df_final)
 
     # Re-sort by Driver then Lap for readability
     df_final = df_final.sort_values(['driver_number', 'lap_number'])
     return df_final
 
-def fetchMLData(session_key):
+# ---------------------------
+# Registered queries
+# ---------------------------
+ML_COLUMNS = [
+    'meeting_key', 'session_key', 'driver_number', 'lap_number',
+    'date_start', 'lap_duration',
+    'duration_sector_1', 'duration_sector_2', 'duration_sector_3',
+    'st_speed', 'i1_speed', 'i2_speed',
+    'segments_sector_1', 'segments_sector_2', 'segments_sector_3',
+    'is_pit_out_lap',
+    'tire_compound', 'laps_on_tire',
+    'rainfall', 'track_temperature', 'air_temperature', 'humidity',
+    'rain_fraction', 'track_temperature_mean', 'air_temperature_mean', 'humidity_mean',
+    'track_temperature_min', 'track_temperature_max', 'air_temperature_min', 'air_temperature_max'
+]
+STINT_COLUMNS = ['driver_number', 'lap_number', 'tire_compound', 'laps_on_tire']
+
+Q_ML_SESSION_KEYS = db.register_query('ml_session_keys', """
+    SELECT DISTINCT session_key FROM ml_training_data ORDER BY session_key
+""", dtypes={'session_key': 'int64'})
+
+Q_ML_EXISTS = db.register_query('ml_session_exists', """
+    SELECT 1 FROM ml_training_data WHERE session_key = :session_key LIMIT 1
+""")
+
+Q_ML_SESSION = db.register_query('ml_session_laps', f"""
+    SELECT {', '.join(ML_COLUMNS)}
+    FROM ml_training_data
+    WHERE session_key = :session_key
+""")
+
+Q_ML_STINTS = db.register_query('ml_session_stints', f"""
+    SELECT {', '.join(STINT_COLUMNS)}
+    FROM ml_training_data
+    WHERE session_key = :session_key
+    ORDER BY driver_number, lap_number
+""")
+
+# Stored sessions the ingest hooks have not run for yet: lap quality flags are the first hook's output
+Q_ML_PENDING_HOOKS = db.register_query('ml_sessions_pending_hooks', """
+    SELECT DISTINCT m.session_key
+    FROM ml_training_data m
+    WHERE NOT EXISTS (SELECT 1 FROM lap_quality q WHERE q.session_key = m.session_key)
+    ORDER BY m.session_key
+""")
+
+def stored_session_keys():
+    """Every session key in ml_training_data, ascending."""
+    keys = db.query_df(Q_ML_SESSION_KEYS)
+    return [int(k) for k in keys['session_key']] if not keys.empty else []
+
+def ensureMLData(session_key, emit_hooks=True):
+    """
+    Makes sure a session's lap data is in the DB, collecting it from the API if not.
+    Returns the freshly collected DataFrame, or None if the session was already stored.
+    emit_hooks runs the ingest hooks for a newly collected session; view-path callers pass
+    False so a page request never does that work. The next sync then runs them (emit_pending_hooks).
+    """
     global SESSION_KEY
     SESSION_KEY = session_key
-    "# Check if session data already exists in DB, otherwise run data collection"
-    Sessions = db.load_from_db(f"""SELECT * FROM ml_training_data WHERE session_key = {session_key}""")
-    if Sessions.empty:
-        print(f"Session {session_key} not found in database.")
-        df = asyncio.run(fetchWithAPI(session_key))
-        db.save_to_db(df, 'ml_training_data', if_exists='append')
-    else:
-        #print(f"Session {session_key} found in database.")
-        df = db.load_from_db(f"""SELECT * FROM ml_training_data WHERE session_key = {session_key}""")
+    if db.query_exists(Q_ML_EXISTS, {'session_key': int(session_key)}):
+        return None
+
+    print(f"Session {session_key} not found in database.")
+    df = asyncio.run(fetchWithAPI(session_key))
+    if df is None:
+        return pd.DataFrame()
+    db.save_to_db(df, 'ml_training_data', if_exists='append')
+    # Precompute per-session outputs (e.g. pit predictions) now, so nothing is scored at view time
+    if emit_hooks:
+        ingestHooks.emit('session_ingested', session_key, laps=df)
+    return df
 
+def fetchMLData(session_key, emit_hooks=True):
+    "# Check if session data already exists in DB, otherwise run data collection"
+    df = ensureMLData(session_key, emit_hooks)
+    if df is None:
+        df = db.query_df(Q_ML_SESSION, {'session_key': int(session_key)})
     return df
 
+def fetchSegmentMatrices(session_key):
+    """
+    Mini-sector status codes for a session as (laps x segments) uint16 matrices, one per sector.
+    Returns (laps DataFrame, {column: matrix}); matrix rows line up with the DataFrame rows.
+    """
+    df = fetchMLData(session_key, emit_hooks=False)
+    if df.empty:
+        return df, {}
+    return df, segmentCodec.sector_matrices(df)
 
-def updateMLData(session_key):
-    if db.test_db_connection():
-        #print("Database connection successful.")
-        df = fetchMLData(session_key)
-        #print(f"Data ready with {len(df)} rows for session {session_key}.")
-        return True
-    else: 
-        print("Database connection failed. Falling back to API fetch.")
-        df = asyncio.run(fetchWithAPI(session_key))
+def fetchStintData(session_key):
+    """Lap-by-lap tyre data only (driver, lap, compound, tyre age) for the stint views."""
+    df = ensureMLData(session_key, emit_hooks=False)
+    if df is None:
+        return db.query_df(Q_ML_STINTS, {'session_key': int(session_key)})
+    return df[[c for c in STINT_COLUMNS if c in df.columns]]
+
+
+def updateMLData(session_key, emit_hooks=True):
+    try:
+        df = fetchMLData(session_key, emit_hooks)
         #print(f"Data ready with {len(df)} rows for session {session_key}.")
+        return not df.empty
+    except Exception as e:
+        print(f"Error updating ML data for session {session_key}: {e}")
         return False
-# ---------------------------
-# get season year (adjust month if needed)
-# ---------------------------
-def get_season_year(today=None, season_start_month=3):
+
+def emit_pending_hooks():
     """
-    Return the season year to query.
-    If the current month is before the season_start_month, return previous year.
-    Default assumes season starts in March so Jan/Feb use previous year.
+    Runs the ingest hooks for every stored session they have not run for yet (no lap_quality rows),
+    e.g. sessions first collected by a page, which skips the hooks, or stored before a hook existed.
+    A session whose hooks fail stays pending and is retried by the next sync. Returns the session keys.
     """
-    if today is None:
-        today = datetime.datetime.now(datetime.timezone.utc)
-    return today.year if today.month >= season_start_month else today.year - 1
+    pending = db.query_df(Q_ML_PENDING_HOOKS)
+    keys = [int(k) for k in pending['session_key']] if not pending.empty else []
+    for key in keys:
+        ingestHooks.emit('session_ingested', key, laps=db.query_df(Q_ML_SESSION, {'session_key': key}))
+    return keys
 
 # ---------------------------
 # Update last five sessions and store if not present
 # ---------------------------
-def update_last_five_sessions():
+def update_last_five_sessions(emit_hooks=True):
     """
-    Fetch the last five session keys and update DB.
-    Returns True only if ALL 5 sessions are successfully processed/verified.
+    Fetch the most recent session keys (the retention window, five by default) and update DB.
+    Returns True only if ALL sessions in the window are successfully processed/verified.
+    Newly collected sessions, and any stored earlier without them, run the ingest hooks unless emit_hooks is False.
     """
-    try:
-        sessions_df = api.get_dataframe('sessions', {
-            'year': get_season_year(), # current year based on season
-            'session_type': 'Race'
-        })
-    except Exception as e:
-        print(f"Error fetching session list: {e}")
-        return False
+    # Shared local calendar: refreshed from the API at most every few hours, works offline
+    raceCalendar.refresh_season()
+    recent_sessions = raceCalendar.get_recent_races(partitions.RETENTION_SESSIONS)
 
-    if sessions_df.empty:
+    if recent_sessions.empty:
         print("No sessions found.")
         return False
-
-    sessions_df = sessions_df.sort_values('date_start')
-    recent_sessions = sessions_df.tail(5)
     
     all_success = True
 
     for _, session in recent_sessions.iterrows():
         # returns True/False based on success
-        result = updateMLData(session['session_key'])
+        result = updateMLData(session['session_key'], emit_hooks)
         if not result:
             all_success = False
             print(f"Issue processing session {session['session_key']}")
 
-    # Handle edge cases for NOT IN clause with fewer than 5 sessions
-    recent_keys = sessions_df['session_key'].tail(5).tolist()
-    try:
-        if len(recent_keys) == 0:
-            # Danger: If list is empty, NOT IN () is invalid SQL
-            print("No recent keys provided. Skipping delete to prevent error.")
-        elif len(recent_keys) == 1:
-            # Handle single item (remove trailing comma)
-            keys_str = f"({recent_keys[0]})"
-            query = f"DELETE FROM race_telemetry WHERE session_key NOT IN {keys_str}"
-            db.execute_query(query)
-        else:
-            # Handle multiple items
-            query = f"DELETE FROM race_telemetry WHERE session_key NOT IN {tuple(recent_keys)}"
-            db.execute_query(query)
-    except Exception as e:
-        print(f"Error cleaning up old sessions: {e}")
-        all_success = False
+    # Sessions a page collected (hooks skipped) are picked up here, whoever stored them first
+    if emit_hooks:
+        emit_pending_hooks()
 
+    # Telemetry retention is applied once, by the race data sync (storeRaceData.update_last_five_sessions)
     return all_success
 
 if __name__ == "__main__":
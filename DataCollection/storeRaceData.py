@@ -1,15 +1,20 @@
 import asyncio
 import os
-import time
 import aiohttp
+import numpy as np
 import pandas as pd
-import datetime
 from datetime import timedelta
 import random
 import math
 import openf1_helper as of1
+import raceCalendar
+from raceCalendar import get_season_year
+import trackOutline
+import trackProjection
+import trackThumbnails
 import sys, os; sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
-import databaseManager as db
+import telemetryPartitions as partitions
+import replaySchema
 import matplotlib.pyplot as plt
 api = of1.api
 
@@ -200,13 +205,14 @@ async def fetchWithAPI():
     
     return df
 
+TELEMETRY_COLUMNS = partitions.TELEMETRY_COLUMNS
+
 # ---------------------------
 # fetch from DB
 # ---------------------------
 def fetchFromDB(session_key):
-    """Fetch session data directly from the database."""
-    df = db.load_from_db(f"""SELECT * FROM race_telemetry WHERE session_key = {session_key}""")
-    return df
+    """Fetch session data directly from the database (decoded from the session's partition)."""
+    return partitions.read_session(session_key)
 
 # ---------------------------
 # update and store to DB
@@ -218,9 +224,7 @@ def updateDB():
     """
     try:
         # Check if session data already exists in DB
-        Sessions = db.load_from_db(f"SELECT * FROM race_telemetry WHERE session_key = {SESSION_KEY}")
-        
-        if Sessions.empty:
+        if not partitions.has_partition(SESSION_KEY):
             print(f"Session {SESSION_KEY} not found in database. Fetching...")
             try:
                 df = asyncio.run(fetchWithAPI())
@@ -233,13 +237,17 @@ def updateDB():
                 print(f"API returned no data for session {SESSION_KEY}.")
                 return False
 
+            # Each session is written to its own partition file
+            if not partitions.write_partition(SESSION_KEY, df):
+                return False
+            print(f"Successfully saved session {SESSION_KEY} to database.")
+
+            # Build the circuit outline once while the telemetry is fresh
             try:
-                db.save_to_db(df, 'race_telemetry', if_exists='append')
-                print(f"Successfully saved session {SESSION_KEY} to database.")
-                return True
+                trackOutline.build_circuit_outline(SESSION_KEY)
             except Exception as e:
-                print(f"Error saving to database: {e}")
-                return False
+                print(f"Error building track outline for session {SESSION_KEY}: {e}")
+            return True
         else:
             print(f"Session {SESSION_KEY} found in database.")
             return True # Data exists, so this is a success
@@ -260,56 +268,29 @@ def check_and_update_DB(session_key):
     global SESSION_KEY
     SESSION_KEY = session_key
     
-    if db.test_db_connection():
-        print("Database connection successful.")
-        # Return the result of the update operation
-        if updateDB():
-            print(f"Data ready for session {SESSION_KEY}.")
-            return True
-        else:
-            print(f"Failed to update/verify data for session {SESSION_KEY}.")
-            return False
-    else: 
-        print("Database connection failed. Falling back to API fetch.")
-        # If DB is down, we return False as we can't "update" the DB
+    # updateDB handles its own DB errors, so no separate connection probe is needed
+    if updateDB():
+        print(f"Data ready for session {SESSION_KEY}.")
+        return True
+    else:
+        print(f"Failed to update/verify data for session {SESSION_KEY}.")
         return False
 
-# ---------------------------
-# get season year
-# ---------------------------
-def get_season_year(today=None, season_start_month=3):
-    """
-    Return the season year to query.
-    If the current month is before the season_start_month, return previous year.
-    Default assumes season starts in March so Jan/Feb use previous year.
-    """
-    if today is None:
-        today = datetime.datetime.now(datetime.timezone.utc)
-    return today.year if today.month >= season_start_month else today.year - 1
-
 # ---------------------------
 # Update last five sessions and store if not present
 # ---------------------------
 def update_last_five_sessions():
     """
-    Fetch the last five session keys and update DB.
-    Returns True only if ALL 5 sessions are successfully processed/verified.
+    Fetch the most recent session keys (the retention window, five by default) and update DB.
+    Returns True only if ALL sessions in the window are successfully processed/verified.
     """
-    try:
-        sessions_df = api.get_dataframe('sessions', {
-            'year': get_season_year(), # current year based on season
-            'session_type': 'Race'
-        })
-    except Exception as e:
-        print(f"Error fetching session list: {e}")
-        return False
+    # Shared local calendar: refreshed from the API at most every few hours, works offline
+    raceCalendar.refresh_season()
+    recent_sessions = raceCalendar.get_recent_races(partitions.RETENTION_SESSIONS)
 
-    if sessions_df.empty:
+    if recent_sessions.empty:
         print("No sessions found.")
         return False
-
-    sessions_df = sessions_df.sort_values('date_start')
-    recent_sessions = sessions_df.tail(5)
     
     all_success = True
 
@@ -320,22 +301,23 @@ def update_last_five_sessions():
             all_success = False
             print(f"Issue processing session {session['session_key']}")
 
-    #remove all sessions not in recent five from the database
-    # UPDATE: Handle edge cases for NOT IN clause with fewer than 5 sessions
-    recent_keys = sessions_df['session_key'].tail(5).tolist()
+    # Pre-render home page thumbnails for any circuit that doesn't have one yet
     try:
-        if len(recent_keys) == 0:
-            # Danger: If list is empty, NOT IN () is invalid SQL
-            print("No recent keys provided. Skipping delete to prevent error.")
-        elif len(recent_keys) == 1:
-            # Handle single item (remove trailing comma)
-            keys_str = f"({recent_keys[0]})"
-            query = f"DELETE FROM race_telemetry WHERE session_key NOT IN {keys_str}"
-            db.execute_query(query)
-        else:
-            # Handle multiple items
-            query = f"DELETE FROM race_telemetry WHERE session_key NOT IN {tuple(recent_keys)}"
-            db.execute_query(query)
+        circuit_keys = []
+        for _, session in recent_sessions.iterrows():
+            circuit_key = session.get('circuit_key')
+            if trackOutline.get_session_outline(session['session_key'], circuit_key) is not None:
+                circuit_keys.append(circuit_key)
+        trackThumbnails.render_thumbnails(circuit_keys)
+    except Exception as e:
+        print(f"Error rendering track thumbnails: {e}")
+
+    # Drop the telemetry partition of every session outside the retention window
+    recent_keys = recent_sessions['session_key'].tolist()
+    try:
+        removed = partitions.apply_retention(recent_keys)
+        if removed:
+            print(f"Removed telemetry for old sessions: {removed}")
     except Exception as e:
         print(f"Error cleaning up old sessions: {e}")
         all_success = False
@@ -343,69 +325,53 @@ def update_last_five_sessions():
     return all_success
 
 def tableOfRaces():
-    sessions_df = api.get_dataframe('sessions', {
-    'year': time.localtime().tm_year,
-    'session_type': 'Race' 
-    })
+    """
+    Returns the completed races in the retention window (last five by default) from the local calendar.
+    Makes no network calls; the sync job keeps the calendar fresh, so both always agree.
+    """
+    recent_sessions = raceCalendar.get_recent_races(partitions.RETENTION_SESSIONS)
 
     # Display last 5 races
-    if not sessions_df.empty:
-        sessions_df = sessions_df.sort_values('date_start')
-        recent_sessions = sessions_df.tail(5)
+    if not recent_sessions.empty:
         print("Recent F1 Races:")
         print("=" * 60)
         for _, session in recent_sessions.iterrows():
             print(f"{session['country_name']} GP - {session['location']}")
             print(f"   Session Key: {session['session_key']}")
-            print(f"   Date: {session['date_start'][:10]}")
+            print(f"   Date: {session['date_start']:%Y-%m-%d}")
             print()
 
     return recent_sessions
 
-def get_track_layout(session_key):
-    """
-    Fetches x, y coordinates for the entire race of the driver with the most laps.
-    This ensures we capture the Pit Lane (In/Out laps) as well as the main track.
+def get_track_layout(session_key, circuit_key=None):
     """
-    if not db.test_db_connection():
-        return pd.DataFrame()
-
-    # Find the driver who completed the MOST laps
-    # We assume the driver with the most laps likely pitted and finished the race.
-    driver_query = f"""
-    SELECT driver_number 
-    FROM race_telemetry 
-    WHERE session_key = {session_key} 
-    GROUP BY driver_number 
-    ORDER BY MAX(lap_number) DESC 
-    LIMIT 1
+    Returns the simplified racing line (x, y) for the session's circuit.
+    Outlines are built once per circuit from telemetry and reused across sessions and seasons.
     """
-    driver_df = db.load_from_db(driver_query)
-    
-    if driver_df.empty:
+    outline = trackOutline.get_session_outline(session_key, circuit_key)
+    if outline is None:
         return None
+    return outline['track']
 
-    target_driver = driver_df.iloc[0]['driver_number']
+def get_pit_lane_layout(session_key, circuit_key=None):
+    """
+    Returns the pit lane path (x, y) for the session's circuit, stored separately from the racing line.
+    Empty if no pit lane transit was found in the telemetry the outline was built from.
+    """
+    outline = trackOutline.get_session_outline(session_key, circuit_key)
+    if outline is None:
+        return pd.DataFrame(columns=['x', 'y'])
+    return outline['pit']
 
-    # Get X, Y coordinates for ALL laps for that driver
-    # We order by timestamp to ensure the line draws sequentially without jumping
-    track_query = f"""
-    SELECT x, y 
-    FROM race_telemetry 
-    WHERE session_key = {session_key} 
-    AND driver_number = {target_driver}
-    ORDER BY timestamp ASC
+def get_track_projection(session_key, circuit_key=None):
     """
-    
-    # Load Data
-    track_df = db.load_from_db(track_query)
-    
- 
-    # Limit to 10,000 points for performance via downsampling if necessary
-    if len(track_df) > 10000:
-        track_df = track_df.iloc[::5, :]
-        
-    return track_df
+    Returns the distance-along-track index (trackProjection.TrackProjection) for the session's circuit.
+    Built from the racing line once per circuit and kept for the process; None without an outline.
+    """
+    if circuit_key is None:
+        circuit_key = trackOutline.resolve_circuit_key(session_key)
+    cache_key = circuit_key if circuit_key is not None else ('session', session_key)
+    return trackProjection.get_projection(cache_key, get_track_layout(session_key, circuit_key))
 
 def plot_track_map(track_df):
     """
@@ -433,51 +399,63 @@ def plot_track_map(track_df):
     return fig
 
 
+# ---------------------------
+# Replay lap table
+# ---------------------------
+REPLAY_MIN_LAP = 2     # Lap 1 starts from the grid; the replay begins at lap 2
+WINDOW_PAD_SECONDS = 2 # Extra samples either side of a window so the edges interpolate
+
+def get_replay_laps(session_key, lap_starts=None):
+    """
+    Lap table for the replay from the per-lap index (no full decode): each driver's lap start
+    in race seconds and the lap's time (start of next lap - start of this lap).
+    Returns (laps typed per replaySchema.REPLAY_LAP_SCHEMA, origin), where origin is the UTC
+    timestamp of race_time 0: the first sample of the replay, rounded to the second.
+    """
+    if lap_starts is None:
+        lap_starts = partitions.read_lap_starts(session_key)
+    laps = lap_starts[lap_starts['lap_number'] >= REPLAY_MIN_LAP].copy()
+    if laps.empty:
+        return pd.DataFrame(columns=list(replaySchema.REPLAY_LAP_SCHEMA)), None
+
+    origin = laps['lap_start'].min().round('1s')
+    laps = laps.sort_values(['driver_acronym', 'lap_number'])
+    # Lap time = start time of next lap - start time of this lap (NaN for each driver's last lap)
+    laps['lap_time'] = laps.groupby('driver_acronym')['lap_start'].diff().shift(-1).dt.total_seconds()
+    laps['lap_start_time'] = (laps['lap_start'].dt.round('1s') - origin).dt.total_seconds()
+    return replaySchema.apply_schema(laps.reset_index(drop=True), replaySchema.REPLAY_LAP_SCHEMA), origin
+
 # ---------------------------
 # Get race replay data
 # ---------------------------
-def get_race_replay_data(session_key):
+def get_race_replay_data(session_key, start_time=None, end_time=None):
     """
     Fetches data and aligns drivers to the nearest second.
+    start_time/end_time (race seconds) load only that window, through the per-lap index;
+    race_time keeps the same origin as the full replay so windows line up.
+    Returns (samples, lap times) typed per replaySchema.RESAMPLED_SCHEMA / LAP_TIME_SCHEMA.
+    Lap times always cover the whole race (they are small and the leaderboard gaps need them).
     """
-    if not db.test_db_connection():
+    lap_starts = partitions.read_lap_starts(session_key)
+    laps, origin = get_replay_laps(session_key, lap_starts)
+    if origin is None:
         return pd.DataFrame(), pd.DataFrame()
 
-    # Fetch Raw Data
-    query = f"""
-    SELECT 
-        driver_number,
-        driver_acronym, 
-        timestamp,
-        x, 
-        y, 
-        lap_duration,
-        lap_number 
-    FROM race_telemetry 
-    WHERE session_key = {session_key} 
-    AND lap_number >= 2 
-    ORDER BY timestamp ASC
-    """
-    
-    df = db.load_from_db(query)
+    # Decode the session's location streams (timestamps come back as UTC datetimes, in time order)
+    if start_time is None and end_time is None:
+        df = partitions.read_session(session_key, min_lap=REPLAY_MIN_LAP)
+    else:
+        window_start = origin + pd.Timedelta(seconds=(start_time or 0) - WINDOW_PAD_SECONDS)
+        window_end = (origin + pd.Timedelta(seconds=end_time + WINDOW_PAD_SECONDS)) if end_time is not None else pd.Timestamp.max.tz_localize('UTC')
+        df = partitions.read_window(session_key, window_start, window_end, min_lap=REPLAY_MIN_LAP, lap_starts=lap_starts)
     
     if df.empty:
-        return df
-
-    # Convert Timestamp to correct format for graphing
-    df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', errors='coerce')
-    df = df.dropna(subset=['timestamp'])
+        return df, pd.DataFrame()
+    replaySchema.check_schema(df, replaySchema.SAMPLE_SCHEMA, 'get_race_replay_data input')
 
     # --- Accurate lap times ---
-    # Determine start time of each lap per driver using the original timestamps
-    lap_start_times = df.groupby(['driver_acronym', 'lap_number'])['timestamp'].min().reset_index()
-    lap_start_times.rename(columns={'timestamp': 'lap_start_time'}, inplace=True)
-    laps_sorted = lap_start_times.sort_values(['driver_acronym', 'lap_number'])
-    # Lap time = start time of next lap - start time of this lap
-    laps_sorted['lap_time'] = laps_sorted.groupby('driver_acronym')['lap_start_time'].diff().shift(-1)
-    # Convert to seconds and drop rows that have NaT (last lap) so we don't have incomplete lap times
-    laps_sorted['lap_time'] = laps_sorted['lap_time'].dt.total_seconds()
-    lap_times_df = laps_sorted.dropna(subset=['lap_time'])[['driver_acronym', 'lap_number', 'lap_time']]
+    # From the start time of each lap per driver (first sample of the lap, via the per-lap index)
+    lap_times_df = laps.dropna(subset=['lap_time'])[['driver_acronym', 'lap_number', 'lap_time']]
 
     # Round timestamps to the nearest second for better track drawing sync
     # This forces NOR with ..32.722 and VER with ..32.850 both into "17:04:33" which is close enough for visual purposes
@@ -486,23 +464,23 @@ def get_race_replay_data(session_key):
     # Group by Driver + Time Bucket
     # We average X/Y just in case a driver has 2 points in the same second due to high sampling rate
     df_resampled = (
-        df.groupby(['driver_acronym', 'driver_number', 'timestamp_bucket'])
+        df.groupby(['driver_acronym', 'driver_number', 'timestamp_bucket'], observed=True)
         [['x', 'y', 'lap_duration', 'lap_number']]
         .mean()
         .reset_index()
     )
 
     # Create Race Time Integer seconds for the Laps Slider which will be converted to min:sec and/or laps later
-    start_time = df_resampled['timestamp_bucket'].min()
-    df_resampled['race_time'] = (df_resampled['timestamp_bucket'] - start_time).dt.total_seconds().astype(int)
+    df_resampled['race_time'] = (df_resampled['timestamp_bucket'] - origin).dt.total_seconds()
 
     # Format & Return
     # Rename bucket back to timestamp for clarity
     df_resampled.rename(columns={'timestamp_bucket': 'timestamp'}, inplace=True)
-    
-    # Ensure integers for clean display
-    df_resampled['lap_number'] = df_resampled['lap_number'].astype(int)
-    df_resampled['driver_number'] = df_resampled['driver_number'].astype(int)
+
+    # Cast to the replay contract (int16 laps/drivers, float32 coordinates, int32 race time)
+    df_resampled['lap_number'] = np.floor(df_resampled['lap_number'])
+    df_resampled = replaySchema.apply_schema(df_resampled, replaySchema.RESAMPLED_SCHEMA)
+    lap_times_df = replaySchema.apply_schema(lap_times_df.reset_index(drop=True), replaySchema.LAP_TIME_SCHEMA)
     #print(lap_times_df)
     return df_resampled, lap_times_df
 
@@ -0,0 +1,312 @@
+import heapq
+import numpy as np
+import pandas as pd
+from sqlalchemy.exc import OperationalError
+import openf1_helper as of1
+import raceCalendar
+import sys, os; sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+import databaseManager as db
+import telemetryPartitions as partitions
+
+api = of1.api
+
+# --- CONFIGURATION ---
+OUTLINE_TABLE = "track_outlines"
+TRACK_POINT_BUDGET = 300    # Points kept for the racing line after simplification
+PIT_POINT_BUDGET = 60       # Points kept for the pit lane after simplification
+PIT_OFFSET_THRESHOLD = 150  # Minimum distance (OpenF1 units) from the racing line to count as pit lane
+PIT_MIN_SAMPLES = 8         # Shortest off-line run accepted as a pit lane transit (filters GPS glitches)
+
+# ---------------------------
+# Registered queries
+# ---------------------------
+Q_OUTLINE_CIRCUIT = db.register_query('outline_circuit_for_session', f"""
+    SELECT circuit_key FROM {OUTLINE_TABLE} WHERE source_session_key = :session_key LIMIT 1
+""")
+
+Q_OUTLINE_LOAD = db.register_query('outline_by_circuit', f"""
+    SELECT path, x, y
+    FROM {OUTLINE_TABLE}
+    WHERE circuit_key = :circuit_key
+    ORDER BY path, point_order
+""", dtypes={'x': 'float64', 'y': 'float64'})
+
+# In-process caches so repeat lookups never touch the DB or API
+_outline_cache = {}      # circuit_key -> {'track': DataFrame, 'pit': DataFrame}
+_circuit_key_cache = {}  # session_key -> circuit_key
+
+# ---------------------------
+# Geometry helpers
+# ---------------------------
+def simplify_path(x, y, max_points):
+    """
+    Visvalingam-Whyatt simplification down to a fixed point budget.
+    Repeatedly removes the point forming the smallest triangle with its neighbours,
+    which keeps corners and drops points on straights. Returns the kept indices in order.
+    """
+    n = len(x)
+    if n <= max_points or n < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    prev_idx = np.arange(n) - 1
+    next_idx = np.arange(n) + 1
+    removed = np.zeros(n, dtype=bool)
+
+    def area(i):
+        p, q = prev_idx[i], next_idx[i]
+        return abs((x[p] - x[i]) * (y[q] - y[i]) - (x[q] - x[i]) * (y[p] - y[i])) / 2.0
+
+    # Endpoints are never removed
+    heap = [(area(i), i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+    current_area = {i: a for a, i in heap}
+    remaining = n
+
+    while remaining > max_points and heap:
+        a, i = heapq.heappop(heap)
+        if removed[i] or current_area.get(i) != a:
+            continue  # Stale heap entry
+        removed[i] = True
+        remaining -= 1
+        p, q = prev_idx[i], next_idx[i]
+        next_idx[p] = q
+        prev_idx[q] = p
+        # Neighbours' triangles changed, push their new areas
+        for j in (p, q):
+            if 0 < j < n - 1 and not removed[j]:
+                # Never let a neighbour's area drop below the one just removed, so detail is lost in order
+                new_area = max(area(j), a)
+                current_area[j] = new_area
+                heapq.heappush(heap, (new_area, j))
+
+    return np.flatnonzero(~removed)
+
+def point_to_path_distance(px, py, path_x, path_y, chunk_size=4096):
+    """
+    Minimum distance from each point to a polyline, computed against every segment at once.
+    Points are processed in chunks to bound memory (chunk_size x segments).
+    """
+    px = np.asarray(px, dtype=float)
+    py = np.asarray(py, dtype=float)
+    ax, ay = np.asarray(path_x[:-1], dtype=float), np.asarray(path_y[:-1], dtype=float)
+    bx, by = np.asarray(path_x[1:], dtype=float), np.asarray(path_y[1:], dtype=float)
+    dx, dy = bx - ax, by - ay
+    seg_len_sq = np.where((dx * dx + dy * dy) == 0, 1.0, dx * dx + dy * dy)
+
+    out = np.empty(len(px))
+    for start in range(0, len(px), chunk_size):
+        cx = px[start:start + chunk_size, None]
+        cy = py[start:start + chunk_size, None]
+        # Projection of each point onto each segment, clamped to the segment ends
+        t = np.clip(((cx - ax) * dx + (cy - ay) * dy) / seg_len_sq, 0.0, 1.0)
+        dist_sq = (ax + t * dx - cx) ** 2 + (ay + t * dy - cy) ** 2
+        out[start:start + chunk_size] = np.sqrt(dist_sq.min(axis=1))
+    return out
+
+# ---------------------------
+# Outline extraction
+# ---------------------------
+def select_reference_lap(driver_df):
+    """
+    Picks the lap used for the racing line: the fastest lap with a full set of samples.
+    Fast laps are clean (no pit lane, no safety car), and the sample check skips partial laps.
+    """
+    laps = driver_df[driver_df['lap_number'] > 1].groupby('lap_number').agg(
+        samples=('x', 'size'), lap_duration=('lap_duration', 'first')
+    ).dropna(subset=['lap_duration'])
+    if laps.empty:
+        return None
+
+    laps = laps[laps['samples'] >= 0.8 * laps['samples'].median()]
+    if laps.empty:
+        return None
+    return laps['lap_duration'].idxmin()
+
+def extract_outline(driver_df):
+    """
+    Splits a single driver's location stream into the racing line and the pit lane.
+    driver_df needs lap_number, lap_duration, timestamp, x and y, ordered by timestamp.
+    Returns (track_df, pit_df); pit_df is empty if no pit lane transit was found.
+    """
+    ref_lap = select_reference_lap(driver_df)
+    if ref_lap is None:
+        return pd.DataFrame(columns=['x', 'y']), pd.DataFrame(columns=['x', 'y'])
+
+    ref = driver_df[driver_df['lap_number'] == ref_lap]
+    track_x = ref['x'].to_numpy(dtype=float)
+    track_y = ref['y'].to_numpy(dtype=float)
+    # Close the loop so the line finishes where it started
+    track_x = np.append(track_x, track_x[0])
+    track_y = np.append(track_y, track_y[0])
+
+    # Samples far from the racing line form candidate pit lane runs
+    all_x = driver_df['x'].to_numpy(dtype=float)
+    all_y = driver_df['y'].to_numpy(dtype=float)
+    off_line = point_to_path_distance(all_x, all_y, track_x, track_y) > PIT_OFFSET_THRESHOLD
+
+    # Run boundaries of consecutive off-line samples
+    edges = np.diff(np.concatenate(([0], off_line.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    run_lengths = run_ends - run_starts
+
+    pit_df = pd.DataFrame(columns=['x', 'y'])
+    if len(run_lengths) > 0 and run_lengths.max() >= PIT_MIN_SAMPLES:
+        # The longest off-line run is the pit lane; include one sample either side to join the track
+        longest = np.argmax(run_lengths)
+        start = max(run_starts[longest] - 1, 0)
+        end = min(run_ends[longest] + 1, len(all_x))
+        pit_df = pd.DataFrame({'x': all_x[start:end], 'y': all_y[start:end]})
+
+    track_df = pd.DataFrame({'x': track_x, 'y': track_y})
+    return track_df, pit_df
+
+def _simplify_df(path_df, max_points):
+    """Applies simplify_path to a x/y DataFrame."""
+    if path_df.empty:
+        return path_df
+    keep = simplify_path(path_df['x'].to_numpy(), path_df['y'].to_numpy(), max_points)
+    return path_df.iloc[keep].reset_index(drop=True)
+
+# ---------------------------
+# Circuit key lookup
+# ---------------------------
+def resolve_circuit_key(session_key):
+    """
+    Returns the OpenF1 circuit_key for a session, or None if it cannot be determined.
+    Circuit keys are stable across seasons so one outline serves every race at that track.
+    """
+    if session_key in _circuit_key_cache:
+        return _circuit_key_cache[session_key]
+
+    # The local calendar knows every synced session's circuit
+    race = raceCalendar.get_race(session_key)
+    if race is not None and pd.notna(race['circuit_key']):
+        _circuit_key_cache[session_key] = int(race['circuit_key'])
+        return _circuit_key_cache[session_key]
+
+    # Outlines already built from this session record their circuit
+    stored = db.query_df(Q_OUTLINE_CIRCUIT, {'session_key': int(session_key)})
+    if not stored.empty:
+        circuit_key = int(stored.iloc[0]['circuit_key'])
+    else:
+        sessions_df = api.get_dataframe('sessions', {'session_key': session_key})
+        if sessions_df.empty or 'circuit_key' not in sessions_df.columns:
+            return None
+        circuit_key = int(sessions_df.iloc[0]['circuit_key'])
+
+    _circuit_key_cache[session_key] = circuit_key
+    return circuit_key
+
+# ---------------------------
+# Build & store
+# ---------------------------
+def build_outline_from_telemetry(session_key):
+    """
+    Builds a simplified outline from a session's telemetry.
+    Uses the driver with the most laps, as they are most likely to have pitted and finished.
+    """
+    laps = partitions.read_laps(session_key)
+    if laps.empty:
+        return None
+
+    target_driver = int(laps.groupby('driver_number')['lap_number'].max().idxmax())
+    samples = partitions.read_session(session_key, drivers=[target_driver])
+    if samples.empty:
+        return None
+
+    track_df, pit_df = extract_outline(samples)
+    if track_df.empty:
+        return None
+
+    return {
+        'track': _simplify_df(track_df, TRACK_POINT_BUDGET),
+        'pit': _simplify_df(pit_df, PIT_POINT_BUDGET),
+    }
+
+def store_outline(circuit_key, outline, source_session_key):
+    """Replaces the stored outline for a circuit."""
+    rows = []
+    for path_name in ('track', 'pit'):
+        path_df = outline[path_name]
+        if path_df.empty:
+            continue
+        rows.append(pd.DataFrame({
+            'circuit_key': circuit_key,
+            'path': path_name,
+            'point_order': np.arange(len(path_df)),
+            'x': path_df['x'].to_numpy(dtype=float),
+            'y': path_df['y'].to_numpy(dtype=float),
+            'source_session_key': source_session_key,
+        }))
+    if not rows:
+        return
+
+    try:
+        db.execute_query(f"DELETE FROM {OUTLINE_TABLE} WHERE circuit_key = :key", {'key': circuit_key})
+    except OperationalError as e:
+        # Table does not exist yet, save_to_db will create it; anything else is a real failure
+        if "no such table" not in str(e):
+            raise
+    db.save_to_db(pd.concat(rows, ignore_index=True), OUTLINE_TABLE, if_exists='append')
+
+def build_circuit_outline(session_key, circuit_key=None):
+    """
+    Builds, simplifies and stores the outline for the session's circuit.
+    Called once after a session's telemetry is ingested. Returns the outline dict or None.
+    """
+    if circuit_key is None:
+        circuit_key = resolve_circuit_key(session_key)
+
+    outline = build_outline_from_telemetry(session_key)
+    if outline is None:
+        print(f"Could not build track outline for session {session_key}.")
+        return None
+
+    if circuit_key is None:
+        # Offline: keep it for this process only, keyed by session
+        _outline_cache[('session', session_key)] = outline
+        return outline
+
+    store_outline(circuit_key, outline, session_key)
+    _outline_cache[circuit_key] = outline
+    print(f"Stored track outline for circuit {circuit_key} ({len(outline['track'])} track / {len(outline['pit'])} pit points).")
+    return outline
+
+# ---------------------------
+# Load
+# ---------------------------
+def get_circuit_outline(circuit_key):
+    """Returns the stored outline for a circuit, or None if it has not been built yet."""
+    if circuit_key in _outline_cache:
+        return _outline_cache[circuit_key]
+
+    rows = db.query_df(Q_OUTLINE_LOAD, {'circuit_key': int(circuit_key)})
+    if rows.empty:
+        return None
+
+    outline = {
+        'track': rows[rows['path'] == 'track'][['x', 'y']].reset_index(drop=True),
+        'pit': rows[rows['path'] == 'pit'][['x', 'y']].reset_index(drop=True),
+    }
+    _outline_cache[circuit_key] = outline
+    return outline
+
+def get_session_outline(session_key, circuit_key=None):
+    """
+    Returns the outline for the circuit a session was held at.
+    Built from the session's telemetry the first time a circuit is seen, then reused.
+    """
+    if circuit_key is None:
+        circuit_key = resolve_circuit_key(session_key)
+
+    if circuit_key is not None:
+        outline = get_circuit_outline(circuit_key)
+        if outline is not None:
+            return outline
+    elif ('session', session_key) in _outline_cache:
+        return _outline_cache[('session', session_key)]
+
+    return build_circuit_outline(session_key, circuit_key)
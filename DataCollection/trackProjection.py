@@ -0,0 +1,148 @@
+import numpy as np
+
+# -------------------------------------------------------
+# Distance along the track
+# -------------------------------------------------------
+# The circuit outline (trackOutline, ~300 simplified points) is densified into a
+# centreline with cumulative arc length. A uniform grid over the circuit stores
+# the nearest centreline point for every cell, so projecting a sample is one cell
+# lookup followed by an exact projection onto the few segments around that point.
+# Every sample of a replay is projected in one vectorised pass, giving each car's
+# distance into its lap and its total race distance (laps completed x track length).
+
+# --- CONFIGURATION ---
+DENSIFY_SPACING = 25.0   # Max distance (OpenF1 units) between centreline points
+GRID_CELL = 100.0        # Grid cell size; the nearest point of a cell is found from its centre
+GRID_MARGIN = 500.0      # Grid padding around the outline (pit lane and run-off stay inside)
+REFINE_SEGMENTS = 4      # Segments either side of the cell's nearest point checked exactly
+CHUNK_SIZE = 4096        # Grid cells per chunk when building the lookup (bounds memory)
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def densify(x, y, spacing=DENSIFY_SPACING):
+    """Inserts evenly spaced points into every segment longer than spacing. Returns (x, y)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    seg_len = np.hypot(np.diff(x), np.diff(y))
+    pieces = np.maximum(np.ceil(seg_len / spacing).astype(np.int64), 1)
+
+    # Fraction along each segment for every inserted point, built with np.repeat rather than a loop
+    seg = np.repeat(np.arange(len(seg_len)), pieces)
+    frac = (np.arange(len(seg)) - np.repeat(np.cumsum(pieces) - pieces, pieces)) / pieces[seg]
+    dense_x = np.append(x[seg] + frac * (x[seg + 1] - x[seg]), x[-1])
+    dense_y = np.append(y[seg] + frac * (y[seg + 1] - y[seg]), y[-1])
+    return dense_x, dense_y
+
+# ---------------------------
+# Projection index
+# ---------------------------
+class TrackProjection:
+    """Projects (x, y) samples onto a closed circuit centreline, built once per circuit."""
+
+    def __init__(self, track_x, track_y):
+        x = np.asarray(track_x, dtype=float)
+        y = np.asarray(track_y, dtype=float)
+        keep = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[keep], y[keep]
+        if len(x) < 3:
+            raise ValueError("A track outline needs at least 3 points")
+        # Close the loop (outlines usually already finish where they start)
+        if x[0] != x[-1] or y[0] != y[-1]:
+            x, y = np.append(x, x[0]), np.append(y, y[0])
+
+        self.x, self.y = densify(x, y)
+        seg_len = np.hypot(np.diff(self.x), np.diff(self.y))
+        self.arc = np.concatenate(([0.0], np.cumsum(seg_len)))
+        self.length = float(self.arc[-1])
+        self.n_segments = len(seg_len)
+
+        self._build_grid()
+
+    def _build_grid(self):
+        """Nearest centreline point for the centre of every grid cell."""
+        self.x0 = self.x.min() - GRID_MARGIN
+        self.y0 = self.y.min() - GRID_MARGIN
+        self.nx = int(np.ceil((self.x.max() + GRID_MARGIN - self.x0) / GRID_CELL))
+        self.ny = int(np.ceil((self.y.max() + GRID_MARGIN - self.y0) / GRID_CELL))
+
+        cx = self.x0 + (np.arange(self.nx) + 0.5) * GRID_CELL
+        cy = self.y0 + (np.arange(self.ny) + 0.5) * GRID_CELL
+        cells = np.column_stack((np.repeat(cx, self.ny), np.tile(cy, self.nx)))
+        points = np.column_stack((self.x[:-1], self.y[:-1]))  # The last point repeats the first
+
+        # |c - p|^2 = |c|^2 - 2 c.p + |p|^2; |c|^2 is the same for every p, so the argmin is one matrix product
+        point_norm = (points ** 2).sum(axis=1)
+        nearest = np.empty(len(cells), dtype=np.int32)
+        for start in range(0, len(cells), CHUNK_SIZE):
+            scores = point_norm - 2.0 * (cells[start:start + CHUNK_SIZE] @ points.T)
+            nearest[start:start + CHUNK_SIZE] = scores.argmin(axis=1)
+        self.grid = nearest.reshape(self.nx, self.ny)
+
+    def project(self, x, y):
+        """
+        Distance along the lap (0 to length) of every sample and its distance from the centreline.
+        Returns (distance, offset) arrays; NaN inputs give NaN.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        distance = np.full(len(x), np.nan)
+        offset = np.full(len(x), np.nan)
+        if not valid.any():
+            return distance, offset
+        qx, qy = x[valid], y[valid]
+
+        # Cell lookup (samples outside the grid use the nearest edge cell)
+        i = np.clip(((qx - self.x0) // GRID_CELL).astype(np.int64), 0, self.nx - 1)
+        j = np.clip(((qy - self.y0) // GRID_CELL).astype(np.int64), 0, self.ny - 1)
+        nearest = self.grid[i, j]
+
+        # Exact projection onto the segments around the nearest point (wrapping round the loop)
+        seg = (nearest[:, None] + np.arange(-REFINE_SEGMENTS, REFINE_SEGMENTS)) % self.n_segments
+        ax, ay = self.x[seg], self.y[seg]
+        dx, dy = self.x[seg + 1] - ax, self.y[seg + 1] - ay
+        seg_len_sq = np.where((dx * dx + dy * dy) == 0, 1.0, dx * dx + dy * dy)
+        t = np.clip(((qx[:, None] - ax) * dx + (qy[:, None] - ay) * dy) / seg_len_sq, 0.0, 1.0)
+        dist_sq = (ax + t * dx - qx[:, None]) ** 2 + (ay + t * dy - qy[:, None]) ** 2
+
+        best = dist_sq.argmin(axis=1)
+        rows = np.arange(len(qx))
+        best_seg = seg[rows, best]
+        distance[valid] = self.arc[best_seg] + t[rows, best] * (self.arc[best_seg + 1] - self.arc[best_seg])
+        offset[valid] = np.sqrt(dist_sq[rows, best])
+        return distance, offset
+
+    def race_distance(self, x, y, lap_number, lap_elapsed, lap_seconds):
+        """
+        Total distance covered: (lap_number - 1) laps plus the projected distance into the lap.
+        Near the line a sample can project to the wrong side of it, so the lap distance is moved
+        by a whole lap when it disagrees by more than half a lap with the time spent in the lap
+        (lap_elapsed / lap_seconds, in seconds).
+        """
+        distance, _ = self.project(x, y)
+        lap_number = np.asarray(lap_number, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = np.clip(np.asarray(lap_elapsed, dtype=float) / np.asarray(lap_seconds, dtype=float), 0.0, 1.0)
+        expected = np.where(np.isnan(expected), distance / self.length, expected)
+        distance = distance - self.length * np.round(distance / self.length - expected)
+        return (lap_number - 1) * self.length + distance
+
+# ---------------------------
+# Per-circuit cache
+# ---------------------------
+_projection_cache = {}  # circuit key (or ('session', key) offline) -> TrackProjection
+
+def get_projection(cache_key, track_df):
+    """Returns the projection for a circuit, building it from its outline the first time."""
+    if cache_key in _projection_cache:
+        return _projection_cache[cache_key]
+    if track_df is None or track_df.empty:
+        return None
+    try:
+        projection = TrackProjection(track_df['x'].to_numpy(), track_df['y'].to_numpy())
+    except ValueError as e:
+        print(f"Could not build track projection: {e}")
+        return None
+    _projection_cache[cache_key] = projection
+    return projection
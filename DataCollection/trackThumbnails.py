@@ -0,0 +1,136 @@
+import os
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import trackOutline
+
+# --- CONFIGURATION ---
+THUMBNAIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TrackThumbnails')
+THUMBNAIL_SIZE = (4, 1.5)  # inches, matches the home page card layout
+THUMBNAIL_DPI = 200        # rendered at 2x so the PNG stays sharp on high-DPI screens
+TRACK_COLOUR = '#FF1801'
+
+# Bytes already read from disk in this process
+_thumbnail_cache = {}
+
+# ---------------------------
+# Rendering
+# ---------------------------
+def thumbnail_path(circuit_key):
+    """Location of the PNG thumbnail for a circuit."""
+    return os.path.join(THUMBNAIL_DIR, f"circuit_{circuit_key}.png")
+
+def render_thumbnail(x, y):
+    """
+    Renders a track outline to PNG bytes.
+    Uses the object-oriented Figure API (no pyplot state) so it is safe to run in worker processes.
+    """
+    fig = Figure(figsize=THUMBNAIL_SIZE, dpi=THUMBNAIL_DPI)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+
+    ax.plot(x, y, color=TRACK_COLOUR, linewidth=2)
+
+    # Same minimalist style as plot_track_map: no axes, no margins, transparent background
+    ax.axis('off')
+    ax.set_aspect('equal', 'datalim')
+    fig.subplots_adjust(left=0, right=1, bottom=0, top=1)
+    fig.patch.set_alpha(0)
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', transparent=True)
+    return buffer.getvalue()
+
+def _render_to_disk(job):
+    """Worker entry point: renders one circuit and writes the PNG. Returns the circuit key."""
+    circuit_key, x, y = job
+    png = render_thumbnail(x, y)
+    path = thumbnail_path(circuit_key)
+    # Write to a temp file first so a reader never sees a half-written image
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    return circuit_key
+
+def render_thumbnails(circuit_keys, max_workers=None, force=False):
+    """
+    Renders thumbnails for every circuit that does not have one yet, across a process pool.
+    Outlines are loaded here and only plain arrays are sent to the workers.
+    Returns the list of circuit keys that were rendered.
+    """
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+
+    jobs = []
+    for circuit_key in dict.fromkeys(circuit_keys):  # de-duplicate, keep order
+        if circuit_key is None:
+            continue
+        if not force and os.path.exists(thumbnail_path(circuit_key)):
+            continue
+        outline = trackOutline.get_circuit_outline(circuit_key)
+        if outline is None or outline['track'].empty:
+            continue
+        track = outline['track']
+        jobs.append((circuit_key, track['x'].to_numpy(dtype=np.float32), track['y'].to_numpy(dtype=np.float32)))
+
+    if not jobs:
+        return []
+
+    if len(jobs) == 1:
+        # Not worth starting a pool for a single image
+        rendered = [_render_to_disk(jobs[0])]
+    else:
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                rendered = list(pool.map(_render_to_disk, jobs))
+        except Exception as e:
+            print(f"Thumbnail pool failed ({e}), rendering sequentially.")
+            rendered = [_render_to_disk(job) for job in jobs]
+
+    for circuit_key in rendered:
+        _thumbnail_cache.pop(circuit_key, None)
+    print(f"Rendered {len(rendered)} track thumbnails.")
+    return rendered
+
+# ---------------------------
+# Serving
+# ---------------------------
+def get_thumbnail(circuit_key):
+    """Returns the PNG bytes for a circuit, or None if it has not been rendered."""
+    if circuit_key in _thumbnail_cache:
+        return _thumbnail_cache[circuit_key]
+
+    path = thumbnail_path(circuit_key)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        png = f.read()
+    _thumbnail_cache[circuit_key] = png
+    return png
+
+def get_session_thumbnail(session_key, circuit_key=None):
+    """
+    Returns thumbnail bytes for a session's circuit.
+    Falls back to rendering inline (and storing the result) if the sync job has not rendered it yet.
+    """
+    if circuit_key is None:
+        circuit_key = trackOutline.resolve_circuit_key(session_key)
+
+    if circuit_key is not None:
+        png = get_thumbnail(circuit_key)
+        if png is not None:
+            return png
+
+    outline = trackOutline.get_session_outline(session_key, circuit_key)
+    if outline is None or outline['track'].empty:
+        return None
+
+    if circuit_key is None:
+        # No stable key to store under, render for this request only
+        return render_thumbnail(outline['track']['x'], outline['track']['y'])
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    _render_to_disk((circuit_key, outline['track']['x'].to_numpy(), outline['track']['y'].to_numpy()))
+    return get_thumbnail(circuit_key)
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import openf1_helper as of1
 
@@ -36,4 +37,115 @@ def get_weather_data(session_key):
 
     except Exception as e:
         print(f"Error fetching weather: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+# ---------------------------
+# Time-weighted weather per lap
+# ---------------------------
+# Weather samples arrive about once a minute while a lap lasts 80-120 s, so besides
+# the sample nearest its start each lap is given the weather over its own
+# [date_start, date_start + lap_duration) window. Readings are linear
+# between samples (held flat before the first and after the last one): means come
+# from a cumulative trapezoid integral evaluated at both window ends
+# (searchsorted), min/max from the window's end values and the samples inside it
+# (one reduceat over every window). Sessions are laid end to end on one time axis,
+# so any number of laps and sessions is handled in one pass.
+
+# --- CONFIGURATION ---
+WEATHER_VALUE_COLUMNS = ['track_temperature', 'air_temperature', 'humidity', 'rainfall']
+RANGE_COLUMNS = ['track_temperature', 'air_temperature']  # Also get _min / _max over the lap
+# Output name of each reading's lap mean; for rainfall that is the share of the lap with rain (0-1)
+MEAN_COLUMNS = {'track_temperature': 'track_temperature_mean', 'air_temperature': 'air_temperature_mean',
+                'humidity': 'humidity_mean', 'rainfall': 'rain_fraction'}
+LAP_WEATHER_COLUMNS = (list(MEAN_COLUMNS.values()) + [f"{c}_min" for c in RANGE_COLUMNS]
+                       + [f"{c}_max" for c in RANGE_COLUMNS])
+
+def _seconds(dates):
+    dates = pd.to_datetime(dates, utc=True, format='mixed')
+    return (dates - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy()
+
+def lap_weather(laps, weather):
+    """
+    Time-weighted weather over each lap's window (LAP_WEATHER_COLUMNS, indexed like laps).
+    laps need date_start and lap_duration (a missing duration gives the values at the lap start);
+    weather needs date plus WEATHER_VALUE_COLUMNS. With a session_key column in both, laps and
+    samples of many sessions are matched by session; without one in weather, every lap uses it.
+    Laps of sessions without weather samples get NaN.
+    """
+    out = pd.DataFrame(np.nan, index=laps.index, columns=LAP_WEATHER_COLUMNS)
+    weather = weather.dropna(subset=['date']) if weather is not None and 'date' in weather.columns else pd.DataFrame()
+    if weather.empty or laps.empty:
+        return out
+
+    lap_session = laps['session_key'].to_numpy(dtype=np.int64) if 'session_key' in laps.columns else np.zeros(len(laps), dtype=np.int64)
+    if 'session_key' in weather.columns and 'session_key' in laps.columns:
+        sample_session = weather['session_key'].to_numpy(dtype=np.int64)
+    else:
+        sample_session = np.full(len(weather), lap_session[0])
+    start = _seconds(laps['date_start'])
+    duration = pd.to_numeric(laps['lap_duration'], errors='coerce').fillna(0.0).clip(lower=0.0).to_numpy()
+    sample_time = _seconds(weather['date'])
+    columns = [c for c in WEATHER_VALUE_COLUMNS if c in weather.columns]
+    values = weather[columns].apply(pd.to_numeric, errors='coerce').astype(float)
+    # Gaps in one reading are filled from the session's neighbouring samples
+    values = values.groupby(sample_session).transform(lambda s: s.interpolate(limit_direction='both')).to_numpy()
+
+    # Per-session time origin and span, so each session occupies its own stretch of one time axis
+    sessions, inverse = np.unique(np.r_[lap_session, sample_session], return_inverse=True)
+    lap_index, sample_index = inverse[:len(laps)], inverse[len(laps):]
+    all_times = np.r_[start, sample_time]
+    origin = np.full(len(sessions), np.inf)
+    np.minimum.at(origin, inverse, all_times)
+    span = np.zeros(len(sessions))
+    np.maximum.at(span, inverse, np.r_[start + duration, sample_time] - origin[inverse])
+    stride = span.max() + 4.0
+
+    # Pad every session with its first and last reading just outside its span (flat extrapolation)
+    t = sample_time - origin[sample_index] + sample_index * stride
+    order = np.lexsort((t, sample_index))
+    t, values, sample_index = t[order], values[order], sample_index[order]
+    first = np.r_[True, sample_index[1:] != sample_index[:-1]]
+    last = np.r_[sample_index[1:] != sample_index[:-1], True]
+    t = np.r_[t, sample_index[first] * stride - 1.0, sample_index[last] * stride + span[sample_index[last]] + 1.0]
+    values = np.vstack([values, values[first], values[last]])
+    order = np.argsort(t, kind='stable')
+    t, values = t[order], values[order]
+
+    # Cumulative trapezoid integral at every sample
+    dt = np.diff(t)
+    integral = np.vstack([np.zeros((1, values.shape[1])), np.cumsum((values[1:] + values[:-1]) / 2 * dt[:, None], axis=0)])
+
+    def at(q):
+        """(reading, integral) of every column at times q."""
+        k = np.clip(np.searchsorted(t, q, side='right') - 1, 0, len(t) - 2)
+        step = np.where(dt[k] > 0, dt[k], 1.0)
+        frac = ((q - t[k]) / step)[:, None]
+        reading = values[k] + frac * (values[k + 1] - values[k])
+        return reading, integral[k] + (q - t[k])[:, None] * (values[k] + reading) / 2
+
+    has_weather = np.isin(lap_index, np.unique(sample_index))
+    q_start = start - origin[lap_index] + lap_index * stride
+    q_end = q_start + duration
+    start_reading, start_integral = at(q_start)
+    end_reading, end_integral = at(q_end)
+    positive = duration > 0
+    mean = np.where(positive[:, None], (end_integral - start_integral) / np.where(positive, duration, 1.0)[:, None], start_reading)
+
+    # Samples strictly inside each window: interleaved reduceat bounds, every other result is a window
+    inner_start = np.searchsorted(t, q_start, side='right')
+    inner_end = np.searchsorted(t, q_end, side='left')
+    has_inner = (inner_end > inner_start)[:, None]
+    padded = np.vstack([values, values[-1:]])
+    bounds = np.column_stack([inner_start, inner_end]).ravel()
+    inner_min = np.minimum.reduceat(padded, bounds, axis=0)[::2]
+    inner_max = np.maximum.reduceat(padded, bounds, axis=0)[::2]
+    low = np.fmin(np.fmin(start_reading, end_reading), np.where(has_inner, inner_min, np.nan))
+    high = np.fmax(np.fmax(start_reading, end_reading), np.where(has_inner, inner_max, np.nan))
+
+    for i, name in enumerate(columns):
+        out[MEAN_COLUMNS[name]] = np.where(has_weather, mean[:, i], np.nan)
+        if name in RANGE_COLUMNS:
+            out[f"{name}_min"] = np.where(has_weather, low[:, i], np.nan)
+            out[f"{name}_max"] = np.where(has_weather, high[:, i], np.nan)
+    out['rain_fraction'] = out['rain_fraction'].clip(0.0, 1.0)
+    return out
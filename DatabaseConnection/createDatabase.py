@@ -1,4 +1,5 @@
 from databaseManager import engine
+import migrations
 from sqlalchemy import text
 
 def create_tables():
@@ -33,9 +34,9 @@ def create_tables():
                 st_speed FLOAT,
                 i1_speed FLOAT,
                 i2_speed FLOAT,
-                segments_sector_1 TEXT, -- Storing list as string "[2049, 2049...]"
-                segments_sector_2 TEXT,
-                segments_sector_3 TEXT,
+                segments_sector_1 BLOB, -- Mini-sector codes packed as uint16 (see segmentCodec.py)
+                segments_sector_2 BLOB,
+                segments_sector_3 BLOB,
                 
                 -- Strategy Flags
                 is_pit_out_lap BOOLEAN,
@@ -47,6 +48,16 @@ def create_tables():
                 track_temperature FLOAT,
                 air_temperature FLOAT,
                 humidity FLOAT,
+
+                -- Weather over the whole lap (see weatherData.lap_weather)
+                rain_fraction FLOAT, -- Share of the lap with rain (0-1)
+                track_temperature_mean FLOAT,
+                air_temperature_mean FLOAT,
+                humidity_mean FLOAT,
+                track_temperature_min FLOAT,
+                track_temperature_max FLOAT,
+                air_temperature_min FLOAT,
+                air_temperature_max FLOAT,
                 
                 -- Constraint: Prevent duplicate rows for the same driver lap in the same session
                 UNIQUE(session_key, driver_number, lap_number)
@@ -54,43 +65,98 @@ def create_tables():
         """))
 
         # -------------------------------------------------------
-        # 2. Race Telemetry Table
+        # 2. Race Telemetry
+        # -------------------------------------------------------
+        # High-frequency (x,y,z) position data for the replay is not stored here:
+        # each session gets its own file (see telemetryPartitions.py) so old races
+        # can be dropped in constant time.
+        # A brand-new file still gets the original (empty) table so migrations 1-2
+        # apply as written; migration 5 then moves it into partitions and drops it.
+        if migrations.current_version() == 0:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS race_telemetry (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_key INTEGER,
+                    driver_acronym TEXT,
+                    driver_number INTEGER,
+                    lap_number INTEGER,
+                    lap_duration FLOAT,
+                    timestamp TIMESTAMP,
+                    x INTEGER,
+                    y INTEGER,
+                    z INTEGER
+                );
+            """))
+
+        # -------------------------------------------------------
+        # 3. Track Outlines Table
         # -------------------------------------------------------
-        # Stores high-frequency (x,y,z) position data.
-        # Used for Phase 1: Dashboard Replay Visualisation.
-        print("   - Creating table: race_telemetry")
+        # Stores simplified circuit outlines built once from telemetry.
+        # Keyed by circuit so one outline is reused across sessions and seasons.
+        print("   - Creating table: track_outlines")
         conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS race_telemetry (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                
-                -- Identifiers
-                session_key INTEGER,
-                driver_acronym TEXT,
-                driver_number INTEGER,
-                lap_number INTEGER,
-                
-                -- Telemetry Data
-                lap_duration FLOAT,
-                timestamp TIMESTAMP,
-                x INTEGER,
-                y INTEGER,
-                z INTEGER
+            CREATE TABLE IF NOT EXISTS track_outlines (
+                circuit_key INTEGER,
+                path TEXT, -- 'track' (racing line) or 'pit' (pit lane)
+                point_order INTEGER,
+                x FLOAT,
+                y FLOAT,
+                source_session_key INTEGER, -- Session the outline was built from
+
+                UNIQUE(circuit_key, path, point_order)
             );
         """))
-        
+
         # -------------------------------------------------------
-        # 3. Indexes
+        # 4. Race Calendar Tables
+        # -------------------------------------------------------
+        # Local copy of each season's race schedule so pages never call the API.
+        print("   - Creating table: race_calendar")
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS race_calendar (
+                session_key INTEGER PRIMARY KEY,
+                meeting_key INTEGER,
+                circuit_key INTEGER,
+                year INTEGER,
+                session_name TEXT, -- 'Race' or 'Sprint'
+                session_type TEXT,
+                country_name TEXT,
+                location TEXT,
+                circuit_short_name TEXT,
+                date_start TIMESTAMP,
+                date_end TIMESTAMP
+            );
+        """))
+
+        # When each season's schedule was last fetched (drives the refresh interval)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS calendar_refresh (
+                year INTEGER PRIMARY KEY,
+                refreshed_at TIMESTAMP
+            );
+        """))
+
+        # -------------------------------------------------------
+        # 5. Indexes
         # -------------------------------------------------------
         print("   - Creating indexes...")
         
         # Optimizes: "Get me all training data for Max Verstappen in this race"
         conn.execute(text("CREATE INDEX IF NOT EXISTS idx_ml_lookup ON ml_training_data (session_key, driver_number);"))
         
-        # Optimizes: "Get me the replay positions for Lap 5" (Critical for Dashboard smoothness)
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_telemetry_lookup ON race_telemetry (session_key, lap_number);"))
-
         conn.commit()
-        print("Database setup complete. 'f1_strategy.db' is ready.")
+
+    # Later schema changes (indexes etc.) are applied as versioned migrations
+    migrations.apply_migrations()
+    print("Database setup complete. 'f1_strategy.db' is ready.")
+
+def ensure_schema():
+    """
+    Creates the tables and applies pending migrations if the database is behind.
+    Cheap when the schema is already current (a single PRAGMA read), so it is safe to call at startup.
+    """
+    if migrations.current_version() < migrations.latest_version():
+        create_tables()
 
 if __name__ == "__main__":
     create_tables()
\ No newline at end of file
@@ -1,6 +1,10 @@
 import os
+import time
+import fcntl
+from contextlib import contextmanager
+from collections import deque
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 
 # --- CONFIGURATION ---
 # Define the base directory for the database
@@ -9,13 +13,117 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Ensure the directory exists
 os.makedirs(BASE_DIR, exist_ok=True)
 
-# Database file path and URL
+# Database file path and URL (F1_DB_PATH overrides it, e.g. for benchmarks on a scratch DB)
 DB_NAME = "f1_strategy.db"
-DB_PATH = os.path.join(BASE_DIR, DB_NAME)
+DB_PATH = os.environ.get("F1_DB_PATH", os.path.join(BASE_DIR, DB_NAME))
 DB_URL = f"sqlite:///{DB_PATH}"
 
+# Connection pool: connections stay open between calls so SQLite's per-connection
+# prepared statement cache and page cache are reused instead of rebuilt on every query
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 5
+STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection
+
+# Query timing log
+QUERY_LOG_SIZE = 1000  # Most recent queries kept in memory
+SLOW_QUERY_MS = 250    # Queries slower than this are printed
+
 # --- DATABASE ENGINE ---
-engine = create_engine(DB_URL)
+engine = create_engine(
+    DB_URL,
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    pool_pre_ping=False,  # SQLite files don't drop connections, so no liveness probe per checkout
+    connect_args={
+        'check_same_thread': False,  # Pooled connections are shared across Streamlit threads
+        'cached_statements': STATEMENT_CACHE_SIZE,
+        'timeout': 30,
+    },
+)
+
+@event.listens_for(engine, "connect")
+def _tune_connection(dbapi_connection, connection_record):
+    """Applies read-heavy PRAGMAs once per pooled connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")     # Readers don't block the sync job's writes
+    cursor.execute("PRAGMA synchronous=NORMAL")   # Safe with WAL, far fewer fsyncs
+    cursor.execute("PRAGMA cache_size=-65536")    # 64 MB page cache
+    cursor.execute("PRAGMA mmap_size=268435456")  # Memory-map up to 256 MB of the file
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+# --- QUERY REGISTRY ---
+# Named, parameterised statements. Each is compiled once and reused, and every
+# execution is timed so slow access paths show up in the query log.
+QUERIES = {}      # name -> {'sql': str, 'statement': TextClause, 'dtypes': dict or None}
+QUERY_LOG = deque(maxlen=QUERY_LOG_SIZE)
+
+def register_query(name, sql, dtypes=None):
+    """
+    Registers a named SELECT with bound parameters (:name style) and an explicit column list.
+    dtypes optionally declares the pandas dtype of each returned column.
+    Returns the name so modules can keep it as a constant.
+    """
+    QUERIES[name] = {'sql': sql, 'statement': text(sql), 'dtypes': dtypes}
+    return name
+
+def _log_query(name, elapsed_ms, rows):
+    """Records a query execution in the timing log."""
+    QUERY_LOG.append({'query': name, 'ms': elapsed_ms, 'rows': rows, 'at': time.time()})
+    if elapsed_ms > SLOW_QUERY_MS:
+        print(f"Slow query '{name}': {elapsed_ms:.1f} ms ({rows} rows)")
+
+def query_df(name, params=None, bind=None):
+    """
+    Runs a registered query with bound parameters and returns a DataFrame
+    with the dtypes declared at registration.
+    bind runs it on another engine (e.g. a telemetry partition) instead of the main DB.
+    """
+    query = QUERIES[name]
+    start = time.perf_counter()
+    try:
+        with (bind or engine).connect() as conn:
+            df = pd.read_sql(query['statement'], conn, params=params or {}, dtype=query['dtypes'])
+    except Exception as e:
+        print(f"Error running query '{name}': {e}")
+        df = pd.DataFrame()
+    _log_query(name, (time.perf_counter() - start) * 1000, len(df))
+    return df
+
+def query_exists(name, params=None, bind=None):
+    """Returns True if a registered query returns at least one row (write it with LIMIT 1)."""
+    query = QUERIES[name]
+    start = time.perf_counter()
+    try:
+        with (bind or engine).connect() as conn:
+            row = conn.execute(query['statement'], params or {}).first()
+    except Exception as e:
+        print(f"Error running query '{name}': {e}")
+        row = None
+    _log_query(name, (time.perf_counter() - start) * 1000, int(row is not None))
+    return row is not None
+
+def in_clause(name, values):
+    """
+    Builds a bound IN (...) list: returns (':name_0, :name_1, ...', {'name_0': v0, ...}).
+    Keeps values out of the SQL text so the statement is safe and cacheable.
+    """
+    params = {f"{name}_{i}": value for i, value in enumerate(values)}
+    return ", ".join(f":{key}" for key in params), params
+
+def get_query_stats():
+    """Summarises the timing log per query: calls, mean/p95/max latency and rows returned."""
+    if not QUERY_LOG:
+        return pd.DataFrame(columns=['query', 'calls', 'mean_ms', 'p95_ms', 'max_ms', 'rows'])
+    log = pd.DataFrame(list(QUERY_LOG))
+    stats = log.groupby('query').agg(
+        calls=('ms', 'size'),
+        mean_ms=('ms', 'mean'),
+        p95_ms=('ms', lambda s: s.quantile(0.95)),
+        max_ms=('ms', 'max'),
+        rows=('rows', 'sum'),
+    ).reset_index()
+    return stats.sort_values('mean_ms', ascending=False)
 
 # --- HELPER FUNCTIONS ---
 
@@ -39,26 +147,53 @@ def save_to_db(df, table_name, if_exists='append'):
     except Exception as e:
         print(f"Error saving to DB: {e}")
 
-def load_from_db(query):
+def load_from_db(query, params=None):
     """
-    Executes a SQL query and returns a Pandas DataFrame.
+    Executes an ad hoc SQL query and returns a Pandas DataFrame.
+    Prefer register_query/query_df for anything on a hot path.
     """
     try:
         with engine.connect() as conn:
-            return pd.read_sql(text(query), conn)
+            return pd.read_sql(text(query), conn, params=params or {})
     except Exception as e:
         print(f"Error loading from DB: {e}")
         return pd.DataFrame()
-    
+
 def execute_query(query, params=None):
     """Executes a query that changes data (INSERT, UPDATE, DELETE)."""
     with engine.connect() as conn:
         conn.execute(text(query), params)
         conn.commit()
-    
+
+def vacuum():
+    """
+    Rebuilds the main DB file so space freed by deletes is returned to the OS.
+    VACUUM cannot run inside a transaction, so it uses an autocommit connection.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+        # In WAL mode the rebuilt pages land in the WAL; checkpoint so the main file actually shrinks
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+@contextmanager
+def file_lock(folder):
+    """
+    Holds an exclusive lock on folder/lock for the duration of the with block, so read-modify-writes
+    of the file stores next to the DB (feature store, model registry) from several threads or
+    processes run one at a time.
+    """
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "lock"), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
 def test_db_connection():
     """
     Tests the database connection by executing a simple query.
+    Only meant for standalone scripts; the app relies on each query's own error handling.
     """
     try:
         with engine.connect() as conn:
@@ -67,4 +202,4 @@ def test_db_connection():
             return True
     except Exception as e:
         print(f"Database connection failed: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,195 @@
+import pandas as pd
+from sqlalchemy import text
+import databaseManager as db
+from databaseManager import engine
+import telemetryPartitions as partitions
+import segmentCodec
+
+# -------------------------------------------------------
+# Versioned schema migrations
+# -------------------------------------------------------
+# Each entry is (version, description, statements). Statements are SQL strings or
+# callables taking a connection; "VACUUM" runs after the migration commits, since it
+# cannot run inside a transaction. The applied version is stored in SQLite's
+# PRAGMA user_version, so each migration runs exactly once per database file.
+# Append new migrations to the end; never edit or reorder applied ones.
+
+def _table_exists(conn, table_name):
+    return conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                        {'name': table_name}).first() is not None
+
+def _add_columns(table_name, columns):
+    """Adds the (name, type) columns a table does not have yet (new databases already create them)."""
+    def run(conn):
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table_name})"))}
+        for name, column_type in columns:
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+    return run
+
+def _move_telemetry_to_partitions(conn):
+    """Copies each session in the legacy race_telemetry table into its own partition file, then drops the table."""
+    if not _table_exists(conn, 'race_telemetry'):
+        return
+    keys = [row[0] for row in conn.execute(text("SELECT DISTINCT session_key FROM race_telemetry"))]
+    for key in keys:
+        if partitions.has_partition(key):
+            continue
+        df = pd.read_sql(text(f"""
+            SELECT {', '.join(partitions.TELEMETRY_COLUMNS)} FROM race_telemetry
+            WHERE session_key = :key ORDER BY timestamp
+        """), conn, params={'key': key})
+        if not partitions.write_partition(key, df):
+            raise RuntimeError(f"Could not move telemetry for session {key} into a partition")
+    conn.execute(text("DROP TABLE race_telemetry"))
+
+def _pack_segment_strings(conn):
+    """Re-encodes segments_sector_* values stored as list repr strings into packed uint16 blobs."""
+    if not _table_exists(conn, 'ml_training_data'):
+        return
+    for col in segmentCodec.SEGMENT_COLUMNS:
+        rows = conn.execute(text(f"SELECT rowid, {col} FROM ml_training_data WHERE typeof({col}) = 'text'")).fetchall()
+        updates = [{'id': row_id, 'blob': segmentCodec.encode_segments(value)} for row_id, value in rows]
+        if updates:
+            conn.execute(text(f"UPDATE ml_training_data SET {col} = :blob WHERE rowid = :id"), updates)
+
+def _encode_row_partitions(conn):
+    """Re-writes partitions stored as one row per sample into encoded per-driver streams."""
+    for key in partitions.list_partitions():
+        engine = partitions.get_engine(key)
+        with engine.connect() as part_conn:
+            if not _table_exists(part_conn, 'race_telemetry'):
+                continue
+            df = pd.read_sql(text(f"SELECT {', '.join(partitions.TELEMETRY_COLUMNS)} FROM race_telemetry"), part_conn)
+        if not partitions.write_partition(key, df):
+            raise RuntimeError(f"Could not encode telemetry partition for session {key}")
+
+MIGRATIONS = [
+    (1, "Per-driver telemetry index (track outline + per-driver streams)", [
+        # Serves WHERE session_key AND driver_number ORDER BY timestamp without a sort,
+        # and the most-laps driver lookup (MAX(lap_number) per driver) from the index alone
+        "CREATE INDEX IF NOT EXISTS idx_telemetry_driver_time ON race_telemetry (session_key, driver_number, timestamp, lap_number)",
+    ]),
+    (2, "Time-ordered telemetry index (replay loads)", [
+        # Serves WHERE session_key ORDER BY timestamp without a temp B-tree sort. lap_number is
+        # included so the lap filter is checked in the index and the planner prefers this
+        # index over idx_telemetry_lookup (which would force a sort of every sample)
+        "CREATE INDEX IF NOT EXISTS idx_telemetry_time ON race_telemetry (session_key, timestamp, lap_number)",
+    ]),
+    (3, "Outline and calendar lookup indexes", [
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_outline_points ON track_outlines (circuit_key, path, point_order)",
+        "CREATE INDEX IF NOT EXISTS idx_outline_source ON track_outlines (source_session_key)",
+        "CREATE INDEX IF NOT EXISTS idx_calendar_season ON race_calendar (year, date_start)",
+    ]),
+    (4, "Refresh planner statistics", [
+        "ANALYZE",
+    ]),
+    (5, "Move telemetry into per-session partition files", [
+        _move_telemetry_to_partitions,
+        # Hand the dropped table's pages back to the OS
+        "VACUUM",
+    ]),
+    (6, "Pack mini-sector segment lists into uint16 blobs", [
+        _pack_segment_strings,
+        "VACUUM",
+    ]),
+    (7, "Encode telemetry partitions as compressed per-driver streams", [
+        _encode_row_partitions,
+    ]),
+    (8, "Stored pit-stop predictions (StrategyModel/pitModel.py)", [
+        """CREATE TABLE IF NOT EXISTS pit_predictions (
+            session_key INTEGER NOT NULL,
+            driver_number INTEGER NOT NULL,
+            lap_number INTEGER NOT NULL,
+            model_name TEXT NOT NULL,
+            model_version INTEGER NOT NULL,
+            pit_probability REAL,
+            ci_low REAL,
+            ci_high REAL
+        )""",
+        # One prediction per lap and model version; serves the per-session load in lap order
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_pit_predictions ON pit_predictions (session_key, model_name, model_version, driver_number, lap_number)",
+    ]),
+    (9, "Measured pit stop losses (StrategyModel/pitLoss.py)", [
+        """CREATE TABLE IF NOT EXISTS pit_losses (
+            session_key INTEGER NOT NULL,
+            circuit_key INTEGER,
+            driver_number INTEGER NOT NULL,
+            in_lap INTEGER NOT NULL,
+            pit_lane_time REAL,
+            in_lap_time REAL,
+            out_lap_time REAL,
+            reference_lap_time REAL,
+            pit_loss REAL,
+            neutralised INTEGER
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_pit_losses ON pit_losses (session_key, driver_number, in_lap)",
+        # Serves the per-circuit distribution
+        "CREATE INDEX IF NOT EXISTS idx_pit_losses_circuit ON pit_losses (circuit_key, neutralised)",
+    ]),
+    (10, "Lap quality flags (DataCollection/lapQuality.py)", [
+        """CREATE TABLE IF NOT EXISTS lap_quality (
+            session_key INTEGER NOT NULL,
+            driver_number INTEGER NOT NULL,
+            lap_number INTEGER NOT NULL,
+            flags INTEGER NOT NULL
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_lap_quality ON lap_quality (session_key, driver_number, lap_number)",
+        # Serves the clean-lap selection (session and flags, covering the join keys)
+        "CREATE INDEX IF NOT EXISTS idx_lap_quality_flags ON lap_quality (session_key, flags, driver_number, lap_number)",
+    ]),
+    (11, "Weather range over each lap (DataCollection/weatherData.py)", [
+        # Laps stored before this keep their nearest-sample weather and no range
+        _add_columns('ml_training_data', [(f"{name}_{stat}", 'FLOAT') for name in ('track_temperature', 'air_temperature')
+                                          for stat in ('min', 'max')]),
+    ]),
+    (12, "Move any legacy race_telemetry rows left in the main DB into partitions", [
+        # A checkout from before migration 5 recreates race_telemetry on startup and writes to it
+        _move_telemetry_to_partitions,
+        "VACUUM",
+    ]),
+    (13, "Time-weighted lap weather beside the start-of-lap readings (DataCollection/weatherData.py)", [
+        # The original weather columns keep their nearest-sample meaning; laps stored before this get NULLs
+        _add_columns('ml_training_data', [('rain_fraction', 'FLOAT')]
+                     + [(f"{name}_mean", 'FLOAT') for name in ('track_temperature', 'air_temperature', 'humidity')]),
+    ]),
+]
+
+def current_version():
+    """Returns the schema version of the database file (0 if no migrations have run)."""
+    with engine.connect() as conn:
+        return conn.execute(text("PRAGMA user_version")).scalar()
+
+def latest_version():
+    """Returns the version the schema will be at once every migration has run."""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def apply_migrations():
+    """
+    Applies every migration newer than the database's current version, in order.
+    Each migration and its version bump commit together, so a failure leaves the
+    database at the last good version. Returns the list of versions applied.
+    """
+    version = current_version()
+    applied = []
+
+    for migration_version, description, statements in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        print(f"   - Applying migration {migration_version}: {description}")
+        vacuum = False
+        with engine.begin() as conn:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                elif statement.strip().upper() == "VACUUM":
+                    vacuum = True
+                else:
+                    conn.execute(text(statement))
+            conn.execute(text(f"PRAGMA user_version = {int(migration_version)}"))
+        if vacuum:
+            db.vacuum()
+        applied.append(migration_version)
+
+    return applied
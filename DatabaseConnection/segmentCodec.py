@@ -0,0 +1,107 @@
+import ast
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------
+# Mini-sector segment codes
+# -------------------------------------------------------
+# OpenF1 reports each sector as a list of mini-sector status codes
+# (e.g. 2048 yellow, 2049 green, 2051 purple, 2064 pit lane, 0 not available).
+# They are stored as packed little-endian uint16 blobs: 2 bytes per segment,
+# no parsing on read, and a whole column decodes into a matrix in one pass.
+
+# --- CONFIGURATION ---
+SEGMENT_DTYPE = np.dtype('<u2')
+MISSING_CODE = 0  # OpenF1's "not available" code; also used for None entries and padding
+SEGMENT_COLUMNS = ['segments_sector_1', 'segments_sector_2', 'segments_sector_3']
+
+# ---------------------------
+# Encode
+# ---------------------------
+def _as_list(value):
+    """Normalises a segment value (list, array, legacy repr string or missing) to a list or None."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=SEGMENT_DTYPE).tolist()
+    if isinstance(value, str):
+        # Rows stored before packing hold the list's repr, e.g. "[2049, 2049, 2048]"
+        if value in ('', 'None', 'nan'):
+            return None
+        value = ast.literal_eval(value)
+        if value is None:
+            return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return list(value)
+
+def encode_segments(value):
+    """Packs one sector's segment codes into a uint16 blob. Returns None if the sector is missing."""
+    codes = _as_list(value)
+    if codes is None:
+        return None
+    codes = [MISSING_CODE if c is None or (isinstance(c, float) and np.isnan(c)) else int(c) for c in codes]
+    return np.asarray(codes, dtype=SEGMENT_DTYPE).tobytes()
+
+def encode_segment_columns(df):
+    """Replaces every segments_sector_* column in a DataFrame with packed blobs (in place)."""
+    for col in SEGMENT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].map(encode_segments)
+    return df
+
+# ---------------------------
+# Decode
+# ---------------------------
+def decode_segments(blob):
+    """Unpacks one blob into a 1D uint16 array (empty if missing)."""
+    if blob is None or (isinstance(blob, float) and np.isnan(blob)):
+        return np.empty(0, dtype=SEGMENT_DTYPE)
+    return np.frombuffer(blob, dtype=SEGMENT_DTYPE)
+
+def segment_matrix(blobs, width=None):
+    """
+    Decodes a column of blobs into a (laps x segments) uint16 matrix.
+    Rows shorter than the widest (or than width) are padded with MISSING_CODE.
+    All blobs are joined and decoded with a single frombuffer and scattered into
+    place with index arithmetic, so there is no per-row parsing.
+    """
+    blobs = [b if isinstance(b, (bytes, bytearray, memoryview)) else b'' for b in blobs]
+    lengths = np.fromiter((len(b) // SEGMENT_DTYPE.itemsize for b in blobs), dtype=np.int64, count=len(blobs))
+    if width is None:
+        width = int(lengths.max()) if len(lengths) else 0
+
+    matrix = np.full((len(blobs), width), MISSING_CODE, dtype=SEGMENT_DTYPE)
+    if width == 0 or lengths.sum() == 0:
+        return matrix
+
+    values = np.frombuffer(b''.join(blobs), dtype=SEGMENT_DTYPE)
+    rows = np.repeat(np.arange(len(blobs)), lengths)
+    # Column of each value = its position minus the start offset of its row
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    cols = np.arange(len(values)) - starts
+
+    keep = cols < width
+    matrix[rows[keep], cols[keep]] = values[keep]
+    return matrix
+
+def sector_matrices(df):
+    """
+    Decodes all three sectors of a lap DataFrame.
+    Returns {column: (laps x segments) matrix}, rows aligned with df.
+    """
+    return {col: segment_matrix(df[col].tolist()) for col in SEGMENT_COLUMNS if col in df.columns}
+
+def segments_to_frame(df, prefix='seg'):
+    """
+    Flattens the sector matrices into feature columns (seg1_0, seg1_1, ..., seg3_n) for the model,
+    indexed like df.
+    """
+    frames = []
+    for col, matrix in sector_matrices(df).items():
+        sector = col.rsplit('_', 1)[-1]
+        frames.append(pd.DataFrame(matrix, index=df.index,
+                                   columns=[f"{prefix}{sector}_{i}" for i in range(matrix.shape[1])]))
+    if not frames:
+        return pd.DataFrame(index=df.index)
+    return pd.concat(frames, axis=1)
@@ -0,0 +1,156 @@
+import os
+import zlib
+import numpy as np
+
+# Optional: LZ4 decodes several times faster than zlib at a slightly lower ratio
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+# -------------------------------------------------------
+# Location stream codec
+# -------------------------------------------------------
+# One driver's location samples (~3.7 Hz) are stored as a single blob instead of
+# one row per sample. Timestamps and coordinates are fixed-point integers; each
+# field is delta-encoded against the previous sample, written at the smallest
+# integer width that holds every delta, and the whole block is compressed.
+# Consecutive samples are close together, so most deltas fit in 1-2 bytes.
+
+# --- CONFIGURATION ---
+TIME_RESOLUTION_MS = 1     # Fixed-point step for timestamps (OpenF1 dates are microseconds; 1 ms is plenty for replay)
+COORD_RESOLUTION = 1.0     # Fixed-point step for x/y/z (OpenF1 already reports whole units, so this is lossless)
+ZLIB_LEVEL = 6
+# 'zlib' (always available) or 'lz4' (needs the lz4 package); F1_TELEMETRY_CODEC overrides it
+DEFAULT_CODEC = os.environ.get("F1_TELEMETRY_CODEC", "zlib")
+
+FIELDS = ['t', 'x', 'y', 'z']
+HEADER_DTYPE = np.dtype([
+    ('n', '<u4'),                                        # Samples in the stream
+    ('t0', '<i8'), ('x0', '<i4'), ('y0', '<i4'), ('z0', '<i4'),  # First sample (fixed-point)
+    ('wt', 'u1'), ('wx', 'u1'), ('wy', 'u1'), ('wz', 'u1'),      # Byte width of each field's deltas
+])
+_WIDTH_DTYPES = {1: np.dtype('<i1'), 2: np.dtype('<i2'), 4: np.dtype('<i4'), 8: np.dtype('<i8')}
+
+# ---------------------------
+# Compression
+# ---------------------------
+def resolve_codec(codec=None):
+    """Returns the codec to write with, falling back to zlib if lz4 is requested but not installed."""
+    codec = codec or DEFAULT_CODEC
+    if codec == 'lz4' and lz4frame is None:
+        print("lz4 is not installed, using zlib for telemetry streams.")
+        return 'zlib'
+    if codec not in ('zlib', 'lz4', 'none'):
+        raise ValueError(f"Unknown telemetry codec '{codec}'")
+    return codec
+
+def _compress(raw, codec):
+    if codec == 'zlib':
+        return zlib.compress(raw, ZLIB_LEVEL)
+    if codec == 'lz4':
+        return lz4frame.compress(raw)
+    return raw
+
+def _decompress(payload, codec):
+    if codec == 'zlib':
+        return zlib.decompress(payload)
+    if codec == 'lz4':
+        if lz4frame is None:
+            raise ImportError("This telemetry was written with lz4; install the lz4 package to read it.")
+        return lz4frame.decompress(payload)
+    return bytes(payload)
+
+# ---------------------------
+# Encode
+# ---------------------------
+def _delta_width(deltas):
+    """Smallest signed integer width (bytes) that holds every delta."""
+    if len(deltas) == 0:
+        return 1
+    lo, hi = int(deltas.min()), int(deltas.max())
+    for width, dtype in _WIDTH_DTYPES.items():
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return width
+    raise ValueError("Delta does not fit in 64 bits")
+
+def to_fixed_time(timestamps):
+    """datetime64 values (or epoch ns integers) -> int64 fixed-point time steps since the epoch."""
+    ns = np.asarray(timestamps).astype('datetime64[ns]').astype(np.int64)
+    step = TIME_RESOLUTION_MS * 1_000_000
+    # Integer rounding: epoch nanoseconds exceed float64 precision
+    return (ns + step // 2) // step
+
+def to_fixed_coord(values):
+    """Coordinates -> int64 fixed-point steps. Missing values repeat the previous sample (0 if none)."""
+    values = np.asarray(values, dtype=float)
+    if np.isnan(values).any():
+        idx = np.where(~np.isnan(values), np.arange(len(values)), 0)
+        np.maximum.accumulate(idx, out=idx)
+        values = np.nan_to_num(values[idx], nan=0.0)
+    return np.round(values / COORD_RESOLUTION).astype(np.int64)
+
+def encode_stream(t, x, y, z, codec=None):
+    """
+    Encodes one driver's samples (already in time order) into a compressed blob.
+    t is fixed-point time (see to_fixed_time); x, y, z are raw coordinates.
+    Returns (payload bytes, codec used).
+    """
+    codec = resolve_codec(codec)
+    columns = {'t': np.asarray(t, dtype=np.int64), 'x': to_fixed_coord(x), 'y': to_fixed_coord(y), 'z': to_fixed_coord(z)}
+    n = len(columns['t'])
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['n'] = n
+    blocks = []
+    for field in FIELDS:
+        values = columns[field]
+        if n:
+            header[f'{field}0'] = values[0]
+        deltas = np.diff(values)
+        width = _delta_width(deltas)
+        header[f'w{field}'] = width
+        blocks.append(deltas.astype(_WIDTH_DTYPES[width]).tobytes())
+
+    raw = header.tobytes() + b''.join(blocks)
+    return _compress(raw, codec), codec
+
+# ---------------------------
+# Decode
+# ---------------------------
+def decode_stream(payload, codec='zlib', start=0, stop=None, fields=FIELDS):
+    """
+    Decodes a blob back into NumPy arrays: {'t': int64 fixed-point time, 'x'/'y'/'z': float64}.
+    Each field is one frombuffer + cumsum, so decoding is linear and allocation-light.
+    start/stop select a sample range (e.g. some laps, via the per-lap index): only the deltas
+    up to stop are summed and only that range is returned. fields limits which fields are decoded.
+    """
+    raw = _decompress(payload, codec)
+    header = np.frombuffer(raw, dtype=HEADER_DTYPE, count=1)[0]
+    n = int(header['n'])
+    stop = n if stop is None else int(min(max(stop, 0), n))
+    start = int(min(max(start, 0), stop))
+
+    out = {}
+    offset = HEADER_DTYPE.itemsize
+    for field in FIELDS:
+        dtype = _WIDTH_DTYPES[int(header[f'w{field}'])]
+        count = max(n - 1, 0)
+        if field in fields:
+            # Samples before stop only need the deltas before stop
+            deltas = np.frombuffer(raw, dtype=dtype, count=max(stop - 1, 0), offset=offset)
+
+            values = np.empty(stop, dtype=np.int64)
+            if stop:
+                values[0] = header[f'{field}0']
+                np.cumsum(deltas, dtype=np.int64, out=values[1:])
+                values[1:] += values[0]
+            values = values[start:]
+            out[field] = values if field == 't' else values * COORD_RESOLUTION
+        offset += count * dtype.itemsize
+    return out
+
+def fixed_time_to_datetime(t):
+    """Fixed-point time steps -> datetime64[ns] array (UTC)."""
+    return (np.asarray(t, dtype=np.int64) * (TIME_RESOLUTION_MS * 1_000_000)).astype('datetime64[ns]')
@@ -0,0 +1,433 @@
+import os
+import glob
+import re
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+import databaseManager as db
+import telemetryCodec
+
+# -------------------------------------------------------
+# Per-session telemetry partitions
+# -------------------------------------------------------
+# Location samples are by far the largest data in the app, and they are only ever
+# read one session at a time. Each session lives in its own SQLite file, so
+# evicting or replacing a race is a file delete/rename instead of a row-level
+# DELETE that rewrites pages and indexes and never gives space back.
+# Inside a partition each driver's samples are one delta-encoded, compressed
+# stream (telemetryCodec.py) rather than one row per sample.
+
+# --- CONFIGURATION ---
+# Partition folder (F1_TELEMETRY_DIR overrides it); defaults to a folder next to the main DB
+PARTITION_DIR = os.environ.get("F1_TELEMETRY_DIR", os.path.join(os.path.dirname(db.DB_PATH), "telemetry"))
+PARTITION_PREFIX = "session_"
+PARTITION_POOL_SIZE = 2  # Open connections kept per partition
+
+# How many of the most recent races keep their telemetry (F1_RETENTION_SESSIONS overrides it)
+RETENTION_SESSIONS = int(os.environ.get("F1_RETENTION_SESSIONS", 5))
+
+# Columns of a decoded session (same as the original one-row-per-sample table)
+TELEMETRY_COLUMNS = ['session_key', 'driver_acronym', 'driver_number', 'lap_number', 'lap_duration', 'timestamp', 'x', 'y', 'z']
+STREAM_TABLE = "telemetry_streams"
+LAP_TABLE = "telemetry_laps"
+PARTITION_TABLES = (STREAM_TABLE, LAP_TABLE)
+
+PARTITION_SCHEMA = [
+    # One row per driver: the whole location stream as an encoded blob (see telemetryCodec.py)
+    f"""
+    CREATE TABLE IF NOT EXISTS {STREAM_TABLE} (
+        session_key INTEGER,
+        driver_number INTEGER,
+        driver_acronym TEXT,
+        codec TEXT,          -- 'zlib', 'lz4' or 'none'
+        n_samples INTEGER,
+        payload BLOB,
+
+        PRIMARY KEY (session_key, driver_number)
+    )
+    """,
+    # One row per driver lap: which slice of the stream belongs to the lap
+    f"""
+    CREATE TABLE IF NOT EXISTS {LAP_TABLE} (
+        session_key INTEGER,
+        driver_number INTEGER,
+        lap_number INTEGER,
+        lap_duration FLOAT,
+        start_index INTEGER, -- First sample of the lap within the driver's stream
+        n_samples INTEGER
+    )
+    """,
+]
+
+# Built after the bulk insert (faster than maintaining them row by row)
+PARTITION_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS idx_laps_driver ON {LAP_TABLE} (session_key, driver_number, start_index)",
+    "ANALYZE",
+]
+
+# ---------------------------
+# Registered queries
+# ---------------------------
+Q_STREAMS = db.register_query('telemetry_streams', f"""
+    SELECT driver_number, driver_acronym, codec, n_samples, payload
+    FROM {STREAM_TABLE}
+    WHERE session_key = :session_key
+    ORDER BY driver_number
+""")
+
+Q_DRIVER_STREAM = db.register_query('telemetry_driver_stream', f"""
+    SELECT driver_number, driver_acronym, codec, n_samples, payload
+    FROM {STREAM_TABLE}
+    WHERE session_key = :session_key
+    AND driver_number = :driver_number
+""")
+
+Q_LAPS = db.register_query('telemetry_laps', f"""
+    SELECT driver_number, lap_number, lap_duration, start_index, n_samples
+    FROM {LAP_TABLE}
+    WHERE session_key = :session_key
+    ORDER BY driver_number, start_index
+""", dtypes={'driver_number': 'int64', 'lap_number': 'int64', 'lap_duration': 'float64',
+             'start_index': 'int64', 'n_samples': 'int64'})
+
+os.makedirs(PARTITION_DIR, exist_ok=True)
+
+_engines = {}  # session_key -> engine for that session's file
+
+# ---------------------------
+# Paths + engines
+# ---------------------------
+def partition_path(session_key):
+    """Returns the file path of a session's telemetry partition."""
+    return os.path.join(PARTITION_DIR, f"{PARTITION_PREFIX}{int(session_key)}.db")
+
+def _create_engine(path):
+    """Pooled engine for one partition file, tuned like the main DB."""
+    engine = create_engine(
+        f"sqlite:///{path}",
+        pool_size=PARTITION_POOL_SIZE,
+        max_overflow=PARTITION_POOL_SIZE,
+        connect_args={
+            'check_same_thread': False,
+            'cached_statements': db.STATEMENT_CACHE_SIZE,
+            'timeout': 30,
+        },
+    )
+    event.listen(engine, "connect", db._tune_connection)
+    return engine
+
+def get_engine(session_key):
+    """Returns the engine for a session's partition, or None if the session is not stored."""
+    key = int(session_key)
+    if key in _engines:
+        return _engines[key]
+    if not has_partition(key):
+        return None
+    _engines[key] = _create_engine(partition_path(key))
+    return _engines[key]
+
+def _close_engine(session_key):
+    """Closes every pooled connection to a partition so its file can be replaced or removed."""
+    engine = _engines.pop(int(session_key), None)
+    if engine is not None:
+        engine.dispose()
+
+# ---------------------------
+# Partition management
+# ---------------------------
+def has_partition(session_key):
+    """True if the session's telemetry is stored (a file check, no query)."""
+    return os.path.exists(partition_path(session_key))
+
+def list_partitions():
+    """Returns the session keys that currently have a telemetry partition, sorted."""
+    keys = []
+    for path in glob.glob(os.path.join(PARTITION_DIR, f"{PARTITION_PREFIX}*.db")):
+        match = re.search(rf"{PARTITION_PREFIX}(\d+)\.db$", path)
+        if match:
+            keys.append(int(match.group(1)))
+    return sorted(keys)
+
+def encode_session(session_key, df, codec=None):
+    """
+    Turns one-row-per-sample telemetry into (streams DataFrame, laps DataFrame):
+    one encoded location stream per driver plus the sample range of each lap.
+    """
+    timestamps = pd.to_datetime(df['timestamp'], utc=True, format='ISO8601', errors='coerce')
+    valid = timestamps.notna().to_numpy()
+    drivers = df['driver_number'].to_numpy()[valid].astype(np.int64)
+    t = telemetryCodec.to_fixed_time(timestamps[valid].dt.tz_localize(None).to_numpy())
+    laps = df['lap_number'].to_numpy()[valid].astype(np.int64)
+    durations = df['lap_duration'].to_numpy(dtype=float)[valid]
+    acronyms = df['driver_acronym'].to_numpy()[valid]
+    coords = {c: df[c].to_numpy(dtype=float)[valid] for c in ('x', 'y', 'z')}
+
+    # Group by driver, time-ordered within each driver
+    order = np.lexsort((t, drivers))
+    drivers, t, laps, durations, acronyms = drivers[order], t[order], laps[order], durations[order], acronyms[order]
+    coords = {c: v[order] for c, v in coords.items()}
+    driver_keys, driver_starts = np.unique(drivers, return_index=True)
+    driver_ends = np.append(driver_starts[1:], len(drivers))
+
+    stream_rows, lap_frames = [], []
+    for driver, start, end in zip(driver_keys, driver_starts, driver_ends):
+        payload, used_codec = telemetryCodec.encode_stream(
+            t[start:end], coords['x'][start:end], coords['y'][start:end], coords['z'][start:end], codec)
+        stream_rows.append({'session_key': int(session_key), 'driver_number': int(driver),
+                            'driver_acronym': acronyms[start], 'codec': used_codec,
+                            'n_samples': int(end - start), 'payload': payload})
+
+        # Run-length encode the lap number of each sample
+        driver_laps = laps[start:end]
+        run_starts = np.flatnonzero(np.diff(driver_laps, prepend=driver_laps[0] - 1))
+        lap_frames.append(pd.DataFrame({
+            'session_key': int(session_key),
+            'driver_number': int(driver),
+            'lap_number': driver_laps[run_starts],
+            'lap_duration': durations[start:end][run_starts],
+            'start_index': run_starts,
+            'n_samples': np.diff(np.append(run_starts, end - start)),
+        }))
+
+    return pd.DataFrame(stream_rows), pd.concat(lap_frames, ignore_index=True)
+
+def write_partition(session_key, df, codec=None):
+    """
+    Encodes a session's telemetry and writes it to its own file, replacing any existing copy.
+    The file is built under a temporary name and renamed into place, so readers
+    only ever see the old partition or the complete new one.
+    """
+    if df is None or df.empty:
+        print(f"No telemetry to store for session {session_key}")
+        return False
+
+    final_path = partition_path(session_key)
+    tmp_path = f"{final_path}.tmp"
+    _remove_files(tmp_path)
+
+    tmp_engine = _create_engine(tmp_path)
+    try:
+        streams, laps = encode_session(session_key, df, codec)
+        with tmp_engine.begin() as conn:
+            for statement in PARTITION_SCHEMA:
+                conn.execute(text(statement))
+            streams.to_sql(STREAM_TABLE, conn, if_exists='append', index=False)
+            laps.to_sql(LAP_TABLE, conn, if_exists='append', index=False)
+        with tmp_engine.begin() as conn:
+            for statement in PARTITION_INDEXES:
+                conn.execute(text(statement))
+    except Exception as e:
+        print(f"Error writing telemetry partition for session {session_key}: {e}")
+        tmp_engine.dispose()
+        _remove_files(tmp_path)
+        return False
+    # Closing the last connection checkpoints the WAL, leaving a single self-contained file
+    tmp_engine.dispose()
+
+    _close_engine(session_key)
+    _remove_files(final_path, main=False)
+    os.replace(tmp_path, final_path)
+    print(f"Saved {len(df)} telemetry samples ({streams['payload'].map(len).sum() / 1e6:.1f} MB encoded) "
+          f"to partition {os.path.basename(final_path)}")
+    return True
+
+def drop_partition(session_key):
+    """Removes a session's telemetry in constant time. Returns True if it existed."""
+    _close_engine(session_key)
+    path = partition_path(session_key)
+    existed = os.path.exists(path)
+    _remove_files(path)
+    return existed
+
+def apply_retention(keep_keys):
+    """
+    Drops the partition of every session not in keep_keys.
+    An empty keep list is ignored so a failed calendar lookup can never wipe all telemetry.
+    Returns the list of dropped session keys.
+    """
+    keep = {int(k) for k in keep_keys}
+    if not keep:
+        print("No sessions to keep provided. Skipping retention to prevent wiping telemetry.")
+        return []
+
+    dropped = [key for key in list_partitions() if key not in keep]
+    for key in dropped:
+        drop_partition(key)
+    return dropped
+
+def _remove_files(path, main=True):
+    """Deletes a SQLite file and its WAL/shared-memory side files if present."""
+    suffixes = ["", "-wal", "-shm"] if main else ["-wal", "-shm"]
+    for suffix in suffixes:
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+# ---------------------------
+# Read + decode
+# ---------------------------
+def read_laps(session_key):
+    """Returns each driver's laps (lap_number, lap_duration, start_index, n_samples), or empty if not stored."""
+    return query_df(session_key, Q_LAPS, {'session_key': int(session_key)})
+
+def _read_streams(session_key, drivers=None):
+    params = {'session_key': int(session_key)}
+    if drivers is None:
+        return query_df(session_key, Q_STREAMS, params)
+    return pd.concat([query_df(session_key, Q_DRIVER_STREAM, {**params, 'driver_number': int(d)})
+                      for d in drivers], ignore_index=True) if len(drivers) else pd.DataFrame()
+
+def _decode_laps(session_key, streams, laps, lap_ranges, time_range=None):
+    """
+    Decodes only the samples of each driver's selected laps, located through the per-lap index.
+    lap_ranges maps driver_number -> (first lap, last lap), None meaning no bound; drivers missing
+    from it are skipped. time_range (fixed-point start, end) trims the result further.
+    Returns the rows as TELEMETRY_COLUMNS, ordered by timestamp.
+    """
+    laps_by_driver = {driver: group for driver, group in laps.groupby('driver_number')}
+    acronyms = pd.unique(streams['driver_acronym'].astype(str))
+    acronym_codes = {acronym: code for code, acronym in enumerate(acronyms)}
+
+    pieces = {name: [] for name in ('driver', 'acronym', 'lap', 'duration', 't', 'x', 'y', 'z')}
+    for stream in streams.itertuples(index=False):
+        driver_laps = laps_by_driver.get(stream.driver_number)
+        if driver_laps is None or stream.driver_number not in lap_ranges:
+            continue
+        first, last = lap_ranges[stream.driver_number]
+        lap_numbers = driver_laps['lap_number'].to_numpy()
+        selected = np.ones(len(driver_laps), dtype=bool)
+        if first is not None:
+            selected &= lap_numbers >= first
+        if last is not None:
+            selected &= lap_numbers <= last
+        if not selected.any():
+            continue
+
+        # Laps are stored in sample order, so the selected laps are one contiguous sample range
+        chosen = driver_laps[selected]
+        start = int(chosen['start_index'].iloc[0])
+        stop = int(chosen['start_index'].iloc[-1] + chosen['n_samples'].iloc[-1])
+        decoded = telemetryCodec.decode_stream(stream.payload, stream.codec, start, stop)
+        lap_number = np.repeat(chosen['lap_number'].to_numpy(np.int16), chosen['n_samples'].to_numpy())
+        lap_duration = np.repeat(chosen['lap_duration'].to_numpy(np.float32), chosen['n_samples'].to_numpy())
+
+        keep = slice(None)
+        if time_range is not None:
+            keep = (decoded['t'] >= time_range[0]) & (decoded['t'] <= time_range[1])
+        n = len(decoded['t'][keep])
+        pieces['driver'].append(np.full(n, stream.driver_number, dtype=np.int16))
+        pieces['acronym'].append(np.full(n, acronym_codes[str(stream.driver_acronym)], dtype=np.int8))
+        pieces['lap'].append(lap_number[keep])
+        pieces['duration'].append(lap_duration[keep])
+        pieces['t'].append(decoded['t'][keep])
+        for field in ('x', 'y', 'z'):
+            pieces[field].append(decoded[field][keep].astype(np.float32))
+
+    if not pieces['t']:
+        return pd.DataFrame(columns=TELEMETRY_COLUMNS)
+    merged = {name: np.concatenate(arrays) for name, arrays in pieces.items()}
+
+    # Merge the per-driver streams back into one time-ordered sequence
+    order = np.argsort(merged['t'], kind='stable')
+    return pd.DataFrame({
+        'session_key': np.full(len(order), int(session_key), dtype=np.int32),
+        'driver_acronym': pd.Categorical.from_codes(merged['acronym'][order], categories=acronyms),
+        'driver_number': merged['driver'][order],
+        'lap_number': merged['lap'][order],
+        'lap_duration': merged['duration'][order],
+        'timestamp': pd.to_datetime(telemetryCodec.fixed_time_to_datetime(merged['t'][order]), utc=True),
+        'x': merged['x'][order],
+        'y': merged['y'][order],
+        'z': merged['z'][order],
+    })
+
+def read_session(session_key, min_lap=None, drivers=None, max_lap=None):
+    """
+    Decodes a session's telemetry into one row per sample (TELEMETRY_COLUMNS), ordered by timestamp.
+    Columns come back compact: driver_acronym categorical, driver_number/lap_number int16,
+    x/y/z/lap_duration float32 (coordinates are whole units, so float32 is exact).
+    min_lap/max_lap limit the laps decoded (inclusive); drivers limits decoding to those driver numbers.
+    Returns an empty DataFrame if the session is not stored.
+    """
+    streams = _read_streams(session_key, drivers)
+    if streams.empty:
+        return pd.DataFrame(columns=TELEMETRY_COLUMNS)
+    lap_ranges = {driver: (min_lap, max_lap) for driver in streams['driver_number']}
+    return _decode_laps(session_key, streams, read_laps(session_key), lap_ranges)
+
+def read_lap_starts(session_key):
+    """
+    Each driver's laps with the time the lap starts (first sample), from the per-lap index.
+    Only the time field of each stream is decoded. Returns driver_number, driver_acronym,
+    lap_number, lap_duration and lap_start (UTC datetimes), or an empty DataFrame if not stored.
+    """
+    streams = query_df(session_key, Q_STREAMS, {'session_key': int(session_key)})
+    laps = read_laps(session_key)
+    if streams.empty or laps.empty:
+        return pd.DataFrame(columns=['driver_number', 'driver_acronym', 'lap_number', 'lap_duration', 'lap_start'])
+
+    starts = []
+    for stream in streams.itertuples(index=False):
+        driver_laps = laps[laps['driver_number'] == stream.driver_number]
+        t = telemetryCodec.decode_stream(stream.payload, stream.codec, fields=('t',))['t']
+        index = driver_laps['start_index'].to_numpy()
+        starts.append(pd.DataFrame({
+            'driver_number': stream.driver_number,
+            'driver_acronym': str(stream.driver_acronym),
+            'lap_number': driver_laps['lap_number'].to_numpy(),
+            'lap_duration': driver_laps['lap_duration'].to_numpy(),
+            'lap_start': t[np.clip(index, 0, max(len(t) - 1, 0))] if len(t) else np.zeros(len(index), dtype=np.int64),
+        }))
+    out = pd.concat(starts, ignore_index=True)
+    out['lap_start'] = pd.to_datetime(telemetryCodec.fixed_time_to_datetime(out['lap_start'].to_numpy()), utc=True)
+    return out
+
+def _as_utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+def read_window(session_key, start_time, end_time, min_lap=None, lap_starts=None):
+    """
+    Decodes only the samples between start_time and end_time (UTC timestamps, inclusive).
+    The per-lap index picks each driver's laps that overlap the window, so only those laps
+    are decoded. lap_starts (from read_lap_starts) can be passed in to avoid rereading it.
+    """
+    streams = _read_streams(session_key)
+    if streams.empty:
+        return pd.DataFrame(columns=TELEMETRY_COLUMNS)
+    if lap_starts is None:
+        lap_starts = read_lap_starts(session_key)
+
+    start, end = _as_utc(start_time), _as_utc(end_time)
+    lap_ranges = {}
+    for driver, group in lap_starts.sort_values(['driver_number', 'lap_number']).groupby('driver_number'):
+        lap_start = group['lap_start']
+        # A lap overlaps the window if it starts before the window ends and the next lap starts after it begins
+        lap_end = lap_start.shift(-1).fillna(pd.Timestamp.max.tz_localize('UTC'))
+        overlap = group[(lap_start <= end) & (lap_end >= start)]
+        if min_lap is not None:
+            overlap = overlap[overlap['lap_number'] >= min_lap]
+        if not overlap.empty:
+            lap_ranges[driver] = (int(overlap['lap_number'].min()), int(overlap['lap_number'].max()))
+
+    time_range = tuple(telemetryCodec.to_fixed_time(np.array([start.tz_convert(None).to_datetime64(),
+                                                              end.tz_convert(None).to_datetime64()])))
+    return _decode_laps(session_key, streams, read_laps(session_key), lap_ranges, time_range)
+
+# ---------------------------
+# Queries
+# ---------------------------
+def query_df(session_key, name, params=None):
+    """Runs a registered telemetry query against a session's partition (empty if not stored)."""
+    engine = get_engine(session_key)
+    if engine is None:
+        return pd.DataFrame()
+    return db.query_df(name, params, bind=engine)
+
+def query_exists(session_key, name, params=None):
+    """Runs a registered existence query against a session's partition."""
+    engine = get_engine(session_key)
+    if engine is None:
+        return False
+    return db.query_exists(name, params, bind=engine)
@@ -1,11 +1,11 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import pandas as pd
 import time
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'DataCollection')))
 import storeRaceData as raceData
+import trackThumbnails
 
 # --- REFRESH CACHE --- #
 # Clear Streamlit caches once when the Dashboard page is first opened.
@@ -162,16 +162,14 @@ st.markdown(
 )
 
 # --- Getter for Track Map Image --- #
-@st.cache_data(show_spinner=False)
-def get_track_map_image(session_key):
+def get_track_map_image(session_key, circuit_key=None):
     """
-    Wrapper to fetch and plot track map.
-    Cached so we don't re-query the DB on every button click.
+    Returns the pre-rendered PNG thumbnail for the race's circuit.
+    Thumbnails are rendered once per circuit by the sync job and read from disk,
+    so this stays cheap no matter how many cards are on the page.
     """
     try:
-        df = raceData.get_track_layout(session_key)
-        fig = raceData.plot_track_map(df)
-        return fig
+        return trackThumbnails.get_session_thumbnail(session_key, circuit_key)
     except Exception:
         return None
 
@@ -246,10 +244,10 @@ else:
                 st.markdown(f"<div class='race-date'>{date_str}</div>", unsafe_allow_html=True)
 
                 # Track Map
-                track_fig = get_track_map_image(race['session_key'])
-                if track_fig:
-                    # Display the plot
-                    st.pyplot(track_fig, use_container_width=True, clear_figure=True)
+                track_png = get_track_map_image(race['session_key'], race.get('circuit_key'))
+                if track_png:
+                    # Display the static image
+                    st.image(track_png, use_container_width=True)
                 else:
                     # Fallback space if no data
                     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -258,6 +256,7 @@ else:
                 if st.button("Select Race", key=f"btn_{race['session_key']}", use_container_width=True, type="primary" if is_selected else "secondary"):
                     st.session_state['selected_session_key'] = race['session_key']
                     st.session_state['selected_race_name'] = race['location']
+                    st.session_state['selected_circuit_key'] = race.get('circuit_key')
                     st.rerun()
                 
                 st.markdown("</div>", unsafe_allow_html=True)
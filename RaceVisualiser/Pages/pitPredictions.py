@@ -0,0 +1,82 @@
+import streamlit as st
+import plotly.graph_objects as go
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'DataCollection')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'DatabaseConnection')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'StrategyModel')))
+import storeMLData as mlData
+import modelRegistry
+import pitModel
+
+# -------------------------------------------------------
+# Pit-stop predictions
+# -------------------------------------------------------
+# Registered model versions, retraining on every stored session, and the stored
+# pit probabilities of the selected race (computed at ingest, only read here).
+
+st.title("Pit-Stop Predictions")
+
+@st.cache_data
+def get_predictions(key):
+    return pitModel.load_predictions(key)
+
+#-----------------MODEL REGISTRY------------------#
+st.subheader("Model Registry")
+models = modelRegistry.list_models()
+if models.empty:
+    st.info("No models trained yet.")
+else:
+    st.dataframe(models, hide_index=True, use_container_width=True)
+
+if st.button("Train on all stored sessions"):
+    session_keys = mlData.stored_session_keys()
+    if not session_keys:
+        st.warning("No sessions in the database to train on.")
+    else:
+        with st.spinner(f"Training on {len(session_keys)} sessions..."):
+            version = pitModel.train_pit_model(session_keys)
+            if version is not None:
+                # Re-score every stored session with the new version
+                pitModel.store_predictions(pitModel.predict_sessions(session_keys, version))
+        # Only the cached predictions changed; the other pages' caches stay warm
+        get_predictions.clear()
+        st.rerun()
+
+#-----------------SESSION PREDICTIONS------------------#
+if 'selected_session_key' not in st.session_state:
+    st.warning("No race selected. Pick one on the Home page to see its predictions.")
+    st.stop()
+
+session_key = st.session_state['selected_session_key']
+st.subheader(f"{st.session_state.get('selected_race_name', 'Race')} — pit probability per lap")
+
+predictions = get_predictions(session_key)
+if predictions.empty:
+    # Sessions ingested before a model existed are scored on demand
+    if modelRegistry.latest_version(pitModel.MODEL_NAME) is not None and st.button("Score this session"):
+        pitModel.store_predictions(pitModel.predict_sessions([session_key]))
+        get_predictions.clear(session_key)
+        st.rerun()
+    st.info("No stored predictions for this session.")
+    st.stop()
+
+grid = predictions.pivot_table(index='driver_number', columns='lap_number', values='pit_probability')
+low = predictions.pivot_table(index='driver_number', columns='lap_number', values='ci_low').reindex_like(grid)
+high = predictions.pivot_table(index='driver_number', columns='lap_number', values='ci_high').reindex_like(grid)
+hover = (low * 100).round().astype('Int64').astype(str) + "–" + (high * 100).round().astype('Int64').astype(str) + "%"
+
+fig = go.Figure(go.Heatmap(
+    z=grid.to_numpy(), x=grid.columns, y=[f"#{d}" for d in grid.index],
+    customdata=hover.to_numpy(), colorscale='Viridis', zmin=0, zmax=1,
+    hovertemplate="Driver %{y}, lap %{x}<br>P(pit) %{z:.0%} (95% CI %{customdata})<extra></extra>",
+    colorbar=dict(title="P(pit)", tickformat=".0%"),
+))
+fig.update_layout(
+    height=max(400, 26 * len(grid)),
+    xaxis_title="Lap", yaxis_title="Driver",
+    plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+    font=dict(family='Space Grotesk', color='#e5e7eb'),
+)
+st.plotly_chart(fig, use_container_width=True)
+st.caption(f"Model version {int(predictions['model_version'].iloc[0])}. Probability of pitting at the end of each lap.")
@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import sys
@@ -8,6 +11,12 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'DataCollection')))
 import storeRaceData as raceData
 import storeMLData as mlData
+import replaySchema
+import stintEngine
+import replayIndex
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'StrategyModel')))
+import pitModel
+import undercutAnalyzer
 
 # ---- GLOBAL THEME FOR RACE REPLAY ----
 st.markdown(
@@ -193,104 +202,95 @@ if "replay_loaded" not in st.session_state:
 
 #-----------------TRACK LAYOUT------------------#
 @st.cache_data
-def get_static_track(key):
-    return raceData.get_track_layout(key)
+def get_static_track(key, circuit_key=None):
+    """
+    Returns the base layer for the replay map: the racing line, then the pit lane.
+    A NaN row between the two paths breaks the line so they draw as one trace.
+    """
+    track = raceData.get_track_layout(key, circuit_key)
+    if track is None:
+        return None
+    pit = raceData.get_pit_lane_layout(key, circuit_key)
+    if pit.empty:
+        return track
+    gap = pd.DataFrame({'x': [np.nan], 'y': [np.nan]})
+    return pd.concat([track, gap, pit], ignore_index=True)
+
+@st.cache_resource
+def get_track_projection(key, circuit_key=None):
+    """Distance-along-track index for the circuit (None without an outline); orders the leaderboard by position on track."""
+    return raceData.get_track_projection(key, circuit_key)
+
+@st.cache_data
+def get_pit_predictions(key):
+    """Pit probabilities stored for the session at ingest (pitModel); empty if no model has scored it."""
+    return pitModel.load_predictions(key)
+
+@st.cache_data
+def get_undercut_analysis(key):
+    """Undercut/overcut margins for every lap and pair of cars on the road (undercutAnalyzer), with driver acronyms."""
+    pairs = undercutAnalyzer.analyze_session(key)
+    laps = get_session_laps(key)
+    if pairs.empty or laps.empty:
+        return pairs
+    acronyms = laps.drop_duplicates('driver_number').set_index('driver_number')['driver_acronym'].astype(str)
+    return pairs.assign(driver=pairs['driver_number'].map(acronyms).fillna(pairs['driver_number'].astype(str)),
+                        ahead_driver=pairs['ahead_driver_number'].map(acronyms).fillna(pairs['ahead_driver_number'].astype(str)))
 
 #-----------------REPLAY DATA------------------#
+# Small per-session tables are cached whole; telemetry frames are loaded per window (see REPLAY FRAMES)
 @st.cache_data
-def get_replay_data(key):
-    """
-    Fetches and processes race replay data for visualization.
-    """
-    # get_race_replay_data now returns (resampled_telemetry_df, lap_times_df)
-    resampled, lap_times = raceData.get_race_replay_data(key)
-    if resampled is None or (hasattr(resampled, 'empty') and resampled.empty):
-        return pd.DataFrame(), pd.DataFrame()
-    
-    #-----------------STINT DATA FOR COMPOUND------------------#
-    pit_data = mlData.fetchMLData(key)
-    stints = [] # List to hold stint information: driver, start lap, end lap, compound
+def get_session_laps(key):
+    """Lap table from the per-lap index (lap starts in race seconds, lap times), typed per replaySchema.REPLAY_LAP_SCHEMA."""
+    laps, _ = raceData.get_replay_laps(key)
+    return laps
+
+@st.cache_data
+def get_driver_colours(key):
+    """Team colour and name per driver (empty if the API is unavailable)."""
+    return raceData.get_driver_colors(key)
+
+@st.cache_data
+def get_race_control(key):
+    """Race control messages (safety car, flags) for the session."""
+    return raceData.get_safety_car_data(key)
+
+@st.cache_data
+def get_stint_laps(key):
+    """Tyre compound per driver and lap (stintEngine.STINT_LAP_COLUMNS)."""
+    laps = get_session_laps(key)
+    pit_data = mlData.fetchStintData(key)
     if not pit_data.empty:
         # Map driver numbers to acronyms
-        if 'driver_number' in resampled.columns and 'driver_acronym' in resampled.columns:
-            driver_map = resampled[['driver_number', 'driver_acronym']].drop_duplicates()
+        if not laps.empty:
+            driver_map = laps[['driver_number', 'driver_acronym']].drop_duplicates()
             pit_data['driver_number'] = pit_data['driver_number'].astype(driver_map['driver_number'].dtype)
             pit_data = pit_data.merge(driver_map, on='driver_number', how='left')
         else:
             pit_data['driver_acronym'] = pit_data['driver_number'].astype(str) # Fallback if mapping unavailable
 
-        y_order = pit_data['driver_acronym'].dropna().unique().tolist() # Maintain order from pit_data
-        lap_col = 'lap_number'
-        compound_col = 'tire_compound'
-        laps_on_tire_col = 'laps_on_tire'
+    # Stint boundaries for every driver at once, expanded to one compound per lap for the merge
+    _, stints_df = stintEngine.segment(pit_data, lap_dtype='int16')
+    return stints_df
 
-        # Process each driver's pit stops to determine stints
-        for drv in y_order:
-            ddf = pit_data[pit_data['driver_acronym'] == drv].copy().sort_values(lap_col)
-            if lap_col not in ddf.columns or compound_col not in ddf.columns:
-                continue
-            
-            # Initialize stint tracking variables
-            current_comp = None
-            current_start = None
-            prev_lap = None
-            prev_tire_age = None
-
-            # Iterate through driver's pit data to identify stints
-            #Sample row: lap_number, tire_compound, laps_on_tire
-            for _, r in ddf.iterrows():
-                lap = int(r[lap_col])
-                comp = str(r[compound_col]).upper() if pd.notna(r[compound_col]) else 'UNKNOWN'
-                current_tire_age = int(r[laps_on_tire_col]) if laps_on_tire_col in ddf.columns and pd.notna(r[laps_on_tire_col]) else (999 if prev_tire_age is None else prev_tire_age + 1)
-
-                if current_comp is None: # First stint initialization
-                    current_comp = comp
-                    current_start = lap
-                # Check for stint change conditions: new compound, tire age reset, or lap discontinuity (pit stop)
-                elif (comp != current_comp) or (prev_tire_age is not None and current_tire_age < prev_tire_age) or (prev_lap is not None and lap > prev_lap + 1):
-                    stints.append({'driver': drv, 'start': current_start, 'end': prev_lap, 'compound': current_comp})
-                    current_comp = comp
-                    current_start = lap
-                
-                # Update previous lap and tire age for next iteration
-                prev_lap = lap
-                prev_tire_age = current_tire_age
-            
-            # Append the final stint after loop
-            if current_comp is not None:
-                stints.append({'driver': drv, 'start': current_start, 'end': prev_lap, 'compound': current_comp})
-
-    stint_lap_data = [] # Expanded list of laps with compounds
-    # Expand stints into per-lap entries so we can merge easily
-    for s in stints:
-        if s['start'] is not None and s['end'] is not None:
-            for lap in range(s['start'], s['end'] + 1):
-                stint_lap_data.append({'driver_acronym': s['driver'], 'lap_number': lap, 'compound': s['compound']})
-    
-    stints_df = pd.DataFrame(stint_lap_data)
-
-    #-----------------DRIVER COLORS------------------#
-    df = resampled
-    if not stints_df.empty:
-        # Merge stint compounds into main dataframe for display
-        df = pd.merge(df, stints_df, on=['driver_acronym', 'lap_number'], how='left')
-        df['compound'] = df['compound'].fillna('Unknown')
-    else:
-        df['compound'] = 'Unknown'
-
-    df_colors = raceData.get_driver_colors(key)
+@st.cache_data
+def get_lap_times(key):
+    """Lap times with team colour and a mm:ss.mmm display string, typed per replaySchema.LAP_TIME_DISPLAY_SCHEMA."""
+    laps = get_session_laps(key)
+    lap_times = laps.dropna(subset=['lap_time'])[['driver_acronym', 'lap_number', 'lap_time']].reset_index(drop=True)
+    if lap_times.empty:
+        return pd.DataFrame(columns=list(replaySchema.LAP_TIME_DISPLAY_SCHEMA))
+
+    df_colors = get_driver_colours(key)
     if not df_colors.empty:
-        df = pd.merge(df, df_colors, on='driver_acronym', how='left')
-        # Fill any individual drivers that missed a color mapping
-        df['team_colour'] = df['team_colour'].fillna('#FF1508')
-        
-        # Merge colours into lap times as well so the line graph can use them
+        df_colors = df_colors.assign(driver_acronym=df_colors['driver_acronym'].astype(lap_times['driver_acronym'].dtype))
+        # Merge colours into lap times so the line graph can use them
         lap_times = pd.merge(lap_times, df_colors[['driver_acronym','team_colour']], on='driver_acronym', how='left')
         lap_times['team_colour'] = lap_times['team_colour'].fillna('#FF1508')
     else:
         # Fallback if API completely failed
-        df['team_colour'] = '#FF1508'
         lap_times['team_colour'] = '#FF1508'
+
     # Format lap times as mm:ss.mmm for display
     def _fmt_time_seconds(val):
         try:
@@ -302,153 +302,599 @@ def get_replay_data(key):
         millis = int(round((t - int(t)) * 1000))
         return f"{mins}:{secs:02d}.{millis:03d}"
 
-    if not lap_times.empty:
-        lap_times['lap_time_fmt'] = lap_times['lap_time'].apply(_fmt_time_seconds)
+    lap_times['lap_time_fmt'] = lap_times['lap_time'].apply(_fmt_time_seconds)
+    return replaySchema.apply_schema(lap_times, replaySchema.LAP_TIME_DISPLAY_SCHEMA)
+
+def get_replay_data(key, start_time=None, end_time=None, resampled=None):
+    """
+    Fetches and processes race replay data for visualization, for the whole race or only the
+    window start_time <= race_time < end_time (race seconds).
+    resampled is the window's already-decoded telemetry (from a background decode), if there is one.
+    Returns (frames, lap times) typed per replaySchema.REPLAY_FRAME_SCHEMA / LAP_TIME_DISPLAY_SCHEMA.
+    """
+    # get_race_replay_data returns (resampled_telemetry_df, lap_times_df); lap times come from get_lap_times
+    if resampled is None:
+        resampled, _ = raceData.get_race_replay_data(key, start_time, end_time)
+    if resampled is None or (hasattr(resampled, 'empty') and resampled.empty):
+        return pd.DataFrame(), pd.DataFrame()
+    replaySchema.check_schema(resampled, replaySchema.RESAMPLED_SCHEMA, 'get_replay_data input')
+    drivers_dtype = resampled['driver_acronym'].dtype
+    
+    #-----------------STINT DATA FOR COMPOUND------------------#
+    stints_df = get_stint_laps(key).copy()
+
+    #-----------------DRIVER COLORS------------------#
+    df = resampled
+    if not stints_df.empty:
+        # Match the replay's key dtypes so the merge keeps them compact
+        stints_df['driver_acronym'] = stints_df['driver_acronym'].astype(str).astype(drivers_dtype)
+        # Merge stint compounds into main dataframe for display
+        stints_df['compound'] = stints_df['compound'].cat.add_categories(['Unknown'])
+        df = pd.merge(df, stints_df, on=['driver_acronym', 'lap_number'], how='left')
+        df['compound'] = df['compound'].fillna('Unknown')
     else:
-        lap_times['lap_time_fmt'] = []
-        
+        df['compound'] = 'Unknown'
+
+    df_colors = get_driver_colours(key)
+    if not df_colors.empty:
+        df_colors = df_colors.assign(driver_acronym=df_colors['driver_acronym'].astype(drivers_dtype))
+        df = pd.merge(df, df_colors, on='driver_acronym', how='left')
+        # Fill any individual drivers that missed a color mapping
+        df['team_colour'] = df['team_colour'].fillna('#FF1508')
+    else:
+        # Fallback if API completely failed
+        df['team_colour'] = '#FF1508'
         
     #-----------------TIME SETUP------------------#
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    start_time = df['timestamp'].min()
-    df['race_time'] = (df['timestamp'] - start_time).dt.total_seconds()
-    df = df.sort_values('race_time')
-
-    # Determine Lap Start Times
-    lap_start_times = df.groupby(['driver_acronym', 'lap_number'])['race_time'].min().reset_index()
-    lap_start_times.rename(columns={'race_time': 'lap_start_time'}, inplace=True)
+    # race_time is already whole seconds from the first sample of the race (int32), also in a window
+    df = df.sort_values('race_time', kind='stable')
+
+    # Lap start times from the lap table, so laps that began before the window still order correctly
+    lap_start_times = get_session_laps(key)[['driver_acronym', 'lap_number', 'lap_start_time']]
+    lap_start_times = lap_start_times.assign(driver_acronym=lap_start_times['driver_acronym'].astype(str).astype(drivers_dtype))
     df = pd.merge(df, lap_start_times, on=['driver_acronym', 'lap_number'], how='left')
+    df['lap_start_time'] = df['lap_start_time'].fillna(df['race_time'].astype(np.float32))
 
     # Create Master Timeline to synchronize all drivers (fixes inconsistent leaderboard issues)
     # Changed from 0.2 to 1.0 to synchronsie to 1 second intervals for performance
-    min_t = df['race_time'].min() # Starting from first timestamp
-    max_t = df['race_time'].max() # Ending at last timestamp
-    master_timeline = np.arange(min_t, max_t, 1.0) 
+    min_t = df['race_time'].min() if start_time is None else int(start_time) # Starting from first timestamp
+    max_t = df['race_time'].max() if end_time is None else int(end_time) # Ending at last timestamp
+    master_timeline = np.arange(min_t, max_t, dtype=np.int32)
     
     aligned_dfs = []
     
     # Align each driver's data to the 'master' timeline which has consistent 1.0s intervals for better animation
-    for driver in df['driver_acronym'].unique():
-        d_data = df[df['driver_acronym'] == driver].set_index('race_time')
-        d_data = d_data[~d_data.index.duplicated(keep='first')]
-        
-        # Expand index to include master timeline and interpolate
-        union_index = d_data.index.union(master_timeline)
-        d_interp = d_data.reindex(union_index)
-        
-        # Carry over Driver Color
-        d_color = d_data['team_colour'].iloc[0] if 'team_colour' in d_data.columns else '#FF1508'
-        
-        # Interpolate Coords Linearly
-        d_interp['x'] = d_interp['x'].interpolate(method='slinear', limit_direction='both')
-        d_interp['y'] = d_interp['y'].interpolate(method='slinear', limit_direction='both')
-        
-        # Fill Metadata
-        d_interp = d_interp.ffill().bfill()
-        
-        # Filter to Master Timeline
-        d_interp = d_interp.reindex(master_timeline)
-        d_interp['driver_acronym'] = driver
-        d_interp['team_colour'] = d_color
+    for driver, d_data in df.groupby('driver_acronym', observed=True, sort=False):
+        d_data = d_data.drop_duplicates('race_time', keep='first')
+        sample_t = d_data['race_time'].to_numpy()
+
+        # Last sample at or before each tick (the first sample for ticks before the driver appears)
+        idx = np.clip(np.searchsorted(sample_t, master_timeline, side='right') - 1, 0, len(sample_t) - 1)
+        d_interp = d_data.iloc[idx].reset_index(drop=True)
+
+        # Interpolate Coords Linearly (held at the first/last position outside the driver's samples)
+        d_interp['race_time'] = master_timeline
+        d_interp['x'] = np.interp(master_timeline, sample_t, d_data['x'].to_numpy()).astype(np.float32)
+        d_interp['y'] = np.interp(master_timeline, sample_t, d_data['y'].to_numpy()).astype(np.float32)
         
-        aligned_dfs.append(d_interp.reset_index().rename(columns={'index': 'race_time'})) # Reset index for concatenation
+        aligned_dfs.append(d_interp)
         
-    unified_df = pd.concat(aligned_dfs)
-    unified_df['lap_number'] = unified_df['lap_number'].fillna(0).astype(int) # Fill missing laps as 0
-    #print(lap_times[['driver_acronym', 'lap_number', 'lap_time_fmt']])
-    return unified_df, lap_times
+    unified_df = pd.concat(aligned_dfs, ignore_index=True)
+    # Cast to the replay contract; drivers without colour/team data keep the defaults
+    unified_df = replaySchema.apply_schema(unified_df, replaySchema.REPLAY_FRAME_SCHEMA,
+                                           fill={'team_colour': '#FF1508', 'team_name': '', 'compound': 'Unknown'})
+    return unified_df, get_lap_times(key)
+
+#-----------------REPLAY FRAMES------------------#
+# Laps of replay loaded and built into the animated figure at a time (the seek controls move the window)
+REPLAY_WINDOW_LAPS = 5
+# Windows kept across reruns (the one before, current, the chained next one and the one after it)
+REPLAY_WINDOW_CACHE = 4
+
+@st.cache_resource
+def get_window_store():
+    """
+    Process-wide replay window store: partition decodes running on the worker pool
+    {(session, start lap): Future}, and the windows built from them {(session, start lap): window}.
+    """
+    return {'pool': ThreadPoolExecutor(max_workers=2), 'decodes': OrderedDict(), 'windows': OrderedDict(),
+            'lock': threading.Lock()}
 
-def str_time_to_seconds(time_str):
-    """Converts a time string in 'M:SS.sss' format to total seconds as float. Will be made redundant once stored properly."""
-    try:
-        # Split '1:26.961' into minutes and seconds
-        minutes, seconds = time_str.split(':')
-        return int(minutes) * 60 + float(seconds)
-    except (ValueError, AttributeError):
-        # Handle cases where data might be missing or already a float
-        return 0.0
-    
-#-----------------LEADERBOARD------------------#
-def get_leaderboard_for_frame(frame_data, lap_times_df):
-    """Generates leaderboard standings for a given frame based on lap number and lap start time."""
-    if frame_data.empty:
-        # Keep team columns so callers can rely on them existing
-        return pd.DataFrame(columns=['Pos', 'Driver', 'Team', 'Lap', 'Compound', 'team_colour', 'compound_colour', 'Gap'])
-
-    # Compound colors
-    compound_colors = {
-        'SOFT': '#ff0000',
-        'MEDIUM': '#ffff00',
-        'HARD': '#ffffff',
-        'INTERMEDIATE': '#00ff00',
-        'WET': '#0099ff',
-        'UNKNOWN': '#808080'
-    }
+def get_window_bounds(laps, start_lap, n_laps=REPLAY_WINDOW_LAPS):
+    """
+    Race-time window (start, end) for start_lap .. start_lap + n_laps: from the leader starting
+    start_lap to the leader starting the lap after the window (end is None for the last window).
+    """
+    leader_starts = laps.groupby('lap_number', observed=True)['lap_start_time'].min().sort_index()
+    lap_numbers = leader_starts.index.to_numpy()
+    i = int(np.clip(np.searchsorted(lap_numbers, start_lap), 0, len(lap_numbers) - 1))
+    j = np.searchsorted(lap_numbers, lap_numbers[i] + n_laps)
+    start = int(leader_starts.iloc[i])
+    end = int(leader_starts.iloc[j]) if j < len(lap_numbers) else None
+    return start, end
+
+def _lru_put(entries, key, value):
+    """Adds key to an LRU OrderedDict, dropping the oldest entries beyond REPLAY_WINDOW_CACHE."""
+    entries[key] = value
+    entries.move_to_end(key)
+    while len(entries) > REPLAY_WINDOW_CACHE:
+        dropped = entries.popitem(last=False)[1]
+        if isinstance(dropped, Future):
+            dropped.cancel()
+
+def _submit_decode(key, start_lap):
+    """
+    Starts decoding a window's telemetry partitions on the worker pool. The bounds come from the
+    cached lap table here in the script thread: workers only run the partition decode, which
+    touches no Streamlit cache. Returns (future, start, end).
+    """
+    start, end = get_window_bounds(get_session_laps(key), start_lap)
+    store = get_window_store()
+    with store['lock']:
+        future = store['decodes'].get((key, start_lap))
+        if future is None:
+            future = store['pool'].submit(raceData.get_race_replay_data, key, start, end)
+        _lru_put(store['decodes'], (key, start_lap), future)
+    return future, start, end
+
+def get_replay_window(key, start_lap, projection=None):
+    """
+    The window starting at start_lap, built in the script thread from its decoded partitions
+    (waits for the decode if it is still being prefetched). If the background decode failed or
+    was cancelled the window is read directly instead. With a track projection the leaderboard
+    follows race distance. Returns {'index', 'start_lap'}, or None when the window has no data.
+    """
+    store = get_window_store()
+    with store['lock']:
+        if (key, start_lap) in store['windows']:
+            store['windows'].move_to_end((key, start_lap))
+            return store['windows'][(key, start_lap)]
 
-    # Frame data has multiple entries per driver; get the latest for each driver
-    drivers = frame_data.groupby('driver_acronym', as_index=False).first()
-   
-    # Higher Lap First, Earlier Start Time Second
-    standings = drivers.sort_values(by=['lap_number', 'lap_start_time'], ascending=[False, True]).copy()
+    future, start, end = _submit_decode(key, start_lap)
+    try:
+        resampled, _ = future.result()
+    except (Exception, CancelledError) as e:
+        print(f"Background load of laps {start_lap}+ failed ({e!r}); reading them directly")
+        with store['lock']:
+            store['decodes'].pop((key, start_lap), None)
+        resampled, _ = raceData.get_race_replay_data(key, start, end)
+
+    frames, lap_times = get_replay_data(key, start, end, resampled=resampled)
+    window = None
+    if not frames.empty:
+        replay_index = replayIndex.ReplayIndex(frames, lap_times, get_race_control(key), projection, get_pit_predictions(key))
+        window = {'index': replay_index, 'start_lap': start_lap}
+    with store['lock']:
+        _lru_put(store['windows'], (key, start_lap), window)
+        # Built windows no longer need their decoded samples
+        store['decodes'].pop((key, start_lap), None)
+    return window
+
+def prefetch_replay_window(key, start_lap):
+    """Starts decoding a window in the background, so building it later does not wait for the load."""
+    store = get_window_store()
+    with store['lock']:
+        if (key, start_lap) in store['windows']:
+            return
+    _submit_decode(key, start_lap)
 
-    standings['Pos'] = range(1, len(standings) + 1)  # Assign Positions
+def get_replay_figure(window, next_window, track_df):
+    """
+    Animated figure for window with next_window's frames chained on after it, so playback runs on
+    past the window edge into the prefetched laps. Built once per (window, next window) pair.
+    """
+    chained = next_window['start_lap'] if next_window is not None else None
+    if 'figure' not in window or window.get('chained') != chained:
+        indexes = [window['index']] + ([next_window['index']] if next_window is not None else [])
+        window['figure'] = build_replay_figure(indexes, track_df)
+        window['chained'] = chained
+    return window['figure']
+
+def leaderboard_cells(lb_data, headers):
+    """Headers, cell values and font colours of the leaderboard table (with a pit probability column when the board has one)."""
+    n = len(lb_data)
+    values = [lb_data.Pos, lb_data.Driver, lb_data.Team, lb_data.Lap, lb_data.Compound, lb_data.Gap]
+    # Set font colors for each column, using team and compound colors where available
+    colours = [['white'] * n, ['white'] * n, lb_data['team_colour'].tolist(), ['white'] * n,
+               lb_data['compound_colour'].tolist(), ['white'] * n]
+    if 'Pit' in lb_data.columns:
+        headers = headers + ["Pit Prob."]
+        values.append(lb_data.Pit)
+        colours.append(['#7cf2d4'] * n)
+    return headers, values, colours
+
+def replay_frame_traces(state, track_color, marker_size=16):
+    """Track, driver markers and leaderboard table for one replay state (ReplayIndex.state_at)."""
+    frame_data = state['positions']
+    lb_data = state['leaderboard']
+    headers, values, colours = leaderboard_cells(lb_data, ["Pos", "Driver", "Team", "Lap", "Compound", "Gap to Leader"])
+    return [
+        go.Scatter(line=dict(color=track_color)), # Update track color based on safety car
+        go.Scatter(
+            x=frame_data['x'] + 5, y=frame_data['y'],
+            ids=frame_data['driver_acronym'],
+            mode='markers+text',
+            text=frame_data['driver_acronym'],
+            textposition="top center",
+            cliponaxis=False,
+            textfont=dict(size=13, color="white", weight="bold"),
+            marker=dict(color=frame_data['team_colour'], size=marker_size, line=dict(width=1, color='white'))
+        ),
+        go.Table(
+            header=dict(values=headers, fill_color='#0b1224', font=dict(color='white', size=14), height=26),
+            cells=dict(
+                values=values,
+                fill_color=[['#0f172a'] * len(lb_data)] * len(values),
+                font=dict(color=colours, size=13),
+                height=30
+            )
+        )
+    ]
+
+def race_message_annotations(curr_message):
+    """Race message box under the map (empty list when there is no message)."""
+    if not curr_message:
+        return []
+    return [
+        dict(
+            text="Race Message",
+            x=0.82,
+            y=-0.04,
+            xref='paper',
+            yref='paper',
+            showarrow=False,
+            align='left',
+            font=dict(color='#e5e7eb', size=13, family='Space Grotesk', weight='bold'),
+        ),
+        dict(
+            text=curr_message,
+            x=0.82,
+            y=-0.12,
+            xref='paper',
+            yref='paper',
+            showarrow=False,
+            align='left',
+            font=dict(color='#cbd5e1', size=12),
+            bgcolor='rgba(255,255,255,0.06)',
+            bordercolor='rgba(255,255,255,0.12)',
+            borderwidth=1,
+            borderpad=6,
+            opacity=0.95
+        )
+    ]
 
-    # Map compound to color
-    standings['compound_colour'] = standings['compound'].map(compound_colors).fillna('#808080')
-    
-    # Distance to position above in laps (calulated from lap numbers and lap times rather than fetch from frame data directly to avoid inconsistencies)
-    if not standings.empty:
-        leader = standings.iloc[0]
-        gaps = []
-        # Formats lap times to seconds for gap calculation
-        lap_times_df['lap_seconds'] = lap_times_df['lap_time_fmt'].apply(str_time_to_seconds)
-        for _, driver in standings.iterrows():
-            if driver['driver_acronym'] == leader['driver_acronym']:
-                gaps.append("Leader") # Leader has no gap
-            else:
-                lap_diff = leader['lap_number'] - driver['lap_number']
-                if lap_diff > 0:
-                    gaps.append(f"+{int(lap_diff)} Lap{'s' if lap_diff > 1 else ''}") # Leader is ahead by laps
-                else:
-                    # Calculate time gap within the same lap by summing lap times up to current lap
-                    leader_total_race_time = lap_times_df[(lap_times_df['driver_acronym'] == leader['driver_acronym']) & (lap_times_df['lap_number'] < leader['lap_number'])]['lap_seconds'].sum()
+def build_replay_figure(replay_indexes, track_df):
+    """
+    Animated track map + leaderboard over the frames of replay_indexes, one window after another.
+    Each frame's state comes straight from its window's index, so no other part of the race is built.
+    """
+    main_fig = make_subplots(
+        rows=1, cols=2,
+        column_widths=[0.6, 0.55],
+        specs=[[{"type": "xy"}, {"type": "table"}]],
+        horizontal_spacing=0.04,
+    )
 
-                    total_race_time = lap_times_df[(lap_times_df['driver_acronym'] == driver['driver_acronym']) & (lap_times_df['lap_number'] < driver['lap_number'])]['lap_seconds'].sum()
+    # Define Axis Ranges for main map
+    padding = 400
+    x_min, x_max = track_df['x'].min() - padding, track_df['x'].max() + padding
+    y_min, y_max = track_df['y'].min() - padding, track_df['y'].max() + padding
+
+    # Generate Frames for animation (drivers + leaderboard)
+    frames = []
+    # For each timestamp, create a frame with driver positions and leaderboard (each timestamp would include: track data, drivers data, table, lap number, race message)
+    for index in replay_indexes:
+        for t in index.times:
+            state = index.state_at(t)
+            control = state['race_control']
+            # Newline for separation when over multiple messages so it doesnt go off screen
+            curr_message = control['message'].replace(" | ", "<br>")
+            # Determine track color for safety car status (yellow if safety car on track)
+            track_color = "#D6D602" if control['safety_car'] else '#444'
+
+            frames.append(go.Frame(
+                data=replay_frame_traces(state, track_color),
+                layout=go.Layout(
+                    title_text=f"Lap {control['lap']}",
+                    title_font=dict(color='#e5e7eb', size=16),
+                    annotations=race_message_annotations(curr_message)
+                ),
+                name=str(t),
+                traces=[0, 1, 2] # Update track, drivers, and table
+            ))
+
+    # ----------------- INITIAL TRACES ON LAUNCH -----------------
+    first_time = replay_indexes[0].times[0]
+    start_state = replay_indexes[0].state_at(first_time)
+    start_data = start_state['positions']
+    start_lb = start_state['leaderboard']
+    track_color = '#FFFF00' if start_state['race_control']['safety_car'] else '#444'
+
+    main_fig.add_trace(go.Scatter(x=track_df['x'], y=track_df['y'], mode='lines', line=dict(color=track_color, width=8), hoverinfo='skip'), row=1, col=1)
+
+    # Driver markers
+    main_fig.add_trace(go.Scatter(
+        x=start_data['x'], y=start_data['y'], mode='markers+text', text=start_data['driver_acronym'],
+        textposition='top center', cliponaxis=False, textfont=dict(size=13, color='white', weight='bold'),
+        marker=dict(color=start_data['team_colour'], size=14, line=dict(width=1, color='white')),
+        hovertemplate="<span style='font-size:14px'><b>%{text}</b>",
+        customdata=np.stack((start_data['lap_number']), axis=-1)
+    ), row=1, col=1)
+    # Leaderboard table
+    headers, values, colours = leaderboard_cells(start_lb, ["Pos", "Driver", "Team", "Lap", "Compound", "Gap"])
+    main_fig.add_trace(go.Table(
+        header=dict(values=headers, fill_color='#0b1224', font=dict(color='white', size=14), height=26),
+        cells=dict(values=values,
+                   fill_color=[['#0f172a'] * len(start_lb)] * len(values),
+                   font=dict(color=colours, size=13),
+                   height=24)
+    ), row=1, col=2)
+
+    main_fig.frames = frames
+
+    # Get the first frame name for the Restart button
+    first_frame_name = str(first_time)
+
+    # play / pause buttons
+    main_fig.update_layout(
+        height=1100,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        title=f"Lap {start_state['race_control']['lap']}",
+        font=dict(family='Space Grotesk', color='#e5e7eb'),
+        xaxis=dict(range=[x_min, x_max], visible=False, fixedrange=True),
+        yaxis=dict(range=[y_min, y_max], visible=False, fixedrange=True, scaleanchor="x", scaleratio=1),
+        showlegend=False,
+        updatemenus=[dict(
+            type="buttons",
+            showactive=True,
+            x=0.05, y=-0.1,
+            xanchor="left", yanchor="top",
+            direction="left",
+            buttons=[
+                dict(label="▶ Play",
+                    method="animate",
+                    args=[None, dict(
+                        # Runs at normal speed 80ms per frame
+                        frame=dict(duration=80, redraw=True), 
+                        transition=dict(duration=80, easing="linear"),
+                        fromcurrent=True
+                    )]),
+                dict(label="⏸ Pause",
+                    method="animate",
+                    # pauses the current animation
+                    args=[[None], dict(frame=dict(duration=0, redraw=False), mode="immediate", transition=dict(duration=0))]),
+                dict(label="⏮ Restart",
+                    method="animate",
+                    # Restarts from first frame of the window
+                    args=[[first_frame_name], dict(frame=dict(duration=0, redraw=True), mode="immediate", transition=dict(duration=0))]),
+                dict(label="Faster ->>",
+                    method="animate",
+                    # Faster play at 40ms per frame (very hard to pause)
+                    args=[None, dict(frame=dict(duration=60, redraw=True), transition=dict(duration=120, easing="linear"), fromcurrent=True, mode="immediate")]),
+                dict(label="<<-- Slower",
+                    method="animate",
+                    # Slower play at 120ms per frame
+                    args=[None, dict(frame=dict(duration=120, redraw=True), transition=dict(duration=60, easing="linear"), fromcurrent=True, mode="immediate")])
+            ],
+            bgcolor="rgba(255,255,255,0.08)",
+            bordercolor="rgba(255,255,255,0.25)",
+            borderwidth=1,
+            pad={"r": 10, "t": 10},
+            font=dict(color="#e5e7eb")
+        )],
+        sliders=[],
+        margin=dict(t=40, l=20, r=20, b=10)
+    )
+    return main_fig
 
-                    time_gap = total_race_time - leader_total_race_time
-                    gaps.append(f"+{abs(time_gap):.3f}s") # Force positive gap due to position offsets during lap (e.g. pit stops, safety cars)
-        standings['Gap'] = gaps 
-    else:
-        standings['Gap'] = []
+#-----------------LAP TIME CHART------------------#
+# Points per driver trace before min/max decimation kicks in (one race is ~70 laps,
+# so this only applies when many races are overlaid)
+LAP_CHART_MAX_POINTS = 2000
 
-    result = standings[['Pos', 'driver_acronym', 'lap_number', 'compound', 'team_colour', 'compound_colour', 'Gap']].rename(
-        columns={'driver_acronym': 'Driver', 'lap_number': 'Lap', 'compound': 'Compound', 'team_colour': 'team_colour'})
+@st.cache_data
+def get_lap_chart_data(key):
+    """
+    Lap-time chart data for a session, split once into per-driver columns:
+    {driver: {'x': laps, 'y': lap times, 'text': formatted times, 'colour': team colour}}.
+    Drivers are in alphabetical order.
+    """
+    lap_times = get_lap_times(key)
+    if lap_times.empty:
+        return {}
+
+    lap_times = lap_times.sort_values('lap_number', kind='stable')
+    drivers = lap_times['driver_acronym'].astype(str).to_numpy()
+    laps = lap_times['lap_number'].to_numpy()
+    times = lap_times['lap_time'].to_numpy()
+    text = lap_times['lap_time_fmt'].to_numpy()
+    colours = lap_times['team_colour'].astype(str).to_numpy()
+
+    # Stable sort by driver keeps laps in order, so each driver is a contiguous slice of the columns
+    order = np.argsort(drivers, kind='stable')
+    drivers, laps, times, text, colours = drivers[order], laps[order], times[order], text[order], colours[order]
+    bounds = np.flatnonzero(np.r_[True, drivers[1:] != drivers[:-1], True])
+    return {
+        drivers[a]: {'x': laps[a:b], 'y': times[a:b], 'text': text[a:b], 'colour': colours[a]}
+        for a, b in zip(bounds[:-1], bounds[1:])
+    }
 
-    # Attach team name if present in the standings
-    if 'team_name' in standings.columns:
-        result['Team'] = standings['team_name'].fillna('')
-    else:
-        result['Team'] = ''
+def decimate_minmax(y, max_points):
+    """
+    Indices of the points to keep so a line of len(y) points draws with at most ~max_points.
+    Points are split into equal buckets and each bucket keeps its lowest and highest value
+    (plus the first and last point), so spikes like pit laps survive the reduction.
+    """
+    n = len(y)
+    if not max_points or n <= max_points:
+        return np.arange(n)
+
+    buckets = max(max_points // 2, 1)
+    size = int(np.ceil(n / buckets))
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+
+    # Skip buckets with no values (padding or missing lap times)
+    valid = ~np.isnan(blocks).all(axis=1)
+    offsets = np.flatnonzero(valid) * size
+    lows = np.nanargmin(blocks[valid], axis=1) + offsets
+    highs = np.nanargmax(blocks[valid], axis=1) + offsets
+    return np.unique(np.concatenate([[0, n - 1], lows, highs]))
+
+def build_lap_figure(chart_data, selected_driver="All", max_points=LAP_CHART_MAX_POINTS):
+    """
+    Lap-time line chart for all drivers or one driver, drawn with WebGL (Scattergl) traces.
+    Traces longer than max_points are reduced with decimate_minmax; pass None to draw every lap.
+    """
+    lap_fig = go.Figure()
+    drivers = list(chart_data) if selected_driver == "All" else [d for d in [selected_driver] if d in chart_data]
+    for drv in drivers:
+        series = chart_data[drv]
+        keep = decimate_minmax(series['y'], max_points)
+        lap_fig.add_trace(go.Scattergl(
+            x=series['x'][keep], y=series['y'][keep], mode='lines+markers', name=drv,
+            line=dict(color=series['colour'], width=2), marker=dict(size=6),
+            text=series['text'][keep],
+            hovertemplate=f"<span style='font-size:14px'><b>{drv}: %{{text}}</b></span><br>Lap: %{{x}}<extra></extra>",
+            hoverlabel=dict(font=dict(size=14))
+        ))
+
+    lap_fig.update_layout(
+        xaxis_title='Lap Number', yaxis_title='Lap Time (s)', height=500,
+        template='plotly_dark',
+        plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family='Space Grotesk', color='#e5e7eb'),
+        xaxis=dict(gridcolor='rgba(148,163,184,0.2)', zeroline=False, linecolor='rgba(255,255,255,0.05)'),
+        yaxis=dict(gridcolor='rgba(148,163,184,0.2)', zeroline=False, linecolor='rgba(255,255,255,0.05)'),
+        legend=dict(
+            orientation='v',
+            y=1.02,
+            yanchor='bottom',
+            x=0.5,
+            xanchor='center',
+            traceorder='normal',
+            font=dict(size=12)
+        ),
+        hoverlabel=dict(bgcolor='rgba(15,23,42,0.9)', font_size=12),
+        showlegend=False,
+        margin=dict(t=5)
+    )
+    return lap_fig
+
+#-----------------STINT CHART------------------#
+# Compound colours for the stint chart, in legend order
+STINT_COMPOUND_COLOURS = {
+    'SOFT': '#ff0000',
+    'MEDIUM': '#ffff00',
+    'HARD': '#ffffff',
+    'INTERMEDIATE': '#00ff00',
+    'WET': '#0099ff'
+}
+
+def build_stint_figure(stints, y_order, max_lap_map=None):
+    """
+    Tyre stint Gantt chart: one horizontal bar trace per compound, with every stint of that
+    compound as one bar in the trace's columns (driver, first lap, length).
+    The trace count is fixed by the compound list, so a race with many stops costs no more to render.
+    """
+    # Clip stints to each driver's last lap (some drivers may retire early or not finish)
+    shown = stintEngine.clip_to_last_lap(stints, max_lap_map or {})
+    compound = shown['compound'].astype(str).to_numpy()
+    start = shown['start'].to_numpy(dtype=np.int32)
+    display_end = shown['end'].to_numpy(dtype=np.int32)
+    # Hover shows the full stint, even where the bar is clipped
+    end = start + shown['laps'].to_numpy(dtype=np.int32) - 1
+
+    pit_fig = go.Figure()
+    other = ~np.isin(compound, list(STINT_COMPOUND_COLOURS))
+    traces = list(STINT_COMPOUND_COLOURS.items()) + ([('UNKNOWN', '#808080')] if other.any() else [])
+    for name, color in traces:
+        mask = other if name == 'UNKNOWN' else compound == name
+        # Each bar covers its laps from start - 0.5 to end + 0.5 so hover works anywhere on it
+        pit_fig.add_trace(go.Bar(
+            orientation='h',
+            y=shown['driver'].astype(str).to_numpy()[mask],
+            base=start[mask] - 0.5,
+            x=display_end[mask] - start[mask] + 1,
+            width=0.6,
+            name=name,
+            marker=dict(color=color, line=dict(color='#0b1020', width=1)), # Dark outline separates back-to-back stints
+            customdata=np.column_stack((start[mask], end[mask], end[mask] - start[mask] + 1)),
+            hovertemplate=("Driver: %{y}<br>"
+                           f"Compound: {name}<br>"
+                           "Laps: %{customdata[0]}-%{customdata[1]}<br>"
+                           "Stint Length: %{customdata[2]}<extra></extra>")
+        ))
+
+    # Set chart height based on number of drivers
+    chart_height = max(600, len(y_order) * 30)
+
+    # Final layout adjustments
+    pit_fig.update_layout(
+        title=dict(text='Stints / Pit Tyres', x=0.5, xanchor='center'),
+        xaxis_title='Lap Number',
+        yaxis_title='Driver',
+        yaxis=dict(categoryorder='array', categoryarray=y_order[::-1]), # Show drivers top to bottom
+        barmode='overlay', # Stints share a driver's row instead of being grouped side by side
+        height=chart_height,
+        template='plotly_dark',
+        font=dict(family='Space Grotesk', color='#e5e7eb'),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=True
+    )
+    return pit_fig
 
-    # Recalculate positions in case of ties
-    result = result.sort_values(by='Pos')
-    result['Pos'] = result.groupby('Lap').cumcount() + 1
-    result['Pos'] = result['Pos'].astype(str)
-    result.loc[result['Pos'] == '0', 'Pos'] = ''
-    
-        
-    # Reorder columns to Pos, Driver, Team, Lap, Compound, team_colour, compound_colour
-    return result[['Pos', 'Driver', 'Team', 'Lap', 'Compound', 'team_colour', 'compound_colour', 'Gap']]
+def build_undercut_figure(pairs, y_order):
+    """
+    Heatmap of the undercut margin (s) for each driver on the car ahead, per lap: positive (green)
+    where stopping now should pass it once it responds, negative (red) where the gap is too big.
+    """
+    grid = undercutAnalyzer.margin_grid(pairs, driver_col='driver')
+    grid = grid.reindex([d for d in y_order if d in grid.index] + [d for d in grid.index if d not in y_order])
+    # Hover details laid out on the same (driver x lap) grid
+    detail = pairs.set_index(['driver', 'lap_number'])
+    hover = np.dstack([detail[col].unstack().reindex(index=grid.index, columns=grid.columns).to_numpy(dtype=object)
+                       for col in ['ahead_driver', 'gap', 'age_difference', 'deg_delta', 'rejoin_places_lost']])
+
+    limit = float(np.nanpercentile(np.abs(grid.to_numpy()), 95)) if grid.notna().any().any() else 1.0
+    fig = go.Figure(go.Heatmap(
+        z=grid.to_numpy(), x=grid.columns, y=grid.index, customdata=hover,
+        colorscale='RdYlGn', zmid=0, zmin=-limit, zmax=limit,
+        colorbar=dict(title="Margin (s)"),
+        hovertemplate=("Driver: %{y} on %{customdata[0]}<br>Lap: %{x}<br>Undercut margin: %{z:.2f}s<br>"
+                       "Gap: %{customdata[1]:.2f}s<br>Tyre age difference: %{customdata[2]} laps<br>"
+                       "Degradation delta: %{customdata[3]:.2f}s<br>Cars rejoined behind: %{customdata[4]}<extra></extra>"),
+    ))
+    fig.update_layout(
+        title=dict(text='Undercut Margin on the Car Ahead', x=0.5, xanchor='center'),
+        xaxis_title='Lap Number',
+        yaxis_title='Driver',
+        yaxis=dict(autorange='reversed'),
+        height=max(600, len(grid) * 30),
+        template='plotly_dark',
+        font=dict(family='Space Grotesk', color='#e5e7eb'),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+    )
+    return fig
 
 # --- Main Replay System ---
 def play_race_replay(session_key):
     
     # Load Data
     with st.spinner(f"Optimizing {race_name} Data"):
-        df, lap_times_df = get_replay_data(session_key)
-        track_df = get_static_track(session_key)
-
-        if df.empty or track_df is None:
+        # Per-session tables are small: load them here (the replay windows below reuse the cached copies)
+        laps_df = get_session_laps(session_key)
+        lap_times_df = get_lap_times(session_key)
+        race_control = get_race_control(session_key)
+        get_stint_laps(session_key)
+        track_df = get_static_track(session_key, st.session_state.get('selected_circuit_key'))
+        projection = get_track_projection(session_key, st.session_state.get('selected_circuit_key'))
+
+        if laps_df.empty or track_df is None:
             st.error("Data unavailable.")
             return
         try:
@@ -460,9 +906,10 @@ def play_race_replay(session_key):
 
         # Quick session overview metrics for header
         try:
-            driver_count = int(df['driver_acronym'].nunique()) if not df.empty else 0
-            total_laps = int(df['lap_number'].max()) if not df.empty else 0
-            duration_min = int((df['race_time'].max() or 0) // 60) if not df.empty else 0
+            driver_count = int(laps_df['driver_acronym'].nunique())
+            total_laps = int(laps_df['lap_number'].max())
+            # Race ends when the last lap started is completed
+            duration_min = int((laps_df['lap_start_time'] + laps_df['lap_time'].fillna(0)).max() // 60)
         except Exception:
             driver_count = total_laps = duration_min = 0
 
@@ -481,250 +928,54 @@ def play_race_replay(session_key):
             unsafe_allow_html=True,
         )
         
-        #-----------------RACE CONTROL------------------#
-        safety_car_data = raceData.get_safety_car_data(session_key)
-        
-        # Determine Safety Car Laps
-        safety_car_laps = set()
-        if not safety_car_data.empty:
-            # Get all laps that have a "SafetyCar" category message
-            sc_laps = safety_car_data[safety_car_data['category'] == 'SafetyCar']['lap_number'].unique()
-            
-            # Find when the safety car ends.
-            # we assume the safety car period ends on the lap of the last SC message,
-            if len(sc_laps) > 0:
-                min_sc_lap = min(sc_laps)
-                
-                # Find the lap where the track is clear again so we can end the SC period
-                track_clear_df = safety_car_data[
-                    (safety_car_data['lap_number'] > min_sc_lap) &
-                    (safety_car_data['message'].str.contains("TRACK CLEAR", na=False))
-                ]
-                
-                # If no TRACK CLEAR message, assume SC lasts until last SC lap
-                max_sc_lap = max(sc_laps)
-                if not track_clear_df.empty:
-                    max_sc_lap = track_clear_df['lap_number'].min()
-
-                # All laps between the start and end of the SC period are considered SC laps. We include both min and max laps so we cover the entire period.
-                for lap in range(int(min_sc_lap), int(max_sc_lap) + 1):
-                    safety_car_laps.add(lap)
-
-            # Race messages (FIA communications) by lap and exclude SafetyCar messages for faster processing
-            race_messages = {}
-            if not safety_car_data.empty and 'message' in safety_car_data.columns and 'lap_number' in safety_car_data.columns:
-                # Drop rows where message is null and filter out 'SafetyCar' category which is handled separately
-                messages_df = safety_car_data.dropna(subset=['message'])
-                messages_df = messages_df[messages_df['category'] != 'SafetyCar']
-                
-                # Group messages by lap number
-                for lap, group in messages_df.groupby('lap_number'):
-                    race_messages[lap] = " | ".join(group['message'].unique()) # Join if multiple messages on same lap
-        
-        #-----------------MAIN FIG SETUP (cached)------------------#
-        # Build or reuse the heavy animated main figure
-        main_fig_key = f"main_fig_{session_key}"
-        if main_fig_key in st.session_state:
-            main_fig = st.session_state[main_fig_key]
-        else:
-            main_fig = make_subplots(
-                rows=1, cols=2,
-                column_widths=[0.6, 0.55],
-                specs=[[{"type": "xy"}, {"type": "table"}]],
-                horizontal_spacing=0.04,
-            )
-
-            # Define Axis Ranges for main map
-            padding = 400
-            x_min, x_max = track_df['x'].min() - padding, track_df['x'].max() + padding
-            y_min, y_max = track_df['y'].min() - padding, track_df['y'].max() + padding
-
-            # Generate Frames for animation (drivers + leaderboard)
-            animation_timestamps = df['race_time'].unique()
-            frames = []
-            # For each timestamp, create a frame with driver positions and leaderboard (each timestamp would include: track data, drivers data, table, lap number, race message)
-            for t in animation_timestamps:
-                frame_data = df[df['race_time'] == t]
-                lb_data = get_leaderboard_for_frame(frame_data, lap_times_df)
-                curr_lap = int(frame_data['lap_number'].max()) if not frame_data.empty else 0
-                
-                # Get race message for current lap if any and newline for separation when over multiple messages so it doesnt go off screen
-                curr_message = race_messages.get(curr_lap, "").replace(" | ", "<br>")
-                
-                # Determine track color for safety car status (yellow if safety car on track)
-                track_color = "#D6D602" if curr_lap in safety_car_laps else '#444'
-
-                # Build frame track, driver markers, leaderboard table
-                frames.append(go.Frame(
-                    data=[
-                        go.Scatter(line=dict(color=track_color)), # Update track color based on safety car
-                        go.Scatter(
-                            x=frame_data['x'] + 5, y=frame_data['y'],
-                            ids=frame_data['driver_acronym'],
-                            mode='markers+text',
-                            text=frame_data['driver_acronym'],
-                            textposition="top center",
-                            cliponaxis=False,
-                            textfont=dict(size=13, color="white", weight="bold"),
-                            marker=dict(color=frame_data['team_colour'], size=16, line=dict(width=1, color='white'))
-                        ),
-                        go.Table(
-                            header=dict(values=["Pos", "Driver", "Team", "Lap", "Compound", "Gap to Leader"], fill_color='#0b1224', font=dict(color='white', size=14), height=26),
-                            cells=dict(
-                                values=[lb_data.Pos, lb_data.Driver, lb_data.Team, lb_data.Lap, lb_data.Compound, lb_data.Gap],
-                                fill_color=[['#0f172a'] * len(lb_data)] * 6,
-                                font=dict(
-                                    # Set font colors for each column, using team and compound colors where available
-                                    color=[
-                                        ['white'] * len(lb_data),
-                                        ['white'] * len(lb_data),
-                                        lb_data['team_colour'].tolist() if 'team_colour' in lb_data.columns else ['white'] * len(lb_data),
-                                        ['white'] * len(lb_data),
-                                        lb_data['compound_colour'].tolist() if 'compound_colour' in lb_data.columns else ['white'] * len(lb_data),
-                                        ['white'] * len(lb_data)
-                                    ],
-                                    size=13
-                                ),
-                                height=30
-                            )
-                        )
-                    ],
-                    layout=go.Layout(
-                        title_text=f"Lap {curr_lap}",
-                        title_font=dict(color='#e5e7eb', size=16),
-                        annotations=(
-                            [
-                                dict(
-                                    text="Race Message",
-                                    x=0.82,
-                                    y=-0.04,
-                                    xref='paper',
-                                    yref='paper',
-                                    showarrow=False,
-                                    align='left',
-                                    font=dict(color='#e5e7eb', size=13, family='Space Grotesk', weight='bold'),
-                                ),
-                                dict(
-                                    text=curr_message,
-                                    x=0.82,
-                                    y=-0.12,
-                                    xref='paper',
-                                    yref='paper',
-                                    showarrow=False,
-                                    align='left',
-                                    font=dict(color='#cbd5e1', size=12),
-                                    bgcolor='rgba(255,255,255,0.06)',
-                                    bordercolor='rgba(255,255,255,0.12)',
-                                    borderwidth=1,
-                                    borderpad=6,
-                                    opacity=0.95
-                                )
-                            ]
-                            if curr_message else []
-                        )
-                    ),
-                    name=str(t),
-                    traces=[0, 1, 2] # Update track, drivers, and table
-                ))
-
-            # ----------------- INITIAL TRACES ON LAUNCH -----------------
-            start_t = animation_timestamps[0] # First timestamp
-            start_data = df[df['race_time'] == start_t]
-            start_lb = get_leaderboard_for_frame(start_data, lap_times_df)
-            
-            # Determine track color based on safety car status at lap 1
-            initial_lap = 1
-            track_color = '#FFFF00' if initial_lap in safety_car_laps else '#444'
-
-            main_fig.add_trace(go.Scatter(x=track_df['x'], y=track_df['y'], mode='lines', line=dict(color=track_color, width=8), hoverinfo='skip'), row=1, col=1)
-
-            # Driver markers
-            main_fig.add_trace(go.Scatter(
-                x=start_data['x'], y=start_data['y'], mode='markers+text', text=start_data['driver_acronym'],
-                textposition='top center', cliponaxis=False, textfont=dict(size=13, color='white', weight='bold'),
-                marker=dict(color=start_data['team_colour'], size=14, line=dict(width=1, color='white')),
-                hovertemplate="<span style='font-size:14px'><b>%{text}</b>",
-                customdata=np.stack((start_data['lap_number']), axis=-1)
-            ), row=1, col=1)
-            # Leaderboard table
-            main_fig.add_trace(go.Table(
-                header=dict(values=["Pos", "Driver", "Team", "Lap", "Compound", "Gap"], fill_color='#0b1224', font=dict(color='white', size=14), height=26),
-                cells=dict(values=[start_lb.Pos, start_lb.Driver, start_lb.Team, start_lb.Lap, start_lb.Compound, start_lb.Gap],
-                           fill_color=[['#0f172a'] * len(start_lb)] * 6,
-                           font=dict(color=[
-                               ['white'] * len(start_lb),
-                               ['white'] * len(start_lb),
-                               start_lb['team_colour'].tolist() if 'team_colour' in start_lb.columns else ['white'] * len(start_lb),
-                               ['white'] * len(start_lb),
-                               start_lb['compound_colour'].tolist() if 'compound_colour' in start_lb.columns else ['white'] * len(start_lb),
-                               ['white'] * len(start_lb)
-                           ], size=13),
-                           height=24)
-            ), row=1, col=2)
-
-            main_fig.frames = frames
-            
-            # Get the first frame name for the Restart button
-            first_frame_name = str(animation_timestamps[0]) if len(animation_timestamps) > 0 else None
-            
-            # play / pause buttons
-            main_fig.update_layout(
-                height=1100,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                title="Lap 1",
-                font=dict(family='Space Grotesk', color='#e5e7eb'),
-                xaxis=dict(range=[x_min, x_max], visible=False, fixedrange=True),
-                yaxis=dict(range=[y_min, y_max], visible=False, fixedrange=True, scaleanchor="x", scaleratio=1),
-                showlegend=False,
-                updatemenus=[dict(
-                    type="buttons",
-                    showactive=True,
-                    x=0.05, y=-0.1,
-                    xanchor="left", yanchor="top",
-                    direction="left",
-                    buttons=[
-                        dict(label="▶ Play",
-                            method="animate",
-                            args=[None, dict(
-                                # Runs at normal speed 80ms per frame
-                                frame=dict(duration=80, redraw=True), 
-                                transition=dict(duration=80, easing="linear"),
-                                fromcurrent=True
-                            )]),
-                        dict(label="⏸ Pause",
-                            method="animate",
-                            # pauses the current animation
-                            args=[[None], dict(frame=dict(duration=0, redraw=False), mode="immediate", transition=dict(duration=0))]),
-                        dict(label="⏮ Restart",
-                            method="animate",
-                            # Restarts from first frame
-                            args=[[first_frame_name], dict(frame=dict(duration=0, redraw=True), mode="immediate", transition=dict(duration=0))]),
-                        dict(label="Faster ->>",
-                            method="animate",
-                            # Faster play at 40ms per frame (very hard to pause)
-                            args=[None, dict(frame=dict(duration=60, redraw=True), transition=dict(duration=120, easing="linear"), fromcurrent=True, mode="immediate")]),
-                        dict(label="<<-- Slower",
-                            method="animate",
-                            # Slower play at 120ms per frame
-                            args=[None, dict(frame=dict(duration=120, redraw=True), transition=dict(duration=60, easing="linear"), fromcurrent=True, mode="immediate")])
-                    ],
-                    bgcolor="rgba(255,255,255,0.08)",
-                    bordercolor="rgba(255,255,255,0.25)",
-                    borderwidth=1,
-                    pad={"r": 10, "t": 10},
-                    font=dict(color="#e5e7eb")
-                )],
-                sliders=[],
-                margin=dict(t=40, l=20, r=20, b=10)
-            )
+        #-----------------SEEK CONTROLS------------------#
+        # The replay is loaded a window of laps at a time; the controls choose the window's first lap
+        first_lap = int(laps_df['lap_number'].min())
+        window_key = f"replay_window_{session_key}"
+        lap_key = f"replay_lap_{session_key}"
+        if window_key not in st.session_state:
+            st.session_state[window_key] = first_lap
+            st.session_state[lap_key] = first_lap
+
+        def _seek(lap):
+            # Callbacks run before the widgets are drawn, so the slider can follow the seek
+            lap = int(np.clip(lap, first_lap, total_laps))
+            st.session_state[window_key] = lap
+            st.session_state[lap_key] = lap
+
+        start_lap = st.session_state[window_key]
+        next_sc = next((lap for lap in replayIndex.safety_car_start_laps(race_control) if lap > start_lap), None)
+        next_lap = start_lap + REPLAY_WINDOW_LAPS
+
+        scrub_col, sc_col, next_col = st.columns([0.6, 0.2, 0.2])
+        with scrub_col:
+            st.slider("Jump to lap", min_value=first_lap, max_value=max(total_laps, first_lap + 1), key=lap_key,
+                      on_change=lambda: _seek(st.session_state[lap_key]))
+        with sc_col:
+            st.button("Jump to Safety Car", disabled=next_sc is None, use_container_width=True,
+                      on_click=lambda: _seek(next_sc))
+        with next_col:
+            st.button(f"Next {REPLAY_WINDOW_LAPS} laps ▶▶", disabled=next_lap > total_laps,
+                      use_container_width=True, on_click=lambda: _seek(next_lap))
 
-            # Cache main_fig in session_state so dropdowns don't rebuild it
-            st.session_state[main_fig_key] = main_fig
+        #-----------------MAIN FIG SETUP (cached)------------------#
+        # Only this window's telemetry is decoded and turned into frames. The next window's partitions
+        # are decoded in the background while this one is built, then chained on so playback runs
+        # straight on past the window edge; the window after that is prefetched for the next seek
+        if next_lap <= total_laps:
+            prefetch_replay_window(session_key, next_lap)
+        window = get_replay_window(session_key, start_lap, projection)
+        if window is None:
+            st.error("Data unavailable.")
+            return
+        next_window = get_replay_window(session_key, next_lap, projection) if next_lap <= total_laps else None
+        if next_lap + REPLAY_WINDOW_LAPS <= total_laps:
+            prefetch_replay_window(session_key, next_lap + REPLAY_WINDOW_LAPS)
+        replay_figure = get_replay_figure(window, next_window, track_df)
 
         # Render main figure (track + leaderboard + play/pause buttons)
         st.markdown("<div class='glass-card'><div class='card-title'>Live Track Replay</div>", unsafe_allow_html=True)
-        st.plotly_chart(st.session_state[main_fig_key], use_container_width=True, config={"displayModeBar": False})
+        st.plotly_chart(replay_figure, use_container_width=True, config={"displayModeBar": False})
         st.markdown("</div>", unsafe_allow_html=True)
 
         # ----------------- LAP-TIME/PIT INFO GRAPH -----------------
@@ -734,59 +985,19 @@ def play_race_replay(session_key):
         # --------------- LINE GRAPH (LEFT SIDE) ---------------
         # Driver selector key for dropdown
         sel_key = f"lap_driver_{session_key}"
-        drivers_list = []
-        if not lap_times_df.empty:
-            drivers_list = sorted(lap_times_df['driver_acronym'].unique())
+        chart_data = get_lap_chart_data(session_key)
+        drivers_list = list(chart_data)
 
         # Read selected driver from session_state
         selected_driver = st.session_state.get(sel_key, "All")
+        if selected_driver != "All" and selected_driver not in chart_data:
+            selected_driver = "All"
 
-        # Build lap figure
-        lap_fig = go.Figure()
-        if not lap_times_df.empty:
-            if selected_driver == "All": # Show all drivers
-                for drv in drivers_list:
-                    drv_df = lap_times_df[lap_times_df['driver_acronym'] == drv]
-                    if drv_df.empty:
-                        continue
-                    lap_fig.add_trace(go.Scatter(
-                        x=drv_df['lap_number'], y=drv_df['lap_time'], mode='lines+markers', name=drv,
-                        line=dict(color=drv_df['team_colour'].iloc[0], width=2), marker=dict(size=6),
-                        text=drv_df['lap_time_fmt'],
-                        hovertemplate=f"<span style='font-size:14px'><b>{drv}: %{{text}}</b></span><br>Lap: %{{x}}<extra></extra>",
-                        hoverlabel=dict(font=dict(size=14)) 
-                    ))
-            else: # Show selected driver only
-                drv_df = lap_times_df[lap_times_df['driver_acronym'] == selected_driver]
-                if not drv_df.empty:
-                    lap_fig.add_trace(go.Scatter(
-                        x=drv_df['lap_number'], y=drv_df['lap_time'], mode='lines+markers', name=selected_driver,
-                        line=dict(color=drv_df['team_colour'].iloc[0], width=2), marker=dict(size=6),
-                        text=drv_df['lap_time_fmt'],
-                        hovertemplate=f"<span style='font-size:14px'><b>{selected_driver}: %{{text}}</b></span><br>Lap: %{{x}}<extra></extra>",
-                        hoverlabel=dict(font=dict(size=14))
-                    ))
-
-        lap_fig.update_layout(
-            xaxis_title='Lap Number', yaxis_title='Lap Time (s)', height=500,
-            template='plotly_dark',
-            plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(family='Space Grotesk', color='#e5e7eb'),
-            xaxis=dict(gridcolor='rgba(148,163,184,0.2)', zeroline=False, linecolor='rgba(255,255,255,0.05)'),
-            yaxis=dict(gridcolor='rgba(148,163,184,0.2)', zeroline=False, linecolor='rgba(255,255,255,0.05)'),
-            legend=dict(
-                orientation='v',
-                y=1.02,
-                yanchor='bottom',
-                x=0.5,
-                xanchor='center',
-                traceorder='normal',
-                font=dict(size=12)
-            ),
-            hoverlabel=dict(bgcolor='rgba(15,23,42,0.9)', font_size=12),
-            showlegend=False,
-            margin=dict(t=5)
-        )
+        # Memoized per selection: switching back to a driver reuses its figure
+        lap_fig_key = f"lap_fig_{session_key}_{selected_driver}"
+        if lap_fig_key not in st.session_state:
+            st.session_state[lap_fig_key] = build_lap_figure(chart_data, selected_driver)
+        lap_fig = st.session_state[lap_fig_key]
 
         # Render lap figure in left column, then place the selectbox below it
         with left_col:
@@ -799,10 +1010,7 @@ def play_race_replay(session_key):
                 # Build legend items as horizontal
                 legend_items = []
                 for drv in drivers_list:
-                    try:
-                        color = lap_times_df[lap_times_df['driver_acronym'] == drv]['team_colour'].iloc[0]
-                    except Exception:
-                        color = '#808080'
+                    color = chart_data[drv]['colour']
                     item_html = (
                         f"<div style='display:inline-flex; align-items:center; margin:4px 8px; font-size:12px;'>"
                         f"<span style='display:inline-block; width:14px; height:14px; background:{color}; border:1px solid #222;'></span>"
@@ -825,198 +1033,76 @@ def play_race_replay(session_key):
             
         # --------------- PIT INFO (RIGHT SIDE) ---------------
         
-        with st.spinner("Loading Pit Stop Data..."):
-            #Update last five sessions to get pit stop data
-            fetch_data = mlData.update_last_five_sessions()
-            if fetch_data:
-                st.success("Pit stop data loaded successfully.")
-            else:
-                st.warning("Pit stop data unavailable; using API fallback.")
-            
-            #Fetch pit stop data for session
-            pit_data = mlData.fetchMLData(session_key)
-            if pit_data.empty:
-                st.info("No pit stop data available for this race.")
-            else:
-                # ----------------- SHOW PIT STOP INFO -----------------
-                # Define compound colors
-                compound_colors = {
-                    'SOFT': '#ff0000',
-                    'MEDIUM': '#ffff00',
-                    'HARD': '#ffffff',
-                    'INTERMEDIATE': '#00ff00',
-                    'WET': '#0099ff'
-                }
-
-                # Map driver_number from ML data to driver_acronym using telemetry driver mapping for y-axis
-                try:
-                    # telemetry contains `driver_number` from MLData and `driver_acronym` from RaceData which are combined as a map
-                    if 'driver_number' in df.columns and 'driver_acronym' in df.columns:
-                        driver_map = df[['driver_number', 'driver_acronym']].drop_duplicates()
-                        # Ensure types align
-                        pit_data['driver_number'] = pit_data['driver_number'].astype(driver_map['driver_number'].dtype)
-                        pit_data = pit_data.merge(driver_map, on='driver_number', how='left')
-                    else:
+        # Built once per session: reruns (e.g. the lap-time selectbox) reuse the cached figure
+        pit_fig_key = f"pit_fig_{session_key}"
+        if pit_fig_key not in st.session_state:
+            with st.spinner("Loading Pit Stop Data..."):
+                #Update last five sessions to get pit stop data
+                # (no ingest hooks on a page view: the next startup sync runs them for sessions stored here)
+                fetch_data = mlData.update_last_five_sessions(emit_hooks=False)
+                if fetch_data:
+                    st.success("Pit stop data loaded successfully.")
+                else:
+                    st.warning("Pit stop data unavailable; using API fallback.")
+
+                #Fetch pit stop data for session
+                pit_data = mlData.fetchStintData(session_key)
+                pit_fig = None
+                if not pit_data.empty:
+                    # Map driver_number from ML data to driver_acronym using telemetry driver mapping for y-axis
+                    try:
+                        # the lap table contains `driver_number` from MLData and `driver_acronym` from RaceData which are combined as a map
+                        if 'driver_number' in laps_df.columns and 'driver_acronym' in laps_df.columns:
+                            driver_map = laps_df[['driver_number', 'driver_acronym']].drop_duplicates()
+                            # Ensure types align
+                            pit_data['driver_number'] = pit_data['driver_number'].astype(driver_map['driver_number'].dtype)
+                            pit_data = pit_data.merge(driver_map, on='driver_number', how='left')
+                        else:
+                            pit_data['driver_acronym'] = pit_data['driver_number'].astype(str)
+                    except Exception:
+                        # use driver_number as string if mapping fails
                         pit_data['driver_acronym'] = pit_data['driver_number'].astype(str)
-                except Exception:
-                    # use driver_number as string if mapping fails
-                    pit_data['driver_acronym'] = pit_data['driver_number'].astype(str)
-
-                # Build stints by merging contiguous laps with the same compound per driver
-                pit_fig = go.Figure()
-
-                # Normalize column names
-                lap_col = 'lap_number' if 'lap_number' in pit_data.columns else ('lap' if 'lap' in pit_data.columns else ('pit_lap' if 'pit_lap' in pit_data.columns else None))
-                compound_col = 'tire_compound' if 'tire_compound' in pit_data.columns else ('compound' if 'compound' in pit_data.columns else None)
-                laps_on_tire_col = 'laps_on_tire' if 'laps_on_tire' in pit_data.columns else None
-
-                # Build max lap per driver from lap_times_df to clip stints to race end
-                max_lap_map = {}
-                try:
-                    if not lap_times_df.empty:
-                        max_lap_series = lap_times_df.groupby('driver_acronym')['lap_number'].max() # Get max lap per driver
-                        max_lap_map = max_lap_series.to_dict() # Convert to dict for easy lookup
-                except Exception:
-                    max_lap_map = {} # Fallback to empty if any issue
-
-                y_order = pit_data['driver_acronym'].dropna().unique().tolist() # Preserve order of appearance
-                
-                #y_order would hold samples like ['HAM', 'VER', 'LEC', 'BOT', ...]
-                #pit_data would have multiple rows per driver with driver_acronym, lap_number, tire_compound, laps_on_tire
-                
-                # Build stints list
-                stints = []
-                for drv in y_order:
-                    ddf = pit_data[pit_data['driver_acronym'] == drv].copy()
-                    
-                    # Ensure we have the necessary columns
-                    if lap_col not in ddf.columns or compound_col not in ddf.columns:
-                        continue
-                    
-                    # Sort by lap to process sequentially
-                    ddf = ddf.sort_values(lap_col)
-                    
-                    current_comp = None
-                    current_start = None
-                    prev_lap = None 
-                    prev_tire_age = None # Track tire age to detect resets (if stops for same compound)
-                    
-                    # Iterate through laps to build continuos stints as a block of laps rather than individual laps
-                    for _, r in ddf.iterrows():
-                        lap = int(r[lap_col])
-                        comp = str(r[compound_col]).upper() if pd.notna(r[compound_col]) else 'UNKNOWN'
-                        
-                        # Get tire age if available, otherwise default to increasing count (for data without tire age)
-                        current_tire_age = int(r[laps_on_tire_col]) if laps_on_tire_col in ddf.columns and pd.notna(r[laps_on_tire_col]) else (999 if prev_tire_age is None else prev_tire_age + 1)
-
-                        # Initialize first stint
-                        if current_comp is None:
-                            current_comp = comp
-                            current_start = lap
-                        
-                        # If Compound changed or tire age reset or lap gap detected, we break the stint here (fixes issue with same compound stops)
-                        # Also fixes and creates a visual gap between stints
-                        elif (comp != current_comp) or \
-                             (prev_tire_age is not None and current_tire_age < prev_tire_age) or \
-                             (prev_lap is not None and lap > prev_lap + 1):
-                            
-                            # Close the previous stint
-                            stints.append({
-                                'driver': drv, 
-                                'start': current_start, 
-                                'end': prev_lap, # End at previous lap e.g 20
-                                'compound': current_comp
-                            })
-                            # Start new stint
-                            current_comp = comp
-                            current_start = lap # Start at current lap e.g 21 which creates a visual gap between 20 and 21 as intended
-                        
-                        prev_lap = lap 
-                        prev_tire_age = current_tire_age
-                    
-                    # Append the final stint after the loop finishes
-                    if current_comp is not None:
-                        stints.append({
-                            'driver': drv, 
-                            'start': current_start, 
-                            'end': prev_lap, 
-                            'compound': current_comp
-                        })
-
-                # Add traces for each stint to the figure
-                for s in stints:
-                    drv = s.get('driver')
-                    start = s.get('start')
-                    end = s.get('end')
-                    compound = (s.get('compound') or '').upper()
-                    stint_start = start
-                    stint_end = end
-
-                    if start is None or end is None or drv is None:
-                        continue
-
-                    # Clip stint to driver's max lap if available (some drivers may retire early or not finish)
-                    max_l = max_lap_map.get(drv, end) # Default to end if no max lap info
-                    display_end = min(end, max_l) # Clip to max lap
-                    
-                    # Skip invalid stints where end is before start after clipping
-                    if display_end < start:
-                        continue
-
-                    color = compound_colors.get(compound, '#808080')
-                    
-                    # Instead of just start, end, we create a list [start, start+1, start+2... end]
-                    # This ensures the hover works on every single pixel of the bar rather than just the end and start
-                    x_values = list(range(start, display_end + 1))
-                    y_values = [drv] * len(x_values)
-
-                    # Add the main stint trace
-                    pit_fig.add_trace(go.Scatter(
-                        x=x_values, 
-                        y=y_values, 
-                        mode='lines',
-                        line=dict(color=color, width=15),
-                        name=compound,
-                        showlegend=False,
-                        # force the hover to snap to the closest point along the x-axis so it works anywhere on the bar
-                        hoverinfo="text",
-                        hovertemplate=(f"Driver: {drv}<br>"
-                                       f"Compound: {compound}<br>"
-                                       f"Laps: {start}-{end}<br>"
-                                       f"Stint Length: {stint_end - stint_start + 1}<extra></extra>")
-                    ))
-                  
-                    
-                # Add legend entries to explain colors
-                for compound, color in compound_colors.items():
-                    pit_fig.add_trace(go.Scatter(
-                        x=[None], y=[None],
-                        mode='markers',
-                        marker=dict(size=10, color=color),
-                        name=compound
-                    ))
-
-                # Set chart height based on number of drivers
-                chart_height = max(600, len(y_order) * 30)
-
-                # Final layout adjustments
-                pit_fig.update_layout(
-                    title=dict(text='Stints / Pit Tyres', x=0.5, xanchor='center'),
-                    xaxis_title='Lap Number',
-                    yaxis_title='Driver',
-                    yaxis=dict(categoryorder='array', categoryarray=y_order[::-1]), # Show drivers top to bottom
-                    height=chart_height,
-                    template='plotly_dark',
-                    font=dict(family='Space Grotesk', color='#e5e7eb'),
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    showlegend=True
-                )
-                # Render pit figure in right column
-                with right_col:
-                    st.plotly_chart(pit_fig, use_container_width=True, config={"displayModeBar": False})
-                    #cols_to_show = ['driver_number', 'driver_acronym'] + [c for c in pit_data.columns if c not in ['driver_number','driver_acronym']]
-                    #st.dataframe(pit_data[cols_to_show].head(200))
+
+                    # Normalize column names
+                    lap_col = 'lap_number' if 'lap_number' in pit_data.columns else ('lap' if 'lap' in pit_data.columns else ('pit_lap' if 'pit_lap' in pit_data.columns else None))
+                    compound_col = 'tire_compound' if 'tire_compound' in pit_data.columns else ('compound' if 'compound' in pit_data.columns else None)
+
+                    # Build max lap per driver from lap_times_df to clip stints to race end
+                    max_lap_map = {}
+                    try:
+                        if not lap_times_df.empty:
+                            max_lap_series = lap_times_df.groupby('driver_acronym', observed=True)['lap_number'].max() # Get max lap per driver
+                            max_lap_map = max_lap_series.to_dict() # Convert to dict for easy lookup
+                    except Exception:
+                        max_lap_map = {} # Fallback to empty if any issue
+
+                    y_order = pit_data['driver_acronym'].dropna().unique().tolist() # Preserve order of appearance
+
+                    # A new stint starts on a compound change, tyre age reset (same-compound stop) or lap gap
+                    stints = stintEngine.build_stints(pit_data, lap_col=lap_col or 'lap_number', compound_col=compound_col or 'tire_compound')
+                    pit_fig = build_stint_figure(stints, y_order, max_lap_map)
+                st.session_state[pit_fig_key] = pit_fig
+
+        pit_fig = st.session_state[pit_fig_key]
+        if pit_fig is None:
+            st.info("No pit stop data available for this race.")
+        else:
+            # Render pit figure in right column
+            with right_col:
+                st.plotly_chart(pit_fig, use_container_width=True, config={"displayModeBar": False})
+
+        # Undercut heatmap beside the stints, drivers in the same order
+        undercut_fig_key = f"undercut_fig_{session_key}"
+        if undercut_fig_key not in st.session_state:
+            pairs = get_undercut_analysis(session_key)
+            y_order = laps_df['driver_acronym'].astype(str).unique().tolist()
+            st.session_state[undercut_fig_key] = build_undercut_figure(pairs, y_order) if not pairs.empty else None
+        undercut_fig = st.session_state[undercut_fig_key]
+        with right_col:
+            if undercut_fig is None:
+                st.info("No lap data for the undercut analysis.")
+            else:
+                st.plotly_chart(undercut_fig, use_container_width=True, config={"displayModeBar": False})
                 
 
 # Start the Replay
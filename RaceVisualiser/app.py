@@ -4,6 +4,9 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
 import storeRaceData as raceData
+import storeMLData as mlData
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+import createDatabase
 
 # --- PAGE CONFIG --- #
 st.set_page_config(layout="wide", page_title="F1 Strategy Dashboard")
@@ -34,8 +37,14 @@ if "data_loaded" not in st.session_state:
     )
 
     with st.spinner('Initializing Dashboard & Syncing Races...'):
+        # Create tables / apply schema migrations before anything reads the DB
+        createDatabase.ensure_schema()
         # This function should returns True if successful
         fetched = raceData.update_last_five_sessions()
+        # Lap data for the models: newly ingested sessions run the ingest hooks (lap flags,
+        # pit predictions, online model updates) here, in the sync, rather than on a page view;
+        # so do stored sessions that have not had them yet (collected by a page since the last sync)
+        mlData.update_last_five_sessions()
     
     if not fetched:
         st.error("Failed to load races. There may be a live race in progress. Please try again later.") #API limitation issue
@@ -51,12 +60,13 @@ if "data_loaded" not in st.session_state:
 # Define the pages
 home_page = st.Page("Pages/dashboardHome.py", title="Home", icon="🏠", default=True)
 replay_page = st.Page("Pages/raceReplay.py", title="Race Replay", icon="🏎️")
+pit_page = st.Page("Pages/pitPredictions.py", title="Pit Predictions", icon="🛞")
 
 # Create the Navigation Object
 pg = st.navigation({
     "Dashboard": [home_page],
     "Analysis": [replay_page],
-    "Prediction Model (Coming Soon)": []
+    "Prediction Model": [pit_page]
 })
 
 # Run the selected page
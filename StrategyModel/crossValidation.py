@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+import databaseManager as db
+import featureMatrix
+import storeMLData as mlData
+import pitModel
+import lapQuality
+
+# -------------------------------------------------------
+# Session-grouped cross-validation and hyperparameter search
+# -------------------------------------------------------
+# Folds are whole sessions: laps of one race are never split between training
+# and test, so the scores say how a model does on a race it has not seen.
+# A search runs one configuration per task on a process pool. Workers open the
+# feature store's memory maps themselves (only session keys cross the process
+# boundary), and share the best finished score: a configuration whose running
+# mean after EARLY_STOP_MIN_FOLDS folds is clearly worse stops there. The first
+# configuration runs on its own, so there is a finished score to compare against
+# even when every configuration has a worker.
+# Every evaluated configuration is appended to a JSON-lines experiment log.
+
+# --- CONFIGURATION ---
+N_FOLDS = 5
+EARLY_STOP_MIN_FOLDS = 2   # Folds a configuration always gets before it can be stopped
+EARLY_STOP_MARGIN = 0.10   # Stop when the running mean score is this much worse than the best finished one
+# Experiment log (F1_EXPERIMENT_LOG overrides it); defaults to a file next to the main DB
+EXPERIMENT_LOG = os.environ.get("F1_EXPERIMENT_LOG", os.path.join(os.path.dirname(db.DB_PATH), "experiments.jsonl"))
+
+# Model families: target column, score to minimise, lap flags whose rows are left out and the default search grid
+MODELS = {
+    'lap_time': {'target': 'lap_duration', 'score': 'rmse', 'exclude': lapQuality.DEGRADATION_EXCLUDE,
+                 'grid': {'alpha': [0.01, 0.1, 1.0, 10.0, 100.0, 1000.0]}},
+    'pit_stop': {'target': 'pits_this_lap', 'score': 'log_loss', 'exclude': pitModel.TRAINING_EXCLUDE,
+                 'grid': {'l2': [0.01, 0.1, 1.0, 10.0, 100.0]}},
+}
+
+# ---------------------------
+# Folds
+# ---------------------------
+def group_folds(groups, n_folds=N_FOLDS):
+    """
+    Splits rows into n_folds by group (session_key), balancing the rows per fold: the largest
+    sessions are placed first, each into the fold with the fewest rows so far.
+    Returns a list of (train_rows, test_rows).
+    """
+    sessions, inverse, sizes = np.unique(np.asarray(groups), return_inverse=True, return_counts=True)
+    n_folds = min(n_folds, len(sessions))
+    fold_of_session = np.empty(len(sessions), dtype=np.int64)
+    fold_rows = np.zeros(n_folds, dtype=np.int64)
+    for s in np.argsort(-sizes, kind='stable'):
+        f = int(np.argmin(fold_rows))
+        fold_of_session[s] = f
+        fold_rows[f] += sizes[s]
+    fold = fold_of_session[inverse]
+    return [(np.flatnonzero(fold != f), np.flatnonzero(fold == f)) for f in range(n_folds)]
+
+# ---------------------------
+# Models and metrics
+# ---------------------------
+def regression_metrics(y, pred):
+    """RMSE, MAE and R²."""
+    residual = y - pred
+    total = np.sum((y - y.mean()) ** 2)
+    return {'rmse': float(np.sqrt(np.mean(residual ** 2))), 'mae': float(np.mean(np.abs(residual))),
+            'r2': float(1 - np.sum(residual ** 2) / total) if total > 0 else np.nan}
+
+def fit_ridge(X, y, alpha):
+    """Ridge regression in closed form. X includes the intercept column, which is not penalised."""
+    penalty = np.full(X.shape[1], float(alpha))
+    penalty[0] = 0.0
+    return np.linalg.solve(X.T @ X + np.diag(penalty), X.T @ y)
+
+def fit_and_score(model, params, features, y, train, test):
+    """Fits one model family on the train rows (scaling from them only) and returns its test metrics."""
+    mean, scale = pitModel.feature_scaling(features[train])
+    X_train = pitModel.design_matrix(features[train], mean, scale)
+    X_test = pitModel.design_matrix(features[test], mean, scale)
+    if model == 'lap_time':
+        weights = fit_ridge(X_train, y[train], params['alpha'])
+        return regression_metrics(y[test], X_test @ weights)
+    weights, covariance = pitModel.fit_logistic(X_train, y[train], params['l2'])
+    p, _, _ = pitModel.predict_proba(X_test, weights, covariance)
+    # RMSE/MAE/R² of the probabilities as well, so both families report the same measures
+    return {**pitModel.classification_metrics(y[test], p), **regression_metrics(y[test], p)}
+
+# ---------------------------
+# Workers
+# ---------------------------
+_worker = {}
+
+def _init_worker(session_keys, version, n_folds, best_score):
+    """Opens the feature store's memory maps once per process (nothing is copied from the parent)."""
+    matrix = featureMatrix.build_feature_matrix(session_keys, version)
+    _worker.update(matrix=matrix, folds=group_folds(matrix.groups, n_folds), best=best_score)
+
+def evaluate_config(model, params, early_stop=True):
+    """
+    Cross-validates one configuration over the worker's folds. Stops early when the running
+    mean score is EARLY_STOP_MARGIN worse than the best finished configuration.
+    """
+    start = time.perf_counter()
+    matrix, best = _worker['matrix'], _worker['best']
+    spec = MODELS[model]
+    y = np.asarray(matrix.target(spec['target']), dtype=float)
+    features = matrix.X
+    labelled = ~np.isnan(y) & ((np.asarray(matrix.flags) & spec['exclude']) == 0)
+
+    fold_metrics = []
+    stopped = False
+    for train, test in _worker['folds']:
+        train, test = train[labelled[train]], test[labelled[test]]
+        if len(train) == 0 or len(test) == 0:
+            continue
+        fold_metrics.append(fit_and_score(model, params, features, y, train, test))
+        running = np.mean([m[spec['score']] for m in fold_metrics])
+        if early_stop and len(fold_metrics) >= EARLY_STOP_MIN_FOLDS and len(fold_metrics) < len(_worker['folds']) \
+                and running > best.value * (1 + EARLY_STOP_MARGIN):
+            stopped = True
+            break
+
+    metrics = pd.DataFrame(fold_metrics).mean().to_dict() if fold_metrics else {}
+    score = metrics.get(spec['score'], np.nan)
+    if not stopped and fold_metrics:
+        with best.get_lock():
+            best.value = min(best.value, score)
+    return {'model': model, 'params': params, 'score_name': spec['score'], 'score': score,
+            'folds': len(fold_metrics), 'stopped_early': stopped, 'metrics': metrics,
+            'fold_scores': [m[spec['score']] for m in fold_metrics], 'seconds': time.perf_counter() - start}
+
+def _evaluate(args):
+    return evaluate_config(*args)
+
+# ---------------------------
+# Search
+# ---------------------------
+def param_grid(grid):
+    """Every combination of a {name: [values]} grid, as a list of dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+def log_results(results, session_keys, path=EXPERIMENT_LOG):
+    """Appends results to the experiment log (one JSON object per line)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    experiment = datetime.now(timezone.utc).isoformat()
+    with open(path, 'a') as f:
+        for result in results:
+            f.write(json.dumps({'experiment': experiment, 'sessions': list(session_keys),
+                                'feature_version': featureMatrix.FEATURE_VERSION, **result}, default=float) + "\n")
+
+def run_search(session_keys, model='lap_time', grid=None, n_folds=N_FOLDS, workers=None, early_stop=True,
+               log_path=EXPERIMENT_LOG, version=featureMatrix.FEATURE_VERSION):
+    """
+    Session-grouped CV of every configuration in grid (MODELS[model]['grid'] by default),
+    spread over workers processes (all cores if None). Returns one row per configuration,
+    best first, and appends them to the experiment log (skipped if log_path is None).
+    With early_stop, the first configuration finishes before the others start: with a worker
+    per configuration they would otherwise all run at once and none could be stopped.
+    """
+    # Make sure every session is in the store before the workers open it
+    matrix = featureMatrix.build_feature_matrix(session_keys, version)
+    if len(matrix) == 0:
+        print("No data to cross-validate.")
+        return pd.DataFrame()
+    session_keys = matrix.session_keys
+    configs = param_grid(grid or MODELS[model]['grid'])
+    workers = min(workers or os.cpu_count() or 1, len(configs))
+
+    best_score = multiprocessing.Value('d', np.inf)
+    tasks = [(model, params, early_stop) for params in configs]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(session_keys, version, n_folds, best_score)) as pool:
+            first = [pool.submit(_evaluate, tasks[0]).result()] if early_stop else []
+            results = first + list(pool.map(_evaluate, tasks[len(first):]))
+    else:
+        _init_worker(session_keys, version, n_folds, best_score)
+        results = [_evaluate(task) for task in tasks]
+
+    if log_path:
+        log_results(results, session_keys, log_path)
+    table = pd.DataFrame([{**r['params'], 'score': r['score'], 'folds': r['folds'], 'stopped_early': r['stopped_early'],
+                           **r['metrics'], 'seconds': r['seconds']} for r in results])
+    return table.sort_values('score', kind='stable').reset_index(drop=True)
+
+def cross_validate(session_keys, model='lap_time', params=None, n_folds=N_FOLDS, version=featureMatrix.FEATURE_VERSION):
+    """Session-grouped CV of a single configuration (all folds, no early stopping). Returns the mean metrics."""
+    params = params or param_grid(MODELS[model]['grid'])[0]
+    _init_worker(featureMatrix.build_feature_matrix(session_keys, version).session_keys, version, n_folds,
+                 multiprocessing.Value('d', np.inf))
+    return evaluate_config(model, params, early_stop=False)['metrics']
+
+def load_experiments(path=EXPERIMENT_LOG):
+    """The experiment log as a DataFrame (params and mean metrics flattened into columns)."""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return pd.json_normalize(records)
+
+if __name__ == "__main__":
+    keys = mlData.stored_session_keys()
+    if not keys:
+        print("No sessions in ml_training_data.")
+    else:
+        for name in MODELS:
+            print(f"\n{name}:")
+            print(run_search(keys, name).to_string(index=False))
@@ -0,0 +1,216 @@
+import os
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
+import stintEngine
+import featureMatrix
+import storeMLData as mlData
+import lapQuality
+
+# -------------------------------------------------------
+# Tyre degradation
+# -------------------------------------------------------
+# Lap time against tyre age for every (session, driver, stint, compound), from
+# ml_training_data laps. Laps that say nothing about the tyre (lap 1, in/out
+# laps, safety car and other neutralised laps, by their lapQuality flags) are removed, and lap times are
+# corrected to an empty tank so the fuel burn-off does not hide the degradation.
+# All stints are fitted together: the least-squares normal equations of every
+# stint are accumulated with np.bincount over a stint id and solved as one
+# stacked (stints x k x k) system, so there is no per-stint model or loop.
+# Across sessions, the pooled linear rate per compound is kept as sufficient
+# statistics (within-stint centred sums), so a new session is added to the
+# history without refitting any earlier one.
+
+# --- CONFIGURATION ---
+FUEL_SECONDS_PER_LAP = 0.06  # Lap time gained per lap of fuel burnt (~1.7 kg/lap at ~0.035 s/kg)
+MIN_STINT_LAPS = 4           # Clean laps needed before a stint is fitted
+DEGREE = 1                   # 1: linear (seconds per lap of tyre age), 2: adds a curvature term
+
+CLEAN_LAP_COLUMNS = ['session_key', 'driver_number', 'lap_number', 'stint', 'compound', 'tyre_age', 'lap_time', 'fuel_corrected']
+FIT_COLUMNS = ['session_key', 'driver_number', 'stint', 'compound', 'laps', 'first_age', 'last_age',
+               'base_time', 'deg_per_lap', 'deg_curvature', 'rmse']
+STAT_COLUMNS = ['stints', 'laps', 'sxx', 'sxy', 'syy']
+
+# ---------------------------
+# Lap selection
+# ---------------------------
+def _stint_numbers(laps):
+    """Stint number and compound for every lap, from stintEngine (sessions and drivers segmented together)."""
+    driver_key = laps['session_key'].astype(np.int64) * 1000 + laps['driver_number'].astype(np.int64)
+    stints = stintEngine.build_stints(laps.assign(stint_driver=driver_key), driver_col='stint_driver')
+    per_lap = stintEngine.stint_laps(stints, lap_dtype='int64', with_stint=True)
+    per_lap['stint_driver'] = per_lap.pop('driver_acronym').astype(np.int64)
+    return pd.merge(laps.assign(stint_driver=driver_key), per_lap, on=['stint_driver', 'lap_number'], how='left')
+
+def prepare_laps(laps, safety_car_laps=None, lap_flags=None):
+    """
+    Clean, fuel-corrected laps ready for fitting (CLEAN_LAP_COLUMNS).
+    Removes laps with any lapQuality.DEGRADATION_EXCLUDE flag (lap 1, pit in/out laps, neutralised
+    laps, laps without a time and off-pace outliers) and laps in safety_car_laps (DataFrame of
+    session_key, lap_number). lap_flags (stored lapQuality flags) are used for the laps they cover,
+    which adds race control track status; the other laps' flags are computed from the laps.
+    """
+    if laps is None or laps.empty:
+        return pd.DataFrame(columns=CLEAN_LAP_COLUMNS)
+
+    laps = laps.sort_values(['session_key', 'driver_number', 'lap_number'], kind='stable').reset_index(drop=True)
+    laps = laps.assign(lap_number=laps['lap_number'].astype(np.int64))
+    laps = _stint_numbers(laps)
+
+    lap_time = pd.to_numeric(laps['lap_duration'], errors='coerce')
+    lap_number = laps['lap_number']
+    session = laps['session_key']
+
+    keep = pd.Series((lapQuality.lap_flags(laps, lap_flags) & lapQuality.DEGRADATION_EXCLUDE) == 0, index=laps.index)
+    keep &= laps['compound'].notna() & (laps['compound'].astype(str) != stintEngine.UNKNOWN_COMPOUND)
+
+    if safety_car_laps is not None and not safety_car_laps.empty:
+        sc_key = safety_car_laps['session_key'].astype(np.int64) * 100000 + safety_car_laps['lap_number'].astype(np.int64)
+        keep &= ~(session.astype(np.int64) * 100000 + lap_number).isin(sc_key)
+
+    # Tyre age from the data, or laps into the stint where it is missing
+    age = pd.to_numeric(laps['laps_on_tire'], errors='coerce')
+    stint_start = lap_number.groupby([laps['stint_driver'], laps['stint']]).transform('min')
+    age = age.fillna(lap_number - stint_start)
+
+    # Correct every lap to an empty tank: a lap with n laps still to go carries n laps of fuel
+    laps_to_go = lap_number.groupby(session).transform('max') - lap_number
+    clean = pd.DataFrame({
+        'session_key': session,
+        'driver_number': laps['driver_number'],
+        'lap_number': lap_number,
+        'stint': laps['stint'],
+        'compound': laps['compound'].astype(str),
+        'tyre_age': age,
+        'lap_time': lap_time,
+        'fuel_corrected': lap_time - FUEL_SECONDS_PER_LAP * laps_to_go,
+    })[keep.to_numpy()]
+    return clean.reset_index(drop=True)
+
+# ---------------------------
+# Batched fit
+# ---------------------------
+def batched_polyfit(group, x, y, n_groups, degree=DEGREE):
+    """
+    Least-squares polynomial of y on x for every group at once.
+    group holds 0..n_groups-1 per row. Returns (coefficients (n_groups x degree+1, lowest power
+    first), rmse per group, rows per group). Groups too small for the degree get a
+    minimum-norm solution from the pseudo-inverse rather than an error.
+    """
+    k = degree + 1
+    powers = x[:, None] ** np.arange(k)
+    xtx = np.empty((n_groups, k, k))
+    for i in range(k):
+        for j in range(i, k):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(group, powers[:, i] * powers[:, j], minlength=n_groups)
+    xty = np.stack([np.bincount(group, powers[:, i] * y, minlength=n_groups) for i in range(k)], axis=1)
+
+    coef = (np.linalg.pinv(xtx) @ xty[:, :, None])[:, :, 0]
+    residual = y - (powers * coef[group]).sum(axis=1)
+    counts = np.bincount(group, minlength=n_groups)
+    rmse = np.sqrt(np.bincount(group, residual ** 2, minlength=n_groups) / np.maximum(counts, 1))
+    return coef, rmse, counts
+
+def fit_degradation(laps, safety_car_laps=None, degree=DEGREE, min_laps=MIN_STINT_LAPS, lap_flags=None):
+    """
+    Fits fuel-corrected lap time against tyre age for every (session, driver, stint, compound)
+    in one pass. Returns FIT_COLUMNS: base_time is the fitted time on new tyres (empty tank),
+    deg_per_lap the seconds lost per lap of tyre age, deg_curvature the quadratic term (0 for degree 1).
+    """
+    clean = prepare_laps(laps, safety_car_laps, lap_flags)
+    if clean.empty:
+        return pd.DataFrame(columns=FIT_COLUMNS)
+
+    # Stints with too few clean laps are dropped before fitting
+    stint_keys = ['session_key', 'driver_number', 'stint']
+    sizes = clean.groupby(stint_keys)['lap_time'].transform('size')
+    clean = clean[sizes >= min_laps]
+    if clean.empty:
+        return pd.DataFrame(columns=FIT_COLUMNS)
+
+    by_stint = clean.groupby(stint_keys, sort=True)
+    group = by_stint.ngroup().to_numpy()
+    age = clean['tyre_age'].to_numpy(dtype=float)
+    coef, rmse, counts = batched_polyfit(group, age, clean['fuel_corrected'].to_numpy(dtype=float), by_stint.ngroups, degree)
+
+    # Group ids follow the sorted stint keys, so the aggregates line up with the coefficients
+    fits = by_stint.agg(compound=('compound', 'first'), first_age=('tyre_age', 'min'), last_age=('tyre_age', 'max')).reset_index()
+    fits['laps'] = counts
+    fits['base_time'] = coef[:, 0]
+    fits['deg_per_lap'] = coef[:, 1]
+    fits['deg_curvature'] = coef[:, 2] if degree > 1 else 0.0
+    fits['rmse'] = rmse
+    return fits[FIT_COLUMNS]
+
+def compound_degradation(fits):
+    """
+    Per (session, compound) summary of the stint fits. Medians, so one odd stint cannot drag
+    the value. Used by the strategy tools.
+    """
+    if fits.empty:
+        return pd.DataFrame(columns=['session_key', 'compound', 'stints', 'laps', 'base_time', 'deg_per_lap', 'deg_curvature'])
+    return fits.groupby(['session_key', 'compound'], as_index=False).agg(
+        stints=('stint', 'size'),
+        laps=('laps', 'sum'),
+        base_time=('base_time', 'median'),
+        deg_per_lap=('deg_per_lap', 'median'),
+        deg_curvature=('deg_curvature', 'median'),
+    )
+
+# ---------------------------
+# Pooled rates from sufficient statistics
+# ---------------------------
+def degradation_statistics(laps, safety_car_laps=None, min_laps=MIN_STINT_LAPS, lap_flags=None):
+    """
+    Sufficient statistics of the pooled linear degradation per compound (index featureMatrix.COMPOUNDS,
+    columns STAT_COLUMNS): stints and laps, and the sums of squares and cross products of tyre age and
+    fuel-corrected lap time centred within each stint (so each stint keeps its own base time).
+    Statistics of different sessions simply add up.
+    """
+    stats = pd.DataFrame(0.0, index=featureMatrix.COMPOUNDS, columns=STAT_COLUMNS)
+    clean = prepare_laps(laps, safety_car_laps, lap_flags)
+    stint_keys = ['session_key', 'driver_number', 'stint']
+    if not clean.empty:
+        clean = clean[clean.groupby(stint_keys)['lap_time'].transform('size') >= min_laps]
+    clean = clean[clean['compound'].isin(featureMatrix.COMPOUNDS)] if not clean.empty else clean
+    if clean.empty:
+        return stats
+
+    group = clean.groupby(stint_keys, sort=False).ngroup().to_numpy()
+    x = clean['tyre_age'].to_numpy(dtype=float)
+    y = clean['fuel_corrected'].to_numpy(dtype=float)
+    counts = np.bincount(group)
+    dx = x - (np.bincount(group, x) / counts)[group]
+    dy = y - (np.bincount(group, y) / counts)[group]
+
+    sums = pd.DataFrame({'compound': clean['compound'].to_numpy(), 'stint': group, 'laps': 1.0,
+                         'sxx': dx * dx, 'sxy': dx * dy, 'syy': dy * dy}).groupby('compound')
+    per_compound = sums[['laps', 'sxx', 'sxy', 'syy']].sum().assign(stints=sums['stint'].nunique())
+    stats.loc[per_compound.index, STAT_COLUMNS] = per_compound[STAT_COLUMNS].astype(float)
+    return stats
+
+def pooled_degradation(stats):
+    """
+    Seconds per lap of tyre age per compound from degradation_statistics (or their sum over sessions),
+    with its standard error. Compounds without data are left out.
+    """
+    stats = stats[stats['sxx'] > 0]
+    deg = stats['sxy'] / stats['sxx']
+    dof = (stats['laps'] - stats['stints'] - 1).clip(lower=1)
+    rmse = np.sqrt(((stats['syy'] - deg * stats['sxy']) / dof).clip(lower=0))
+    return pd.DataFrame({'compound': stats.index, 'stints': stats['stints'].astype(int), 'laps': stats['laps'].astype(int),
+                         'deg_per_lap': deg, 'std_error': rmse / np.sqrt(stats['sxx']), 'rmse': rmse}).reset_index(drop=True)
+
+def fit_sessions(session_keys, safety_car_laps=None, degree=DEGREE):
+    """Degradation fits for stored sessions (ml_training_data), using their stored lap quality flags."""
+    return fit_degradation(featureMatrix.fetch_laps(session_keys), safety_car_laps, degree,
+                           lap_flags=lapQuality.load_flags(session_keys))
+
+if __name__ == "__main__":
+    keys = mlData.stored_session_keys()
+    if not keys:
+        print("No sessions in ml_training_data.")
+    else:
+        fits = fit_sessions(keys)
+        print(compound_degradation(fits).to_string(index=False))
@@ -0,0 +1,287 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
+import databaseManager as db
+import storeMLData as mlData
+import lapQuality
+
+# -------------------------------------------------------
+# Cached feature matrices over ml_training_data
+# -------------------------------------------------------
+# Every lap in ml_training_data becomes one float32 row of FEATURE_COLUMNS plus
+# TARGET_COLUMNS. Rows are appended session by session to flat binary files that
+# are opened as memory maps, so a matrix for any set of sessions is a list of row
+# ranges into the same files: nothing is rebuilt when a new session lands (only
+# its rows are added), and worker processes can share the arrays without copying.
+# Each row also keeps its lapQuality flags, so models pick their training laps
+# with FeatureMatrix.without instead of re-implementing the lap filters.
+# Each FEATURE_VERSION has its own store; bump it whenever the features change.
+
+# --- CONFIGURATION ---
+FEATURE_VERSION = 3  # 2: adds the time-weighted lap weather (weatherData.lap_weather), 3: adds lap flags
+# Store folder (F1_FEATURE_DIR overrides it); defaults to a folder next to the main DB
+FEATURE_DIR = os.environ.get("F1_FEATURE_DIR", os.path.join(os.path.dirname(db.DB_PATH), "features"))
+
+COMPOUNDS = ['SOFT', 'MEDIUM', 'HARD', 'INTERMEDIATE', 'WET']
+WEATHER_COLUMNS = ['rainfall', 'track_temperature', 'air_temperature', 'humidity']
+# Weather over each lap's window (NaN for laps stored before it was collected)
+LAP_WEATHER_COLUMNS = ['rain_fraction', 'track_temperature_mean', 'air_temperature_mean', 'humidity_mean',
+                       'track_temperature_min', 'track_temperature_max', 'air_temperature_min', 'air_temperature_max']
+SECTOR_COLUMNS = ['duration_sector_1', 'duration_sector_2', 'duration_sector_3']
+
+FEATURE_COLUMNS = (
+    ['lap_number', 'race_progress', 'laps_on_tire']
+    + [f"compound_{c.lower()}" for c in COMPOUNDS]
+    + WEATHER_COLUMNS
+    + LAP_WEATHER_COLUMNS
+    + ['sector_1_delta', 'sector_2_delta', 'sector_3_delta']
+    + ['is_pit_out_lap']
+)
+# lap_duration for lap time models, pits_this_lap (the next lap is a pit out lap) for pit models
+TARGET_COLUMNS = ['lap_duration', 'pits_this_lap']
+KEY_COLUMNS = ['session_key', 'driver_number', 'lap_number']
+
+FEATURE_DTYPE = np.dtype('float32')
+KEY_DTYPE = np.dtype('int32')
+FLAG_DTYPE = np.dtype('int32')
+
+# ---------------------------
+# Feature assembly
+# ---------------------------
+def lap_features(laps):
+    """
+    Builds the feature, target and key arrays for laps of one or more sessions (ml_training_data rows).
+    Sector deltas are each lap's sector time minus the session's median for that sector.
+    Missing values stay NaN. Returns (features, targets, keys) ordered by session, driver and lap.
+    """
+    laps = laps.sort_values(KEY_COLUMNS, kind='stable').reset_index(drop=True)
+    n = len(laps)
+    features = np.full((n, len(FEATURE_COLUMNS)), np.nan, dtype=FEATURE_DTYPE)
+    col = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+    def numeric(name):
+        if name not in laps.columns:
+            return pd.Series(np.nan, index=laps.index)
+        return pd.to_numeric(laps[name], errors='coerce')
+
+    session = laps['session_key']
+    lap_number = numeric('lap_number')
+    features[:, col['lap_number']] = lap_number
+    features[:, col['race_progress']] = lap_number / lap_number.groupby(session).transform('max')
+    features[:, col['laps_on_tire']] = numeric('laps_on_tire')
+
+    # Compound one-hot (all zero when the compound is unknown)
+    compound = laps['tire_compound'].astype(str).str.upper() if 'tire_compound' in laps.columns else pd.Series('', index=laps.index)
+    for c in COMPOUNDS:
+        features[:, col[f"compound_{c.lower()}"]] = (compound == c).to_numpy()
+
+    for name in WEATHER_COLUMNS + LAP_WEATHER_COLUMNS:
+        features[:, col[name]] = numeric(name)
+
+    for i, name in enumerate(SECTOR_COLUMNS, start=1):
+        sector = numeric(name)
+        features[:, col[f"sector_{i}_delta"]] = sector - sector.groupby(session).transform('median')
+
+    pit_out = numeric('is_pit_out_lap').fillna(0).astype(bool)
+    features[:, col['is_pit_out_lap']] = pit_out
+
+    # A driver pits at the end of a lap when their next lap is a pit out lap
+    same_driver = (session.shift(-1) == session) & (laps['driver_number'].shift(-1) == laps['driver_number'])
+    next_lap = lap_number.shift(-1) == lap_number + 1
+    pits = (same_driver & next_lap & pit_out.shift(-1, fill_value=False)).to_numpy()
+
+    targets = np.column_stack((numeric('lap_duration').to_numpy(), pits)).astype(FEATURE_DTYPE)
+    keys = laps[KEY_COLUMNS].to_numpy(dtype=KEY_DTYPE)
+    return features, targets, keys
+
+# ---------------------------
+# Store
+# ---------------------------
+def store_dir(version=FEATURE_VERSION):
+    return os.path.join(FEATURE_DIR, f"v{version}")
+
+def _paths(version):
+    base = store_dir(version)
+    return {
+        'manifest': os.path.join(base, "manifest.json"),
+        'features': os.path.join(base, "features.f32"),
+        'targets': os.path.join(base, "targets.f32"),
+        'keys': os.path.join(base, "keys.i32"),
+        'flags': os.path.join(base, "flags.i32"),
+    }
+
+def load_manifest(version=FEATURE_VERSION):
+    """Store contents: {'version', 'features', 'targets', 'rows', 'sessions': {session_key: [start, stop]}}."""
+    path = _paths(version)['manifest']
+    if not os.path.exists(path):
+        return {'version': version, 'features': FEATURE_COLUMNS, 'targets': TARGET_COLUMNS, 'rows': 0, 'sessions': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_manifest(manifest, version):
+    # Written to a temp file and renamed, so readers never see a half-written manifest
+    path = _paths(version)['manifest']
+    with open(path + ".tmp", 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def _append(manifest, features, targets, keys, flags, session_ranges, version):
+    """Appends rows to the store files and records their sessions in the manifest (call under file_lock)."""
+    paths = _paths(version)
+    os.makedirs(store_dir(version), exist_ok=True)
+    rows = manifest['rows']
+    for name, block in (('features', features), ('targets', targets), ('keys', keys), ('flags', flags[:, None])):
+        with open(paths[name], 'ab') as f:
+            # Drop anything past the manifest (an append interrupted before its manifest update)
+            f.truncate(rows * block.shape[1] * block.dtype.itemsize)
+            f.write(np.ascontiguousarray(block).tobytes())
+
+    for session_key, (start, stop) in session_ranges.items():
+        manifest['sessions'][str(session_key)] = [rows + start, rows + stop]
+    manifest['rows'] = rows + len(features)
+    _write_manifest(manifest, version)
+
+def open_store(version=FEATURE_VERSION, manifest=None):
+    """Read-only memory maps of the whole store: (features, targets, keys, flags). Cheap, nothing is read up front."""
+    manifest = manifest or load_manifest(version)
+    rows = manifest['rows']
+    paths = _paths(version)
+    if rows == 0:
+        return (np.empty((0, len(FEATURE_COLUMNS)), FEATURE_DTYPE), np.empty((0, len(TARGET_COLUMNS)), FEATURE_DTYPE),
+                np.empty((0, len(KEY_COLUMNS)), KEY_DTYPE), np.empty(0, FLAG_DTYPE))
+    return (
+        np.memmap(paths['features'], dtype=FEATURE_DTYPE, mode='r', shape=(rows, len(manifest['features']))),
+        np.memmap(paths['targets'], dtype=FEATURE_DTYPE, mode='r', shape=(rows, len(manifest['targets']))),
+        np.memmap(paths['keys'], dtype=KEY_DTYPE, mode='r', shape=(rows, len(KEY_COLUMNS))),
+        np.memmap(paths['flags'], dtype=FLAG_DTYPE, mode='r', shape=(rows,)),
+    )
+
+def add_sessions(laps, version=FEATURE_VERSION):
+    """
+    Adds the laps of sessions not yet in the store (laps may hold several sessions).
+    Sessions already stored are skipped, so calling this again after an ingest only adds the new one.
+    Each row keeps the session's stored lapQuality flags (computed from the laps when there are none).
+    Returns the session keys added.
+    """
+    # Locked from the manifest read to its write: concurrent writers (ingest hook, training,
+    # cross-validation) would otherwise truncate each other's rows or reuse their ranges
+    with db.file_lock(store_dir(version)):
+        manifest = load_manifest(version)
+        laps = laps[~laps['session_key'].astype(str).isin(manifest['sessions'].keys())]
+        if laps.empty:
+            return []
+
+        laps = laps.sort_values(KEY_COLUMNS, kind='stable').reset_index(drop=True)
+        features, targets, keys = lap_features(laps)
+        stored_flags = lapQuality.load_flags([int(k) for k in pd.unique(laps['session_key'])])
+        flags = lapQuality.lap_flags(laps, stored_flags).astype(FLAG_DTYPE)
+        # Rows come back grouped by session, so each session is one contiguous range
+        sessions, starts = np.unique(keys[:, 0], return_index=True)
+        stops = np.append(starts[1:], len(keys))
+        ranges = {int(s): (int(a), int(b)) for s, a, b in zip(sessions, starts, stops)}
+        _append(manifest, features, targets, keys, flags, ranges, version)
+    return list(ranges)
+
+# ---------------------------
+# Matrices for a session set
+# ---------------------------
+class FeatureMatrix:
+    """Rows of the store that belong to a set of sessions, in session order."""
+
+    def __init__(self, session_keys, rows, version=FEATURE_VERSION, manifest=None):
+        self.session_keys = list(session_keys)
+        self.rows = rows
+        self.version = version
+        self._manifest = manifest
+        self.features, self.targets, self.keys, self.lap_flags = open_store(version, manifest)
+        self.columns = FEATURE_COLUMNS
+        # Sessions stored contiguously (the usual case) are plain slices of the memory maps, i.e. zero copy
+        contiguous = len(rows) > 0 and bool(np.all(np.diff(rows) == 1))
+        self._slice = slice(int(rows[0]), int(rows[-1]) + 1) if contiguous else None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _take(self, array):
+        return array[self._slice] if self._slice is not None else array[self.rows]
+
+    @property
+    def X(self):
+        return self._take(self.features)
+
+    @property
+    def y(self):
+        return self._take(self.targets)
+
+    def target(self, name):
+        return self._take(self.targets[:, TARGET_COLUMNS.index(name)])
+
+    @property
+    def lap_keys(self):
+        """(session_key, driver_number, lap_number) of every row."""
+        return self._take(self.keys)
+
+    @property
+    def flags(self):
+        """lapQuality flags of every row."""
+        return self._take(self.lap_flags)
+
+    def without(self, exclude):
+        """The rows with none of the exclude flag bits set, as a FeatureMatrix over the same sessions."""
+        keep = (np.asarray(self.flags) & exclude) == 0
+        return FeatureMatrix(self.session_keys, np.asarray(self.rows)[keep], self.version, self._manifest)
+
+    @property
+    def groups(self):
+        """session_key of every row (for session-grouped cross-validation)."""
+        return self._take(self.keys[:, 0])
+
+    def frame(self):
+        """The matrix as a DataFrame (keys, features and targets), for inspection."""
+        # lap_number is already a feature, so only the session and driver keys are added
+        return pd.DataFrame(np.hstack([self.lap_keys[:, :2], self.X, self.y]),
+                            columns=KEY_COLUMNS[:2] + FEATURE_COLUMNS + TARGET_COLUMNS)
+
+def fetch_laps(session_keys):
+    """Stored laps of the given sessions (sessions not in ml_training_data are skipped)."""
+    frames = [db.query_df(mlData.Q_ML_SESSION, {'session_key': int(key)}) for key in session_keys]
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def build_feature_matrix(session_keys, version=FEATURE_VERSION):
+    """
+    Feature matrix and targets for a set of sessions, read from the store as memory maps.
+    Sessions missing from the store are assembled from ml_training_data and appended first;
+    ones already there are never rebuilt. Returns a FeatureMatrix.
+    """
+    session_keys = sorted({int(k) for k in session_keys})
+    manifest = load_manifest(version)
+    missing = [k for k in session_keys if str(k) not in manifest['sessions']]
+    if missing:
+        laps = fetch_laps(missing)
+        if not laps.empty:
+            added = add_sessions(laps, version)
+            print(f"Added {len(added)} session(s) to feature store v{version}.")
+        manifest = load_manifest(version)
+
+    stored = [k for k in session_keys if str(k) in manifest['sessions']]
+    ranges = [manifest['sessions'][str(k)] for k in stored]
+    rows = np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.empty(0, dtype=np.int64)
+    return FeatureMatrix(stored, rows, version, manifest)
+
+def stored_sessions(version=FEATURE_VERSION):
+    """Session keys already in the store."""
+    return sorted(int(k) for k in load_manifest(version)['sessions'])
+
+if __name__ == "__main__":
+    # Build (or extend) the store for every session in ml_training_data
+    keys = mlData.stored_session_keys()
+    if not keys:
+        print("No sessions in ml_training_data.")
+    else:
+        matrix = build_feature_matrix(keys)
+        print(f"Feature matrix: {len(matrix)} laps x {len(FEATURE_COLUMNS)} features from {len(matrix.session_keys)} sessions.")
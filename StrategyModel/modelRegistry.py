@@ -0,0 +1,111 @@
+import os
+import re
+import json
+import threading
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+import databaseManager as db
+
+# -------------------------------------------------------
+# Local model registry
+# -------------------------------------------------------
+# Trained models are versioned artifacts on disk: <name>/v<version>.npz holds the
+# numeric state (weights, covariance, scaling) and v<version>.json the metadata
+# (features, feature version, training sessions, metrics). Versions only ever go
+# up, so a prediction can always name the exact model that produced it. Loaded
+# artifacts are kept per process, so serving never re-reads the file.
+
+# --- CONFIGURATION ---
+# Registry folder (F1_MODEL_DIR overrides it); defaults to a folder next to the main DB
+MODEL_DIR = os.environ.get("F1_MODEL_DIR", os.path.join(os.path.dirname(db.DB_PATH), "models"))
+
+_model_cache = {}  # (name, version) -> (arrays, metadata)
+_cache_lock = threading.Lock()
+
+# ---------------------------
+# Paths
+# ---------------------------
+def _model_dir(name):
+    return os.path.join(MODEL_DIR, name)
+
+def list_versions(name):
+    """Saved versions of a model, oldest first."""
+    folder = _model_dir(name)
+    if not os.path.isdir(folder):
+        return []
+    versions = [int(m.group(1)) for f in os.listdir(folder) if (m := re.fullmatch(r"v(\d+)\.json", f))]
+    return sorted(versions)
+
+def latest_version(name):
+    """Newest saved version of a model, or None if it has never been saved."""
+    versions = list_versions(name)
+    return versions[-1] if versions else None
+
+# ---------------------------
+# Save / load
+# ---------------------------
+def save_model(name, arrays, metadata):
+    """
+    Saves a new version of a model: arrays (dict of numpy arrays) and JSON-serialisable metadata.
+    Returns the version number.
+    """
+    folder = _model_dir(name)
+    # Locked from picking the version number to writing it, so concurrent saves never share a version
+    with db.file_lock(folder):
+        version = (latest_version(name) or 0) + 1
+        metadata = {**metadata, 'name': name, 'version': version, 'created_at': datetime.now(timezone.utc).isoformat()}
+
+        # Arrays first, metadata last: a version only counts as saved once its JSON exists
+        np.savez(os.path.join(folder, f"v{version}.npz"), **arrays)
+        with open(os.path.join(folder, f"v{version}.json"), 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+    print(f"Saved model '{name}' version {version}.")
+    return version
+
+def load_model(name, version=None):
+    """
+    Returns (arrays, metadata) for a model version (latest if None), or (None, None) if there is none.
+    Each version is read from disk once per process.
+    """
+    version = version or latest_version(name)
+    if version is None:
+        return None, None
+    key = (name, int(version))
+    with _cache_lock:
+        if key not in _model_cache:
+            folder = _model_dir(name)
+            try:
+                with np.load(os.path.join(folder, f"v{version}.npz")) as data:
+                    arrays = {k: data[k] for k in data.files}
+                with open(os.path.join(folder, f"v{version}.json")) as f:
+                    metadata = json.load(f)
+            except FileNotFoundError:
+                print(f"Model '{name}' version {version} not found.")
+                return None, None
+            _model_cache[key] = (arrays, metadata)
+        return _model_cache[key]
+
+def list_models():
+    """Every saved model version with its main metadata, newest first."""
+    rows = []
+    if os.path.isdir(MODEL_DIR):
+        for name in sorted(os.listdir(MODEL_DIR)):
+            for version in list_versions(name):
+                _, metadata = load_model(name, version)
+                if metadata is None:
+                    continue
+                rows.append({
+                    'name': name,
+                    'version': version,
+                    'created_at': metadata.get('created_at'),
+                    'feature_version': metadata.get('feature_version'),
+                    'sessions': len(metadata.get('training_sessions', [])),
+                    'rows': metadata.get('rows'),
+                    **{f"metric_{k}": v for k, v in metadata.get('metrics', {}).items()},
+                })
+    if not rows:
+        return pd.DataFrame(columns=['name', 'version', 'created_at', 'feature_version', 'sessions', 'rows'])
+    return pd.DataFrame(rows).sort_values(['name', 'version'], ascending=[True, False]).reset_index(drop=True)
@@ -0,0 +1,152 @@
+import os
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
+import ingestHooks
+import featureMatrix
+import storeMLData as mlData
+import modelRegistry
+import degradationModel
+import pitModel
+import lapQuality
+
+# -------------------------------------------------------
+# Incremental model updates
+# -------------------------------------------------------
+# When a session is ingested, the models learn from its rows only:
+# - degradation: the pooled per-compound statistics (degradationModel) of the
+#   new session's laps (minus those lapQuality flagged) are added to the stored ones;
+# - pit stop: the current weights and covariance are the prior for a Newton
+#   update on the new rows (pitModel.update_pit_model).
+# Each update is a new registry version. There is no first model until MIN_SESSIONS
+# sessions are stored; it is then trained on all of them. The hook is only emitted
+# by the ingest sync (storeMLData.update_last_five_sessions), never on a page view;
+# sessions a page stored are caught up by the next sync (storeMLData.emit_pending_hooks).
+# A full retrain on the same sessions is available on demand; comparing the two
+# shows how far the online models drifted.
+
+# --- CONFIGURATION ---
+DEGRADATION_MODEL = "degradation"
+MIN_SESSIONS = 3                    # Stored sessions needed before a first model is trained
+DRIFT_PROBABILITY_TOLERANCE = 0.02  # Mean |online - retrained| pit probability reported as drift
+DRIFT_DEGRADATION_TOLERANCE = 0.01  # Seconds per lap of tyre age reported as drift
+
+# ---------------------------
+# Degradation statistics
+# ---------------------------
+def load_degradation_statistics(version=None):
+    """(statistics, metadata) of the stored degradation model; empty statistics and None if there is none."""
+    arrays, metadata = modelRegistry.load_model(DEGRADATION_MODEL, version)
+    if arrays is None:
+        return pd.DataFrame(0.0, index=featureMatrix.COMPOUNDS, columns=degradationModel.STAT_COLUMNS), None
+    return pd.DataFrame(arrays['statistics'], index=metadata['compounds'], columns=metadata['columns']), metadata
+
+def _save_degradation(stats, sessions, laps, base_version=None, update='online'):
+    pooled = degradationModel.pooled_degradation(stats)
+    return modelRegistry.save_model(DEGRADATION_MODEL, {'statistics': stats.to_numpy()}, {
+        'compounds': list(stats.index),
+        'columns': list(stats.columns),
+        'training_sessions': sessions,
+        'rows': int(laps),
+        'update': update,
+        'base_version': base_version,
+        'metrics': {f"deg_{c.lower()}": float(d) for c, d in zip(pooled['compound'], pooled['deg_per_lap'])},
+    })
+
+def update_degradation(session_keys, laps=None):
+    """
+    Adds the statistics of new sessions to the degradation model (sessions already in it are skipped).
+    laps (ml_training_data rows) saves reading them back from the DB. Without a model yet, nothing is
+    saved until MIN_SESSIONS sessions are stored, then every stored session is used. Returns the new version or None.
+    """
+    stats, metadata = load_degradation_statistics()
+    if metadata is None:
+        session_keys = mlData.stored_session_keys()
+        if len(session_keys) < MIN_SESSIONS:
+            return None
+        laps = None
+    seen = set(metadata['training_sessions']) if metadata else set()
+    new_keys = sorted({int(k) for k in session_keys} - seen)
+    if not new_keys:
+        return None
+    laps = featureMatrix.fetch_laps(new_keys) if laps is None else laps[laps['session_key'].astype(int).isin(new_keys)]
+    if laps.empty:
+        return None
+
+    stats = stats + degradationModel.degradation_statistics(laps, lap_flags=lapQuality.load_flags(new_keys))
+    return _save_degradation(stats, sorted(seen | set(new_keys)), (metadata or {}).get('rows', 0) + len(laps),
+                             (metadata or {}).get('version'))
+
+# ---------------------------
+# Ingest hook
+# ---------------------------
+def update_models(session_keys, laps=None):
+    """
+    Online update of both models with new sessions. The first pit model is trained in full on every
+    stored session, once there are MIN_SESSIONS of them (until then nothing is saved). So is a new
+    one when the latest was trained on other features (a FEATURE_VERSION bump).
+    """
+    deg_version = update_degradation(session_keys, laps)
+    if pitModel.load_pit_model()[0] is None:
+        stored = mlData.stored_session_keys()
+        pit_version = pitModel.train_pit_model(stored) if len(stored) >= MIN_SESSIONS else None
+    else:
+        pit_version = pitModel.update_pit_model(session_keys)
+    return {'degradation': deg_version, pitModel.MODEL_NAME: pit_version}
+
+@ingestHooks.register('session_ingested', ingestHooks.UPDATE_PRIORITY)
+def update_on_ingest(session_key, laps=None):
+    """Ingest hook: learns from the new session only (runs after it has been scored by pitModel)."""
+    versions = update_models([session_key], laps)
+    print(f"Online model update for session {session_key}: {versions}")
+
+# ---------------------------
+# Full retrain and drift
+# ---------------------------
+def retrain_and_check_drift(save=True):
+    """
+    Retrains both models from scratch on every session the online models have seen and compares
+    them: pit probabilities over all those laps, and the pooled degradation rate per compound.
+    With save=True the retrained models become the latest versions. Returns one row per check.
+    """
+    report = []
+
+    pit_arrays, pit_metadata = pitModel.load_pit_model()
+    if pit_arrays is not None:
+        sessions = pit_metadata['training_sessions']
+        full_arrays, full_metadata = pitModel.fit_pit_model(sessions, pit_metadata['l2'])
+        matrix = featureMatrix.build_feature_matrix(sessions)
+        online, _, _ = pitModel.predict_proba(pitModel.design_matrix(matrix.X, pit_arrays['mean'], pit_arrays['scale']),
+                                              pit_arrays['weights'], pit_arrays['covariance'])
+        full, _, _ = pitModel.predict_proba(pitModel.design_matrix(matrix.X, full_arrays['mean'], full_arrays['scale']),
+                                            full_arrays['weights'], full_arrays['covariance'])
+        y = np.asarray(matrix.target('pits_this_lap'), dtype=float)
+        drift = float(np.mean(np.abs(online - full)))
+        report.append({'model': pitModel.MODEL_NAME, 'check': 'mean |p online - p retrained|', 'item': 'all laps',
+                       'online': pitModel.classification_metrics(y, online)['log_loss'],
+                       'retrained': full_metadata['metrics']['log_loss'], 'difference': drift,
+                       'drift': drift > DRIFT_PROBABILITY_TOLERANCE})
+        if save:
+            modelRegistry.save_model(pitModel.MODEL_NAME, full_arrays, full_metadata)
+
+    stats, deg_metadata = load_degradation_statistics()
+    if deg_metadata is not None:
+        sessions = deg_metadata['training_sessions']
+        laps = featureMatrix.fetch_laps(sessions)
+        full_stats = degradationModel.degradation_statistics(laps, lap_flags=lapQuality.load_flags(sessions))
+        merged = pd.merge(degradationModel.pooled_degradation(stats), degradationModel.pooled_degradation(full_stats),
+                          on='compound', how='outer', suffixes=('_online', '_retrained'))
+        for row in merged.itertuples():
+            difference = abs(row.deg_per_lap_online - row.deg_per_lap_retrained)
+            report.append({'model': DEGRADATION_MODEL, 'check': 'deg_per_lap', 'item': row.compound,
+                           'online': row.deg_per_lap_online, 'retrained': row.deg_per_lap_retrained,
+                           'difference': difference, 'drift': bool(difference > DRIFT_DEGRADATION_TOLERANCE)})
+        if save:
+            _save_degradation(full_stats, sessions, len(laps), deg_metadata['version'], update='full')
+
+    return pd.DataFrame(report)
+
+if __name__ == "__main__":
+    print(retrain_and_check_drift(save=False).to_string(index=False))
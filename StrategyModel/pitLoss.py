@@ -0,0 +1,242 @@
+import os
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+import databaseManager as db
+import ingestHooks
+import telemetryPartitions as partitions
+import trackOutline
+import trackProjection
+import featureMatrix
+import storeMLData as mlData
+import strategySimulator
+
+# -------------------------------------------------------
+# Pit loss per circuit
+# -------------------------------------------------------
+# How much a pit stop costs at each circuit, measured two ways for every stop:
+# - pit lane time: the stored location stream is split into samples off the
+#   racing line and on the circuit's pit lane path, and each driver's run of such
+#   samples is one transit (timed from its first to its last sample);
+# - pit loss: in-lap + out-lap minus twice the driver's pace on the clean laps
+#   either side of the stop.
+# All samples of a session are classified at once (grid projection onto the
+# racing line, segment distances to the pit lane path), transits come from run
+# boundaries and the reference pace from a (drivers x laps) matrix, so there is
+# no per-sample or per-stop Python loop. Stops are stored per session when it is
+# ingested (the race data sync stores its telemetry first); their distribution
+# per circuit feeds the strategy tools.
+
+# --- CONFIGURATION ---
+PIT_LOSS_TABLE = "pit_losses"
+DEFAULT_PIT_LOSS = strategySimulator.PIT_LOSS_SECONDS  # Used for circuits without enough measured stops (s)
+PIT_PATH_TOLERANCE = 100    # Furthest a pit lane sample can be from the stored pit lane path (OpenF1 units)
+REFERENCE_LAPS = 3          # Clean laps either side of a stop that set the reference pace
+SLOW_LAP_FACTOR = 1.10      # Field slower than this x the session median on the in/out lap: stop was neutralised (SC/VSC)
+MIN_CIRCUIT_STOPS = 3       # Green-flag stops needed before a circuit's own median is used
+
+STOP_COLUMNS = ['session_key', 'circuit_key', 'driver_number', 'in_lap', 'pit_lane_time', 'in_lap_time',
+                'out_lap_time', 'reference_lap_time', 'pit_loss', 'neutralised']
+
+# ---------------------------
+# Registered queries
+# ---------------------------
+Q_CIRCUIT_STOPS = db.register_query('pit_losses_for_circuit', f"""
+    SELECT session_key, driver_number, in_lap, pit_lane_time, pit_loss
+    FROM {PIT_LOSS_TABLE}
+    WHERE circuit_key = :circuit_key AND neutralised = 0
+""", dtypes={'pit_lane_time': 'float64', 'pit_loss': 'float64'})
+
+Q_ALL_STOPS = db.register_query('pit_losses_all', f"""
+    SELECT {', '.join(STOP_COLUMNS)} FROM {PIT_LOSS_TABLE}
+""")
+
+# ---------------------------
+# Pit lane transits from telemetry
+# ---------------------------
+def pit_lane_samples(x, y, track, pit, projection=None):
+    """
+    True for samples in the pit lane: further than trackOutline.PIT_OFFSET_THRESHOLD from the racing
+    line and, when the circuit has a pit lane path, within PIT_PATH_TOLERANCE of it.
+    """
+    projection = projection or trackProjection.TrackProjection(track['x'].to_numpy(), track['y'].to_numpy())
+    _, offset = projection.project(x, y)
+    in_pit = offset > trackOutline.PIT_OFFSET_THRESHOLD
+    if pit is not None and len(pit) > 1 and in_pit.any():
+        # Only the off-line samples are measured against the pit lane path
+        candidates = np.flatnonzero(in_pit)
+        near = trackOutline.point_to_path_distance(x[candidates], y[candidates], pit['x'].to_numpy(), pit['y'].to_numpy())
+        in_pit[candidates[near > PIT_PATH_TOLERANCE]] = False
+    return in_pit
+
+def pit_transits(samples, in_pit, min_samples=trackOutline.PIT_MIN_SAMPLES):
+    """
+    One row per pit lane transit: runs of consecutive in_pit samples of the same driver.
+    samples need driver_number, lap_number and timestamp. Returns driver_number, entry_lap, exit_lap, pit_lane_time.
+    """
+    timestamp = pd.to_datetime(samples['timestamp'], utc=True)
+    time = (timestamp - timestamp.min()).dt.total_seconds().to_numpy()
+    driver = samples['driver_number'].to_numpy(dtype=np.int64)
+    order = np.lexsort((time, driver))
+    time, driver, in_pit = time[order], driver[order], np.asarray(in_pit)[order]
+    lap = samples['lap_number'].to_numpy(dtype=np.int64)[order]
+
+    same_driver_before = np.r_[False, driver[1:] == driver[:-1]]
+    same_driver_after = np.r_[driver[1:] == driver[:-1], False]
+    starts = np.flatnonzero(in_pit & ~(np.r_[False, in_pit[:-1]] & same_driver_before))
+    ends = np.flatnonzero(in_pit & ~(np.r_[in_pit[1:], False] & same_driver_after))
+    keep = ends - starts + 1 >= min_samples
+    starts, ends = starts[keep], ends[keep]
+    return pd.DataFrame({
+        'driver_number': driver[starts],
+        'entry_lap': lap[starts],
+        'exit_lap': lap[ends],
+        'pit_lane_time': time[ends] - time[starts],
+    })
+
+# ---------------------------
+# Time lost per stop from lap times
+# ---------------------------
+def stop_losses(laps):
+    """
+    Pit loss of every stop in one session's laps (ml_training_data rows): in-lap + out-lap minus twice
+    the median of up to REFERENCE_LAPS clean laps either side. Returns driver_number, in_lap, in_lap_time,
+    out_lap_time, reference_lap_time, pit_loss and neutralised.
+    """
+    drivers, d = np.unique(laps['driver_number'].to_numpy(dtype=np.int64), return_inverse=True)
+    lap = laps['lap_number'].to_numpy(dtype=np.int64)
+    # Columns are laps 0..max + REFERENCE_LAPS + 1 so every reference window stays in range
+    times = np.full((len(drivers), lap.max() + REFERENCE_LAPS + 2), np.nan)
+    times[d, lap] = pd.to_numeric(laps['lap_duration'], errors='coerce').to_numpy()
+    pit_out = np.zeros(times.shape, dtype=bool)
+    pit_out[d, lap] = pd.to_numeric(laps['is_pit_out_lap'], errors='coerce').fillna(0).to_numpy(dtype=bool)
+
+    out_d, out_lap = np.nonzero(pit_out)
+    stops = out_lap > 1  # Lap 1 "out laps" are starts from the pit lane, not stops
+    out_d, in_lap = out_d[stops], out_lap[stops] - 1
+
+    # Laps the whole field ran slowly (safety car / VSC); pandas medians skip NaN without warnings
+    field = pd.DataFrame(times).median(axis=0).to_numpy()
+    slow_lap = field > SLOW_LAP_FACTOR * np.nanmedian(field)
+
+    # Reference pace: clean laps (no lap 1, in/out laps or neutralised laps) around the stop
+    in_lap_flags = np.zeros(times.shape, dtype=bool)
+    in_lap_flags[:, :-1] = pit_out[:, 1:]
+    clean = np.where(pit_out | in_lap_flags | slow_lap[None, :], np.nan, times)
+    clean[:, :2] = np.nan
+
+    window = np.r_[-np.arange(REFERENCE_LAPS, 0, -1), np.arange(2, REFERENCE_LAPS + 2)]
+    columns = np.clip(in_lap[:, None] + window, 0, times.shape[1] - 1)
+    reference = pd.DataFrame(clean[out_d[:, None], columns]).median(axis=1).to_numpy() if len(in_lap) else np.empty(0)
+
+    in_time = times[out_d, in_lap]
+    out_time = times[out_d, in_lap + 1]
+    return pd.DataFrame({
+        'driver_number': drivers[out_d],
+        'in_lap': in_lap,
+        'in_lap_time': in_time,
+        'out_lap_time': out_time,
+        'reference_lap_time': reference,
+        'pit_loss': in_time + out_time - 2 * reference,
+        'neutralised': slow_lap[in_lap] | slow_lap[in_lap + 1],
+    })
+
+# ---------------------------
+# Sessions
+# ---------------------------
+def estimate_session(session_key, laps=None, samples=None, circuit_key=None):
+    """
+    Every stop of a session with its pit lane time (NaN without telemetry or a pit lane outline)
+    and pit loss. laps (ml_training_data rows) and samples (telemetry) are read from the DB if not given.
+    Returns STOP_COLUMNS.
+    """
+    laps = featureMatrix.fetch_laps([session_key]) if laps is None else laps
+    if laps.empty:
+        return pd.DataFrame(columns=STOP_COLUMNS)
+    circuit_key = trackOutline.resolve_circuit_key(session_key) if circuit_key is None else circuit_key
+    stops = stop_losses(laps)
+
+    samples = partitions.read_session(session_key) if samples is None else samples
+    outline = trackOutline.get_session_outline(session_key, circuit_key) if not samples.empty else None
+    if outline is not None and not outline['track'].empty:
+        cache_key = circuit_key if circuit_key is not None else ('session', session_key)
+        projection = trackProjection.get_projection(cache_key, outline['track'])
+        x, y = samples['x'].to_numpy(dtype=float), samples['y'].to_numpy(dtype=float)
+        transits = pit_transits(samples, pit_lane_samples(x, y, outline['track'], outline['pit'], projection))
+        # The timing line is in the pit lane, so a stop's transit enters on the in-lap
+        transits = transits.rename(columns={'entry_lap': 'in_lap'}).drop_duplicates(['driver_number', 'in_lap'])
+        stops = stops.merge(transits[['driver_number', 'in_lap', 'pit_lane_time']], on=['driver_number', 'in_lap'], how='left')
+    else:
+        stops['pit_lane_time'] = np.nan
+
+    stops['session_key'] = int(session_key)
+    stops['circuit_key'] = circuit_key
+    return stops[STOP_COLUMNS]
+
+def estimate_all(session_keys=None, store=True):
+    """
+    Pit stops of every given session (all sessions with lap data by default), stored in PIT_LOSS_TABLE
+    (replacing the sessions' earlier rows) when store is True. Returns STOP_COLUMNS.
+    """
+    if session_keys is None:
+        session_keys = mlData.stored_session_keys()
+    frames = [estimate_session(key) for key in session_keys]
+    stops = pd.concat([f for f in frames if not f.empty], ignore_index=True) if any(not f.empty for f in frames) \
+        else pd.DataFrame(columns=STOP_COLUMNS)
+    if store:
+        store_stops(stops)
+    return stops
+
+def store_stops(stops):
+    """Saves stops (STOP_COLUMNS) to PIT_LOSS_TABLE, replacing the earlier rows of their sessions."""
+    if stops.empty:
+        return
+    for key in stops['session_key'].unique():
+        db.execute_query(f"DELETE FROM {PIT_LOSS_TABLE} WHERE session_key = :s", {'s': int(key)})
+    db.save_to_db(stops.assign(neutralised=stops['neutralised'].astype(int)), PIT_LOSS_TABLE, if_exists='append')
+
+# ---------------------------
+# Distributions
+# ---------------------------
+def circuit_distribution(stops=None):
+    """Per-circuit summary of green-flag stops: count, median, spread and percentiles of pit loss and pit lane time."""
+    stops = db.query_df(Q_ALL_STOPS) if stops is None else stops
+    green = stops[~stops['neutralised'].astype(bool)] if not stops.empty else stops
+    if green.empty:
+        return pd.DataFrame(columns=['circuit_key', 'stops', 'pit_loss_median', 'pit_loss_std', 'pit_loss_p10',
+                                     'pit_loss_p90', 'pit_lane_time_median'])
+    return green.groupby('circuit_key').agg(
+        stops=('pit_loss', 'count'),
+        pit_loss_median=('pit_loss', 'median'),
+        pit_loss_std=('pit_loss', 'std'),
+        pit_loss_p10=('pit_loss', lambda s: s.quantile(0.10)),
+        pit_loss_p90=('pit_loss', lambda s: s.quantile(0.90)),
+        pit_lane_time_median=('pit_lane_time', 'median'),
+    ).reset_index()
+
+def circuit_pit_loss(circuit_key, default=DEFAULT_PIT_LOSS):
+    """Median green-flag pit loss at a circuit (s), or default with fewer than MIN_CIRCUIT_STOPS measured stops."""
+    if circuit_key is None:
+        return default
+    stops = db.query_df(Q_CIRCUIT_STOPS, {'circuit_key': int(circuit_key)})['pit_loss'].dropna()
+    return float(stops.median()) if len(stops) >= MIN_CIRCUIT_STOPS else default
+
+def session_pit_loss(session_key, default=DEFAULT_PIT_LOSS):
+    """Pit loss for the circuit a session was held at (see circuit_pit_loss)."""
+    return circuit_pit_loss(trackOutline.resolve_circuit_key(session_key), default)
+
+# ---------------------------
+# Ingest hook
+# ---------------------------
+@ingestHooks.register('session_ingested', ingestHooks.PIT_LOSS_PRIORITY)
+def estimate_on_ingest(session_key, laps=None):
+    """Ingest hook: measures the new session's pit stops and stores them."""
+    stops = estimate_session(session_key, laps if laps is not None and not laps.empty else None)
+    store_stops(stops)
+    print(f"Stored {len(stops)} pit stop(s) for session {session_key}.")
+
+if __name__ == "__main__":
+    stops = estimate_all()
+    print(circuit_distribution(stops).to_string(index=False))
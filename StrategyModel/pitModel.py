@@ -0,0 +1,267 @@
+import os
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
+import databaseManager as db
+import ingestHooks
+import featureMatrix
+import storeMLData as mlData
+import lapQuality
+import modelRegistry
+
+# -------------------------------------------------------
+# Pit-stop prediction
+# -------------------------------------------------------
+# Probability that a driver pits at the end of a lap (featureMatrix target
+# pits_this_lap), from an L2-regularised logistic regression on the standardised
+# feature matrix, fitted by Newton's method in NumPy. The inverse Hessian at the
+# optimum is kept as the weights' covariance, so every prediction gets a
+# confidence interval from the delta method. Models live in the registry;
+# a session's predictions are computed in one matrix product when it is ingested
+# and stored, so the replay only reads them.
+
+# --- CONFIGURATION ---
+MODEL_NAME = "pit_stop"
+PREDICTION_TABLE = "pit_predictions"
+L2_PENALTY = 1.0      # Prior precision of the (standardised) weights; the intercept is not penalised
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-8      # Newton step size at which the fit has converged
+CONFIDENCE_Z = 1.96   # 95% interval
+# Rows left out of training: a red flag sends every car down the pit lane, which reads as stops
+TRAINING_EXCLUDE = lapQuality.RED_FLAG
+
+PREDICTION_COLUMNS = ['session_key', 'driver_number', 'lap_number', 'model_name', 'model_version',
+                      'pit_probability', 'ci_low', 'ci_high']
+
+# ---------------------------
+# Registered queries
+# ---------------------------
+Q_PREDICTIONS = db.register_query('pit_predictions_for_session', f"""
+    SELECT driver_number, lap_number, model_version, pit_probability, ci_low, ci_high
+    FROM {PREDICTION_TABLE}
+    WHERE session_key = :session_key AND model_name = :model_name
+      AND model_version = (SELECT MAX(model_version) FROM {PREDICTION_TABLE}
+                           WHERE session_key = :session_key AND model_name = :model_name)
+    ORDER BY driver_number, lap_number
+""", dtypes={'driver_number': 'int16', 'lap_number': 'int16', 'pit_probability': 'float32',
+             'ci_low': 'float32', 'ci_high': 'float32'})
+
+# ---------------------------
+# Logistic regression
+# ---------------------------
+def _sigmoid(z):
+    return 0.5 * (1.0 + np.tanh(0.5 * z))  # Stable for large |z|
+
+def feature_scaling(features):
+    """Per-column mean and standard deviation ignoring NaN (0 and 1 for empty or constant columns)."""
+    features = np.asarray(features, dtype=float)
+    known = ~np.isnan(features)
+    count = np.maximum(known.sum(axis=0), 1)
+    mean = np.where(known, features, 0.0).sum(axis=0) / count
+    scale = np.sqrt(np.where(known, (features - mean) ** 2, 0.0).sum(axis=0) / count)
+    return mean, np.where(scale > 0, scale, 1.0)
+
+def design_matrix(features, mean, scale):
+    """Standardised features with an intercept column; missing values sit at the training mean (0)."""
+    z = (np.asarray(features, dtype=float) - mean) / scale
+    z[np.isnan(z)] = 0.0
+    return np.hstack([np.ones((len(z), 1)), z])
+
+def fit_logistic(X, y, l2=L2_PENALTY, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE,
+                 prior_mean=None, prior_precision=None):
+    """
+    Regularised logistic regression by Newton's method. X includes the intercept column.
+    By default the prior is N(0, I / l2) on every weight but the intercept (L2); prior_mean and
+    prior_precision (a full matrix) replace it, e.g. with a previous fit for an online update.
+    Returns (weights, covariance) where covariance is the inverse Hessian at the optimum.
+    """
+    if prior_precision is None:
+        penalty = np.full(X.shape[1], float(l2))
+        penalty[0] = 0.0
+        prior_precision = np.diag(penalty)
+    prior_mean = np.zeros(X.shape[1]) if prior_mean is None else np.asarray(prior_mean, dtype=float)
+    w = prior_mean.copy()
+    for _ in range(max_iterations):
+        p = _sigmoid(X @ w)
+        gradient = X.T @ (p - y) + prior_precision @ (w - prior_mean)
+        hessian = (X * (p * (1 - p))[:, None]).T @ X + prior_precision
+        step = np.linalg.solve(hessian, gradient)
+        w -= step
+        if np.abs(step).max() < tolerance:
+            break
+    p = _sigmoid(X @ w)
+    hessian = (X * (p * (1 - p))[:, None]).T @ X + prior_precision
+    return w, np.linalg.pinv(hessian)
+
+def predict_proba(X, weights, covariance):
+    """Probability with a CONFIDENCE_Z interval per row (delta method on the logit). Returns (p, low, high)."""
+    logit = X @ weights
+    se = np.sqrt(np.einsum('ij,jk,ik->i', X, covariance, X))
+    return _sigmoid(logit), _sigmoid(logit - CONFIDENCE_Z * se), _sigmoid(logit + CONFIDENCE_Z * se)
+
+def classification_metrics(y, p):
+    """Log loss, Brier score, ROC AUC (rank based) and positive rate."""
+    eps = 1e-12
+    log_loss = -np.mean(y * np.log(p + eps) + (1 - y) * np.log(1 - p + eps))
+    positives = y == 1
+    n_pos, n_neg = positives.sum(), (~positives).sum()
+    if n_pos and n_neg:
+        ranks = pd.Series(p).rank().to_numpy()
+        auc = (ranks[positives].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+    else:
+        auc = np.nan
+    return {'log_loss': float(log_loss), 'brier': float(np.mean((p - y) ** 2)),
+            'auc': float(auc), 'positive_rate': float(y.mean()) if len(y) else np.nan}
+
+# ---------------------------
+# Training
+# ---------------------------
+def fit_pit_model(session_keys, l2=L2_PENALTY):
+    """
+    Fits the pit model on the feature matrix of the given sessions (rows flagged TRAINING_EXCLUDE left out).
+    Returns (arrays, metadata) ready for the registry, or (None, None) if there is no data.
+    """
+    matrix = featureMatrix.build_feature_matrix(session_keys).without(TRAINING_EXCLUDE)
+    if len(matrix) == 0:
+        print("No training data for the pit model.")
+        return None, None
+
+    features = np.asarray(matrix.X, dtype=float)
+    y = np.asarray(matrix.target('pits_this_lap'), dtype=float)
+    mean, scale = feature_scaling(features)
+
+    X = design_matrix(features, mean, scale)
+    weights, covariance = fit_logistic(X, y, l2)
+    p, _, _ = predict_proba(X, weights, covariance)
+
+    return {
+        'weights': weights, 'covariance': covariance, 'mean': mean, 'scale': scale,
+    }, {
+        'features': featureMatrix.FEATURE_COLUMNS,
+        'feature_version': featureMatrix.FEATURE_VERSION,
+        'target': 'pits_this_lap',
+        'training_sessions': matrix.session_keys,
+        'rows': len(matrix),
+        'l2': l2,
+        'update': 'full',
+        'metrics_scope': 'training rows',
+        'metrics': classification_metrics(y, p),
+    }
+
+def train_pit_model(session_keys, l2=L2_PENALTY):
+    """Fits the pit model on the given sessions and saves it to the registry. Returns the new version (None without data)."""
+    arrays, metadata = fit_pit_model(session_keys, l2)
+    if arrays is None:
+        return None
+    return modelRegistry.save_model(MODEL_NAME, arrays, metadata)
+
+def update_pit_model(session_keys, version=None):
+    """
+    Online update of the pit model with new sessions only (Laplace approximation): the current
+    weights and their precision (inverse covariance) become the prior, and Newton's method
+    runs on the new rows alone. The scaling of the base model is kept, so versions stay comparable.
+    Sessions the model has already seen are skipped. Returns the new version (None if nothing changed).
+    """
+    arrays, metadata = load_pit_model(version)
+    if arrays is None:
+        print("No pit model to update; train one first.")
+        return None
+    new_keys = sorted({int(k) for k in session_keys} - set(metadata['training_sessions']))
+    matrix = featureMatrix.build_feature_matrix(new_keys).without(TRAINING_EXCLUDE)
+    if len(matrix) == 0:
+        return None
+
+    X = design_matrix(matrix.X, arrays['mean'], arrays['scale'])
+    y = np.asarray(matrix.target('pits_this_lap'), dtype=float)
+    # Scores of the current model on the unseen sessions, before it learns from them
+    before, _, _ = predict_proba(X, arrays['weights'], arrays['covariance'])
+    weights, covariance = fit_logistic(X, y, prior_mean=arrays['weights'],
+                                       prior_precision=np.linalg.pinv(arrays['covariance']))
+
+    return modelRegistry.save_model(MODEL_NAME, {
+        'weights': weights, 'covariance': covariance, 'mean': arrays['mean'], 'scale': arrays['scale'],
+    }, {
+        **{k: metadata[k] for k in ('features', 'feature_version', 'target', 'l2')},
+        'training_sessions': metadata['training_sessions'] + matrix.session_keys,
+        'rows': metadata['rows'] + len(matrix),
+        'update': 'online',
+        'base_version': metadata['version'],
+        'metrics_scope': 'new sessions, before the update',
+        'metrics': classification_metrics(y, before),
+    })
+
+# ---------------------------
+# Batch prediction
+# ---------------------------
+def load_pit_model(version=None):
+    """(arrays, metadata) of the pit model (latest version if None); (None, None) if none is registered."""
+    arrays, metadata = modelRegistry.load_model(MODEL_NAME, version)
+    if metadata is not None and metadata['features'] != featureMatrix.FEATURE_COLUMNS:
+        print(f"Pit model v{metadata['version']} was trained on feature version {metadata['feature_version']}; retrain it.")
+        return None, None
+    return arrays, metadata
+
+def predict_features(features, keys, version=None):
+    """
+    Scores every row of a feature matrix in one pass. keys holds (session_key, driver_number, lap_number)
+    per row. Returns PREDICTION_COLUMNS (empty if no model is registered).
+    """
+    arrays, metadata = load_pit_model(version)
+    if arrays is None or len(features) == 0:
+        return pd.DataFrame(columns=PREDICTION_COLUMNS)
+    X = design_matrix(features, arrays['mean'], arrays['scale'])
+    p, low, high = predict_proba(X, arrays['weights'], arrays['covariance'])
+    keys = np.asarray(keys)
+    return pd.DataFrame({
+        'session_key': keys[:, 0], 'driver_number': keys[:, 1], 'lap_number': keys[:, 2],
+        'model_name': MODEL_NAME, 'model_version': metadata['version'],
+        'pit_probability': p, 'ci_low': low, 'ci_high': high,
+    })
+
+def predict_laps(laps, version=None):
+    """Pit probabilities for every driver and lap in ml_training_data rows (one or more sessions)."""
+    features, _, keys = featureMatrix.lap_features(laps)
+    return predict_features(features, keys, version)
+
+def predict_sessions(session_keys, version=None):
+    """Pit probabilities for stored sessions, read from the feature store."""
+    matrix = featureMatrix.build_feature_matrix(session_keys)
+    return predict_features(matrix.X, matrix.lap_keys, version)
+
+# ---------------------------
+# Stored predictions
+# ---------------------------
+def store_predictions(predictions):
+    """Replaces the stored predictions of the sessions and model version in predictions."""
+    if predictions.empty:
+        return
+    for (session_key, version), _ in predictions.groupby(['session_key', 'model_version']):
+        db.execute_query(f"DELETE FROM {PREDICTION_TABLE} WHERE session_key = :s AND model_name = :m AND model_version = :v",
+                         {'s': int(session_key), 'm': MODEL_NAME, 'v': int(version)})
+    db.save_to_db(predictions[PREDICTION_COLUMNS], PREDICTION_TABLE, if_exists='append')
+
+def load_predictions(session_key):
+    """Stored predictions of the newest model version for a session (empty if none)."""
+    return db.query_df(Q_PREDICTIONS, {'session_key': int(session_key), 'model_name': MODEL_NAME})
+
+@ingestHooks.register('session_ingested', ingestHooks.PREDICT_PRIORITY)
+def predict_on_ingest(session_key, laps=None):
+    """Ingest hook: scores the new session with the current model and stores the predictions."""
+    if modelRegistry.latest_version(MODEL_NAME) is None:
+        return
+    predictions = predict_laps(laps) if laps is not None and not laps.empty else predict_sessions([session_key])
+    store_predictions(predictions)
+    print(f"Stored {len(predictions)} pit predictions for session {session_key}.")
+
+if __name__ == "__main__":
+    # Train on every stored session, then score them all
+    session_keys = mlData.stored_session_keys()
+    if not session_keys:
+        print("No sessions in ml_training_data.")
+    else:
+        version = train_pit_model(session_keys)
+        if version is not None:
+            print(modelRegistry.list_models().to_string(index=False))
+            store_predictions(predict_sessions(session_keys))
@@ -0,0 +1,230 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
+import degradationModel
+
+# -------------------------------------------------------
+# Monte Carlo strategy simulation
+# -------------------------------------------------------
+# Races are rolled out from a starting state (gaps, tyres, pace) to the flag as
+# arrays of shape (simulations x laps x drivers): deterministic lap times from
+# the compound degradation curves and each driver's pit plan, plus random lap
+# noise, pit losses and safety cars drawn for every simulation at once. Only the
+# running race time is carried lap to lap (safety cars bunch the field up, which
+# depends on the order at the time). Finishing positions are summarised as
+# distributions with confidence intervals; large runs can be split over a
+# process pool. Cars race on time alone: no overtaking difficulty, DNFs or
+# reactive pit calls.
+
+# --- CONFIGURATION ---
+DEFAULT_SIMULATIONS = 2000
+LAP_NOISE_SD = 0.3             # Random lap-to-lap variation (s)
+PACE_NOISE_SD = 0.1            # Per-simulation variation of each driver's pace (s/lap)
+PIT_LOSS_SECONDS = 22.0        # Default pit loss (see pitLoss for per-circuit values)
+PIT_LOSS_SD = 1.5
+SAFETY_CAR_PROBABILITY = 0.02  # Chance of a safety car starting on any lap
+SAFETY_CAR_LAPS = 4            # Laps a safety car stays out
+SAFETY_CAR_LAP_FACTOR = 1.4    # SC lap time as a multiple of the field's base lap time
+SAFETY_CAR_PIT_FACTOR = 0.5    # Share of the pit loss paid when stopping under the safety car
+SAFETY_CAR_GAP = 0.8           # Gap between cars once the field has bunched up behind the SC (s)
+CONFIDENCE_Z = 1.96            # 95% interval on the expected position
+POSITION_RANGE = (5, 95)       # Percentiles reported as each driver's likely range
+PARALLEL_MIN_SIMULATIONS = 20000  # Below this a process pool costs more than it saves
+DEFAULT_DEGRADATION = {        # Used for compounds without a fit: (base time offset, s/lap, curvature)
+    'SOFT': (0.0, 0.10, 0.0),
+    'MEDIUM': (0.4, 0.06, 0.0),
+    'HARD': (0.8, 0.035, 0.0),
+    'INTERMEDIATE': (8.0, 0.05, 0.0),
+    'WET': (12.0, 0.04, 0.0),
+}
+
+COMPOUNDS = list(DEFAULT_DEGRADATION)
+STATE_COLUMNS = ['driver', 'gap', 'compound', 'tyre_age', 'pace']
+RESULT_COLUMNS = ['driver', 'expected_position', 'ci_low', 'ci_high', 'position_low', 'position_high',
+                  'win_probability', 'podium_probability', 'mean_race_time']
+
+# ---------------------------
+# Inputs
+# ---------------------------
+def degradation_table(compounds=None):
+    """
+    (n_compounds x 3) array of base time offset, degradation per lap and curvature in COMPOUNDS order,
+    from a degradationModel.compound_degradation frame for one session (defaults fill the gaps).
+    Offsets are relative to the fastest compound so the table adds onto a driver's pace.
+    """
+    table = np.array([DEFAULT_DEGRADATION[c] for c in COMPOUNDS], dtype=float)
+    if compounds is not None and not compounds.empty:
+        fitted = compounds.set_index(compounds['compound'].astype(str).str.upper())
+        for i, c in enumerate(COMPOUNDS):
+            if c in fitted.index:
+                row = fitted.loc[c]
+                table[i] = (row['base_time'], row['deg_per_lap'], row['deg_curvature'])
+        known = [i for i, c in enumerate(COMPOUNDS) if c in fitted.index]
+        if known:
+            # Fitted base times are absolute lap times; defaults are already offsets
+            table[known, 0] -= table[known, 0].min()
+    return table
+
+def plan_arrays(state, plans, start_lap, total_laps):
+    """
+    Compound index, tyre age and pit flag for every (lap, driver) after start_lap, shape (laps x drivers).
+    plans maps driver -> [(lap, compound), ...]: the driver pits at the end of lap and leaves on compound.
+    """
+    laps = np.arange(start_lap + 1, total_laps + 1)
+    n_drivers = len(state)
+    compound = np.empty((len(laps), n_drivers), dtype=np.int64)
+    age = np.empty((len(laps), n_drivers), dtype=float)
+    pit = np.zeros((len(laps), n_drivers), dtype=bool)
+
+    for d, row in enumerate(state.itertuples(index=False)):
+        stops = sorted((int(lap), str(c).upper()) for lap, c in plans.get(row.driver, []) if start_lap < int(lap) < total_laps)
+        # Stint boundaries: each lap's stint is the number of stops made before it
+        stop_laps = np.array([lap for lap, _ in stops], dtype=np.int64)
+        stint = np.searchsorted(stop_laps, laps, side='left')
+        stint_compounds = np.array([COMPOUNDS.index(str(row.compound).upper()) if str(row.compound).upper() in COMPOUNDS else 1]
+                                   + [COMPOUNDS.index(c) if c in COMPOUNDS else 1 for _, c in stops])
+        stint_first_lap = np.concatenate(([start_lap + 1], stop_laps + 1))
+        stint_first_age = np.concatenate(([float(row.tyre_age) + 1], np.ones(len(stops))))
+
+        compound[:, d] = stint_compounds[stint]
+        age[:, d] = stint_first_age[stint] + laps - stint_first_lap[stint]
+        pit[stop_laps - start_lap - 1, d] = True
+    return compound, age, pit
+
+# ---------------------------
+# Rollout
+# ---------------------------
+def _rollout(seed, n_sims, base, compound, age, pit, gap, pace, degradation, fuel, params):
+    """Runs n_sims races; returns final race times (sims x drivers)."""
+    rng = np.random.default_rng(seed)
+    n_laps, n_drivers = compound.shape
+
+    # Deterministic lap times (laps x drivers), then the random parts for every simulation at once
+    # (float32: the noise is far coarser than its precision, and it halves the memory traffic)
+    offset, deg, curvature = degradation[compound, 0], degradation[compound, 1], degradation[compound, 2]
+    planned = (base + offset + deg * age + curvature * age ** 2 + pace + fuel[:, None]).astype(np.float32)
+    lap_times = rng.standard_normal((n_sims, n_laps, n_drivers), dtype=np.float32)
+    lap_times *= params['lap_noise_sd']
+    lap_times += planned
+    lap_times += rng.normal(0.0, params['pace_noise_sd'], (n_sims, 1, n_drivers)).astype(np.float32)
+
+    # Safety cars: a start on any lap covers it and the following SAFETY_CAR_LAPS - 1 laps
+    starts = rng.random((n_sims, n_laps)) < params['safety_car_probability']
+    count = np.cumsum(starts, axis=1)
+    behind = np.concatenate((np.zeros((n_sims, params['safety_car_laps']), dtype=count.dtype), count), axis=1)[:, :n_laps]
+    safety_car = (count - behind) > 0
+    sc_lap_time = base * params['safety_car_lap_factor'] + fuel
+    lap_times[safety_car] = np.broadcast_to(sc_lap_time, safety_car.shape)[safety_car][:, None]
+
+    # Pit losses are only drawn for the (lap, driver) cells where someone stops
+    stop_lap, stop_driver = np.nonzero(pit)
+    if len(stop_lap):
+        pit_loss = rng.normal(params['pit_loss'], params['pit_loss_sd'], (n_sims, len(stop_lap)))
+        pit_loss *= np.where(safety_car[:, stop_lap], params['safety_car_pit_factor'], 1.0)
+        lap_times[:, stop_lap, stop_driver] += pit_loss.astype(np.float32)
+
+    # Race time lap by lap: the field bunches up behind a safety car
+    race_time = np.broadcast_to(gap, (n_sims, n_drivers)).astype(float)  # Summed in float64
+    ranks = np.arange(n_drivers) * params['safety_car_gap']
+    for lap in range(n_laps):
+        race_time = race_time + lap_times[:, lap]
+        sc = safety_car[:, lap]
+        if sc.any():
+            order = np.argsort(race_time[sc], axis=1)
+            ordered = np.take_along_axis(race_time[sc], order, axis=1)
+            bunched = np.minimum(ordered, ordered[:, :1] + ranks)
+            rows = race_time[sc]
+            np.put_along_axis(rows, order, bunched, axis=1)
+            race_time[sc] = rows
+    return race_time
+
+def _rollout_chunk(args):
+    return _rollout(*args)
+
+def simulate(state, plans, start_lap, total_laps, compounds=None, base_lap_time=90.0, n_sims=DEFAULT_SIMULATIONS,
+             pit_loss=PIT_LOSS_SECONDS, pit_loss_sd=PIT_LOSS_SD, safety_car_probability=SAFETY_CAR_PROBABILITY,
+             seed=0, workers=None):
+    """
+    Simulates the rest of a race from start_lap to total_laps.
+    state: one row per driver with STATE_COLUMNS (gap to the leader in seconds, current compound and
+    tyre age, pace offset in s/lap). plans: driver -> [(lap, compound), ...]. compounds: a
+    degradationModel.compound_degradation frame (defaults otherwise).
+    workers > 1 splits the simulations over a process pool (only worth it for very large runs).
+    Returns (finishing positions, race times), both (simulations x drivers); position 1 is the winner.
+    """
+    compound, age, pit = plan_arrays(state, plans, start_lap, total_laps)
+    laps_to_go = total_laps - np.arange(start_lap + 1, total_laps + 1)
+    fuel = degradationModel.FUEL_SECONDS_PER_LAP * laps_to_go
+    params = {
+        'lap_noise_sd': LAP_NOISE_SD, 'pace_noise_sd': PACE_NOISE_SD, 'pit_loss': pit_loss, 'pit_loss_sd': pit_loss_sd,
+        'safety_car_probability': safety_car_probability, 'safety_car_laps': SAFETY_CAR_LAPS,
+        'safety_car_lap_factor': SAFETY_CAR_LAP_FACTOR, 'safety_car_pit_factor': SAFETY_CAR_PIT_FACTOR,
+        'safety_car_gap': SAFETY_CAR_GAP,
+    }
+    inputs = (float(base_lap_time), compound, age, pit, state['gap'].to_numpy(dtype=float),
+              state['pace'].to_numpy(dtype=float), degradation_table(compounds), fuel, params)
+
+    if workers and workers > 1 and n_sims >= PARALLEL_MIN_SIMULATIONS:
+        # Independent streams per chunk, so the result does not depend on scheduling
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        sizes = np.diff(np.linspace(0, n_sims, workers + 1).astype(int))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            race_time = np.vstack(list(pool.map(_rollout_chunk, [(s, n) + inputs for s, n in zip(seeds, sizes)])))
+    else:
+        race_time = _rollout(seed, n_sims, *inputs)
+    return race_time.argsort(axis=1).argsort(axis=1) + 1, race_time
+
+# ---------------------------
+# Results
+# ---------------------------
+def summarise(state, positions, race_time=None):
+    """Finishing-position distribution per driver (RESULT_COLUMNS), best expected position first."""
+    n_sims = len(positions)
+    mean = positions.mean(axis=0)
+    half_width = CONFIDENCE_Z * positions.std(axis=0, ddof=1) / np.sqrt(n_sims) if n_sims > 1 else np.zeros(len(mean))
+    low, high = np.percentile(positions, POSITION_RANGE, axis=0)
+    summary = pd.DataFrame({
+        'driver': state['driver'].to_numpy(),
+        'expected_position': mean,
+        'ci_low': mean - half_width,
+        'ci_high': mean + half_width,
+        'position_low': low.astype(int),
+        'position_high': high.astype(int),
+        'win_probability': (positions == 1).mean(axis=0),
+        'podium_probability': (positions <= 3).mean(axis=0),
+        'mean_race_time': race_time.mean(axis=0) if race_time is not None else np.nan,
+    })
+    return summary.sort_values('expected_position').reset_index(drop=True)
+
+def compare_plans(state, driver, candidate_plans, plans, start_lap, total_laps, **kwargs):
+    """
+    What-if: the driver's finishing position under each candidate plan, everyone else on plans.
+    Every candidate uses the same random draws (same seed), so differences come from the plan alone.
+    Returns one row per candidate with the driver's RESULT_COLUMNS.
+    """
+    rows = []
+    for name, candidate in candidate_plans.items():
+        positions, race_time = simulate(state, {**plans, driver: candidate}, start_lap, total_laps, **kwargs)
+        summary = summarise(state, positions, race_time)
+        rows.append(summary[summary['driver'] == driver].assign(plan=name))
+    result = pd.concat(rows, ignore_index=True)
+    return result[['plan'] + RESULT_COLUMNS].sort_values('expected_position').reset_index(drop=True)
+
+if __name__ == "__main__":
+    # Quick what-if on a synthetic 20-car field
+    rng = np.random.default_rng(1)
+    state = pd.DataFrame({
+        'driver': np.arange(1, 21), 'gap': np.sort(rng.uniform(0, 30, 20)), 'compound': 'MEDIUM',
+        'tyre_age': 15, 'pace': rng.normal(0, 0.3, 20),
+    })
+    plans = {d: [(30, 'HARD')] for d in state['driver']}
+    import time
+    start = time.perf_counter()
+    result = compare_plans(state, 5, {'Stop lap 25': [(25, 'HARD')], 'Stop lap 30': [(30, 'HARD')],
+                                      'Two stops': [(25, 'SOFT'), (42, 'SOFT')]},
+                           plans, start_lap=15, total_laps=57)
+    print(result.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    print(f"\n{len(result)} plans x {DEFAULT_SIMULATIONS} races in {time.perf_counter() - start:.2f}s")
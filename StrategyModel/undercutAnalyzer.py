@@ -0,0 +1,185 @@
+import os
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DataCollection')))
+import featureMatrix
+import storeMLData as mlData
+import degradationModel
+import strategySimulator
+import pitLoss
+
+# -------------------------------------------------------
+# Undercut / overcut analysis
+# -------------------------------------------------------
+# For every lap and every pair of cars running next to each other on the road
+# (ahead, behind), estimates whether the car behind could pass the car ahead
+# through the pit stops:
+# - undercut: behind stops at the end of the lap, ahead stays out UNDERCUT_LAPS
+#   more laps on its old tyres before responding;
+# - overcut: ahead stops at the end of the lap, behind stays out UNDERCUT_LAPS
+#   more laps while the car ahead warms up its new tyres.
+# The margin is the tyre time gained minus the gap (> 0: the move works). The
+# pit loss gives the number of cars the stopping car rejoins behind. Everything is
+# built as (laps x drivers) matrices from ml_training_data laps, so all
+# (lap, pair) combinations are computed in one pass.
+
+# --- CONFIGURATION ---
+UNDERCUT_LAPS = 1           # Laps the other car stays out before responding
+WARM_UP_PENALTY = 1.0       # Time lost on an out-lap while new tyres come up to temperature (s)
+FRESH_TYRE_AGE = 1          # Age of a new set on its out-lap
+PIT_LOSS_SECONDS = strategySimulator.PIT_LOSS_SECONDS
+
+PAIR_COLUMNS = ['lap_number', 'position', 'driver_number', 'ahead_driver_number', 'gap',
+                'compound', 'ahead_compound', 'tyre_age', 'ahead_tyre_age', 'age_difference',
+                'deg_per_lap', 'ahead_deg_per_lap', 'deg_delta', 'pit_loss', 'rejoin_places_lost',
+                'undercut_gain', 'undercut_margin', 'undercut_viable', 'overcut_gain', 'overcut_margin', 'overcut_viable']
+
+# ---------------------------
+# Inputs
+# ---------------------------
+def compound_rates(laps):
+    """Degradation (s/lap of tyre age) per compound in featureMatrix.COMPOUNDS order: the session's pooled fit, defaults elsewhere."""
+    rates = np.array([strategySimulator.DEFAULT_DEGRADATION[c][1] for c in featureMatrix.COMPOUNDS])
+    pooled = degradationModel.pooled_degradation(degradationModel.degradation_statistics(laps))
+    pooled = pooled[pooled['laps'] >= degradationModel.MIN_STINT_LAPS * 2]
+    for compound, rate in zip(pooled['compound'], pooled['deg_per_lap']):
+        rates[featureMatrix.COMPOUNDS.index(compound)] = max(rate, 0.0)
+    return rates
+
+def lap_matrices(laps):
+    """
+    (drivers x laps) matrices from one session's laps: end of each lap in seconds from the first lap
+    start, tyre age, compound index (-1 unknown) and pit in-lap flags. Lap l is column l - 1.
+    Returns (driver_numbers, matrices dict).
+    """
+    drivers, d = np.unique(laps['driver_number'].to_numpy(dtype=np.int64), return_inverse=True)
+    lap = laps['lap_number'].to_numpy(dtype=np.int64) - 1
+    shape = (len(drivers), int(lap.max()) + 2)  # One spare column so lap l + 1 always exists
+
+    def matrix(values, fill=np.nan, dtype=float):
+        out = np.full(shape, fill, dtype=dtype)
+        out[d, lap] = values
+        return out
+
+    start_time = pd.to_datetime(laps['date_start'], utc=True, format='mixed')
+    start = matrix((start_time - start_time.min()).dt.total_seconds().to_numpy())
+    duration = matrix(pd.to_numeric(laps['lap_duration'], errors='coerce').to_numpy())
+    # A lap ends when the next one starts; the recorded duration covers a driver's last lap
+    end = np.where(np.isnan(start[:, 1:]), start[:, :-1] + duration[:, :-1], start[:, 1:])
+    end = np.hstack([end, np.full((shape[0], 1), np.nan)])
+
+    compound = laps['tire_compound'].astype(str).str.upper()
+    compound_index = compound.map({c: i for i, c in enumerate(featureMatrix.COMPOUNDS)}).fillna(-1).to_numpy(dtype=np.int64)
+    pit_out = matrix(pd.to_numeric(laps['is_pit_out_lap'], errors='coerce').fillna(0).to_numpy(dtype=bool), False, bool)
+    in_lap = np.zeros(shape, dtype=bool)
+    in_lap[:, :-1] = pit_out[:, 1:]
+
+    return drivers, {
+        'end': end,
+        'age': matrix(pd.to_numeric(laps['laps_on_tire'], errors='coerce').to_numpy()),
+        'compound': matrix(compound_index, -1, np.int64),
+        'pit': pit_out | in_lap,  # Laps on which a stop is already happening
+    }
+
+# ---------------------------
+# Analysis
+# ---------------------------
+def analyze_pairs(laps, pit_loss=PIT_LOSS_SECONDS, undercut_laps=UNDERCUT_LAPS, rates=None):
+    """
+    Undercut and overcut margins for every (lap, adjacent pair) of one session's laps
+    (ml_training_data rows). Pairs on laps where either car is already pitting are left out.
+    Returns PAIR_COLUMNS, one row per lap and car with a car ahead.
+    """
+    if laps is None or laps.empty:
+        return pd.DataFrame(columns=PAIR_COLUMNS)
+    rates = compound_rates(laps) if rates is None else rates
+    drivers, m = lap_matrices(laps)
+    n_drivers, n_laps = m['end'].shape
+
+    # Running order at the end of every lap: sort each lap's end times (missing ones last)
+    end_by_lap = m['end'].T
+    order = np.argsort(end_by_lap, axis=1, kind='stable')
+    sorted_end = np.take_along_axis(end_by_lap, order, axis=1)
+    ahead, behind = order[:, :-1], order[:, 1:]
+    lap_index = np.broadcast_to(np.arange(n_laps)[:, None], ahead.shape)
+    gap = sorted_end[:, 1:] - sorted_end[:, :-1]
+
+    def pair(matrix):
+        return matrix[ahead, lap_index], matrix[behind, lap_index]
+
+    age_a, age_b = pair(m['age'])
+    comp_a, comp_b = pair(m['compound'])
+    pit_a, pit_b = pair(m['pit'])
+    rate_a = np.where(comp_a >= 0, rates[np.maximum(comp_a, 0)], np.nan)
+    rate_b = np.where(comp_b >= 0, rates[np.maximum(comp_b, 0)], np.nan)
+
+    # Tyre time over the next k laps: old tyres keep ageing, a new set starts at FRESH_TYRE_AGE
+    j = np.arange(undercut_laps)
+    old_a = (rate_a[..., None] * (age_a[..., None] + 1 + j)).sum(axis=-1)
+    old_b = (rate_b[..., None] * (age_b[..., None] + 1 + j)).sum(axis=-1)
+    new_a = (rate_a[..., None] * (FRESH_TYRE_AGE + j)).sum(axis=-1)
+    new_b = (rate_b[..., None] * (FRESH_TYRE_AGE + j)).sum(axis=-1)
+    undercut_gain = old_a - new_b - WARM_UP_PENALTY
+    overcut_gain = WARM_UP_PENALTY + new_a - old_b
+
+    # Cars the stopping car (behind) drops behind: those within the pit loss behind it on the road.
+    # Rows are offset so one searchsorted on the flattened order answers every lap at once.
+    span = np.nanmax(sorted_end) + pit_loss + 1 if np.isfinite(sorted_end).any() else 1.0
+    offset = (np.arange(n_laps) * 2 * span)[:, None]
+    flat = (np.where(np.isnan(sorted_end), span, sorted_end) + offset).ravel()
+    position = np.arange(1, n_drivers)[None, :]
+    rejoin = np.searchsorted(flat, (sorted_end[:, 1:] + pit_loss + offset).ravel(), side='right').reshape(gap.shape)
+    places_lost = rejoin - (lap_index * n_drivers + position + 1)
+
+    valid = ~np.isnan(gap) & ~pit_a & ~pit_b
+    lap_i, k = np.nonzero(valid)
+    take = (lap_i, k)
+    undercut_margin = undercut_gain - gap
+    overcut_margin = overcut_gain - gap
+    names = np.array(featureMatrix.COMPOUNDS + ['UNKNOWN'], dtype=object)
+    result = pd.DataFrame({
+        'lap_number': lap_i + 1,
+        'position': k + 2,
+        'driver_number': drivers[behind[take]],
+        'ahead_driver_number': drivers[ahead[take]],
+        'gap': gap[take],
+        'compound': names[comp_b[take]],
+        'ahead_compound': names[comp_a[take]],
+        'tyre_age': age_b[take],
+        'ahead_tyre_age': age_a[take],
+        'age_difference': (age_a - age_b)[take],
+        'deg_per_lap': rate_b[take],
+        'ahead_deg_per_lap': rate_a[take],
+        # Time the ahead car's tyres currently cost it relative to the car behind
+        'deg_delta': (rate_a * age_a - rate_b * age_b)[take],
+        'pit_loss': pit_loss,
+        'rejoin_places_lost': places_lost[take],
+        'undercut_gain': undercut_gain[take],
+        'undercut_margin': undercut_margin[take],
+        'undercut_viable': (undercut_margin > 0)[take],
+        'overcut_gain': overcut_gain[take],
+        'overcut_margin': overcut_margin[take],
+        'overcut_viable': (overcut_margin > 0)[take],
+    })
+    return result[PAIR_COLUMNS]
+
+def analyze_session(session_key, pit_loss=None, undercut_laps=UNDERCUT_LAPS):
+    """analyze_pairs for a stored session (ml_training_data); pit_loss defaults to the circuit's measured value (pitLoss)."""
+    if pit_loss is None:
+        pit_loss = pitLoss.session_pit_loss(session_key)
+    return analyze_pairs(featureMatrix.fetch_laps([session_key]), pit_loss, undercut_laps)
+
+def margin_grid(pairs, value='undercut_margin', driver_col='driver_number'):
+    """(drivers x laps) table of one result column for a heatmap; the driver (driver_col) is the car behind."""
+    if pairs.empty:
+        return pd.DataFrame()
+    return pairs.pivot_table(index=driver_col, columns='lap_number', values=value, aggfunc='first')
+
+if __name__ == "__main__":
+    keys = mlData.stored_session_keys()
+    if not keys:
+        print("No sessions in ml_training_data.")
+    else:
+        pairs = analyze_session(keys[-1])
+        print(pairs[pairs['undercut_viable']].head(20).to_string(index=False))
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------
+# Shared scaffolding for the benchmark and validation scripts
+# -------------------------------------------------------
+# Importing this module puts the project folders on the path. Scripts that touch
+# the DB call scratch_environment() before importing anything that opens it, so
+# databaseManager, the feature store and the registry never see the real files.
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for folder in ('DatabaseConnection', 'DataCollection', 'StrategyModel'):
+    path = os.path.join(REPO_DIR, folder)
+    if path not in sys.path:
+        sys.path.append(path)
+
+def scratch_environment(prefix):
+    """Points the DB, telemetry partitions, feature store, registry and experiment log at a new temp folder."""
+    scratch = tempfile.mkdtemp(prefix=prefix)
+    os.environ['F1_DB_PATH'] = os.path.join(scratch, "bench.db")
+    os.environ['F1_FEATURE_DIR'] = os.path.join(scratch, "features")
+    os.environ['F1_MODEL_DIR'] = os.path.join(scratch, "models")
+    os.environ['F1_EXPERIMENT_LOG'] = os.path.join(scratch, "experiments.jsonl")
+    # Partitions default to a folder next to the DB, i.e. inside the scratch folder
+    os.environ.pop('F1_TELEMETRY_DIR', None)
+    return scratch
+
+def median_time(func, repeats=3):
+    """Runs func repeats times. Returns (median seconds, result of the last run)."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), result
+
+def check(condition, message):
+    """Prints message as a failure when condition is false. Returns the condition."""
+    if not condition:
+        print(f"ERR: {message}")
+    return bool(condition)
+
+def finish(passed, success, failure):
+    """Prints the SUCCESS / ERR line and exits with the matching status."""
+    print(f"\nSUCCESS: {success}" if passed else f"\nERR: {failure}")
+    sys.exit(0 if passed else 1)
+
+def make_laps(num_races, num_drivers, num_laps, stops=(1, 2), stop_laps=(10, 5),
+              compounds=('SOFT', 'MEDIUM', 'HARD'), seed=0, first_session_key=9000):
+    """
+    Synthetic ml_training_data tyre columns for a season: every driver of every race runs num_laps laps,
+    pitting stops[0]..stops[1] times at random laps in [stop_laps[0], num_laps - stop_laps[1]), each stint on
+    a random compound. Returns session_key, driver_number, lap_number, tire_compound, laps_on_tire (1 on a
+    stint's first lap) and is_pit_out_lap (the lap after a stop); scripts add their own lap times.
+    """
+    rng = np.random.default_rng(seed)
+    laps = np.arange(1, num_laps + 1)
+    frames = []
+    for race in range(num_races):
+        for driver in range(1, num_drivers + 1):
+            n_stops = rng.integers(stops[0], stops[1] + 1)
+            stop = np.sort(rng.choice(np.arange(stop_laps[0], num_laps - stop_laps[1]), n_stops, replace=False))
+            # The in-lap (lap == stop) still belongs to the stint before the stop
+            stint = np.searchsorted(stop, laps, side='left')
+            frames.append(pd.DataFrame({
+                'session_key': first_session_key + race, 'driver_number': driver, 'lap_number': laps,
+                'tire_compound': np.asarray(compounds)[rng.integers(0, len(compounds), n_stops + 1)][stint],
+                'laps_on_tire': (laps - np.r_[0, stop][stint]).astype(float),
+                'is_pit_out_lap': np.isin(laps, stop + 1),
+            }))
+    return pd.concat(frames, ignore_index=True)
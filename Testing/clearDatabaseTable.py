@@ -6,33 +6,46 @@ from sqlalchemy import text
 # Add the path to your databaseManager
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'DatabaseConnection')))
 import databaseManager as db
+import telemetryPartitions as partitions
 
 # --- CONFIGURATION ---
 # CHANGE THIS to the session you want to delete
-SESSION_TO_DELETE = 9939 
+SESSION_TO_DELETE = 9939
+VACUUM_AFTER_DELETE = True  # Shrink the main DB file afterwards
 
 def clear_session_data(session_key):
     print(f"Attempting to delete data for Session {session_key}")
-    
-    tables_to_clean = ['ml_training_data', 'race_telemetry']
-    
+
+    # Lap data lives in the main DB (a few thousand rows per session)
+    tables_to_clean = ['ml_training_data']
+
     try:
         # Open a connection and begin a transaction
         with db.engine.connect() as conn:
             for table in tables_to_clean:
                 # Construct the delete query
                 query = text(f"DELETE FROM {table} WHERE session_key = :key")
-                
+
                 # Execute
                 result = conn.execute(query, {"key": session_key})
-                
+
                 # result.rowcount tells us how many rows were removed
                 print(f"Table '{table}': Deleted {result.rowcount} rows.")
-            
+
             # Commit the changes to the file
             conn.commit()
             print("Deletion complete. Database committed.")
-            
+
+        # Telemetry is a per-session file, so removing it is a constant-time drop
+        if partitions.drop_partition(session_key):
+            print(f"Telemetry partition for session {session_key} removed.")
+        else:
+            print(f"No telemetry partition found for session {session_key}.")
+
+        if VACUUM_AFTER_DELETE:
+            db.vacuum()
+            print("Database vacuumed.")
+
     except Exception as e:
         print(f"Error deleting data: {e}")
 
@@ -40,12 +53,12 @@ if __name__ == "__main__":
     # Check if DB exists first
     if db.test_db_connection():
         clear_session_data(SESSION_TO_DELETE)
-        
+
         # Verification check
         print("\nVerification")
-        df = db.load_from_db(f"SELECT count(*) as count FROM ml_training_data WHERE session_key = {SESSION_TO_DELETE}")
+        df = db.load_from_db("SELECT count(*) as count FROM ml_training_data WHERE session_key = :key", {"key": SESSION_TO_DELETE})
         count = df.iloc[0]['count'] if not df.empty else 0
-        if count == 0:
+        if count == 0 and not partitions.has_partition(SESSION_TO_DELETE):
             print(f"Session {SESSION_TO_DELETE} is successfully gone.")
         else:
-            print(f"Warning: {count} rows still remain.")
\ No newline at end of file
+            print(f"Warning: {count} rows still remain.")
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+
+import benchmarkUtils as bench
+# Store, DB and experiment log go to a scratch folder, never the real ones
+bench.scratch_environment("cv_benchmark_")
+import featureMatrix
+import crossValidation as cv
+
+# --- CONFIGURATION ---
+# A synthetic season in the feature store: lap time depends on tyre age and compound
+NUM_RACES = 24
+NUM_DRIVERS = 20
+NUM_LAPS = 60                 # 24 x 20 x 60 ~ 29k laps
+DEG = {'SOFT': 0.10, 'MEDIUM': 0.06, 'HARD': 0.03}
+NOISE = 0.4
+GRID = {'alpha': [0.01, 1.0, 100.0, 1e4, 1e5, 1e6, 1e7, 1e8]}  # The largest ones are poor and can stop early
+MIN_SPEEDUP_PER_CORE = 0.6    # Parallel search must reach this share of linear scaling (skipped on one core)
+
+# ---------------------------
+# Synthetic season
+# ---------------------------
+def make_season():
+    laps = bench.make_laps(NUM_RACES, NUM_DRIVERS, NUM_LAPS, stops=(1, 1), stop_laps=(15, 15), compounds=list(DEG))
+    rng = np.random.default_rng(1)
+    # Circuits differ, so sessions are genuinely grouped
+    base = rng.uniform(75, 100, NUM_RACES)[(laps['session_key'] - 9000).to_numpy()]
+    noise = rng.normal(0, NOISE, len(laps))
+    return laps.assign(
+        lap_duration=base + laps['tire_compound'].map(DEG) * laps['laps_on_tire'] - 0.06 * laps['lap_number'] + noise,
+        track_temperature=base / 2 + rng.normal(0, 1, len(laps)), air_temperature=25.0, humidity=50.0, rainfall=0.0,
+    )
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    laps = make_season()
+    featureMatrix.add_sessions(laps)
+    keys = sorted(laps['session_key'].unique())
+    matrix = featureMatrix.build_feature_matrix(keys)
+    print(f"Synthetic season: {NUM_RACES} races, {len(matrix)} laps, {len(cv.param_grid(GRID))} configurations x {cv.N_FOLDS} folds")
+
+    # Folds never share a session
+    groups = np.asarray(matrix.groups)
+    leak = any(np.intersect1d(groups[train], groups[test]).size for train, test in cv.group_folds(groups))
+
+    # At least two workers, so the process pool path is always exercised
+    cores = os.cpu_count() or 1
+    workers = max(cores, 2)
+    serial_s, serial = bench.median_time(
+        lambda: cv.run_search(keys, 'lap_time', GRID, workers=1, early_stop=False, log_path=None), repeats=1)
+    parallel_s, parallel = bench.median_time(
+        lambda: cv.run_search(keys, 'lap_time', GRID, workers=workers, early_stop=False, log_path=None), repeats=1)
+
+    early = cv.run_search(keys, 'lap_time', GRID, workers=1)
+    # A worker per configuration: early stopping must still work when nothing waits for a worker
+    early_parallel = cv.run_search(keys, 'lap_time', GRID, workers=len(cv.param_grid(GRID)), log_path=None)
+    same = np.allclose(serial['score'].to_numpy(), parallel['score'].to_numpy())
+    logged = len(cv.load_experiments())
+    speedup = serial_s / parallel_s
+
+    print(early.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    print(f"\nSerial {serial_s:.2f}s, {workers} worker(s) {parallel_s:.2f}s (speedup x{speedup:.2f}); "
+          f"{int(early['stopped_early'].sum())} configuration(s) stopped early serially, "
+          f"{int(early_parallel['stopped_early'].sum())} with a worker each; {logged} rows logged; fold leak: {leak}")
+    if cores < 2:
+        print(f"SKIPPED: scaling check needs at least 2 cores ({cores} available)")
+        scaled = True
+    else:
+        scaled = bench.check(speedup >= MIN_SPEEDUP_PER_CORE * min(cores, len(cv.param_grid(GRID))),
+                             f"Speedup x{speedup:.2f} on {cores} cores is below {MIN_SPEEDUP_PER_CORE:.0%} of linear")
+    return not leak and same and scaled and early['stopped_early'].any() and early_parallel['stopped_early'].any() \
+        and logged == len(early)
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 "Grouped folds, parallel results match serial, poor configurations stopped early.",
+                 "Folds leaked, results differ, scaling too low or nothing stopped early.")
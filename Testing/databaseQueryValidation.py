@@ -116,7 +116,7 @@ def test_storage_and_validation():
     # Load the data from DB
     print(f"\nLoading Data from Database for Session {SESSION_KEY}")
     # Ensure table name matches what is saved to the table
-    db_df = db.load_from_db(f"SELECT * FROM race_telemetry WHERE session_key = {SESSION_KEY}")
+    db_df = rd.fetchFromDB(SESSION_KEY)
     
     # Add Cool-down to prevent 429 Errors
     print("\nCooling down API for 10 seconds before verification fetch...")
@@ -136,7 +136,7 @@ def check_for_last_5_races():
         print("Database connection successful.")
         recent_races = rd.tableOfRaces().head(5)
         for _, race in recent_races.iterrows():
-            if db.load_from_db(f"SELECT * FROM race_telemetry WHERE session_key = {race['session_key']}").empty:
+            if not rd.partitions.has_partition(race['session_key']):
                 print(f"Race {race['session_key']} not found in database. Fetching...")
                 all_data_present = False
             else:
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+import benchmarkUtils as bench
+import degradationModel
+
+# --- CONFIGURATION ---
+# A synthetic season of ml_training_data laps with known degradation per compound
+NUM_RACES = 22
+NUM_DRIVERS = 20
+NUM_LAPS = 57                 # 22 x 20 x 57 ~ 25k laps
+BASE_LAP = 90.0
+TRUE_DEG = {'SOFT': 0.12, 'MEDIUM': 0.07, 'HARD': 0.04}  # Seconds per lap of tyre age
+NOISE = 0.25                  # Lap-to-lap noise (s)
+SAFETY_CAR_RATE = 0.3         # Share of races with a 4-lap safety car
+REPEATS = 3
+TARGET_SECONDS = 1.0          # Whole-season fit must finish within this
+MAX_DEG_ERROR = 0.01          # Largest accepted error of the per-compound median (s/lap)
+
+# ---------------------------
+# Synthetic season
+# ---------------------------
+def make_season():
+    laps = bench.make_laps(NUM_RACES, NUM_DRIVERS, NUM_LAPS, stop_laps=(12, 8), compounds=list(TRUE_DEG))
+    rng = np.random.default_rng(1)
+    lap = laps['lap_number']
+    fuel = degradationModel.FUEL_SECONDS_PER_LAP * (NUM_LAPS - lap)
+    lap_time = BASE_LAP + laps['tire_compound'].map(TRUE_DEG) * laps['laps_on_tire'] + fuel + rng.normal(0, NOISE, len(laps))
+
+    # A 4-lap safety car in some races
+    sc_start = np.where(rng.random(NUM_RACES) < SAFETY_CAR_RATE, rng.integers(10, NUM_LAPS - 10, NUM_RACES), -100)
+    sc_start = sc_start[(laps['session_key'] - 9000).to_numpy()]
+    lap_time = lap_time.where((lap < sc_start) | (lap >= sc_start + 4), lap_time * 1.4)
+
+    # Slow pit out laps and in-laps
+    in_lap = laps.groupby(['session_key', 'driver_number'])['is_pit_out_lap'].shift(-1, fill_value=False)
+    return laps.assign(lap_duration=lap_time + 20 * laps['is_pit_out_lap'] + 5 * in_lap)
+
+# ---------------------------
+# Reference: one np.polyfit per stint
+# ---------------------------
+def loop_fits(clean):
+    out = []
+    for (session, driver, stint), g in clean.groupby(['session_key', 'driver_number', 'stint']):
+        if len(g) >= degradationModel.MIN_STINT_LAPS:
+            slope, intercept = np.polyfit(g['tyre_age'], g['fuel_corrected'], 1)
+            out.append({'session_key': session, 'driver_number': driver, 'stint': stint, 'deg_per_lap': slope})
+    return pd.DataFrame(out)
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    laps = make_season()
+    print(f"Synthetic season: {NUM_RACES} races, {len(laps)} laps")
+
+    fit_s, fits = bench.median_time(lambda: degradationModel.fit_degradation(laps), REPEATS)
+
+    clean = degradationModel.prepare_laps(laps)
+    loop_s, reference = bench.median_time(lambda: loop_fits(clean), repeats=1)
+
+    merged = fits.merge(reference, on=['session_key', 'driver_number', 'stint'], suffixes=('', '_loop'))
+    max_diff = float(np.abs(merged['deg_per_lap'] - merged['deg_per_lap_loop']).max())
+
+    summary = fits.groupby('compound')['deg_per_lap'].median()
+    errors = {c: abs(summary[c] - TRUE_DEG[c]) for c in TRUE_DEG}
+    print(f"{len(fits)} stints fitted from {len(clean)} clean laps in {fit_s * 1000:.0f} ms "
+          f"(per-stint polyfit loop: {loop_s * 1000:.0f} ms, max slope difference {max_diff:.2e})")
+    print(pd.DataFrame({'true': TRUE_DEG, 'fitted': summary.reindex(list(TRUE_DEG))}).to_string(float_format=lambda v: f"{v:.4f}"))
+    return fit_s <= TARGET_SECONDS and max(errors.values()) <= MAX_DEG_ERROR and max_diff < 1e-6 and len(merged) == len(fits)
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 f"Season fitted in under {TARGET_SECONDS:.0f}s and degradation recovered.",
+                 "Fit too slow or degradation not recovered.")
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+import benchmarkUtils as bench
+# Scratch DB, feature store and registry, never the real ones
+bench.scratch_environment("ingest_hooks_")
+import databaseManager as db
+import createDatabase
+# Deliberately imported before lapQuality: hook order must not follow import order
+import pitModel
+import lapQuality
+import ingestHooks
+import storeMLData as mlData
+import modelRegistry
+import pitLoss
+
+SESSION_KEY = 9200
+
+def make_session():
+    """Ten drivers over twenty laps, with one pit stop each (so there are flags to find)."""
+    laps = bench.make_laps(1, 10, 20, stops=(1, 1), stop_laps=(10, 9), first_session_key=SESSION_KEY)
+    return laps.assign(lap_duration=90 + np.random.default_rng(0).normal(0, 0.2, len(laps)))
+
+def validate_hook_order():
+    """The pit prediction hook must see the flags the lap quality hook stores, whatever the import order."""
+    createDatabase.ensure_schema()
+    laps = make_session()
+    db.save_to_db(laps, 'ml_training_data', if_exists='append')
+
+    # No API here; the pit hook reports what is stored when it runs instead of scoring
+    lapQuality.fetch_race_control = lambda session_keys: pd.DataFrame()
+    seen = {}
+    def record_flags(session_laps, version=None):
+        seen['flags'] = len(lapQuality.load_flags([SESSION_KEY]))
+        return pd.DataFrame(columns=pitModel.PREDICTION_COLUMNS)
+    pitModel.predict_laps = record_flags
+    pitModel.store_predictions = lambda predictions: None
+    # A registered model makes the pit hook score; its stub features keep the online update from using it
+    modelRegistry.save_model(pitModel.MODEL_NAME, {}, {'features': ['stub'], 'feature_version': 0})
+
+    succeeded = ingestHooks.emit('session_ingested', SESSION_KEY, laps=laps)
+    order = [func.__module__ for func in ingestHooks.hooks_for('session_ingested')]
+    print(f"Hooks ran in order {order}; pit hook saw {seen.get('flags')} flagged laps")
+
+    passed = bench.check(order[:2] == ['lapQuality', 'pitModel'], "Lap quality hook does not run before the pit hook")
+    passed &= bench.check(seen.get('flags') == len(laps), "Flags were not stored when the pit hook ran")
+    passed &= bench.check(succeeded == len(order), "Not every hook succeeded")
+    # One stop per driver; there is no telemetry, so only the lap-time pit loss is measured
+    stops = db.query_df(pitLoss.Q_ALL_STOPS)
+    passed &= bench.check(order[-1] == 'pitLoss' and (stops['session_key'] == SESSION_KEY).sum() == 10,
+                          f"Pit loss hook did not store the session's stops (stored {len(stops)})")
+    return passed
+
+def validate_pending_hooks():
+    """A session stored without its hooks (as a page does) gets them from the next sync, once."""
+    laps = make_session().assign(session_key=SESSION_KEY + 1)
+    db.save_to_db(laps, 'ml_training_data', if_exists='append')
+    first = mlData.emit_pending_hooks()
+    second = mlData.emit_pending_hooks()
+    print(f"Pending hooks ran for {first}, then for {second}")
+
+    passed = bench.check(first == [SESSION_KEY + 1], f"Pending hooks ran for {first}, expected only session {SESSION_KEY + 1}")
+    passed &= bench.check(len(lapQuality.load_flags([SESSION_KEY + 1])) == len(laps), "Pending session was not flagged")
+    passed &= bench.check(second == [], "Hooks ran again for a session that already has them")
+    return passed
+
+if __name__ == "__main__":
+    bench.finish(validate_hook_order() and validate_pending_hooks(),
+                 "Ingest hooks run in priority order regardless of import order, and catch up on stored sessions.",
+                 "Ingest hook order check failed.")
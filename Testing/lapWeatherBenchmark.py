@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+import benchmarkUtils as bench
+import weatherData
+
+# --- CONFIGURATION ---
+# A synthetic season: weather about once a minute, rain showers, 20 drivers x 60 laps per race
+NUM_SESSIONS = 24
+NUM_DRIVERS = 20
+NUM_LAPS = 60
+WEATHER_SAMPLES = 120        # Per session, over two hours
+CHECKED_LAPS = 200           # Laps compared against a dense numerical integration
+GRID_POINTS = 20001          # Points per lap in that integration
+REPEATS = 3
+TARGET_MS = 500.0            # The whole season (~29k laps) must be aggregated within this
+TOLERANCE = 1e-3
+
+# ---------------------------
+# Synthetic season
+# ---------------------------
+def make_season():
+    rng = np.random.default_rng(0)
+    base = pd.Timestamp("2025-03-16 04:00:00", tz="UTC")
+    weather = []
+    for session in range(NUM_SESSIONS):
+        start = base + pd.Timedelta(days=7 * session)
+        t = np.sort(rng.uniform(0, 7200, WEATHER_SAMPLES))
+        rain_from = rng.uniform(0, 7200)
+        weather.append(pd.DataFrame({
+            'session_key': 9000 + session,
+            'date': start + pd.to_timedelta(t, unit='s'),
+            'track_temperature': 40 + 5 * np.sin(t / 900) + rng.normal(0, 0.3, len(t)),
+            'air_temperature': 25 + rng.normal(0, 0.5, len(t)),
+            'humidity': 50 + rng.normal(0, 2, len(t)),
+            'rainfall': ((t > rain_from) & (t < rain_from + 900)).astype(int),
+        }))
+
+    # Each driver's laps back to back from a minute in, the grid 0.4 s apart
+    laps = bench.make_laps(NUM_SESSIONS, NUM_DRIVERS, NUM_LAPS, stops=(0, 0))[['session_key', 'driver_number', 'lap_number']]
+    duration = pd.Series(rng.uniform(85, 95, len(laps)))
+    lap_start = 60 + 0.4 * laps['driver_number'] + duration.groupby([laps['session_key'], laps['driver_number']]).cumsum() - duration
+    session_start = base + pd.to_timedelta(7 * (laps['session_key'] - 9000), unit='D')
+    laps['date_start'] = (session_start + pd.to_timedelta(lap_start, unit='s')).map(pd.Timestamp.isoformat)
+    laps['lap_duration'] = duration
+    # Shuffled samples: the stage must not rely on input order
+    return laps, pd.concat(weather, ignore_index=True).sample(frac=1, random_state=0)
+
+# ---------------------------
+# Reference: dense integration of the interpolated readings, one lap at a time
+# ---------------------------
+def reference_lap(lap, weather):
+    samples = weather[weather['session_key'] == lap['session_key']].sort_values('date')
+    sample_time = (samples['date'] - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy()
+    start = (pd.Timestamp(lap['date_start']) - pd.Timestamp(0, tz='UTC')).total_seconds()
+    grid = np.linspace(start, start + lap['lap_duration'], GRID_POINTS)
+    track = np.interp(grid, sample_time, samples['track_temperature'].to_numpy())
+    rain = np.interp(grid, sample_time, samples['rainfall'].to_numpy(dtype=float))
+    return {'track_temperature_mean': np.trapezoid(track, grid) / lap['lap_duration'],
+            'rain_fraction': np.trapezoid(rain, grid) / lap['lap_duration'],
+            'track_temperature_min': track.min(), 'track_temperature_max': track.max()}
+
+# ---------------------------
+# Hand-computed cases
+# ---------------------------
+def correctness_cases():
+    """
+    Laps whose lap weather can be worked out by hand, as (laps, weather, expected).
+    Session 1 track temperature: 20 at t=0, 30 at t=100, 50 at t=200 (linear in between).
+    Session 2 has no sample before t=1000. Sessions 3 and 4 have interleaved sample times.
+    """
+    base = pd.Timestamp("2025-03-16 04:00:00", tz="UTC")
+    samples = [(1, 0, 20.0, 0), (1, 100, 30.0, 0), (1, 200, 50.0, 0),
+               (2, 1000, 20.0, 1), (2, 1100, 20.0, 1),
+               (3, 0, 10.0, 0), (3, 100, 10.0, 0), (3, 200, 10.0, 0),
+               (4, 50, 50.0, 1), (4, 150, 50.0, 1), (4, 250, 50.0, 1)]
+    weather = pd.DataFrame([{'session_key': s, 'date': base + pd.Timedelta(seconds=t), 'track_temperature': v,
+                             'air_temperature': 25.0, 'humidity': 50.0, 'rainfall': r} for s, t, v, r in samples])
+    cases = [
+        # (session, start s, duration s, track mean, min, max, rain fraction)
+        # Spans the t=100 sample: (27.5 * 50 + 35 * 50) / 100 between readings of 25 and 40
+        (1, 50, 100.0, 31.25, 25.0, 40.0, 0.0),
+        # Before the first sample: held flat at its reading
+        (2, 0, 90.0, 20.0, 20.0, 20.0, 1.0),
+        # No lap time: the reading at the lap start
+        (1, 50, np.nan, 25.0, 25.0, 25.0, 0.0),
+        # Interleaved sessions: each lap only sees its own session's samples
+        (3, 20, 200.0, 10.0, 10.0, 10.0, 0.0),
+        (4, 20, 200.0, 50.0, 50.0, 50.0, 1.0),
+    ]
+    laps = pd.DataFrame([{'session_key': s, 'driver_number': 1, 'lap_number': i + 1,
+                          'date_start': (base + pd.Timedelta(seconds=t)).isoformat(), 'lap_duration': d}
+                         for i, (s, t, d, *_) in enumerate(cases)])
+    expected = pd.DataFrame([c[3:] for c in cases], columns=['track_temperature_mean', 'track_temperature_min',
+                                                              'track_temperature_max', 'rain_fraction'])
+    return laps, weather, expected
+
+def check_cases():
+    laps, weather, expected = correctness_cases()
+    result = weatherData.lap_weather(laps, weather)[expected.columns]
+    error = np.abs(result.to_numpy() - expected.to_numpy())
+    passed = True
+    for i in np.flatnonzero(~(error < 1e-9).all(axis=1)):
+        passed = bench.check(False, f"Case {i + 1}: got {result.iloc[i].to_dict()}, expected {expected.iloc[i].to_dict()}")
+    print(f"{len(expected)} hand-computed laps {'match' if passed else 'DIFFER'}")
+    return passed
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    laps, weather = make_season()
+
+    vector_s, result = bench.median_time(lambda: weatherData.lap_weather(laps, weather), REPEATS)
+    vector_ms = vector_s * 1000
+
+    checked = np.random.default_rng(1).choice(len(laps), CHECKED_LAPS, replace=False)
+    # Min/max on the dense grid can miss a sample by up to one grid step, hence the tolerance
+    error = max(abs(value - result.loc[i, name])
+                for i in checked for name, value in reference_lap(laps.loc[i], weather).items())
+
+    wet = result['rain_fraction'].between(0, 1, inclusive='neither').sum()
+    print(f"{len(laps)} laps of {NUM_SESSIONS} sessions aggregated in {vector_ms:.1f} ms "
+          f"(max difference from dense integration {error:.2e}, {wet} laps partly wet)")
+    return check_cases() and vector_ms <= TARGET_MS and error < TOLERANCE and not result.isna().any().any()
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 f"Lap weather matches the hand-computed laps, and the season is computed in under {TARGET_MS:.0f} ms "
+                 "matching the dense integration.",
+                 "Lap weather wrong, too slow or different from the dense integration.")
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+import benchmarkUtils as bench
+# DB, feature store, registry and experiment log go to a scratch folder, never the real ones
+bench.scratch_environment("f1_model_validation_")
+import databaseManager as db
+import createDatabase
+import lapQuality
+import featureMatrix
+import modelRegistry
+import crossValidation as cv
+import pitModel
+import onlineUpdates
+
+# --- CONFIGURATION ---
+NUM_RACES = 12
+NUM_DRIVERS = 20
+NUM_LAPS = 50
+PROBABILITY_TOLERANCE = 0.01   # Largest accepted |p online - p refit| on any lap
+
+# ---------------------------
+# Synthetic data
+# ---------------------------
+def make_season():
+    """ml_training_data rows: one or two stops per driver at random laps, lap time rising with tyre age."""
+    laps = bench.make_laps(NUM_RACES, NUM_DRIVERS, NUM_LAPS, first_session_key=9300)
+    rng = np.random.default_rng(1)
+    return laps.assign(
+        lap_duration=90 + 0.05 * laps['laps_on_tire'] + rng.normal(0, 0.3, len(laps)),
+        duration_sector_1=30.0, duration_sector_2=30.0, duration_sector_3=30.0,
+        track_temperature=40.0, air_temperature=25.0, humidity=50.0, rainfall=0.0,
+    )
+
+def flag_session():
+    """
+    Five drivers over ten laps of one session, every flag built in by hand. Drivers 2-5 lap in
+    exactly 90 s, so the field median is 90 s on every lap and only driver 1 has a pace spread.
+    """
+    rows = []
+    for driver in range(1, 6):
+        for lap in range(1, 11):
+            rows.append({'session_key': 1, 'driver_number': driver, 'lap_number': lap, 'lap_duration': 90.0,
+                         'duration_sector_1': 30.0, 'duration_sector_2': 30.0, 'duration_sector_3': 30.0,
+                         'is_pit_out_lap': False})
+    laps = pd.DataFrame(rows)
+    at = lambda driver, lap: (laps['driver_number'] == driver) & (laps['lap_number'] == lap)
+    laps.loc[at(2, 6), 'is_pit_out_lap'] = True             # Lap 5 is driver 2's in-lap
+    laps.loc[at(5, 9), 'lap_duration'] = np.nan             # No lap time
+    laps.loc[at(5, 7), 'duration_sector_2'] = np.nan        # No sector 2 time
+    race_control = pd.DataFrame({'session_key': 1, 'lap_number': [4, 5, 8, 2, 3, 3], 'message': [
+        "SAFETY CAR DEPLOYED", "SAFETY CAR IN THIS LAP",
+        "VIRTUAL SAFETY CAR DEPLOYED",                      # Never ends: runs to the last lap
+        "CAR 3 (ABC) TIME 1:30.000 DELETED - TRACK LIMITS AT TURN 4 LAP 2 14:02:11",
+        "CAR 4 (DEF) TIME 1:30.000 DELETED - TRACK LIMITS AT TURN 9 LAP 3 14:03:40",
+        "CAR 4 (DEF) LAP 3 TIME 1:30.000 REINSTATED",
+    ]})
+    return laps, race_control
+
+def outlier_session(gap):
+    """
+    Driver 1's gaps to the field on laps 2-10 are -0.2, -0.1, 0, 0.1, 0.2, -0.1, 0, 0.1 and gap:
+    median 0 and MAD 0.1, so the last lap's robust z is 0.6745 * gap / 0.1.
+    """
+    laps = pd.DataFrame([{'session_key': 2, 'driver_number': d, 'lap_number': l, 'lap_duration': 90.0,
+                          'is_pit_out_lap': False} for d in range(1, 6) for l in range(1, 11)])
+    gaps = [0.0, -0.2, -0.1, 0.0, 0.1, 0.2, -0.1, 0.0, 0.1, gap]
+    laps.loc[laps['driver_number'] == 1, 'lap_duration'] = 90.0 + np.array(gaps)
+    return laps
+
+# ---------------------------
+# Checks
+# ---------------------------
+def validate_flags():
+    """Every bit of compute_flags on a hand-built session, and the MAD outlier threshold."""
+    laps, race_control = flag_session()
+    flags = lapQuality.compute_flags(laps, race_control).set_index(['driver_number', 'lap_number'])['flags']
+
+    expected = pd.Series(0, index=flags.index)
+    expected.loc[:, 1] |= lapQuality.LAP_ONE
+    expected.loc[:, [4, 5]] |= lapQuality.SAFETY_CAR
+    expected.loc[:, [8, 9, 10]] |= lapQuality.VSC
+    expected.loc[(2, 5)] |= lapQuality.PIT_IN
+    expected.loc[(2, 6)] |= lapQuality.PIT_OUT
+    expected.loc[(5, 9)] |= lapQuality.NO_TIME
+    expected.loc[(5, 7)] |= lapQuality.MISSING_SECTORS
+    expected.loc[(3, 2)] |= lapQuality.DELETED
+    wrong = flags[flags != expected]
+    passed = bench.check(wrong.empty, f"Unexpected flags: {wrong.to_dict()} (expected {expected[wrong.index].to_dict()})")
+
+    deleted = lapQuality.deleted_lap_keys(race_control)
+    passed &= bench.check(deleted.tolist() == [lapQuality.lap_key(1, 3, 2)],
+                          f"Deleted lap keys {deleted.tolist()}, expected only car 3 lap 2 (car 4 was reinstated)")
+
+    # Threshold at gap = 3.5 * 0.1 / 0.6745 = 0.519 s
+    for gap, outlier in ((0.50, False), (0.55, True), (-0.55, True)):
+        result = lapQuality.compute_flags(outlier_session(gap)).set_index(['driver_number', 'lap_number'])['flags']
+        passed &= bench.check(bool(result[(1, 10)] & lapQuality.OUTLIER) == outlier,
+                              f"Gap {gap:+.2f} s: outlier flag should be {outlier}")
+        passed &= bench.check((result.drop((1, 10)) & lapQuality.OUTLIER == 0).all(),
+                              f"Gap {gap:+.2f} s: outlier flag set on another lap")
+    print(f"Flags: {len(flags)} laps checked, {int((flags != 0).sum())} flagged")
+    return passed
+
+def validate_registry():
+    """Saved versions load back with the same arrays and metadata, latest by default."""
+    first = {'weights': np.array([0.5, -1.25]), 'matrix': np.arange(6, dtype=np.int16).reshape(2, 3)}
+    second = {'weights': np.array([0.75, -1.0])}
+    v1 = modelRegistry.save_model('registry_check', first, {'training_sessions': [1, 2], 'metrics': {'score': 0.5}})
+    v2 = modelRegistry.save_model('registry_check', second, {'training_sessions': [1, 2, 3]})
+
+    arrays, metadata = modelRegistry.load_model('registry_check', v1)
+    latest_arrays, latest_metadata = modelRegistry.load_model('registry_check')
+    listed = modelRegistry.list_models()
+    listed = listed[listed['name'] == 'registry_check']
+
+    passed = bench.check((v1, v2) == (1, 2) and modelRegistry.latest_version('registry_check') == 2, "Versions not numbered 1, 2")
+    passed &= bench.check(all(np.array_equal(arrays[k], first[k]) and arrays[k].dtype == first[k].dtype for k in first),
+                          "Version 1 arrays did not round-trip")
+    passed &= bench.check(metadata['training_sessions'] == [1, 2] and metadata['metrics'] == {'score': 0.5}
+                          and metadata['version'] == 1, "Version 1 metadata did not round-trip")
+    passed &= bench.check(latest_metadata['version'] == 2 and np.array_equal(latest_arrays['weights'], second['weights']),
+                          "Latest version is not version 2")
+    passed &= bench.check(listed['version'].tolist() == [2, 1] and listed['sessions'].tolist() == [3, 2],
+                          "list_models does not show both versions, newest first")
+    passed &= bench.check(modelRegistry.load_model('never_saved') == (None, None), "Missing model should load as (None, None)")
+    print(f"Registry: versions {listed['version'].tolist()} round-tripped")
+    return passed
+
+def validate_concurrent_writes(laps, keys):
+    """
+    Stores written from several threads at once (ingest hook, Train button, cross-validation):
+    every session keeps its own rows in the feature store and every model save gets its own version.
+    """
+    version = featureMatrix.FEATURE_VERSION + 100  # A fresh store, so every session is added here
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda key: featureMatrix.add_sessions(laps[laps['session_key'] == key], version), keys))
+        saved = list(pool.map(lambda i: modelRegistry.save_model('concurrent_check', {'i': np.array([i])}, {}), range(8)))
+
+    manifest = featureMatrix.load_manifest(version)
+    _, _, stored_keys, _ = featureMatrix.open_store(version, manifest)
+    passed = bench.check(sorted(int(k) for k in manifest['sessions']) == keys and manifest['rows'] == len(laps),
+                         f"Feature store holds {manifest['rows']} rows of {sorted(manifest['sessions'])}")
+    for key, (start, stop) in manifest['sessions'].items():
+        passed &= bench.check(stop - start == (laps['session_key'] == int(key)).sum()
+                              and (stored_keys[start:stop, 0] == int(key)).all(), f"Session {key} rows overwritten")
+    passed &= bench.check(sorted(saved) == list(range(1, 9)), f"Concurrent saves got versions {sorted(saved)}")
+    print(f"Concurrent writes: {len(keys)} sessions added and {len(saved)} model versions saved from 4 threads")
+    return passed
+
+def validate_folds(matrix):
+    """Group folds: every session is tested exactly once and never also trained on in that fold."""
+    groups = np.asarray(matrix.groups)
+    folds = cv.group_folds(groups)
+    tested = np.concatenate([test for _, test in folds])
+    passed = bench.check(len(folds) == cv.N_FOLDS, f"{len(folds)} folds, expected {cv.N_FOLDS}")
+    passed &= bench.check(np.array_equal(np.sort(tested), np.arange(len(groups))), "Rows not tested exactly once")
+    for train, test in folds:
+        passed &= bench.check(len(np.intersect1d(train, test)) == 0 and len(train) + len(test) == len(groups),
+                              "Train and test rows overlap or miss rows")
+        passed &= bench.check(len(np.intersect1d(groups[train], groups[test])) == 0, "A session is in train and test")
+    print(f"Folds: {len(folds)} folds over {len(np.unique(groups))} sessions, sizes {[len(t) for _, t in folds]}")
+    return passed
+
+def validate_online_updates(laps, keys):
+    """
+    Stores the races one at a time, as the sync ingests them, and runs the online update after each.
+    No model is saved before MIN_SESSIONS races; then the first is trained on all of them, and each
+    later race is one online version. At the end the online pit model must predict like a refit on
+    every race, and the online degradation statistics must equal a full recount.
+    """
+    passed = True
+    for count, key in enumerate(keys, start=1):
+        session_laps = laps[laps['session_key'] == key]
+        db.save_to_db(session_laps, 'ml_training_data', if_exists='append')
+        versions = onlineUpdates.update_models([key], session_laps)
+        expected = None if count < onlineUpdates.MIN_SESSIONS else count - onlineUpdates.MIN_SESSIONS + 1
+        passed &= bench.check(versions == {'degradation': expected, pitModel.MODEL_NAME: expected},
+                              f"After {count} session(s) saved versions {versions}, expected {expected}")
+
+    report = onlineUpdates.retrain_and_check_drift(save=False)
+    online, metadata = pitModel.load_pit_model()
+    full, _ = pitModel.fit_pit_model(keys, metadata['l2'])
+    matrix = featureMatrix.build_feature_matrix(keys)
+    p_online, _, _ = pitModel.predict_proba(pitModel.design_matrix(matrix.X, online['mean'], online['scale']),
+                                            online['weights'], online['covariance'])
+    p_full, _, _ = pitModel.predict_proba(pitModel.design_matrix(matrix.X, full['mean'], full['scale']),
+                                          full['weights'], full['covariance'])
+    difference = float(np.max(np.abs(p_online - p_full)))
+    degradation = report[report['model'] == onlineUpdates.DEGRADATION_MODEL]
+
+    passed &= bench.check(sorted(metadata['training_sessions']) == keys, "Online model has not seen every session")
+    passed &= bench.check(difference < PROBABILITY_TOLERANCE,
+                          f"Online pit probabilities differ from the refit by up to {difference:.4f}")
+    passed &= bench.check(not degradation.empty and (degradation['difference'] < 1e-9).all(),
+                          "Online degradation statistics differ from a full recount")
+    print(f"Online update: {len(keys) - onlineUpdates.MIN_SESSIONS} online versions, "
+          f"max |p online - p refit| {difference:.5f}, degradation difference {degradation['difference'].max():.1e}")
+    return passed
+
+def run_validation():
+    createDatabase.ensure_schema()
+    laps = make_season()
+    keys = sorted(int(k) for k in laps['session_key'].unique())
+
+    passed = validate_flags()
+    passed &= validate_registry()
+    passed &= validate_concurrent_writes(laps, keys)
+    passed &= validate_online_updates(laps, keys)
+    passed &= validate_folds(featureMatrix.build_feature_matrix(keys))
+    return passed
+
+if __name__ == "__main__":
+    bench.finish(run_validation(),
+                 "Lap flags, registry round-trips, concurrent store writes, online updates and CV folds behave as specified.",
+                 "Model behaviour check failed.")
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+import benchmarkUtils as bench
+# Point databaseManager (and the telemetry partitions next to it) at a scratch DB before anything imports it
+bench.scratch_environment("f1_pit_loss_bench_")
+import databaseManager as db
+import createDatabase
+import telemetryPartitions as partitions
+import pitLoss
+import trackOutline
+
+# --- CONFIGURATION ---
+# One synthetic race on a circular track; the pit lane runs inside the circle around the line
+NUM_DRIVERS = 20
+NUM_LAPS = 57
+LAP_SECONDS = 90.0
+LAP_NOISE = 0.1
+SAMPLE_HZ = 4.0
+RADIUS = 5000.0
+PIT_RADIUS = 4600.0        # 400 units off the racing line
+IN_LAP_LOSS = 8.0          # Extra time on the in-lap (s)
+OUT_LAP_LOSS = 13.0        # Extra time on the out-lap (s)
+PIT_ENTRY_SECONDS = 10.0   # In-lap time spent in the pit lane
+PIT_EXIT_SECONDS = 14.0    # Out-lap time spent in the pit lane
+SAFETY_CAR_LAPS = (40, 41) # Whole field slow: stops on these laps are neutralised
+SESSION_KEY = 9100
+CIRCUIT_KEY = 91
+TARGET_MS = 1000.0         # One session's estimate (every sample classified) must finish within this
+TOLERANCE = 0.5            # Recovered losses must be this close to the simulated ones (s)
+
+# ---------------------------
+# Synthetic race
+# ---------------------------
+def make_race():
+    """Laps (ml_training_data rows), telemetry samples and the true stops of one race."""
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2025-03-16 04:03:00", tz="UTC")
+    lap_rows, sample_frames, truth = [], [], []
+    for driver in range(1, NUM_DRIVERS + 1):
+        # One stop each, spread over the race; driver 1 stops under the safety car
+        in_lap = SAFETY_CAR_LAPS[0] if driver == 1 else 10 + driver
+        durations = LAP_SECONDS + rng.normal(0, LAP_NOISE, NUM_LAPS)
+        durations[np.array(SAFETY_CAR_LAPS) - 1] *= 1.4
+        durations[in_lap - 1] += IN_LAP_LOSS
+        durations[in_lap] += OUT_LAP_LOSS
+        lap_start = np.r_[0.0, np.cumsum(durations)[:-1]] + driver * 0.5
+        laps = np.arange(1, NUM_LAPS + 1)
+        lap_rows.append(pd.DataFrame({
+            'session_key': SESSION_KEY, 'driver_number': driver, 'lap_number': laps,
+            'date_start': (start + pd.to_timedelta(lap_start, unit='s')).map(pd.Timestamp.isoformat),
+            'lap_duration': durations, 'is_pit_out_lap': laps == in_lap + 1,
+            'tire_compound': np.where(laps <= in_lap, 'MEDIUM', 'HARD'),
+            'laps_on_tire': np.where(laps <= in_lap, laps, laps - in_lap),
+        }))
+
+        t = np.arange(0, lap_start[-1] + durations[-1], 1 / SAMPLE_HZ) + rng.uniform(0, 0.05)
+        lap = np.searchsorted(lap_start, t, side='right')
+        fraction = (t - lap_start[lap - 1]) / durations[lap - 1]
+        pit_start = lap_start[in_lap] - PIT_ENTRY_SECONDS
+        in_pit = (t >= pit_start) & (t <= lap_start[in_lap] + PIT_EXIT_SECONDS)
+        radius = np.where(in_pit, PIT_RADIUS, RADIUS)
+        theta = 2 * np.pi * fraction
+        sample_frames.append(pd.DataFrame({
+            'session_key': SESSION_KEY, 'driver_acronym': f"D{driver:02d}", 'driver_number': driver,
+            'lap_number': lap, 'lap_duration': durations[lap - 1],
+            'timestamp': start + pd.to_timedelta(t, unit='s'),
+            'x': np.round(radius * np.cos(theta)), 'y': np.round(radius * np.sin(theta)), 'z': 0,
+        }))
+        in_pit_t = t[in_pit]
+        truth.append({'driver_number': driver, 'in_lap': in_lap, 'true_loss': IN_LAP_LOSS + OUT_LAP_LOSS,
+                      'true_lane_time': in_pit_t[-1] - in_pit_t[0]})
+
+    samples = pd.concat(sample_frames, ignore_index=True).sort_values('timestamp', kind='stable').reset_index(drop=True)
+    return pd.concat(lap_rows, ignore_index=True), samples, pd.DataFrame(truth)
+
+def make_outline():
+    """Racing line round the circle, pit lane along the inside arc either side of the line."""
+    theta = np.linspace(0, 2 * np.pi, 200)
+    pit_theta = np.linspace(-1.0, 1.0, 40)
+    return {
+        'track': pd.DataFrame({'x': RADIUS * np.cos(theta), 'y': RADIUS * np.sin(theta)}),
+        'pit': pd.DataFrame({'x': PIT_RADIUS * np.cos(pit_theta), 'y': PIT_RADIUS * np.sin(pit_theta)}),
+    }
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    createDatabase.ensure_schema()
+    laps, samples, truth = make_race()
+    db.save_to_db(laps, 'ml_training_data', if_exists='append')
+    partitions.write_partition(SESSION_KEY, samples)
+    trackOutline.store_outline(CIRCUIT_KEY, make_outline(), SESSION_KEY)
+
+    vector_s, stops = bench.median_time(
+        lambda: pitLoss.estimate_session(SESSION_KEY, laps=laps, samples=samples, circuit_key=CIRCUIT_KEY))
+    vector_ms = vector_s * 1000
+
+    # Full path: read laps and telemetry back from the store and save the stops
+    stored = pitLoss.estimate_all([SESSION_KEY])
+    distribution = pitLoss.circuit_distribution()
+    print(f"{len(samples)} samples, {len(stops)} stops estimated in {vector_ms:.1f} ms "
+          f"({len(stored)} stored from the partition)")
+    print(distribution.to_string(index=False))
+
+    merged = stops.merge(truth, on=['driver_number', 'in_lap'])
+    green = merged[~merged['neutralised']]
+    loss_error = float(np.max(np.abs(green['pit_loss'] - green['true_loss'])))
+    lane_error = float(np.max(np.abs(merged['pit_lane_time'] - merged['true_lane_time'])))
+    neutralised = merged.loc[merged['driver_number'] == 1, 'neutralised'].all() and len(green) == NUM_DRIVERS - 1
+    circuit_loss = pitLoss.circuit_pit_loss(CIRCUIT_KEY)
+    print(f"Max pit loss error {loss_error:.3f} s, max pit lane time error {lane_error:.3f} s, "
+          f"safety car stop neutralised: {neutralised}, circuit pit loss {circuit_loss:.2f} s")
+
+    return (vector_ms <= TARGET_MS and len(merged) == NUM_DRIVERS and len(stored) == NUM_DRIVERS
+            and loss_error < TOLERANCE and lane_error < TOLERANCE and neutralised
+            and abs(circuit_loss - (IN_LAP_LOSS + OUT_LAP_LOSS)) < TOLERANCE)
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 f"Pit losses and pit lane times recovered within {TOLERANCE} s in under {TARGET_MS:.0f} ms.",
+                 "Pit loss estimate too slow or too far from the simulated stops.")
@@ -0,0 +1,196 @@
+import re
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+# Size of the synthetic database (defaults are roughly a 6-race window of real telemetry)
+NUM_RACES = 6
+NUM_DRIVERS = 20
+NUM_LAPS = 57
+SAMPLES_PER_LAP = 330  # ~3.7 Hz over a 90 s lap
+REPEATS = 5            # Timed runs per query
+
+# Latency budget per query in ms (anything not listed uses the default)
+DEFAULT_BUDGET_MS = 1000
+LATENCY_BUDGET_MS = {
+    'ml_session_exists': 5,
+    'outline_by_circuit': 20,
+    'calendar_season': 20,
+    'telemetry_streams': 100,
+    'telemetry_laps': 50,
+}
+RETENTION_BUDGET_MS = 50  # Dropping one session's telemetry partition
+
+# Queries allowed to sort in a temp B-tree (they sort a small aggregate, not raw rows)
+ALLOWED_TEMP_SORT = set()
+# Queries allowed to read a whole table (pit_losses holds one small row per stop and is summarised per circuit)
+ALLOWED_FULL_SCAN = {'pit_losses_all'}
+
+# Point databaseManager (and the telemetry partitions next to it) at a scratch DB before anything imports it
+import benchmarkUtils as bench
+BENCH_DIR = bench.scratch_environment("f1_bench_")
+import databaseManager as db
+import createDatabase
+import telemetryPartitions as partitions
+# Importing the collectors registers every production query
+import storeRaceData
+import storeMLData
+import trackOutline
+import raceCalendar
+import lapQuality
+import pitModel
+import pitLoss
+
+BASE_SESSION_KEY = 9000
+BASE_CIRCUIT_KEY = 10
+SEASON_YEAR = 2025
+
+# ---------------------------
+# Seed synthetic data
+# ---------------------------
+def seed_database():
+    """Creates the schema and fills it with NUM_RACES synthetic races."""
+    createDatabase.create_tables()
+    rng = np.random.default_rng(0)
+
+    theta = np.linspace(0, 2 * np.pi, SAMPLES_PER_LAP, endpoint=False)
+    track_x = (8000 * np.cos(theta)).astype(int)
+    track_y = (3000 * np.sin(theta)).astype(int)
+
+    raw = db.engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for race in range(NUM_RACES):
+            session_key = BASE_SESSION_KEY + race
+            start = pd.Timestamp(f"{SEASON_YEAR}-03-01 15:00:00") + pd.Timedelta(days=14 * race)
+
+            telemetry_rows = []
+            ml_rows = []
+            for driver in range(1, NUM_DRIVERS + 1):
+                # Interleaved timestamps, as the real collector sorts all drivers by time
+                t = start + pd.to_timedelta(np.arange(NUM_LAPS * SAMPLES_PER_LAP) * 0.27 + driver * 0.01, unit='s')
+                laps = np.repeat(np.arange(1, NUM_LAPS + 1), SAMPLES_PER_LAP)
+                noise = rng.integers(-20, 20, size=len(laps))
+                timestamps = t.strftime('%Y-%m-%d %H:%M:%S.%f')
+                telemetry_rows.extend(zip(
+                    [session_key] * len(laps), [f"D{driver:02d}"] * len(laps), [driver] * len(laps),
+                    laps.tolist(), [90.0] * len(laps), timestamps,
+                    (np.tile(track_x, NUM_LAPS) + noise).tolist(), (np.tile(track_y, NUM_LAPS) + noise).tolist(), [0] * len(laps)
+                ))
+                for lap in range(1, NUM_LAPS + 1):
+                    ml_rows.append((session_key, session_key, driver, lap, str(start), 90.0 + rng.random(),
+                                    'MEDIUM' if lap < 25 else 'HARD', lap if lap < 25 else lap - 24))
+
+            telemetry_rows.sort(key=lambda r: r[5])
+            partitions.write_partition(session_key, pd.DataFrame(telemetry_rows, columns=partitions.TELEMETRY_COLUMNS))
+            cursor.executemany(
+                "INSERT INTO ml_training_data (meeting_key, session_key, driver_number, lap_number, date_start, lap_duration, tire_compound, laps_on_tire) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ml_rows)
+            cursor.execute(
+                "INSERT INTO race_calendar (session_key, meeting_key, circuit_key, year, session_name, session_type, country_name, location, date_start, date_end) "
+                "VALUES (?, ?, ?, ?, 'Race', 'Race', 'Country', 'Location', ?, ?)",
+                (session_key, session_key, BASE_CIRCUIT_KEY + race, SEASON_YEAR, start.isoformat(), (start + pd.Timedelta(hours=2)).isoformat()))
+            cursor.executemany(
+                "INSERT INTO track_outlines (circuit_key, path, point_order, x, y, source_session_key) VALUES (?, 'track', ?, ?, ?, ?)",
+                [(BASE_CIRCUIT_KEY + race, i, float(track_x[i]), float(track_y[i]), session_key) for i in range(SAMPLES_PER_LAP)])
+            raw.commit()
+            print(f"Seeded race {race + 1}/{NUM_RACES} ({len(telemetry_rows)} telemetry rows)")
+    finally:
+        raw.close()
+
+    # Indexes are created by migrations, so the benchmark checks exactly what production runs
+    createDatabase.ensure_schema()
+
+# ---------------------------
+# Plan + latency checks
+# ---------------------------
+def sample_params(sql):
+    """Binds every :param in a statement to a value that exists in the seeded DB."""
+    values = {
+        'session_key': BASE_SESSION_KEY + NUM_RACES // 2,
+        'key': BASE_SESSION_KEY,
+        'driver_number': 1,
+        'min_lap': 2,
+        'circuit_key': BASE_CIRCUIT_KEY,
+        'year': SEASON_YEAR,
+        'model_name': pitModel.MODEL_NAME,
+    }
+    return {name: values[name] for name in set(re.findall(r":(\w+)", sql))}
+
+def engine_for(sql, params):
+    """Telemetry statements run against a session's partition, everything else against the main DB."""
+    if any(table in sql for table in partitions.PARTITION_TABLES):
+        return partitions.get_engine(params['session_key'])
+    return db.engine
+
+def check_plan(name, sql, params):
+    """Returns (plan lines, list of problems) for a statement's EXPLAIN QUERY PLAN."""
+    with engine_for(sql, params).connect() as conn:
+        plan = [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)]
+
+    problems = []
+    for line in plan:
+        # 'SCAN table' with no index is a full table scan
+        if re.match(r"^SCAN \w+$", line.strip()) and name not in ALLOWED_FULL_SCAN:
+            problems.append(f"full table scan: {line}")
+        if 'USE TEMP B-TREE' in line and name not in ALLOWED_TEMP_SORT:
+            problems.append(f"unindexed sort: {line}")
+    return plan, problems
+
+def time_query(sql, params):
+    """Runs a SELECT REPEATS times and returns (median ms, p95 ms, rows)."""
+    timings = []
+    rows = 0
+    with engine_for(sql, params).connect() as conn:
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            rows = len(conn.execute(text(sql), params).fetchall())
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings)), float(np.percentile(timings, 95)), rows
+
+def run_benchmark():
+    statements = {name: q['sql'] for name, q in db.QUERIES.items()}
+
+    results = []
+    failed = False
+    for name, sql in sorted(statements.items()):
+        params = sample_params(sql)
+        plan, problems = check_plan(name, sql, params)
+
+        median_ms = p95_ms = rows = None
+        if sql.strip().upper().startswith('SELECT'):
+            median_ms, p95_ms, rows = time_query(sql, params)
+            budget = LATENCY_BUDGET_MS.get(name, DEFAULT_BUDGET_MS)
+            if median_ms > budget:
+                problems.append(f"median {median_ms:.1f} ms over budget {budget} ms")
+
+        failed = failed or bool(problems)
+        results.append({'query': name, 'median_ms': median_ms, 'p95_ms': p95_ms, 'rows': rows,
+                        'status': 'OK' if not problems else 'FAIL'})
+        print(f"\n[{'OK' if not problems else 'FAIL'}] {name}")
+        for line in plan:
+            print(f"    plan: {line}")
+        for problem in problems:
+            print(f"    !! {problem}")
+
+    # Retention: evicting the oldest session is a partition drop, independent of its size
+    drop_s, dropped = bench.median_time(
+        lambda: partitions.apply_retention([BASE_SESSION_KEY + race for race in range(1, NUM_RACES)]), repeats=1)
+    drop_ms = drop_s * 1000
+    drop_ok = dropped == [BASE_SESSION_KEY] and drop_ms <= RETENTION_BUDGET_MS
+    failed = failed or not drop_ok
+    results.append({'query': 'retention_drop_session', 'median_ms': drop_ms, 'p95_ms': drop_ms, 'rows': None,
+                    'status': 'OK' if drop_ok else 'FAIL'})
+
+    print("\nSummary")
+    print(pd.DataFrame(results).to_string(index=False))
+    return not failed
+
+if __name__ == "__main__":
+    print(f"Seeding synthetic database in {BENCH_DIR}")
+    seed_database()
+    bench.finish(run_benchmark(),
+                 "Every production query uses an index and is within budget.",
+                 "Query plan or latency regression detected.")
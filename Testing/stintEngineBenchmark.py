@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+import benchmarkUtils as bench
+import stintEngine
+
+# --- CONFIGURATION ---
+# A synthetic season of lap-by-lap tyre data, shaped like fetchStintData output
+NUM_RACES = 24
+NUM_DRIVERS = 20
+NUM_LAPS = 57
+MISSING_AGE_RATE = 0.03   # Laps without a tyre age (the views count on from the previous lap)
+MISSING_LAP_RATE = 0.01   # Laps missing from the data (break the stint)
+REPEATS = 3
+TARGET_SPEEDUP = 10.0     # Minimum per-race speed-up over the iterrows loop
+
+# ---------------------------
+# Synthetic season
+# ---------------------------
+def make_season():
+    """One shuffled frame per race: 1-3 stops, some same-compound stops, gaps and missing ages."""
+    season = bench.make_laps(NUM_RACES, NUM_DRIVERS, NUM_LAPS, stops=(1, 3), stop_laps=(8, 5))
+    rng = np.random.default_rng(1)
+    # Tyres fitted 0-3 laps old, and a few stints without a compound
+    stint = (season['laps_on_tire'] == 1).cumsum().to_numpy()
+    season['laps_on_tire'] += rng.integers(0, 4, stint.max() + 1)[stint]
+    season['tire_compound'] = season['tire_compound'].where(rng.random(stint.max() + 1)[stint] > 0.02, None)
+
+    season['driver_acronym'] = "D" + season['driver_number'].astype(str).str.zfill(2)
+    season.loc[rng.random(len(season)) < MISSING_AGE_RATE, 'laps_on_tire'] = np.nan
+    season = season[rng.random(len(season)) >= MISSING_LAP_RATE]
+    season['tire_compound'] = season['tire_compound'].where(rng.random(len(season)) > 0.5, season['tire_compound'].str.lower())
+    columns = ['driver_acronym', 'lap_number', 'tire_compound', 'laps_on_tire']
+    return [race[columns].sample(frac=1.0, random_state=i).reset_index(drop=True)
+            for i, (_, race) in enumerate(season.groupby('session_key'))]
+
+# ---------------------------
+# Reference: the previous lap-by-lap loop
+# ---------------------------
+def legacy_stints(pit_data):
+    stints = []
+    lap_col, compound_col, laps_on_tire_col = 'lap_number', 'tire_compound', 'laps_on_tire'
+    for drv in pit_data['driver_acronym'].dropna().unique().tolist():
+        ddf = pit_data[pit_data['driver_acronym'] == drv].copy().sort_values(lap_col)
+        current_comp = current_start = prev_lap = prev_tire_age = None
+        for _, r in ddf.iterrows():
+            lap = int(r[lap_col])
+            comp = str(r[compound_col]).upper() if pd.notna(r[compound_col]) else 'UNKNOWN'
+            current_tire_age = int(r[laps_on_tire_col]) if pd.notna(r[laps_on_tire_col]) else (999 if prev_tire_age is None else prev_tire_age + 1)
+            if current_comp is None:
+                current_comp, current_start = comp, lap
+            elif (comp != current_comp) or (prev_tire_age is not None and current_tire_age < prev_tire_age) or (prev_lap is not None and lap > prev_lap + 1):
+                stints.append({'driver': drv, 'start': current_start, 'end': prev_lap, 'compound': current_comp})
+                current_comp, current_start = comp, lap
+            prev_lap, prev_tire_age = lap, current_tire_age
+        if current_comp is not None:
+            stints.append({'driver': drv, 'start': current_start, 'end': prev_lap, 'compound': current_comp})
+
+    stint_lap_data = []
+    for s in stints:
+        for lap in range(s['start'], s['end'] + 1):
+            stint_lap_data.append({'driver_acronym': s['driver'], 'lap_number': lap, 'compound': s['compound']})
+    return pd.DataFrame(stints), pd.DataFrame(stint_lap_data)
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    races = make_season()
+    total_laps = sum(len(r) for r in races)
+    print(f"Synthetic season: {NUM_RACES} races, {total_laps} driver-laps")
+
+    legacy_s, legacy = bench.median_time(lambda: [legacy_stints(r) for r in races], REPEATS)
+    engine_s, engine = bench.median_time(lambda: [stintEngine.segment(r) for r in races], REPEATS)
+
+    # The whole season in one call: drivers keyed per race, so every stint boundary is one array pass
+    season = pd.concat([r.assign(driver_acronym=f"R{i:02d}-" + r['driver_acronym']) for i, r in enumerate(races)], ignore_index=True)
+    season_s, (season_stints, _) = bench.median_time(lambda: stintEngine.segment(season), REPEATS)
+
+    # Same stints and the same per-lap compounds as the loop it replaces
+    matches = True
+    for (old_stints, old_laps), (new_stints, new_laps) in zip(legacy, engine):
+        new_stints = new_stints.assign(driver=new_stints['driver'].astype(str), compound=new_stints['compound'].astype(str))
+        new_laps = new_laps.astype({'driver_acronym': str, 'compound': str, 'lap_number': int})
+        if not (old_stints.reset_index(drop=True).equals(new_stints[['driver', 'start', 'end', 'compound']].astype({'start': int, 'end': int}))
+                and old_laps.equals(new_laps)):
+            matches = False
+
+    stint_count = sum(len(s) for s, _ in engine)
+    if len(season_stints) != stint_count:
+        matches = False
+    print(pd.DataFrame([
+        {'method': 'iterrows loop (old)', 'season_s': legacy_s, 'per_race_ms': legacy_s / NUM_RACES * 1000},
+        {'method': 'stintEngine (per race)', 'season_s': engine_s, 'per_race_ms': engine_s / NUM_RACES * 1000},
+        {'method': 'stintEngine (one call)', 'season_s': season_s, 'per_race_ms': season_s / NUM_RACES * 1000},
+    ]).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    speedup = legacy_s / engine_s
+    print(f"\n{stint_count} stints, speed-up {speedup:.1f}x, results {'match' if matches else 'DIFFER'}")
+    return matches and speedup >= TARGET_SPEEDUP
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 f"Vectorised stints match the loop and are at least {TARGET_SPEEDUP:.0f}x faster.",
+                 "Stint mismatch or speed-up below target.")
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+import benchmarkUtils as bench
+import strategySimulator as sim
+
+# --- CONFIGURATION ---
+REPEATS = 3
+TARGET_S = 1.0              # A three-plan what-if at DEFAULT_SIMULATIONS must finish within this
+NUM_DRIVERS = 20
+START_LAP, TOTAL_LAPS = 15, 57
+POSITION_TOLERANCE = 0.1    # Largest expected-position difference allowed between parallel and serial runs
+PROBABILITY_TOLERANCE = 0.02
+PIT_LOSS_TOLERANCE = 0.1    # Mean safety car pit loss vs the discounted pit loss (s)
+
+def make_field():
+    """A 20-car field 15 laps in, everyone on MEDIUMs planning one stop for HARDs."""
+    rng = np.random.default_rng(1)
+    state = pd.DataFrame({
+        'driver': np.arange(1, NUM_DRIVERS + 1), 'gap': np.sort(rng.uniform(0, 30, NUM_DRIVERS)), 'compound': 'MEDIUM',
+        'tyre_age': 15, 'pace': rng.normal(0, 0.3, NUM_DRIVERS),
+    })
+    return state, {d: [(30, 'HARD')] for d in state['driver']}
+
+# ---------------------------
+# Checks
+# ---------------------------
+def validate_what_if():
+    """compare_plans over three plans at the default simulation count, within TARGET_S."""
+    state, plans = make_field()
+    candidates = {'Stop lap 25': [(25, 'HARD')], 'Stop lap 30': [(30, 'HARD')], 'Two stops': [(25, 'SOFT'), (42, 'SOFT')]}
+    seconds, result = bench.median_time(
+        lambda: sim.compare_plans(state, 5, candidates, plans, start_lap=START_LAP, total_laps=TOTAL_LAPS), REPEATS)
+    print(f"What-if: {len(result)} plans x {sim.DEFAULT_SIMULATIONS} races in {seconds:.2f}s")
+    return bench.check(seconds <= TARGET_S and len(result) == len(candidates), f"What-if took {seconds:.2f}s")
+
+def validate_parallel():
+    """A run split over a process pool gives the same position distribution as the serial run."""
+    state, plans = make_field()
+    n_sims = sim.PARALLEL_MIN_SIMULATIONS
+    serial = sim.summarise(state, *sim.simulate(state, plans, START_LAP, TOTAL_LAPS, n_sims=n_sims))
+    parallel = sim.summarise(state, *sim.simulate(state, plans, START_LAP, TOTAL_LAPS, n_sims=n_sims, workers=2))
+    merged = serial.merge(parallel, on='driver', suffixes=('', '_parallel'))
+    position_diff = np.abs(merged['expected_position'] - merged['expected_position_parallel']).max()
+    win_diff = np.abs(merged['win_probability'] - merged['win_probability_parallel']).max()
+    print(f"Parallel vs serial over {n_sims} races: max expected position difference {position_diff:.3f}, "
+          f"max win probability difference {win_diff:.3f}")
+    return bench.check(len(merged) == NUM_DRIVERS and position_diff <= POSITION_TOLERANCE and win_diff <= PROBABILITY_TOLERANCE,
+                       "Parallel run does not match the serial distribution")
+
+def validate_safety_car_bunching():
+    """Under a safety car on every lap the field closes up to SAFETY_CAR_GAP and nobody changes places."""
+    state, _ = make_field()
+    positions, race_time = sim.simulate(state, {}, START_LAP, TOTAL_LAPS, n_sims=500, safety_car_probability=1.0)
+    gaps = np.sort(race_time, axis=1) - race_time.min(axis=1, keepdims=True)
+    limit = np.arange(NUM_DRIVERS) * sim.SAFETY_CAR_GAP + 1e-6
+    same_order = bool((positions == np.arange(1, NUM_DRIVERS + 1)).all())
+    print(f"Safety car on every lap: field spread {gaps[:, -1].max():.2f}s (from {state['gap'].max():.2f}s), "
+          f"starting order kept: {same_order}")
+    return bench.check(bool((gaps <= limit).all()) and same_order, "Field did not bunch up behind the safety car")
+
+def validate_safety_car_pit_discount():
+    """A stop under the safety car costs SAFETY_CAR_PIT_FACTOR of the pit loss; a green-flag stop pays all of it."""
+    state = pd.DataFrame({'driver': [1], 'gap': [0.0], 'compound': ['MEDIUM'], 'tyre_age': [10], 'pace': [0.0]})
+    plan = {1: [(30, 'MEDIUM')]}
+    # Same seed throughout, so only the stop (or its loss) differs; a safety car on every lap also hides the tyre effect
+    _, stay_out = sim.simulate(state, {}, START_LAP, TOTAL_LAPS, safety_car_probability=1.0)
+    _, stop = sim.simulate(state, plan, START_LAP, TOTAL_LAPS, safety_car_probability=1.0)
+    safety_car_loss = float((stop - stay_out).mean())
+    _, free_stop = sim.simulate(state, plan, START_LAP, TOTAL_LAPS, pit_loss=0.0, safety_car_probability=0.0)
+    _, stop = sim.simulate(state, plan, START_LAP, TOTAL_LAPS, safety_car_probability=0.0)
+    green_loss = float((stop - free_stop).mean())
+    expected = sim.SAFETY_CAR_PIT_FACTOR * sim.PIT_LOSS_SECONDS
+    print(f"Stop costs {safety_car_loss:.2f}s under the safety car (expected {expected:.2f}s), "
+          f"{green_loss:.2f}s under green (pit loss {sim.PIT_LOSS_SECONDS:.1f}s)")
+    passed = bench.check(abs(safety_car_loss - expected) <= PIT_LOSS_TOLERANCE, "Safety car stop was not discounted")
+    passed &= bench.check(abs(green_loss - sim.PIT_LOSS_SECONDS) <= PIT_LOSS_TOLERANCE, "Green-flag stop was discounted")
+    return passed
+
+if __name__ == "__main__":
+    bench.finish(validate_what_if() & validate_parallel() & validate_safety_car_bunching() & validate_safety_car_pit_discount(),
+                 f"What-if in under {TARGET_S:.0f}s, parallel runs match serial, and safety cars bunch the field and discount stops.",
+                 "Strategy simulator check failed.")
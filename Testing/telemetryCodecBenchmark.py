@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+# One synthetic race, shaped like real OpenF1 location data
+NUM_DRIVERS = 20
+NUM_LAPS = 57
+LAP_SECONDS = 90.0
+SAMPLE_HZ = 3.7
+REPEATS = 5
+TARGET_RATIO = 10.0  # Minimum storage reduction vs the one-row-per-sample layout
+
+# Point databaseManager (and the telemetry partitions next to it) at a scratch DB before anything imports it
+import benchmarkUtils as bench
+BENCH_DIR = bench.scratch_environment("f1_codec_bench_")
+import telemetryCodec
+import telemetryPartitions as partitions
+
+SESSION_KEY = 9000
+
+# ---------------------------
+# Synthetic telemetry
+# ---------------------------
+def make_session():
+    """Builds one session of samples: a smooth circuit loop per driver with GPS noise and timing jitter."""
+    rng = np.random.default_rng(0)
+    samples_per_lap = int(LAP_SECONDS * SAMPLE_HZ)
+    n = NUM_LAPS * samples_per_lap
+    start = pd.Timestamp("2025-03-16 04:03:00", tz="UTC")
+
+    frames = []
+    for driver in range(1, NUM_DRIVERS + 1):
+        # Sample clock with jitter at OpenF1's microsecond precision
+        dt = rng.normal(1 / SAMPLE_HZ, 0.02, size=n).clip(0.15, 0.5)
+        t = start + pd.to_timedelta(np.cumsum(dt) + driver * 0.05, unit='s')
+        theta = np.linspace(0, 2 * np.pi * NUM_LAPS, n) + rng.normal(0, 0.002, size=n)
+        frames.append(pd.DataFrame({
+            'session_key': SESSION_KEY,
+            'driver_acronym': f"D{driver:02d}",
+            'driver_number': driver,
+            'lap_number': np.repeat(np.arange(1, NUM_LAPS + 1), samples_per_lap),
+            'lap_duration': np.repeat(LAP_SECONDS + rng.normal(0, 0.5, NUM_LAPS), samples_per_lap),
+            'timestamp': t,
+            'x': np.round(8000 * np.cos(theta) + 1500 * np.cos(3 * theta)).astype(int),
+            'y': np.round(3000 * np.sin(theta) + 800 * np.sin(2 * theta)).astype(int),
+            'z': np.round(50 + 10 * np.sin(theta)).astype(int),
+        }))
+    return pd.concat(frames, ignore_index=True).sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+def write_row_layout(df, path):
+    """The previous layout: one row per sample with ISO timestamps, plus its indexes."""
+    rows = df.assign(timestamp=df['timestamp'].map(pd.Timestamp.isoformat))
+    conn = sqlite3.connect(path)
+    rows.to_sql('race_telemetry', conn, index=False)
+    conn.execute("CREATE INDEX idx_telemetry_lookup ON race_telemetry (session_key, lap_number)")
+    conn.execute("CREATE INDEX idx_telemetry_driver_time ON race_telemetry (session_key, driver_number, timestamp, lap_number)")
+    conn.execute("CREATE INDEX idx_telemetry_time ON race_telemetry (session_key, timestamp, lap_number)")
+    conn.commit()
+    conn.close()
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    df = make_session()
+    n = len(df)
+    print(f"Synthetic session: {n} samples ({NUM_DRIVERS} drivers x {NUM_LAPS} laps)")
+
+    # Old layout
+    row_path = os.path.join(BENCH_DIR, "rows.db")
+    write_row_layout(df, row_path)
+    row_bytes = os.path.getsize(row_path)
+
+    def read_rows():
+        conn = sqlite3.connect(row_path)
+        try:
+            out = pd.read_sql("SELECT * FROM race_telemetry WHERE session_key = ? ORDER BY timestamp", conn, params=(SESSION_KEY,))
+            out['timestamp'] = pd.to_datetime(out['timestamp'], format='ISO8601')
+            return out
+        finally:
+            conn.close()
+    row_read_s, _ = bench.median_time(read_rows, REPEATS)
+
+    results = [{'layout': 'rows (old)', 'file_mb': row_bytes / 1e6, 'payload_mb': np.nan, 'ratio': 1.0,
+                'read_s': row_read_s, 'msamples_per_s': n / row_read_s / 1e6}]
+
+    codecs = ['none', 'zlib'] + (['lz4'] if telemetryCodec.lz4frame is not None else [])
+    passed = True
+    for codec in codecs:
+        partitions.write_partition(SESSION_KEY, df, codec=codec)
+        file_bytes = os.path.getsize(partitions.partition_path(SESSION_KEY))
+        streams, _ = partitions.encode_session(SESSION_KEY, df, codec)
+        payload_bytes = int(streams['payload'].map(len).sum())
+
+        read_s, decoded = bench.median_time(lambda: partitions.read_session(SESSION_KEY), REPEATS)
+
+        # Pure decode throughput (no SQLite), the part the codec is responsible for
+        payloads = list(zip(streams['payload'], streams['codec']))
+        decode_s, _ = bench.median_time(lambda: [telemetryCodec.decode_stream(p, c) for p, c in payloads], REPEATS)
+
+        # Round trip: coordinates are exact, timestamps within the fixed-point step
+        original = df.sort_values(['driver_number', 'timestamp'], kind='stable').reset_index(drop=True)
+        restored = decoded.sort_values(['driver_number', 'timestamp'], kind='stable').reset_index(drop=True)
+        coords_ok = all(np.array_equal(original[c].to_numpy(), restored[c].to_numpy()) for c in ('x', 'y', 'z'))
+        laps_ok = np.array_equal(original['lap_number'].to_numpy(), restored['lap_number'].to_numpy())
+        max_time_error_ms = (original['timestamp'] - restored['timestamp']).abs().max() / pd.Timedelta(milliseconds=1)
+        exact = coords_ok and laps_ok and max_time_error_ms <= telemetryCodec.TIME_RESOLUTION_MS / 2 + 1e-9
+
+        ratio = row_bytes / file_bytes
+        results.append({'layout': f"streams ({codec})", 'file_mb': file_bytes / 1e6, 'payload_mb': payload_bytes / 1e6,
+                        'ratio': ratio, 'read_s': read_s, 'msamples_per_s': n / read_s / 1e6,
+                        'decode_msamples_per_s': n / decode_s / 1e6, 'round_trip': 'OK' if exact else 'FAIL'})
+        if not exact:
+            passed = False
+        if codec != 'none' and ratio < TARGET_RATIO:
+            passed = False
+
+    print("\nSummary")
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    return passed
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 f"Compressed streams round-trip and are at least {TARGET_RATIO:.0f}x smaller than rows.",
+                 "Round-trip mismatch or compression ratio below target.")
@@ -0,0 +1,65 @@
+import numpy as np
+
+import benchmarkUtils as bench
+import trackProjection
+
+# --- CONFIGURATION ---
+# A synthetic circuit (a wobbly loop ~5 km long, in OpenF1 units) and a race's worth of samples
+OUTLINE_POINTS = 300        # Same budget as trackOutline.TRACK_POINT_BUDGET
+NUM_SAMPLES = 20 * 57 * 90  # 20 drivers, 57 laps, 1 Hz
+SAMPLE_NOISE = 40.0         # Lateral spread of samples around the centreline (racing line, pit lane)
+CHECK_SAMPLES = 5000        # Samples checked against the brute-force projection
+MAX_ERROR = 1.0             # Largest accepted distance error (units)
+TARGET_SAMPLES_PER_S = 1e6  # Minimum projection throughput
+
+# ---------------------------
+# Synthetic circuit
+# ---------------------------
+def make_outline():
+    theta = np.linspace(0, 2 * np.pi, OUTLINE_POINTS)
+    radius = 6000 + 1500 * np.sin(3 * theta) + 600 * np.cos(7 * theta)
+    return radius * np.cos(theta) * 1.4, radius * np.sin(theta)
+
+def make_samples(projection):
+    """Points scattered around random positions on the densified centreline."""
+    rng = np.random.default_rng(0)
+    i = rng.integers(0, len(projection.x) - 1, NUM_SAMPLES)
+    t = rng.random(NUM_SAMPLES)
+    x = projection.x[i] + t * (projection.x[i + 1] - projection.x[i]) + rng.normal(0, SAMPLE_NOISE, NUM_SAMPLES)
+    y = projection.y[i] + t * (projection.y[i + 1] - projection.y[i]) + rng.normal(0, SAMPLE_NOISE, NUM_SAMPLES)
+    return x, y
+
+def brute_force(projection, x, y):
+    """Projection onto every centreline segment; the reference the grid lookup must match."""
+    ax, ay = projection.x[:-1], projection.y[:-1]
+    dx, dy = projection.x[1:] - ax, projection.y[1:] - ay
+    t = np.clip(((x[:, None] - ax) * dx + (y[:, None] - ay) * dy) / (dx * dx + dy * dy), 0.0, 1.0)
+    dist_sq = (ax + t * dx - x[:, None]) ** 2 + (ay + t * dy - y[:, None]) ** 2
+    best = dist_sq.argmin(axis=1)
+    rows = np.arange(len(x))
+    return projection.arc[best] + t[rows, best] * (projection.arc[best + 1] - projection.arc[best])
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    outline_x, outline_y = make_outline()
+    build_s, projection = bench.median_time(lambda: trackProjection.TrackProjection(outline_x, outline_y), repeats=1)
+    print(f"Circuit: {projection.length:.0f} units, {projection.n_segments} segments, "
+          f"{projection.nx}x{projection.ny} grid, built in {build_s:.2f}s")
+
+    x, y = make_samples(projection)
+    project_s, (distance, _) = bench.median_time(lambda: projection.project(x, y), repeats=1)
+    rate = NUM_SAMPLES / project_s
+    print(f"Projected {NUM_SAMPLES} samples in {project_s * 1000:.1f} ms ({rate / 1e6:.1f}M samples/s)")
+
+    check = slice(0, CHECK_SAMPLES)
+    error = np.abs(brute_force(projection, x[check], y[check]) - distance[check])
+    error = np.minimum(error, projection.length - error)  # Either side of the start line is the same point
+    print(f"Max error vs brute force: {error.max():.4f} units (p99 {np.percentile(error, 99):.4f})")
+    return error.max() <= MAX_ERROR and rate >= TARGET_SAMPLES_PER_S
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 "Grid projection matches the brute-force projection at the target throughput.",
+                 "Projection error or throughput outside target.")
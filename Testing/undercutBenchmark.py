@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import pandas as pd
+
+import benchmarkUtils as bench
+import undercutAnalyzer
+
+# --- CONFIGURATION ---
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'DataCollection', 'RaceDataCSV', 'MLData_session_9869.csv')
+REPEATS = 5
+TARGET_MS = 100.0  # One session's analysis (every lap x pair) must finish within this
+
+# ---------------------------
+# Reference: one sort and one pass over the pairs per lap
+# ---------------------------
+def loop_pairs(laps, rates):
+    drivers, m = undercutAnalyzer.lap_matrices(laps)
+    rows = []
+    for lap in range(m['end'].shape[1]):
+        ends = m['end'][:, lap]
+        order = [d for d in np.argsort(ends, kind='stable') if not np.isnan(ends[d])]
+        for k in range(1, len(order)):
+            a, b = order[k - 1], order[k]
+            if m['pit'][a, lap] or m['pit'][b, lap]:
+                continue
+            rate_a = rates[m['compound'][a, lap]] if m['compound'][a, lap] >= 0 else np.nan
+            rate_b = rates[m['compound'][b, lap]] if m['compound'][b, lap] >= 0 else np.nan
+            gain = rate_a * (m['age'][a, lap] + 1) - rate_b * undercutAnalyzer.FRESH_TYRE_AGE - undercutAnalyzer.WARM_UP_PENALTY
+            lost = sum(1 for d in order[k + 1:] if ends[d] <= ends[b] + undercutAnalyzer.PIT_LOSS_SECONDS)
+            rows.append({'lap_number': lap + 1, 'driver_number': drivers[b], 'ahead_driver_number': drivers[a],
+                         'undercut_margin': gain - (ends[b] - ends[a]), 'rejoin_places_lost': lost})
+    return pd.DataFrame(rows)
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run_benchmark():
+    laps = pd.read_csv(CSV_PATH)
+    rates = undercutAnalyzer.compound_rates(laps)
+
+    vector_s, pairs = bench.median_time(lambda: undercutAnalyzer.analyze_pairs(laps, rates=rates), REPEATS)
+    loop_s, reference = bench.median_time(lambda: loop_pairs(laps, rates), repeats=1)
+    vector_ms, loop_ms = vector_s * 1000, loop_s * 1000
+
+    merged = pairs.merge(reference, on=['lap_number', 'driver_number', 'ahead_driver_number'], suffixes=('', '_loop'))
+    margin_diff = np.nanmax(np.abs(merged['undercut_margin'] - merged['undercut_margin_loop']).to_numpy())
+    places_match = bool((merged['rejoin_places_lost'] == merged['rejoin_places_lost_loop']).all())
+
+    print(f"{len(pairs)} (lap, pair) rows in {vector_ms:.1f} ms (per-lap loop: {loop_ms:.1f} ms, "
+          f"max margin difference {margin_diff:.2e}, places lost match: {places_match})")
+    print(f"Undercut viable on {pairs['undercut_viable'].mean():.1%} of pairs, overcut on {pairs['overcut_viable'].mean():.1%}")
+    return vector_ms <= TARGET_MS and len(merged) == len(pairs) == len(reference) and margin_diff < 1e-9 and places_match
+
+if __name__ == "__main__":
+    bench.finish(run_benchmark(),
+                 f"Session analysed in under {TARGET_MS:.0f} ms and matches the per-lap reference.",
+                 "Analysis too slow or different from the per-lap reference.")